@@ -37,3 +37,14 @@ def admin_client():
     }
     session.save()
     return client
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    Start each test with an empty cache. The database is rolled back
+    between tests but the cache isn't, so data versions and pages cached
+    by one test would otherwise be read by the next.
+    """
+    from django.core.cache import cache
+    cache.clear()
@@ -159,38 +159,38 @@ class TestArticleFeaturedToggle:
 
     def test_toggling_featured_clears_homepage_cache(self, article):
         """Test that toggling featured status triggers cache clearing for homepage."""
-        with patch('givefood.models.articles.decache_async') as mock_decache:
+        with patch('givefood.models.articles.queue_decache') as mock_decache:
             # Toggle featured from False to True
             article.featured = True
             article.save()
             
-            # Verify decache_async.enqueue was called
-            assert mock_decache.enqueue.called
-            call_args = mock_decache.enqueue.call_args[0][0]
+            # Verify queue_decache was called
+            assert mock_decache.called
+            call_args = mock_decache.call_args[0][0]
             
             # Check that homepage URLs are included
             assert any('/' in url or url == '/' for url in call_args)
             
             # Reset mock
-            mock_decache.enqueue.reset_mock()
+            mock_decache.reset_mock()
             
             # Toggle featured from True to False
             article.featured = False
             article.save()
             
-            # Verify decache_async.enqueue was called again
-            assert mock_decache.enqueue.called
-            call_args = mock_decache.enqueue.call_args[0][0]
+            # Verify queue_decache was called again
+            assert mock_decache.called
+            call_args = mock_decache.call_args[0][0]
             
             # Check that homepage URLs are included
             assert any('/' in url or url == '/' for url in call_args)
 
     def test_saving_without_changing_featured_does_not_clear_cache(self, article):
         """Test that saving an article without changing featured status doesn't clear cache."""
-        with patch('givefood.models.articles.decache_async') as mock_decache:
+        with patch('givefood.models.articles.queue_decache') as mock_decache:
             # Save without changing featured status
             article.title = "Updated Title"
             article.save()
             
-            # Verify decache_async.enqueue was NOT called
-            assert not mock_decache.enqueue.called
+            # Verify queue_decache was NOT called
+            assert not mock_decache.called
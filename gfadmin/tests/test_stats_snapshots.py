@@ -0,0 +1,197 @@
+"""Tests for the admin stats pages reading their figures from StatsSnapshot."""
+import datetime
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from givefood.models import (
+    Foodbank,
+    FoodbankChange,
+    FoodbankChangeLine,
+    FoodbankSubscriber,
+    Order,
+    StatsSnapshot,
+    WhatsappSubscriber,
+)
+from givefood.utils.stats import get_stats, refresh_stats
+
+
+def make_foodbank(name, **kwargs):
+    foodbank = Foodbank(
+        name=name,
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country="England",
+        lat_lng="51.5014,-0.1419",
+        network="Independent",
+        url="https://test.example.com",
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+        **kwargs,
+    )
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def make_order(foodbank, created, **totals):
+    with patch("givefood.models.orders.gemini", return_value=[]):
+        order = Order(foodbank=foodbank, items_text="Test items", delivery_date=created.date(), delivery_hour=10)
+        order.save(do_foodbank_save=False)
+    Order.objects.filter(pk=order.pk).update(created=created, **totals)
+    return order
+
+
+@pytest.fixture
+def admin_client(client):
+    session = client.session
+    session['user_data'] = {
+        'email': 'test@givefood.org.uk',
+        'email_verified': True,
+        'hd': 'givefood.org.uk',
+    }
+    session.save()
+    return client
+
+
+@pytest.mark.django_db
+class TestStatsFigures:
+    """Test the snapshot figures are what the pages used to count."""
+
+    def test_edit_stats(self):
+        """Headline donation points count delivery addresses the way the page always has."""
+        # Set after saving, which would geocode it
+        with_delivery = make_foodbank("With Delivery")
+        Foodbank.objects.filter(pk=with_delivery.pk).update(delivery_address="2 Test Street", edited=timezone.now())
+        make_foodbank("Empty Delivery", delivery_address="")
+        make_foodbank("No Delivery", delivery_address=None, address_is_administrative=True)
+
+        stats, snapshot = get_stats("edit_stats")
+
+        assert stats["Total Food Banks"] == 3
+        assert stats["Headline Locations"] == 3
+        # Two not administrative, and exclude() keeps the food bank with no delivery address
+        assert stats["Headline DP"] == 2 + Foodbank.objects.exclude(delivery_address="").count()
+        assert isinstance(stats["Newest Edit"], datetime.datetime)
+
+    def test_order_stats(self):
+        foodbank = make_foodbank("Order Food Bank")
+        now = timezone.now()
+        make_order(foodbank, now, weight=1500, calories=1000, no_items=10, cost=250)
+        make_order(foodbank, now, weight=500, calories=200, no_items=2, cost=150)
+
+        stats, snapshot = get_stats("order_stats")
+
+        assert stats["Total Weight"] == 2
+        assert stats["Total Calories"] == 1200
+        assert stats["Total Items"] == 12
+        assert stats["Total Orders"] == 2
+        assert stats["Total Cost"] == 4
+
+    def test_order_stats_empty(self):
+        """No orders is all noughts, rather than an error summing nothing."""
+        stats, snapshot = get_stats("order_stats")
+        assert stats["Total Weight"] == 0
+        assert stats["Total Cost"] == 0
+
+    def test_need_stats(self):
+        foodbank = make_foodbank("Need Food Bank")
+        need = FoodbankChange(foodbank=foodbank, change_text="Pasta\nRice", excess_change_text="Beans", published=False)
+        need.save()
+        FoodbankChangeLine.objects.filter(need=need).delete()
+        for item, line_type in [("Pasta", "need"), ("Rice", "need"), ("Beans", "excess")]:
+            FoodbankChangeLine.objects.create(need=need, foodbank=foodbank, item=item, type=line_type, category="Pasta", group="Food")
+
+        stats, snapshot = get_stats("need_stats")
+
+        assert stats == {"Needs": 1, "Items": 3, "Needed Items": 2, "Excess Items": 1}
+
+    def test_subscriber_graph(self):
+        """Subscriptions are counted per type and week, with the weeks in order."""
+        foodbank = make_foodbank("Subscriber Food Bank")
+        first_week = datetime.datetime(2024, 1, 3, 12, tzinfo=datetime.timezone.utc)
+        second_week = datetime.datetime(2024, 1, 10, 12, tzinfo=datetime.timezone.utc)
+        subscribers = [
+            FoodbankSubscriber.objects.create(foodbank=foodbank, email="one@example.com", confirmed=True),
+            FoodbankSubscriber.objects.create(foodbank=foodbank, email="two@example.com", confirmed=True),
+            FoodbankSubscriber.objects.create(foodbank=foodbank, email="three@example.com", confirmed=False),
+        ]
+        FoodbankSubscriber.objects.filter(pk=subscribers[0].pk).update(created=second_week)
+        FoodbankSubscriber.objects.filter(pk__in=[subscribers[1].pk, subscribers[2].pk]).update(created=first_week)
+        whatsapp = WhatsappSubscriber.objects.create(foodbank=foodbank, phone_number="+447700900000")
+        WhatsappSubscriber.objects.filter(pk=whatsapp.pk).update(created=second_week)
+
+        week_subs, snapshot = get_stats("subscriber_graph")
+
+        assert list(week_subs.items()) == [
+            ("2024-1", {"email": 1, "whatsapp": 0, "webpush": 0, "mobile": 0, "total": 1}),
+            ("2024-2", {"email": 1, "whatsapp": 1, "webpush": 0, "mobile": 0, "total": 2}),
+        ]
+
+
+@pytest.mark.django_db
+class TestStatsPages:
+    """Test the pages read their snapshot, and refresh it on demand."""
+
+    def test_built_once_then_read(self, admin_client, django_assert_max_num_queries):
+        """The first view builds the snapshot, and later views read it without counting again."""
+        make_foodbank("Stats Food Bank")
+
+        response = admin_client.get(reverse("admin:edit_stats"))
+        assert response.status_code == 200
+        assert StatsSnapshot.objects.filter(name="edit_stats").exists()
+
+        make_foodbank("Another Food Bank")
+        with django_assert_max_num_queries(10) as queries:
+            response = admin_client.get(reverse("admin:edit_stats"))
+        assert response.context["stats"]["Total Food Banks"] == 1
+        assert not [query for query in queries.captured_queries if "givefood_foodbank" in query["sql"]]
+
+    def test_refresh(self, admin_client):
+        """Refreshing a page's snapshot brings its figures up to date."""
+        make_foodbank("Stats Food Bank")
+        get_stats("edit_stats")
+        make_foodbank("Another Food Bank")
+
+        response = admin_client.post(reverse("admin:stats_refresh", args=["edit_stats"]))
+
+        assert response.status_code == 302
+        assert response.url == reverse("admin:edit_stats")
+        stats, snapshot = get_stats("edit_stats")
+        assert stats["Total Food Banks"] == 2
+
+    def test_refresh_unknown(self, admin_client):
+        response = admin_client.post(reverse("admin:stats_refresh", args=["not_stats"]))
+        assert response.status_code == 404
+
+    def test_subscriber_graph_page(self, admin_client):
+        response = admin_client.get(reverse("admin:subscriber_graph"))
+        assert response.status_code == 200
+        assert response.context["snapshot"].name == "subscriber_graph"
+
+    def test_quarter_stats(self, admin_client):
+        """The quarter's orders are summed by the database, and only those in range."""
+        foodbank = make_foodbank("Quarter Food Bank")
+        make_order(foodbank, datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc), weight=2500, calories=100, no_items=5, cost=1050)
+        make_order(foodbank, datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc), weight=500, calories=50, no_items=1, cost=50)
+        make_order(foodbank, datetime.datetime(2024, 6, 1, tzinfo=datetime.timezone.utc), weight=9999, calories=999, no_items=99, cost=999)
+
+        response = admin_client.get(reverse("admin:quarter_stats"), {"start": "2024-01-01", "end": "2024-03-31"})
+
+        stats = response.context["stats"]
+        assert stats["Deliveries"] == 2
+        assert stats["Items"] == 6
+        assert stats["Calories"] == 150
+        assert stats["Weight"] == "3.0 kg"
+        assert stats["Cost"] == "£11.0"
+
+    def test_command(self):
+        """refresh_stats builds every snapshot, or just the ones named."""
+        call_command("refresh_stats", "need_stats")
+        assert list(StatsSnapshot.objects.values_list("name", flat=True)) == ["need_stats"]
+
+        call_command("refresh_stats")
+        assert StatsSnapshot.objects.count() == 5
+        assert len(refresh_stats()) == 5
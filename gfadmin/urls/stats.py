@@ -9,5 +9,6 @@ urlpatterns = [
     path("stats/subscribers/", subscriber_stats, name="subscriber_stats"),
     path("stats/subscribers/graph/", subscriber_graph, name="subscriber_graph"),
     path("stats/needs/", need_stats, name="need_stats"),
+    path("stats/<slug:name>/refresh/", stats_refresh, name="stats_refresh"),
 
 ]
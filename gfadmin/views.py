@@ -1,4 +1,3 @@
-from collections import OrderedDict
 import csv
 import json
 import logging
@@ -19,7 +18,6 @@ from django.utils.encoding import smart_str
 from django.utils import timezone
 from django.core.cache import cache
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db import IntegrityError
 from django.db.models import Sum, Q, Count, OuterRef, Subquery, IntegerField
 from django.db.models.functions import Coalesce
 from django.contrib.contenttypes.models import ContentType
@@ -27,13 +25,16 @@ from django.core.validators import validate_email, URLValidator
 from django.core.exceptions import ValidationError as DjangoValidationError
 
 from givefood.const.general import BOT_USER_AGENT, PACKAGING_WEIGHT_PC
-from givefood.utils.cache import delete_all_cached_credentials, get_all_foodbanks, get_all_locations, get_cred
+from givefood.utils.bulkload import load_constituency_boundaries, load_places
+from givefood.utils.cache import delete_all_cached_credentials, get_all_foodbanks, get_all_locations, get_cred, purge_stats
 from givefood.utils.crawlers import foodbank_article_crawl, foodbank_article_crawl_async
 from givefood.utils.ai import gemini, openrouter
 from givefood.utils.geo import distance_meters, find_locations
+from givefood.utils.stats import STATS, get_stats, refresh_stats
+from givefood.utils.tasks import queue_stats
 from givefood.utils.notifications import post_to_subscriber, send_email, send_firebase_notification, send_firebase_notification_async, send_single_webpush_notification, send_webpush_notification, send_webpush_notification_async, send_whatsapp_notification, send_whatsapp_notification_async, send_whatsapp_template_notification
 from givefood.utils.text import diff_html, htmlbodytext
-from givefood.models import CrawlItem, Foodbank, FoodbankArticle, FoodbankChangeTranslation, FoodbankDonationPoint, FoodbankHit, MobileSubscriber, Order, OrderGroup, OrderItem, FoodbankChange, FoodbankLocation, ParliamentaryConstituency, GfCredential, FoodbankSubscriber, Place, FoodbankChangeLine, FoodbankDiscrepancy, CrawlSet, SlugRedirect, WebPushSubscription, WhatsappSubscriber, PlacePhoto
+from givefood.models import CrawlItem, Foodbank, FoodbankArticle, FoodbankChangeTranslation, FoodbankDonationPoint, FoodbankHit, MobileSubscriber, Order, OrderGroup, OrderItem, FoodbankChange, FoodbankLocation, ParliamentaryConstituency, GfCredential, FoodbankSubscriber, Place, FoodbankChangeLine, FoodbankDiscrepancy, CrawlSet, SearchDocument, SlugRedirect, WebPushSubscription, WhatsappSubscriber, PlacePhoto
 from givefood.forms import FoodbankDonationPointForm, FoodbankForm, OrderForm, NeedForm, FoodbankPoliticsForm, FoodbankLocationForm, FoodbankLocationAreaForm, OrderGroupForm, ParliamentaryConstituencyForm, OrderItemForm, GfCredentialForm, NeedLineForm, FoodbankUrlsForm, FoodbankAddressForm, FoodbankPhoneForm, FoodbankEmailForm, FoodbankFsaIdForm, SlugRedirectForm, PlaceForm
 from django_tasks_db.models import DBTaskResult
 from django_tasks.base import TaskResultStatus
@@ -92,6 +93,8 @@ def index(request):
         "charity_check_24h":crawl_counts.get("charity", 0),
         "tasks_24h":tasks_24h,
         "tasks_outstanding":tasks_outstanding,
+        "task_queues":queue_stats(yesterday),
+        "cache_purges":purge_stats(yesterday),
     }
 
     # Articles
@@ -114,54 +117,13 @@ def search_results(request):
     if query:
         query = query.strip()
 
-    foodbanks = Foodbank.objects.filter(
-        Q(slug__icontains=query) |
-        Q(name__icontains=query) |
-        Q(address__icontains=query) |
-        Q(postcode__icontains=query) |
-        Q(url__icontains=query) |
-        Q(shopping_list_url__icontains=query) |
-        Q(rss_url__icontains=query) |
-        Q(news_url__icontains=query) |
-        Q(donation_points_url__icontains=query) |
-        Q(locations_url__icontains=query) |
-        Q(contacts_url__icontains=query) |
-        Q(charity_name__icontains=query)
-    )[:100]
-
-    locations = FoodbankLocation.objects.filter(
-        Q(slug__icontains=query) |
-        Q(name__icontains=query) |
-        Q(address__icontains=query) |
-        Q(postcode__icontains=query)
-    )[:100]
-
-    donationpoints = FoodbankDonationPoint.objects.filter(
-        Q(name__icontains=query) |
-        Q(address__icontains=query) |
-        Q(postcode__icontains=query)
-    )[:100]
-
-    constituencies = ParliamentaryConstituency.objects.filter(
-        Q(name__icontains=query) |
-        Q(mp__icontains=query)
-    )[:100]
-
-    needs = FoodbankChange.objects.filter(
-        Q(change_text__icontains=query) |
-        Q(excess_change_text__icontains=query)
-    ).order_by("-created")[:100]
-
-    # Search subscriptions across all types and combine into single list
+    # One ranked query over the search documents, then each type's objects by id
+    results = SearchDocument.search(query)
+
+    # Combine subscriptions of all types into a single list
     subscriptions = []
-    
-    # Email subscriptions (confirmed only)
-    email_subs = FoodbankSubscriber.objects.filter(
-        Q(email__icontains=query) &
-        Q(confirmed=True)
-    ).select_related('foodbank')[:100]
-    
-    for sub in email_subs:
+
+    for sub in results["email"]:
         subscriptions.append({
             'type': 'email',
             'type_emoji': '<span class="mdi mdi-email"></span>',
@@ -170,13 +132,8 @@ def search_results(request):
             'foodbank_name': sub.foodbank_name,
             'foodbank_slug': sub.foodbank_slug(),
         })
-    
-    # WhatsApp subscriptions
-    whatsapp_subs = WhatsappSubscriber.objects.filter(
-        Q(phone_number__icontains=query)
-    ).select_related('foodbank')[:100]
-    
-    for sub in whatsapp_subs:
+
+    for sub in results["whatsapp"]:
         subscriptions.append({
             'type': 'whatsapp',
             'type_emoji': '<span class="mdi mdi-whatsapp"></span>',
@@ -185,13 +142,8 @@ def search_results(request):
             'foodbank_name': sub.foodbank_name,
             'foodbank_slug': sub.foodbank.slug,
         })
-    
-    # Mobile subscriptions
-    mobile_subs = MobileSubscriber.objects.filter(
-        Q(device_id__icontains=query)
-    ).select_related('foodbank')[:100]
-    
-    for sub in mobile_subs:
+
+    for sub in results["mobile"]:
         device_id_display = sub.device_id[:20] + "..." if len(sub.device_id) > 20 else sub.device_id
         subscriptions.append({
             'type': 'mobile',
@@ -201,13 +153,8 @@ def search_results(request):
             'foodbank_name': sub.foodbank.name,
             'foodbank_slug': sub.foodbank.slug,
         })
-    
-    # WebPush subscriptions
-    webpush_subs = WebPushSubscription.objects.filter(
-        Q(endpoint__icontains=query)
-    ).select_related('foodbank')[:100]
-    
-    for sub in webpush_subs:
+
+    for sub in results["webpush"]:
         endpoint_display = sub.endpoint[:30] + "..." if len(sub.endpoint) > 30 else sub.endpoint
         subscriptions.append({
             'type': 'webpush',
@@ -220,11 +167,11 @@ def search_results(request):
 
     template_vars = {
         "query": query,
-        "foodbanks": foodbanks,
-        "locations": locations,
-        "donationpoints": donationpoints,
-        "constituencies": constituencies,
-        "needs": needs,
+        "foodbanks": results["foodbank"],
+        "locations": results["location"],
+        "donationpoints": results["donationpoint"],
+        "constituencies": results["constituency"],
+        "needs": results["need"],
         "subscriptions": subscriptions,
         "section": "search",
     }
@@ -1146,7 +1093,9 @@ def foodbank_check(request, slug):
         0,
         response_mime_type = "application/json",
         model = "gemini-2.5-flash",
-        response_schema = FOODBANK_CHECK_RESPONSE_SCHEMA
+        response_schema = FOODBANK_CHECK_RESPONSE_SCHEMA,
+        caller = "foodbank_check",
+        cache = True,
     )
 
     for location in foodbank_json["locations"]:
@@ -1233,7 +1182,9 @@ def foodbank_check_result(request, slug):
         0,
         response_mime_type = "application/json",
         model = "gemini-2.5-flash",
-        response_schema = FOODBANK_CHECK_RESPONSE_SCHEMA
+        response_schema = FOODBANK_CHECK_RESPONSE_SCHEMA,
+        caller = "foodbank_check",
+        cache = True,
     )
 
     return HttpResponse(json.dumps(check_result, indent=2), content_type="application/json")
@@ -1475,7 +1426,7 @@ Only suggest URLs from the list provided. Return as JSON with these exact field
                             "required": ["shopping_list_url", "rss_url", "news_url", "donation_points_url", "locations_url", "contacts_url"]
                         }
                         
-                        suggestions = gemini(prompt, temperature=0, response_mime_type="application/json", response_schema=response_schema)
+                        suggestions = gemini(prompt, temperature=0, response_mime_type="application/json", response_schema=response_schema, caller="foodbank_urls", cache=True)
                         
                         # Apply suggestions to empty fields only
                         for field in empty_fields:
@@ -2344,22 +2295,20 @@ def quarter_stats(request):
     start_date = datetime.strptime(start_date, "%Y-%m-%d")
     end_date = datetime.strptime(end_date, "%Y-%m-%d")
 
-    orders = Order.objects.filter(created__gte=start_date, created__lte=end_date)
-    order_count = orders.count()
-
-    weight = 0
-    items = 0
-    calories = 0
-    cost = 0
-    
-    for order in orders:
-        weight += order.weight
-        items += order.no_items
-        calories += order.calories
-        cost += order.cost
+    # Summed by the database, rather than loading every order in the quarter
+    totals = Order.objects.filter(created__gte=start_date, created__lte=end_date).aggregate(
+        order_count = Count("id"),
+        weight = Coalesce(Sum("weight"), 0),
+        items = Coalesce(Sum("no_items"), 0),
+        calories = Coalesce(Sum("calories"), 0),
+        cost = Coalesce(Sum("cost"), 0),
+    )
+    order_count = totals["order_count"]
+    items = totals["items"]
+    calories = totals["calories"]
 
-    weight = "%s kg" % (round(weight / 1000,2))
-    cost = "£%s" % (round(cost / 100,2))
+    weight = "%s kg" % (round(totals["weight"] / 1000,2))
+    cost = "£%s" % (round(totals["cost"] / 100,2))
 
     edits = Foodbank.objects.filter(edited__gte=start_date, edited__lte=end_date).count()
     new_subscribers = FoodbankSubscriber.objects.filter(created__gte=start_date, created__lte=end_date).count()
@@ -2388,153 +2337,55 @@ def quarter_stats(request):
     
 
 def edit_stats(request):
-
-    foodbanks = Foodbank.objects.count()
-    locations = FoodbankLocation.objects.count()
-    headline_locations = locations + foodbanks
-
-    donation_points = FoodbankDonationPoint.objects.all().count()
-    headline_donation_points = donation_points + Foodbank.objects.exclude(address_is_administrative = True).count() + Foodbank.objects.exclude(delivery_address = "").count() + FoodbankLocation.objects.filter(is_donation_point = True).count()
-
-    newest_edit = Foodbank.objects.all().order_by("-edited")[:1][0].edited
-    oldest_edit = Foodbank.objects.all().order_by("edited")[:1][0].edited
-
-    stats = {
-        "Total Food Banks":foodbanks,
-        "Total Locations":locations,
-        "Headline Locations":headline_locations,
-        "Donation Points":donation_points,
-        "Headline DP":headline_donation_points,
-        "FB With DP":Foodbank.objects.exclude(no_donation_points = 0).count(),
-        "Newest Edit":newest_edit,
-        "Oldest Edit":oldest_edit,
-        "Total Discrepancies":FoodbankDiscrepancy.objects.count(),
-        "Discrepancies Outstanding":FoodbankDiscrepancy.objects.filter(status = "New").count(),
-        "Discrepancies Invalid":FoodbankDiscrepancy.objects.filter(status = "Invalid").count(),
-        "Discrepancies Done":FoodbankDiscrepancy.objects.filter(status = "Done").count(),
-    }
-
-    template_vars = {
-        "stats":stats,
-        "title":"Edit",
-        "section":"stats",
-    }
-
-    return render(request, "admin/stats.html", template_vars)
+    return _stats_page(request, "edit_stats", "Edit")
 
 
 def order_stats(request):
-
-    total_weight = Order.objects.aggregate(Sum("weight"))["weight__sum"]
-    total_calories = Order.objects.aggregate(Sum("calories"))["calories__sum"]
-    total_items = Order.objects.aggregate(Sum("no_items"))["no_items__sum"]
-    total_cost = Order.objects.aggregate(Sum("cost"))["cost__sum"]
-    total_orders = Order.objects.all().count()
-
-    total_weight = total_weight / 1000
-    total_weight_pkg = total_weight * PACKAGING_WEIGHT_PC
-    total_weight_pkg = round(total_weight_pkg, 2)
-
-    total_cost = float(total_cost) / 100
-
-    stats = {
-        "Total Weight":total_weight,
-        "Total Calories":total_calories,
-        "Total Items":total_items,
-        "Total Orders":total_orders,
-        "Total Cost":total_cost,
-        "Total Weight (inc. packaging)":total_weight_pkg,
-    }
-
-    template_vars = {
-        "stats":stats,
-        "title":"Order",
-        "section":"stats",
-    }
-
-    return render(request, "admin/stats.html", template_vars)
+    return _stats_page(request, "order_stats", "Order")
 
 
 def subscriber_stats(request):
-
-    stats = {
-        "Confirmed":FoodbankSubscriber.objects.filter(confirmed = True).count(),
-        "Unconfirmed":FoodbankSubscriber.objects.filter(confirmed = False).count(),
-    }
-
-    template_vars = {
-        "stats":stats,
-        "title":"Subscriber",
-        "section":"stats",
-    }
-
-    return render(request, "admin/stats.html", template_vars)
+    return _stats_page(request, "subscriber_stats", "Subscriber")
 
 
 def subscriber_graph(request):
 
-    week_keys = OrderedDict()
-
-    email_subs = {}
-    whatsapp_subs = {}
-    webpush_subs = {}
-    mobile_subs = {}
-
-    for sub in FoodbankSubscriber.objects.filter(confirmed = True).order_by("created"):
-        week_key = "%s-%s" % (sub.created.year, sub.created.isocalendar()[1])
-        email_subs[week_key] = email_subs.get(week_key, 0) + 1
-        week_keys[week_key] = True
-
-    for sub in WhatsappSubscriber.objects.all().order_by("created"):
-        week_key = "%s-%s" % (sub.created.year, sub.created.isocalendar()[1])
-        whatsapp_subs[week_key] = whatsapp_subs.get(week_key, 0) + 1
-        week_keys[week_key] = True
-
-    for sub in WebPushSubscription.objects.all().order_by("created"):
-        week_key = "%s-%s" % (sub.created.year, sub.created.isocalendar()[1])
-        webpush_subs[week_key] = webpush_subs.get(week_key, 0) + 1
-        week_keys[week_key] = True
-
-    for sub in MobileSubscriber.objects.all().order_by("created"):
-        week_key = "%s-%s" % (sub.created.year, sub.created.isocalendar()[1])
-        mobile_subs[week_key] = mobile_subs.get(week_key, 0) + 1
-        week_keys[week_key] = True
-
-    # Build combined ordered dict with per-type counts
-    week_subs = OrderedDict()
-    for week_key in week_keys:
-        counts = {
-            "email": email_subs.get(week_key, 0),
-            "whatsapp": whatsapp_subs.get(week_key, 0),
-            "webpush": webpush_subs.get(week_key, 0),
-            "mobile": mobile_subs.get(week_key, 0),
-        }
-        counts["total"] = sum(counts.values())
-        week_subs[week_key] = counts
+    week_subs, snapshot = get_stats("subscriber_graph")
 
     template_vars = {
         "week_subs":week_subs,
+        "snapshot":snapshot,
     }
     return render(request, "admin/sub_graph.html", template_vars)
 
 
 def need_stats(request):
+    return _stats_page(request, "need_stats", "Need")
 
-    stats = {
-        "Needs": FoodbankChange.objects.count(),
-        "Items": FoodbankChangeLine.objects.all().count(),
-        "Needed Items": FoodbankChangeLine.objects.filter(type = "need").count(),
-        "Excess Items": FoodbankChangeLine.objects.filter(type = "excess").count(),
-    }
+
+def _stats_page(request, name, title):
+
+    stats, snapshot = get_stats(name)
 
     template_vars = {
         "stats":stats,
-        "title":"Need",
+        "snapshot":snapshot,
+        "title":title,
         "section":"stats",
     }
 
     return render(request, "admin/stats.html", template_vars)
 
+
+@require_POST
+def stats_refresh(request, name):
+
+    if name not in STATS:
+        raise Http404
+    refresh_stats([name])
+    return redirect(reverse("admin:%s" % name))
+
+
 def order_email(request, id):
 
     order = get_object_or_404(Order, order_id = id)
@@ -2631,24 +2482,7 @@ def parlcon_loader(request):
 
 def parlcon_loader_geojson(request):
 
-    parlcons = ParliamentaryConstituency.objects.all()
-
-    files = [
-        "gb",
-    ]
-
-    for file in files:
-        geojson_file = open('./givefood/data/parlcon/%s.geojson' % (file), 'r')
-        lines = geojson_file.readlines()
-
-        for line in lines:
-            # logging.info(line)
-            for parlcon in parlcons:
-                # if not parlcon.boundary_geojson:
-                if parlcon.name in line:
-                    logging.info("Found " + parlcon.name)
-                    parlcon.boundary_geojson = line
-                    parlcon.save()
+    load_constituency_boundaries('./givefood/data/parlcon/gb.geojson')
 
     return HttpResponse("OK")
 
@@ -2701,29 +2535,8 @@ def parlcon_loader_twitter_handle(request):
 
 def places_loader(request):
 
-    with open('./givefood/data/places.csv') as csvfile:
-        readCSV = csv.reader(csvfile, delimiter=',')
-
-        for row in readCSV:
-
-            try:
-                new_place = Place(
-                    gbpnid = row[0],
-                    name = row[1],
-                    lat_lng = "%s,%s" % (row[2], row[3]),
-                    histcounty = row[4],
-                    adcounty = row[5],
-                    district = row[6],
-                    uniauth = row[7],
-                    police = row[8],
-                    region = row[9],
-                    type = row[10],
-                )
-                new_place.save()
-            except IntegrityError:
-                # Skip duplicate places (unique constraint on gbpnid)
-                # This allows re-running the loader without errors
-                pass
+    # Adds and updates places, leaving any not in the file
+    load_places('./givefood/data/places.csv', replace = False)
 
     return HttpResponse("OK")
 
@@ -3517,7 +3330,7 @@ def needtestbed(request):
             }
 
             try:
-                api_response = openrouter(need_prompt, 0, model, response_schema=response_schema)
+                api_response = openrouter(need_prompt, 0, model, response_schema=response_schema, caller="need_testbed")
 
                 if api_response.status_code == 200:
                     response_json = api_response.json()
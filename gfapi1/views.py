@@ -2,18 +2,17 @@ import unicodecsv as csv
 
 from django.http import HttpResponseBadRequest, JsonResponse, HttpResponse
 from django.utils.timesince import timesince
-from django.views.decorators.cache import cache_page
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 
-from givefood.utils.cache import get_all_foodbanks
+from givefood.utils.cache import versioned_cache_page
 from givefood.utils.geo import find_foodbanks, geocode
 from givefood.models import Foodbank, FoodbankChange
 from givefood.const.general import API_DOMAIN
 from givefood.const.cache_times import SECONDS_IN_HOUR, SECONDS_IN_DAY, SECONDS_IN_MONTH
 
 
-@cache_page(SECONDS_IN_MONTH)
+@versioned_cache_page(SECONDS_IN_MONTH, ("foodbank",))
 def api_foodbanks(request):
 
     allowed_formats = [
@@ -22,7 +21,7 @@ def api_foodbanks(request):
     ]
     default_format = "json"
 
-    foodbanks = get_all_foodbanks()
+    foodbanks = Foodbank.objects.all()
     response_list = []
 
     format = request.GET.get("format", default_format)
@@ -110,7 +109,7 @@ def api_foodbanks(request):
 
 
 
-@cache_page(SECONDS_IN_DAY)
+@versioned_cache_page(SECONDS_IN_DAY, ("foodbank", "need"))
 def api_foodbank_search(request):
 
     lat_lng = request.GET.get("lattlong")
@@ -157,7 +156,7 @@ def api_foodbank_search(request):
     return JsonResponse(response_list, safe=False)
 
 
-@cache_page(SECONDS_IN_MONTH)
+@versioned_cache_page(SECONDS_IN_MONTH, ("foodbank", "location", "need"))
 def api_foodbank(request, slug):
 
     foodbank = get_object_or_404(Foodbank.objects.select_related("latest_need"), slug = slug)
@@ -211,7 +210,7 @@ def api_foodbank(request, slug):
 
     return JsonResponse(foodbank_response, safe=False)
 
-@cache_page(SECONDS_IN_HOUR)
+@versioned_cache_page(SECONDS_IN_HOUR, ("need", "foodbank"))
 def api_needs(request):
 
     allowed_limits = [100,1000]
@@ -240,7 +239,7 @@ def api_needs(request):
     return JsonResponse(response_list, safe=False)
 
 
-@cache_page(SECONDS_IN_DAY)
+@versioned_cache_page(SECONDS_IN_DAY, ("need", "foodbank"))
 def api_need(request, id):
 
     need = get_object_or_404(FoodbankChange, need_id = id)
@@ -1,8 +1,8 @@
-import yaml
-import dicttoxml
-import logging
-from xml.dom.minidom import parseString
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+import uuid
+
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+
+from .renderers import get_renderer
 
 
 # Sets of formats that can be returned per object name
@@ -17,18 +17,22 @@ STD_FORMATS_GEOJSON = [
     "yaml",
     "geojson",
 ]
+STREAM_FORMATS_GEOJSON = STD_FORMATS_GEOJSON + [
+    "ndjson",
+]
 
 # The formats allowed per object name
 ALLOWED_FORMATS = {
     "foodbank": STD_FORMATS_GEOJSON,
-    "foodbanks": STD_FORMATS_GEOJSON,
+    "foodbanks": STREAM_FORMATS_GEOJSON,
     "location": STD_FORMATS,
-    "locations": STD_FORMATS_GEOJSON,
-    "donationpoints": STD_FORMATS_GEOJSON,
+    "locations": STREAM_FORMATS_GEOJSON,
+    "donationpoints": STREAM_FORMATS_GEOJSON,
     "need": STD_FORMATS,
     "needs": STD_FORMATS,
     "constituency": STD_FORMATS_GEOJSON,
     "constituencies": STD_FORMATS,
+    "changes": STD_FORMATS,
 }
 
 
@@ -37,40 +41,125 @@ def ApiResponse(data, obj_name, format):
     if format not in ALLOWED_FORMATS.get(obj_name):
         return HttpResponseBadRequest()
 
-    json_formats = [
-        "json",
-        "geojson"
-    ]
-    xml_formats = [
-        "xml",
-        "opml",
-        "rss",
-    ]
-
-    if format in json_formats:
-        response = JsonResponse(data, safe=False, json_dumps_params={'indent': 2})
-    elif format in xml_formats:
-        dicttoxml.LOG.setLevel(logging.ERROR)
-        xml_str = dicttoxml.dicttoxml(data, attr_type=False, custom_root=obj_name, item_func=xml_item_name)
-        xml_dom = parseString(xml_str)
-        xml_str = xml_dom.toprettyxml()
-        response = HttpResponse(xml_str, content_type="text/xml")
-    elif format == "yaml":
-        yaml_str = yaml.dump(data, encoding='utf-8', allow_unicode=True, default_flow_style=False)
-        response = HttpResponse(yaml_str, content_type="text/yaml")
-    
+    renderer = get_renderer(format)
+    response = HttpResponse(renderer.render(data, obj_name), content_type=renderer.content_type)
+
     response["Access-Control-Allow-Origin"] = "*"
     return response
 
 
-def xml_item_name(plural):
+def ApiStreamingResponse(items, obj_name, format, container = None, key = None):
+    """
+    Stream a collection out as it is read, rather than building it first.
+
+    items should be lazy -- a map over a queryset iterator() -- so the rows
+    are fetched and serialised in chunks while the response is being sent.
+    Streamed responses aren't stored by cache_page, which is the point: the
+    full document never exists in memory, in the view or in the cache.
+    """
+
+    if format not in ALLOWED_FORMATS.get(obj_name):
+        return HttpResponseBadRequest()
+
+    renderer = get_renderer(format)
+    response = StreamingHttpResponse(renderer.stream(items, obj_name, container, key), content_type=renderer.content_type)
+
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
+
+
+def wants_stream(request, format):
+    """NDJSON is always streamed, the other formats when ?stream=1 is given."""
+    return format == "ndjson" or request.GET.get("stream") in ["1", "true"]
+
+
+def feature_collection(features = None):
+    return {
+        "type": "FeatureCollection",
+        "features": features,
+    }
+
+
+# Rows per page when ?after= is given without ?limit=, and the most
+# a single page can ask for
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def get_fields(request, field_map):
+    """
+    The set of fields asked for with ?fields=, or None for all of them.
+
+    Raises ValueError for a field the collection doesn't have, so a typo
+    gets a 400 rather than a quietly empty response.
+    """
+
+    fields = request.GET.get("fields")
+    if fields is None:
+        return None
+    fields = set(field.strip() for field in fields.split(",") if field.strip())
+    if not fields or not fields <= set(field_map):
+        raise ValueError("Unknown field")
+    return fields
+
+
+def field_columns(field_map, fields):
+    """The model columns needed to build the given fields, for .only()."""
+    columns = set()
+    for field in fields:
+        columns.update(field_map[field][0])
+    return sorted(columns)
+
 
-    singular = {
-        "foodbanks":"foodbank",
-        "nearby_foodbanks":"foodbank",
-        "locations":"location",
-        "needs":"need",
-        "constituencies":"constituency",
+def select_fields(obj, field_map, fields = None):
+    """Build the fields of obj from a field map, in the map's order."""
+    return {
+        name: build(obj)
+        for name, (columns, build) in field_map.items()
+        if fields is None or name in fields
     }
 
-    return singular.get(plural)
\ No newline at end of file
+
+def get_page(request):
+    """
+    The (after, limit) of a keyset page from ?after=<uuid>&limit=, or None.
+
+    Pages are ordered by uuid and start after the given one, so a page is
+    an index range scan however deep into the collection it is, and rows
+    added or removed between requests don't shift the pages after them.
+    Raises ValueError for a malformed uuid or limit.
+    """
+
+    after = request.GET.get("after")
+    limit = request.GET.get("limit")
+    if after is None and limit is None:
+        return None
+    if after is not None:
+        after = uuid.UUID(after)
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        limit = int(limit)
+        if limit < 1 or limit > MAX_PAGE_SIZE:
+            raise ValueError("Limit out of range")
+    return after, limit
+
+
+def paginate(queryset, page):
+    """Evaluate one keyset page of a queryset with a uuid field."""
+    after, limit = page
+    if after is not None:
+        queryset = queryset.filter(uuid__gt = after)
+    return list(queryset.order_by("uuid")[:limit])
+
+
+def add_next_link(response, request, rows, page):
+    """Point to the following page with a Link header, if there may be one."""
+    # Not from an error, such as the 400 for a format there isn't
+    if response.status_code != 200 or len(rows) < page[1]:
+        return response
+    query = request.GET.copy()
+    query["after"] = str(rows[-1].uuid)
+    query["limit"] = page[1]
+    response["Link"] = '<https://www.givefood.org.uk%s?%s>; rel="next"' % (request.path, query.urlencode(safe=","))
+    return response
@@ -0,0 +1,340 @@
+"""
+Serialisers behind ApiResponse, one per output format.
+
+Each renderer can produce a whole document in one go with render(), or hand
+it out in pieces with stream() so a large collection never has to exist as a
+single string. Both produce the same bytes for the same data.
+
+- JSON goes through orjson when it is installed, which is several times
+  faster than the stdlib encoder at the same two-space indent. Dates and
+  anything else orjson doesn't know are handed back to DjangoJSONEncoder, so
+  the output decodes to what JsonResponse used to send. orjson always
+  writes non-ASCII characters as UTF-8 rather than escaping them, so the
+  stdlib fallback does too, and the bytes are the same whichever is used.
+- XML is written directly, element by element. It used to be built as a
+  string by dicttoxml, parsed back into a minidom tree and serialised again
+  with toprettyxml() -- three full copies of the document to indent it. The
+  writer here produces the same pretty-printed layout in a single pass.
+- NDJSON writes one compact JSON object per line, for clients that want to
+  process a collection a row at a time.
+- YAML uses libyaml's CSafeDumper when PyYAML was built against it, and the
+  pure Python SafeDumper otherwise.
+"""
+
+import json
+from itertools import chain
+
+import yaml
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from yaml import CSafeDumper as BaseDumper
+except ImportError:
+    from yaml import SafeDumper as BaseDumper
+
+
+# Streamed output is gathered into chunks of about this many bytes before
+# being handed on, rather than one write per row.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def buffered(pieces, chunk_size = STREAM_CHUNK_SIZE):
+    """Join an iterable of small byte strings into chunks of roughly chunk_size."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def xml_item_name(plural):
+
+    singular = {
+        "foodbanks":"foodbank",
+        "nearby_foodbanks":"foodbank",
+        "locations":"location",
+        "donationpoints":"donationpoint",
+        "needs":"need",
+        "constituencies":"constituency",
+        "changes":"change",
+    }
+
+    # dicttoxml's own default for a list it has no name for
+    return singular.get(plural, "item")
+
+
+class Renderer:
+    """
+    Base class for the API output formats.
+
+    stream() takes the rows of a collection as any iterable, so a queryset
+    iterator or a generator of dicts can be written out without first being
+    gathered into a list. When the rows sit inside an outer object, such as
+    the features of a GeoJSON FeatureCollection, pass that object as
+    `container` and the key the rows belong under as `key`.
+    """
+
+    content_type = None
+
+    def render(self, data, obj_name):
+        raise NotImplementedError
+
+    def stream(self, items, obj_name, container = None, key = None):
+        raise NotImplementedError
+
+
+class JSONRenderer(Renderer):
+
+    content_type = "application/json"
+
+    def __init__(self):
+        self.encoder = DjangoJSONEncoder()
+
+    def dumps(self, data):
+        if orjson is not None:
+            return orjson.dumps(
+                data,
+                default = self.encoder.default,
+                option = orjson.OPT_INDENT_2 | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        return json.dumps(data, cls = DjangoJSONEncoder, indent = 2, ensure_ascii = False).encode("utf-8")
+
+    def render(self, data, obj_name):
+        return self.dumps(data)
+
+    def _indent(self, data, depth):
+        return self.dumps(data).replace(b"\n", b"\n" + b"  " * depth)
+
+    def _array(self, items, depth):
+        pad = b"  " * depth
+        first = True
+        for item in items:
+            if first:
+                yield b"[\n" + pad + b"  "
+                first = False
+            else:
+                yield b",\n" + pad + b"  "
+            yield self._indent(item, depth + 1)
+        if first:
+            yield b"[]"
+        else:
+            yield b"\n" + pad + b"]"
+
+    def _pieces(self, items, container, key):
+        if container is None:
+            yield from self._array(items, 0)
+            return
+        yield b"{"
+        for index, (name, value) in enumerate(container.items()):
+            yield b"\n  " if index == 0 else b",\n  "
+            yield self.dumps(name) + b": "
+            if name == key:
+                yield from self._array(items, 1)
+            else:
+                yield self._indent(value, 1)
+        yield b"\n}"
+
+    def stream(self, items, obj_name, container = None, key = None):
+        return buffered(self._pieces(items, container, key))
+
+
+class NDJSONRenderer(JSONRenderer):
+    """
+    Newline delimited JSON, one compact object per line.
+
+    Rows that would sit inside a container, like the features of a GeoJSON
+    FeatureCollection, are written on their own and the container dropped.
+    """
+
+    content_type = "application/x-ndjson"
+
+    def dumps(self, data):
+        if orjson is not None:
+            return orjson.dumps(
+                data,
+                default = self.encoder.default,
+                option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE,
+            )
+        return (json.dumps(data, cls = DjangoJSONEncoder, separators = (",", ":"), ensure_ascii = False) + "\n").encode("utf-8")
+
+    def render(self, data, obj_name):
+        if isinstance(data, dict) and isinstance(data.get("features"), list):
+            data = data["features"]
+        return b"".join(self.dumps(item) for item in data)
+
+    def stream(self, items, obj_name, container = None, key = None):
+        return buffered(self.dumps(item) for item in items)
+
+
+class XMLRenderer(Renderer):
+
+    content_type = "text/xml"
+
+    header = '<?xml version="1.0" ?>\n'
+
+    def _name(self, key):
+        key = str(key).replace(" ", "_")
+        if key[:1].isdigit():
+            key = "n%s" % (key)
+        return key
+
+    def _text(self, value):
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if hasattr(value, "isoformat"):
+            value = value.isoformat()
+        # The same escaping minidom applied on the way out, and the same
+        # line ending normalisation its parser applied on the way in.
+        return str(value).replace("&", "&amp;").replace("<", "&lt;").replace(
+            "\"", "&quot;").replace(">", "&gt;").replace("\r\n", "\n").replace("\r", "\n")
+
+    def _element(self, name, value, depth):
+        pad = "\t" * depth
+        if isinstance(value, dict):
+            if not value:
+                yield "%s<%s/>\n" % (pad, name)
+                return
+            yield "%s<%s>\n" % (pad, name)
+            for key, child in value.items():
+                yield from self._element(self._name(key), child, depth + 1)
+            yield "%s</%s>\n" % (pad, name)
+        elif isinstance(value, (list, tuple)):
+            yield from self._list(name, value, depth)
+        else:
+            text = self._text(value)
+            if text:
+                yield "%s<%s>%s</%s>\n" % (pad, name, text, name)
+            else:
+                yield "%s<%s/>\n" % (pad, name)
+
+    def _list(self, name, items, depth):
+        pad = "\t" * depth
+        item_name = xml_item_name(name)
+        empty = True
+        for item in items:
+            if empty:
+                yield "%s<%s>\n" % (pad, name)
+                empty = False
+            yield from self._element(item_name, item, depth + 1)
+        if empty:
+            yield "%s<%s/>\n" % (pad, name)
+        else:
+            yield "%s</%s>\n" % (pad, name)
+
+    def _pieces(self, items, obj_name, container, key):
+        yield self.header
+        if container is None:
+            yield from self._list(obj_name, items, 0)
+            return
+        yield "<%s>\n" % (obj_name)
+        for name, value in container.items():
+            if name == key:
+                yield from self._list(self._name(name), items, 1)
+            else:
+                yield from self._element(self._name(name), value, 1)
+        yield "</%s>\n" % (obj_name)
+
+    def render(self, data, obj_name):
+        if isinstance(data, dict):
+            pieces = [self.header]
+            pieces.extend(self._element(obj_name, data, 0))
+        else:
+            pieces = self._pieces(data, obj_name, None, None)
+        return "".join(pieces).encode("utf-8")
+
+    def stream(self, items, obj_name, container = None, key = None):
+        pieces = self._pieces(items, obj_name, container, key)
+        return buffered(piece.encode("utf-8") for piece in pieces)
+
+
+class APIDumper(BaseDumper):
+    """
+    Safe YAML dumper for API output.
+
+    Aliases are switched off so a response never contains &id001 references,
+    which also means a streamed list dumps identically to the whole list.
+    """
+
+    def ignore_aliases(self, data):
+        return True
+
+
+# Safe dumpers only know plain str, so SafeString and friends need telling.
+APIDumper.add_multi_representer(str, APIDumper.represent_str)
+
+
+class YAMLRenderer(Renderer):
+
+    content_type = "text/yaml"
+
+    # Rows are dumped this many at a time when streaming, as each dump() call
+    # has a fixed setup cost.
+    batch_size = 200
+
+    def dumps(self, data):
+        return yaml.dump(data, Dumper = APIDumper, encoding = "utf-8", allow_unicode = True, default_flow_style = False)
+
+    def render(self, data, obj_name):
+        return self.dumps(data)
+
+    def _sequence(self, items):
+        batch = []
+        empty = True
+        for item in items:
+            batch.append(item)
+            if len(batch) == self.batch_size:
+                yield self.dumps(batch)
+                batch = []
+                empty = False
+        if batch or empty:
+            yield self.dumps(batch)
+
+    def _pieces(self, items, container, key):
+        if container is None:
+            yield from self._sequence(items)
+            return
+        # yaml.dump sorts mapping keys, so the rows go wherever their key
+        # sorts to. A block sequence isn't indented under its key, so the
+        # rows dump exactly as they would at the top level.
+        for name in sorted(container):
+            if name != key:
+                yield self.dumps({name: container[name]})
+                continue
+            items = iter(items)
+            first = next(items, None)
+            if first is None:
+                yield self.dumps({name: []})
+            else:
+                yield ("%s:\n" % (name)).encode("utf-8")
+                yield from self._sequence(chain([first], items))
+
+    def stream(self, items, obj_name, container = None, key = None):
+        return buffered(self._pieces(items, container, key))
+
+
+RENDERERS = {
+    "json": JSONRenderer(),
+    "geojson": JSONRenderer(),
+    "ndjson": NDJSONRenderer(),
+    "xml": XMLRenderer(),
+    "opml": XMLRenderer(),
+    "rss": XMLRenderer(),
+    "yaml": YAMLRenderer(),
+}
+
+
+def get_renderer(format):
+    return RENDERERS.get(format)
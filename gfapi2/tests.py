@@ -1,7 +1,11 @@
 """
 Tests for the gfapi2 (API v2) app.
 """
+import datetime
+import json
+
 import pytest
+import yaml
 from django.test import Client
 from django.urls import reverse
 
@@ -362,3 +366,512 @@ class TestAPI2DonationPointSearch:
                             # Verify it's a valid URL string
                             assert isinstance(homepage_url, str)
                             assert homepage_url.startswith('http')
+
+
+class TestAPI2Renderers:
+    """Test the per-format renderers behind ApiResponse."""
+
+    rows = [
+        {
+            "name": "Location & Co <1>",
+            "address": "1 High Street\r\nSometown",
+            "is_donation_point": True,
+            "lat_lng": "51.1,-1.8",
+            "phone": None,
+            "modified": datetime.datetime(2024, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc),
+            "foodbank": {"name": "Food Bank", "urls": {"self": "https://www.givefood.org.uk/api/2/foodbank/fb/"}},
+            "needs": ["Tea", "Coffee"],
+        },
+        {
+            "name": "Location 2",
+            "address": "2 High Street",
+            "is_donation_point": False,
+            "lat_lng": "51.2,-1.9",
+            "phone": "01234 567890",
+            "modified": datetime.datetime(2024, 1, 3, tzinfo=datetime.timezone.utc),
+            "foodbank": {"name": "Food Bank", "urls": {}},
+            "needs": [],
+        },
+    ]
+
+    def test_json_matches_jsonresponse(self):
+        """Test that JSON output decodes to what JsonResponse would have sent."""
+        from django.http import JsonResponse
+        from gfapi2.renderers import get_renderer
+
+        rendered = get_renderer("json").render(self.rows, "locations")
+        legacy = JsonResponse(self.rows, safe=False, json_dumps_params={'indent': 2}).content
+        assert json.loads(rendered) == json.loads(legacy)
+        assert json.loads(rendered)[0]["modified"] == "2024-01-02T03:04:05.678Z"
+
+    @pytest.mark.parametrize("format", ["json", "ndjson"])
+    def test_json_without_orjson(self, format):
+        """Test that the stdlib fallback writes non-ASCII as UTF-8 rather than escaping it, as orjson does."""
+        from unittest.mock import patch
+        from gfapi2.renderers import get_renderer
+
+        rows = [dict(self.rows[0], name="Banc Bwyd Caerdydd – Café")]
+        with patch("gfapi2.renderers.orjson", None):
+            rendered = get_renderer(format).render(rows, "locations")
+        assert "Banc Bwyd Caerdydd – Café".encode("utf-8") in rendered
+
+    @pytest.mark.parametrize("format", ["json", "ndjson"])
+    def test_json_same_with_and_without_orjson(self, format):
+        """Test that orjson and the stdlib fallback give the same bytes."""
+        from unittest.mock import patch
+        from gfapi2.renderers import get_renderer
+
+        pytest.importorskip("orjson")
+        renderer = get_renderer(format)
+        rows = self.rows + [dict(self.rows[1], name="Banc Bwyd Caerdydd – Café")]
+        with patch("gfapi2.renderers.orjson", None):
+            fallback = renderer.render(rows, "locations")
+        assert renderer.render(rows, "locations") == fallback
+
+    def test_xml_matches_dicttoxml(self):
+        """Test that XML output is byte for byte what dicttoxml and minidom produced."""
+        from xml.dom.minidom import parseString
+        from dicttoxml import dicttoxml
+        from gfapi2.renderers import get_renderer, xml_item_name
+
+        data = [{key: value for key, value in row.items() if key not in ("is_donation_point", "needs")} for row in self.rows]
+        legacy = parseString(
+            dicttoxml(data, attr_type=False, custom_root="locations", item_func=xml_item_name)
+        ).toprettyxml().encode("utf-8")
+        assert get_renderer("xml").render(data, "locations") == legacy
+
+        single = data[0]
+        legacy = parseString(
+            dicttoxml(single, attr_type=False, custom_root="location", item_func=xml_item_name)
+        ).toprettyxml().encode("utf-8")
+        assert get_renderer("xml").render(single, "location") == legacy
+
+    def test_yaml_round_trip(self):
+        """Test that YAML output loads back to the same data."""
+        from gfapi2.renderers import get_renderer
+
+        loaded = yaml.safe_load(get_renderer("yaml").render(self.rows, "locations"))
+        assert loaded == self.rows
+
+    @pytest.mark.parametrize("format", ["json", "geojson", "xml", "yaml"])
+    def test_stream_matches_render(self, format):
+        """Test that streaming a collection gives the same bytes as rendering it."""
+        from gfapi2.renderers import get_renderer
+
+        renderer = get_renderer(format)
+        for rows in (self.rows, self.rows[:1], []):
+            streamed = b"".join(renderer.stream(iter(rows), "locations"))
+            assert streamed == renderer.render(rows, "locations")
+
+    @pytest.mark.parametrize("format", ["geojson", "xml", "yaml"])
+    def test_stream_in_container_matches_render(self, format):
+        """Test that rows streamed inside an outer object match rendering the whole object."""
+        from gfapi2.renderers import get_renderer
+
+        renderer = get_renderer(format)
+        for rows in (self.rows, []):
+            container = {"type": "FeatureCollection", "features": None, "name": "Locations"}
+            streamed = b"".join(renderer.stream(iter(rows), "locations", container=container, key="features"))
+            container["features"] = rows
+            assert streamed == renderer.render(container, "locations")
+
+    def test_stream_chunks(self):
+        """Test that streamed output is gathered into chunks rather than one per row."""
+        from gfapi2.renderers import get_renderer
+
+        rows = self.rows * 500
+        chunks = list(get_renderer("json").stream(iter(rows), "locations"))
+        assert 1 < len(chunks) < len(rows)
+
+
+@pytest.fixture
+def streaming_foodbank():
+    """A food bank with a location, a donation point and a delivery address."""
+    from unittest.mock import patch
+    from givefood.models import Foodbank, FoodbankDonationPoint, FoodbankLocation
+
+    with patch('givefood.models.foodbank.queue_decache'):
+        foodbank = Foodbank(
+            name="Streaming",
+            slug="streaming",
+            address="1 Test Street",
+            postcode="SW1A 1AA",
+            country="England",
+            lat_lng="51.5014,-0.1419",
+            latitude=51.5014,
+            longitude=-0.1419,
+            network="Independent",
+            url="https://test.example.com",
+            shopping_list_url="https://test.example.com/shopping",
+            contact_email="test@example.com",
+        )
+        foodbank.save(do_geoupdate=False, do_decache=False)
+        # save() geocodes a delivery address, so set it behind its back
+        Foodbank.objects.filter(pk=foodbank.pk).update(
+            delivery_address="2 Test Street",
+            delivery_lat_lng="51.5015,-0.1420",
+        )
+        location = FoodbankLocation(
+            foodbank=foodbank,
+            name="Streaming Location",
+            slug="streaming-location",
+            address="3 Test Street",
+            postcode="SW1A 1AA",
+            lat_lng="51.5074,-0.1278",
+            latitude=51.5074,
+            longitude=-0.1278,
+        )
+        location.save(do_geoupdate=False, do_foodbank_resave=False)
+        donation_point = FoodbankDonationPoint(
+            foodbank=foodbank,
+            name="Streaming Donation Point",
+            address="4 Test Street",
+            postcode="SW1A 1AA",
+            lat_lng="51.5014,-0.1419",
+        )
+        donation_point.save(do_geoupdate=False, do_foodbank_resave=False, do_photo_update=False)
+    return foodbank
+
+
+@pytest.mark.django_db
+class TestAPI2Streaming:
+    """Test the opt-in streamed responses for the collection endpoints."""
+
+    @pytest.mark.parametrize("path", [
+        "/api/2/foodbanks/",
+        "/api/2/foodbanks/?format=geojson",
+        "/api/2/locations/",
+        "/api/2/locations/?format=geojson",
+        "/api/2/donationpoints/",
+    ])
+    def test_stream_matches_buffered(self, client, streaming_foodbank, path):
+        """Test that ?stream=1 sends the same document as the buffered response."""
+        separator = "&" if "?" in path else "?"
+        streamed = client.get(path + separator + "stream=1")
+        buffered = client.get(path)
+        assert streamed.status_code == 200
+        assert streamed.streaming
+        assert not buffered.streaming
+        assert streamed["Access-Control-Allow-Origin"] == "*"
+        assert json.loads(b"".join(streamed.streaming_content)) == json.loads(buffered.content)
+
+    @pytest.mark.parametrize("path,count", [
+        ("/api/2/foodbanks/", 1),
+        ("/api/2/locations/", 1),
+        ("/api/2/donationpoints/", 2),
+    ])
+    def test_ndjson(self, client, streaming_foodbank, path, count):
+        """Test that format=ndjson streams one JSON object per line."""
+        response = client.get(path + "?format=ndjson")
+        assert response.status_code == 200
+        assert response.streaming
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        assert len(lines) == count
+        for line in lines:
+            assert isinstance(json.loads(line), dict)
+
+    def test_ndjson_donationpoints_are_features(self, client, streaming_foodbank):
+        """Test that NDJSON donation points are the features of the GeoJSON response."""
+        response = client.get("/api/2/donationpoints/?format=ndjson")
+        features = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        assert features == json.loads(client.get("/api/2/donationpoints/").content)["features"]
+
+    def test_ndjson_not_allowed_for_other_endpoints(self, client):
+        """Test that NDJSON is only offered for the streamable collection endpoints."""
+        response = client.get("/api/2/needs/?format=ndjson")
+        assert response.status_code == 400
+
+
+@pytest.fixture
+def paged_foodbanks():
+    """Five open food banks, each with one location."""
+    from unittest.mock import patch
+    from givefood.models import Foodbank, FoodbankLocation
+
+    foodbanks = []
+    with patch('givefood.models.foodbank.queue_decache'):
+        for number in range(5):
+            foodbank = Foodbank(
+                name="Paged %s" % number,
+                slug="paged-%s" % number,
+                address="%s Test Street" % number,
+                postcode="SW1A 1AA",
+                country="England",
+                lat_lng="51.5014,-0.1419",
+                latitude=51.5014,
+                longitude=-0.1419,
+                network="Independent",
+                url="https://test.example.com",
+                shopping_list_url="https://test.example.com/shopping",
+                contact_email="test@example.com",
+            )
+            foodbank.save(do_geoupdate=False, do_decache=False)
+            FoodbankLocation(
+                foodbank=foodbank,
+                name="Paged Location %s" % number,
+                lat_lng="51.5074,-0.1278",
+                latitude=51.5074,
+                longitude=-0.1278,
+            ).save(do_geoupdate=False, do_foodbank_resave=False)
+            foodbanks.append(foodbank)
+    return foodbanks
+
+
+@pytest.mark.django_db
+class TestAPI2FieldsAndPages:
+    """Test ?fields= sparse fieldsets and ?after=&limit= keyset pages."""
+
+    @pytest.mark.parametrize("path", ["/api/2/foodbanks/", "/api/2/locations/"])
+    def test_fields_selects_keys(self, client, paged_foodbanks, path):
+        """Test that only the requested fields are returned, in their usual order."""
+        response = client.get(path + "?fields=lat_lng,slug,politics")
+        assert response.status_code == 200
+        data = json.loads(response.content)
+        assert len(data) == 5
+        for item in data:
+            assert list(item.keys()) == ["slug", "lat_lng", "politics"]
+
+    @pytest.mark.parametrize("path", ["/api/2/foodbanks/", "/api/2/locations/"])
+    def test_fields_match_full_response(self, client, paged_foodbanks, path):
+        """Test that selected fields have the same values as in the full response."""
+        full = {item["slug"]: item for item in json.loads(client.get(path).content)}
+        sparse = json.loads(client.get(path + "?fields=slug,name,urls").content)
+        for item in sparse:
+            assert item == {key: full[item["slug"]][key] for key in ["name", "slug", "urls"]}
+
+    @pytest.mark.parametrize("model,field_map", [
+        ("Foodbank", "FOODBANK_FIELDS"),
+        ("FoodbankLocation", "LOCATION_FIELDS"),
+    ])
+    def test_field_columns_cover_fields(self, paged_foodbanks, django_assert_num_queries, model, field_map):
+        """Test that each field builds from its .only() columns without further queries."""
+        from givefood import models
+        from gfapi2 import views
+        from gfapi2.func import field_columns, select_fields
+
+        field_map = getattr(views, field_map)
+        for field in field_map:
+            obj = getattr(models, model).objects.only(*field_columns(field_map, {field})).first()
+            with django_assert_num_queries(0):
+                select_fields(obj, field_map, {field})
+
+    @pytest.mark.parametrize("query", [
+        "fields=slug,nope",
+        "fields=,",
+        "fields=slug&format=geojson",
+        "after=not-a-uuid",
+        "limit=0",
+        "limit=100000",
+        "limit=ten",
+    ])
+    def test_bad_parameters(self, client, query):
+        """Test that unknown fields and malformed pages are rejected."""
+        response = client.get("/api/2/foodbanks/?" + query)
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("path", ["/api/2/foodbanks/", "/api/2/locations/"])
+    def test_pages_walk_collection(self, client, paged_foodbanks, path):
+        """Test that following the Link header visits every row once, in uuid order."""
+        url = path + "?limit=2&fields=id"
+        seen = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == 200
+            seen.extend(item["id"] for item in json.loads(response.content))
+            link = response.get("Link")
+            url = link[link.index("/api/"):link.index(">")] if link else None
+        assert len(seen) == 5
+        assert seen == sorted(seen)
+
+    def test_page_link_keeps_parameters(self, client, paged_foodbanks):
+        """Test that the next page link carries the format and fields along."""
+        response = client.get("/api/2/foodbanks/?limit=2&fields=slug,lat_lng&format=xml")
+        assert response.status_code == 200
+        link = response["Link"]
+        assert "format=xml" in link
+        assert "fields=slug,lat_lng" in link
+        assert "limit=2" in link
+        assert 'rel="next"' in link
+
+    @pytest.mark.parametrize("path", ["/api/2/foodbanks/", "/api/2/locations/"])
+    def test_no_page_link_on_error(self, client, paged_foodbanks, path):
+        """Test that a page rejected for its format doesn't point to a next one."""
+        response = client.get(path + "?limit=2&format=nope")
+        assert response.status_code == 400
+        assert "Link" not in response
+
+    def test_paged_stream(self, client, paged_foodbanks):
+        """Test that a page can be streamed, and streams the same rows."""
+        streamed = client.get("/api/2/foodbanks/?limit=3&stream=1")
+        buffered = client.get("/api/2/foodbanks/?limit=3")
+        assert streamed.streaming
+        assert json.loads(b"".join(streamed.streaming_content)) == json.loads(buffered.content)
+        assert streamed["Link"].replace("&stream=1", "") == buffered["Link"]
+
+    def test_paged_geojson(self, client, paged_foodbanks):
+        """Test that GeoJSON collections can be paged too."""
+        response = client.get("/api/2/locations/?format=geojson&limit=4")
+        data = json.loads(response.content)
+        assert data["type"] == "FeatureCollection"
+        assert len(data["features"]) == 4
+        assert "Link" in response
+
+
+@pytest.mark.django_db
+class TestAPI2Changes:
+    """Test the /api/2/changes/ feed."""
+
+    @pytest.fixture(autouse=True)
+    def no_lag(self, monkeypatch):
+        """Hand out changes as soon as they're made, other than in the lag's own test."""
+        monkeypatch.setattr("gfapi2.views.CHANGES_LAG_SECONDS", 0)
+
+    def get_changes(self, client, query=""):
+        # The feed is cached for a minute, and these tests ask again sooner
+        from django.core.cache import cache
+        cache.clear()
+        response = client.get("/api/2/changes/" + query)
+        assert response.status_code == 200
+        return json.loads(response.content)
+
+    def test_empty_feed(self, client):
+        """Test the feed with nothing in it."""
+        data = self.get_changes(client)
+        assert data == {"since": 0, "cursor": 0, "more": False, "changes": []}
+
+    def test_records_foodbank_and_children(self, client, streaming_foodbank):
+        """Test that creating a food bank, location and donation point are all recorded."""
+        data = self.get_changes(client)
+        seen = [(change["type"], change["action"]) for change in data["changes"]]
+        assert ("foodbank", "created") in seen
+        assert ("location", "created") in seen
+        assert ("donationpoint", "created") in seen
+        location = [change for change in data["changes"] if change["type"] == "location"][0]
+        assert location["foodbank"]["slug"] == "streaming"
+        assert location["urls"]["self"] == "https://www.givefood.org.uk/needs/at/streaming/streaming-location/"
+
+    def test_since_cursor(self, client, streaming_foodbank):
+        """Test that a cursor returns only later changes, and paging walks the whole feed."""
+        from unittest.mock import patch
+
+        everything = self.get_changes(client)["changes"]
+        cursor = 0
+        paged = []
+        while True:
+            data = self.get_changes(client, "?since=%s&limit=2" % cursor)
+            paged.extend(data["changes"])
+            cursor = data["cursor"]
+            if not data["more"]:
+                break
+        assert paged == everything
+
+        streaming_foodbank.is_closed = True
+        with patch('givefood.models.foodbank.queue_decache'):
+            streaming_foodbank.save(do_geoupdate=False, do_decache=False)
+        data = self.get_changes(client, "?since=%s" % cursor)
+        assert [(change["type"], change["action"]) for change in data["changes"]] == [("foodbank", "closed")]
+
+    def test_published_needs_only(self, client, streaming_foodbank):
+        """Test that needs appear once published, and deletions are recorded."""
+        from unittest.mock import patch
+        from givefood.models import FoodbankChange
+
+        cursor = self.get_changes(client)["cursor"]
+        with patch('givefood.models.foodbank.queue_decache'), patch('givefood.models.needs.translate_needs_async'):
+            need = FoodbankChange(foodbank=streaming_foodbank, change_text="Pasta", published=False)
+            need.save()
+            assert not [change for change in self.get_changes(client, "?since=%s" % cursor)["changes"] if change["type"] == "need"]
+
+            need.published = True
+            need.save()
+            need.delete()
+
+        needs = [change for change in self.get_changes(client, "?since=%s" % cursor)["changes"] if change["type"] == "need"]
+        assert [change["action"] for change in needs] == ["created", "deleted"]
+        assert needs[0]["id"] == str(need.need_id)
+
+    def test_need_changes_only(self, client, streaming_foodbank):
+        """Test that a need is recorded once per public change, without its food bank, and unpublishing is a delete."""
+        from unittest.mock import patch
+        from givefood.models import FoodbankChange
+
+        with patch('givefood.models.foodbank.queue_decache'), patch('givefood.models.needs.translate_needs_async'):
+            # Catch up the counts the fixture changed behind its back
+            streaming_foodbank.save(do_geoupdate=False, do_decache=False)
+            need = FoodbankChange(foodbank=streaming_foodbank, change_text="Pasta", published=True)
+            need.save()
+            cursor = self.get_changes(client)["cursor"]
+
+            need = FoodbankChange.objects.get(pk=need.pk)
+            need.notified = datetime.datetime.now(datetime.timezone.utc)
+            need.save()
+            assert self.get_changes(client, "?since=%s" % cursor)["changes"] == []
+
+            need.published = False
+            need.save()
+
+        changes = self.get_changes(client, "?since=%s" % cursor)["changes"]
+        assert [(change["type"], change["action"]) for change in changes] == [("need", "deleted")]
+
+    def test_publish_records_need_only(self, client, streaming_foodbank):
+        """Test that publishing a need doesn't record its food bank as well."""
+        from unittest.mock import patch
+        from givefood.models import FoodbankChange
+
+        with patch('givefood.models.foodbank.queue_decache'), patch('givefood.models.needs.translate_needs_async'):
+            # Catch up the counts the fixture changed behind its back
+            streaming_foodbank.save(do_geoupdate=False, do_decache=False)
+            cursor = self.get_changes(client)["cursor"]
+            FoodbankChange(foodbank=streaming_foodbank, change_text="Pasta", published=True).save()
+
+        changes = self.get_changes(client, "?since=%s" % cursor)["changes"]
+        assert [(change["type"], change["action"]) for change in changes] == [("need", "created")]
+
+    def test_lag(self, client, streaming_foodbank, monkeypatch):
+        """Test that changes are held back until they're settled, and the cursor stops before them."""
+        from givefood.models import DataChange
+
+        monkeypatch.setattr("gfapi2.views.CHANGES_LAG_SECONDS", 60)
+        assert self.get_changes(client) == {"since": 0, "cursor": 0, "more": False, "changes": []}
+
+        first = DataChange.objects.order_by("id").first()
+        DataChange.objects.filter(id=first.id).update(created=first.created - datetime.timedelta(minutes=2))
+        data = self.get_changes(client)
+        assert data["cursor"] == first.id
+        assert len(data["changes"]) == 1
+        assert not data["more"]
+
+    def test_prune(self, streaming_foodbank):
+        """Test that old changes are pruned and recent ones kept."""
+        from django.utils import timezone
+        from givefood.models import DataChange
+        from givefood.utils.cache import prune_changes
+
+        first = DataChange.objects.order_by("id").first()
+        DataChange.objects.filter(id=first.id).update(created=timezone.now() - datetime.timedelta(days=100))
+        kept = DataChange.objects.count() - 1
+
+        assert prune_changes(90) == 1
+        assert DataChange.objects.count() == kept
+
+    def test_foodbank_delete_recorded(self, client, streaming_foodbank):
+        """Test that deleting a food bank is recorded."""
+        from unittest.mock import patch
+
+        with patch('givefood.models.foodbank.queue_decache'):
+            streaming_foodbank.delete()
+        last = self.get_changes(client)["changes"][-1]
+        assert (last["type"], last["action"], last["slug"]) == ("foodbank", "deleted", "streaming")
+
+    def test_xml(self, client, streaming_foodbank):
+        """Test that the feed can be had as XML."""
+        response = client.get("/api/2/changes/?format=xml")
+        assert response.status_code == 200
+        assert b"<change>" in response.content
+
+    @pytest.mark.parametrize("query", ["?since=abc", "?since=-1", "?limit=0", "?limit=5000"])
+    def test_bad_parameters(self, client, query):
+        """Test that a malformed cursor or limit is rejected."""
+        response = client.get("/api/2/changes/" + query)
+        assert response.status_code == 400
@@ -15,6 +15,7 @@ urlpatterns = (
     path("donationpoints/search/", donationpoint_search, name="donationpoint_search"),
     path("needs/", needs, name="needs"),
     path("need/<uuid:id>/", need, name="need"),
+    path("changes/", changes, name="changes"),
     path("constituencies/", constituencies, name="constituencies"),
     path("constituency/<slug:slug>/", constituency, name="constituency"),
 )
\ No newline at end of file
@@ -1,20 +1,25 @@
 import datetime
+from itertools import chain
 
 from django.shortcuts import get_object_or_404, render
 from django.http import HttpResponseBadRequest
+from django.utils import timezone
 from django.views.decorators.cache import cache_page
 
 from django_earthdistance.models import EarthDistance, LlToEarth
 
-from givefood.models import Foodbank, FoodbankChange, FoodbankDonationPoint, ParliamentaryConstituency, FoodbankChange
-from .func import ApiResponse
-from givefood.utils.cache import get_all_open_foodbanks, get_all_open_locations
+from givefood.models import DataChange, Foodbank, FoodbankChange, FoodbankDonationPoint, FoodbankLocation, ParliamentaryConstituency, FoodbankChange
+from .func import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ApiResponse, ApiStreamingResponse, add_next_link, feature_collection, field_columns, get_fields, get_page, paginate, select_fields, wants_stream
+from givefood.utils.cache import versioned_cache_page
 from givefood.utils.geo import NearestFirst, find_donationpoints, find_locations, geocode, is_uk, miles
-from givefood.const.cache_times import SECONDS_IN_HOUR, SECONDS_IN_DAY, SECONDS_IN_MONTH, SECONDS_IN_WEEK
+from givefood.const.cache_times import SECONDS_IN_MINUTE, SECONDS_IN_HOUR, SECONDS_IN_DAY, SECONDS_IN_MONTH, SECONDS_IN_WEEK
 from givefood.models import Dump
 
 DEFAULT_FORMAT = "json"
 
+# Rows fetched per round trip when a collection is streamed
+STREAM_QUERY_CHUNK_SIZE = 500
+
 
 @cache_page(SECONDS_IN_DAY)
 def index(request):
@@ -70,88 +75,128 @@ def docs(request):
     return render(request, "docs.html", template_vars)
 
 
-@cache_page(SECONDS_IN_HOUR)
+def politics_block(place):
+
+    return {
+        "parliamentary_constituency":place.parliamentary_constituency_name,
+        "mp":place.mp,
+        "mp_party":place.mp_party,
+        "mp_parl_id":place.mp_parl_id,
+        "ward":place.ward,
+        "district":place.district,
+        "urls": {
+            "self":"https://www.givefood.org.uk/api/2/constituency/%s/" % (place.parliamentary_constituency_slug),
+            "html":"https://www.givefood.org.uk/needs/in/constituency/%s/" % (place.parliamentary_constituency_slug),
+        },
+    }
+
+
+POLITICS_COLUMNS = ["parliamentary_constituency_name", "parliamentary_constituency_slug", "mp", "mp_party", "mp_parl_id", "ward", "district"]
+
+
+# Each field of a food bank in the list, with the columns it needs
+# and how to build it. ?fields= picks from these, and the columns
+# of the chosen ones are all that is read from the database.
+FOODBANK_FIELDS = {
+    "id": (["uuid"], lambda foodbank: str(foodbank.uuid)),
+    "name": (["name", "alt_name"], lambda foodbank: foodbank.full_name()),
+    "alt_name": (["alt_name"], lambda foodbank: foodbank.alt_name),
+    "slug": (["slug"], lambda foodbank: foodbank.slug),
+    "phone": (["phone_number"], lambda foodbank: foodbank.phone_number),
+    "secondary_phone": (["secondary_phone_number"], lambda foodbank: foodbank.secondary_phone_number),
+    "email": (["contact_email"], lambda foodbank: foodbank.contact_email),
+    "address": (["address", "postcode"], lambda foodbank: foodbank.full_address()),
+    "postcode": (["postcode"], lambda foodbank: foodbank.postcode),
+    "closed": (["is_closed"], lambda foodbank: foodbank.is_closed),
+    "country": (["country"], lambda foodbank: foodbank.country),
+    "lat_lng": (["lat_lng"], lambda foodbank: foodbank.lat_lng),
+    "network": (["network"], lambda foodbank: foodbank.network),
+    "created": (["created"], lambda foodbank: datetime.datetime.fromtimestamp(foodbank.created.timestamp())),
+    "urls": (["slug", "url", "shopping_list_url"], lambda foodbank: {
+        "self":"https://www.givefood.org.uk/api/2/foodbank/%s/" % (foodbank.slug),
+        "html":"https://www.givefood.org.uk/needs/at/%s/" % (foodbank.slug),
+        "homepage":foodbank.url,
+        "shopping_list":foodbank.shopping_list_url,
+    }),
+    "charity": (["charity_number", "country"], lambda foodbank: {
+        "registration_id":foodbank.charity_number,
+        "register_url":foodbank.charity_register_url(),
+    }),
+    "politics": (POLITICS_COLUMNS, politics_block),
+}
+
+
+def foodbank_item(foodbank, fields = None):
+
+    return select_fields(foodbank, FOODBANK_FIELDS, fields)
+
+
+def foodbank_feature(foodbank):
+
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(foodbank.lat_lng.split(",")[1]), float(foodbank.lat_lng.split(",")[0])]
+        },
+        "properties": {
+            "name": foodbank.name,
+            "slug": foodbank.slug,
+            "address": foodbank.full_address(),
+            "country": foodbank.country,
+            "url": "https://www.givefood.org.uk/needs/at/%s/" % (foodbank.slug),
+            "json": "https://www.givefood.org.uk/api/2/foodbank/%s/" % (foodbank.slug),
+            "network": foodbank.network,
+            "email": foodbank.contact_email,
+            "telephone": foodbank.phone_number,
+            "parliamentary_constituency": foodbank.parliamentary_constituency_name,
+        }
+    }
+
+
+@versioned_cache_page(SECONDS_IN_HOUR, ("foodbank",))
 def foodbanks(request):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
 
-    foodbanks = get_all_open_foodbanks()
-    response_list = []
+    try:
+        fields = get_fields(request, FOODBANK_FIELDS)
+        page = get_page(request)
+    except ValueError:
+        return HttpResponseBadRequest()
+    # GeoJSON features have their own fixed set of properties
+    if fields and format == "geojson":
+        return HttpResponseBadRequest()
+    stream = wants_stream(request, format)
 
-    if format != "geojson":
-        for foodbank in foodbanks:
-            response_list.append({
-                "id": str(foodbank.uuid),
-                "name":foodbank.full_name(),
-                "alt_name":foodbank.alt_name,
-                "slug":foodbank.slug,
-                "phone":foodbank.phone_number,
-                "secondary_phone":foodbank.secondary_phone_number,
-                "email":foodbank.contact_email,
-                "address":foodbank.full_address(),
-                "postcode":foodbank.postcode,
-                "closed":foodbank.is_closed,
-                "country":foodbank.country,
-                "lat_lng":foodbank.lat_lng,
-                "network":foodbank.network,
-                "created":datetime.datetime.fromtimestamp(foodbank.created.timestamp()),
-                "urls": {
-                    "self":"https://www.givefood.org.uk/api/2/foodbank/%s/" % (foodbank.slug),
-                    "html":"https://www.givefood.org.uk/needs/at/%s/" % (foodbank.slug),
-                    "homepage":foodbank.url,
-                    "shopping_list":foodbank.shopping_list_url,
-                },
-                "charity": {
-                    "registration_id":foodbank.charity_number,
-                    "register_url":foodbank.charity_register_url(),
-                },
-                "politics": {
-                    "parliamentary_constituency":foodbank.parliamentary_constituency_name,
-                    "mp":foodbank.mp,
-                    "mp_party":foodbank.mp_party,
-                    "mp_parl_id":foodbank.mp_parl_id,
-                    "ward":foodbank.ward,
-                    "district":foodbank.district,
-                    "urls": {
-                        "self":"https://www.givefood.org.uk/api/2/constituency/%s/" % (foodbank.parliamentary_constituency_slug),
-                        "html":"https://www.givefood.org.uk/needs/in/constituency/%s/" % (foodbank.parliamentary_constituency_slug),
-                    },
-                }
-            })
-    else:
-        features = []
-        for foodbank in foodbanks:
-            features.append(
-                {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [float(foodbank.lat_lng.split(",")[1]), float(foodbank.lat_lng.split(",")[0])]
-                    },
-                    "properties": {
-                        "name": foodbank.name,
-                        "slug": foodbank.slug,
-                        "address": foodbank.full_address(),
-                        "country": foodbank.country,
-                        "url": "https://www.givefood.org.uk/needs/at/%s/" % (foodbank.slug),
-                        "json": "https://www.givefood.org.uk/api/2/foodbank/%s/" % (foodbank.slug),
-                        "network": foodbank.network,
-                        "email": foodbank.contact_email,
-                        "telephone": foodbank.phone_number,
-                        "parliamentary_constituency": foodbank.parliamentary_constituency_name,
-                    }
-                }
-            )
+    foodbanks = Foodbank.objects.filter(is_closed = False)
+    if fields:
+        foodbanks = foodbanks.only(*field_columns(FOODBANK_FIELDS, fields))
 
-        response_list = {
-            "type": "FeatureCollection",
-            "features": features
-        }
+    if page:
+        foodbanks = paginate(foodbanks, page)
+    elif stream:
+        foodbanks = foodbanks.iterator(chunk_size = STREAM_QUERY_CHUNK_SIZE)
 
-    return ApiResponse(response_list, "foodbanks", format)
+    if format == "geojson":
+        features = (foodbank_feature(foodbank) for foodbank in foodbanks)
+        if stream:
+            response = ApiStreamingResponse(features, "foodbanks", format, container = feature_collection(), key = "features")
+        else:
+            response = ApiResponse(feature_collection(list(features)), "foodbanks", format)
+    else:
+        items = (foodbank_item(foodbank, fields) for foodbank in foodbanks)
+        if stream:
+            response = ApiStreamingResponse(items, "foodbanks", format)
+        else:
+            response = ApiResponse(list(items), "foodbanks", format)
 
+    if page:
+        add_next_link(response, request, foodbanks, page)
+    return response
 
-@cache_page(SECONDS_IN_DAY)
+
+@versioned_cache_page(SECONDS_IN_DAY, ("foodbank", "location", "donationpoint", "need"))
 def foodbank(request, slug):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -356,7 +401,7 @@ def foodbank(request, slug):
     return ApiResponse(response_dict, "foodbank", format)
 
 
-@cache_page(SECONDS_IN_DAY)
+@versioned_cache_page(SECONDS_IN_DAY, ("foodbank", "need"))
 def foodbank_search(request):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -448,87 +493,105 @@ def foodbank_search(request):
     return ApiResponse(response_list, "foodbanks", format)
 
 
-@cache_page(SECONDS_IN_MONTH)
-def locations(request):
+LOCATION_FIELDS = {
+    "id": (["uuid"], lambda location: str(location.uuid)),
+    "name": (["name"], lambda location: location.name),
+    "slug": (["slug"], lambda location: location.slug),
+    "phone": (["phone_number", "foodbank_phone_number"], lambda location: location.phone_or_foodbank_phone()),
+    "email": (["email", "foodbank_email"], lambda location: location.email_or_foodbank_email()),
+    "address": (["address", "postcode"], lambda location: location.full_address()),
+    "postcode": (["postcode"], lambda location: location.postcode),
+    "lat_lng": (["lat_lng"], lambda location: location.lat_lng),
+    "urls": (["slug", "foodbank_slug"], lambda location: {
+        "html":"https://www.givefood.org.uk/needs/at/%s/%s/" % (location.foodbank_slug, location.slug)
+    }),
+    "foodbank": (["foodbank_name", "foodbank_slug", "foodbank_network"], lambda location: {
+        "name":location.foodbank_name,
+        "slug":location.foodbank_slug,
+        "network":location.foodbank_network,
+        "urls": {
+            "self":"https://www.givefood.org.uk/api/2/foodbank/%s/" % (location.foodbank_slug),
+            "html":"https://www.givefood.org.uk/needs/at/%s/" % (location.foodbank_slug)
+        },
+    }),
+    "politics": (POLITICS_COLUMNS, politics_block),
+}
 
-    format = request.GET.get("format", DEFAULT_FORMAT)
 
-    locations = get_all_open_locations()
-    response_list = []
+def location_item(location, fields = None):
 
-    if format != "geojson":
-        for location in locations:
+    return select_fields(location, LOCATION_FIELDS, fields)
 
-            response_list.append({
-                "id": str(location.uuid),
-                "name":location.name,
-                "slug":location.slug,
-                "phone":location.phone_or_foodbank_phone(),
-                "email":location.email_or_foodbank_email(),
-                "address":location.full_address(),
-                "postcode":location.postcode,
-                "lat_lng":location.lat_lng,
-                "urls": {
-                    "html":"https://www.givefood.org.uk/needs/at/%s/%s/" % (location.foodbank_slug, location.slug)
-                },
-                "foodbank": {
-                    "name":location.foodbank_name,
-                    "slug":location.foodbank_slug,
-                    "network":location.foodbank_network,
-                    "urls": {
-                        "self":"https://www.givefood.org.uk/api/2/foodbank/%s/" % (location.foodbank_slug),
-                        "html":"https://www.givefood.org.uk/needs/at/%s/" % (location.foodbank_slug)
-                    },
-                },
-                "politics": {
-                    "parliamentary_constituency":location.parliamentary_constituency_name,
-                    "mp":location.mp,
-                    "mp_party":location.mp_party,
-                    "mp_parl_id":location.mp_parl_id,
-                    "ward":location.ward,
-                    "district":location.district,
-                    "urls": {
-                        "self":"https://www.givefood.org.uk/api/2/constituency/%s/" % (location.parliamentary_constituency_slug),
-                        "html":"https://www.givefood.org.uk/needs/in/constituency/%s/" % (location.parliamentary_constituency_slug),
-                    },
-                }
-            })
-    else:
 
-        features = []
-        for location in locations:
-            features.append(
-                {
-                    "type": "Feature",
-                    "geometry": {
-                        "type": "Point",
-                        "coordinates": [float(location.lat_lng.split(",")[1]), float(location.lat_lng.split(",")[0])]
-                    },
-                    "properties": {
-                        "name": location.full_name(),
-                        "slug": location.slug,
-                        "address": location.full_address(),
-                        "url": "https://www.givefood.org.uk/needs/at/%s/%s/" % (location.foodbank_slug, location.slug),
-                        "network": location.foodbank_network,
-                        "email": location.email_or_foodbank_email(),
-                        "telephone": location.phone_or_foodbank_phone(),
-                        "foodbank": location.foodbank_name,
-                        "foodbank_slug": location.foodbank_slug,
-                        "foodbank_url": "https://www.givefood.org.uk/needs/at/%s/" % (location.foodbank_slug),
-                        "parliamentary_constituency": location.parliamentary_constituency_name,
-                    }
-                }
-            )
+def location_feature(location):
 
-        response_list = {
-            "type": "FeatureCollection",
-            "features": features
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(location.lat_lng.split(",")[1]), float(location.lat_lng.split(",")[0])]
+        },
+        "properties": {
+            "name": location.full_name(),
+            "slug": location.slug,
+            "address": location.full_address(),
+            "url": "https://www.givefood.org.uk/needs/at/%s/%s/" % (location.foodbank_slug, location.slug),
+            "network": location.foodbank_network,
+            "email": location.email_or_foodbank_email(),
+            "telephone": location.phone_or_foodbank_phone(),
+            "foodbank": location.foodbank_name,
+            "foodbank_slug": location.foodbank_slug,
+            "foodbank_url": "https://www.givefood.org.uk/needs/at/%s/" % (location.foodbank_slug),
+            "parliamentary_constituency": location.parliamentary_constituency_name,
         }
+    }
 
-    return ApiResponse(response_list, "locations", format)
 
+@versioned_cache_page(SECONDS_IN_MONTH, ("location",))
+def locations(request):
 
-@cache_page(SECONDS_IN_DAY)
+    format = request.GET.get("format", DEFAULT_FORMAT)
+
+    try:
+        fields = get_fields(request, LOCATION_FIELDS)
+        page = get_page(request)
+    except ValueError:
+        return HttpResponseBadRequest()
+    if fields and format == "geojson":
+        return HttpResponseBadRequest()
+    stream = wants_stream(request, format)
+
+    locations = FoodbankLocation.objects.filter(is_closed = False)
+    if fields:
+        locations = locations.only(*field_columns(LOCATION_FIELDS, fields))
+    elif format == "geojson":
+        # full_name() reads the food bank's name off the related row
+        locations = locations.select_related("foodbank")
+
+    if page:
+        locations = paginate(locations, page)
+    elif stream:
+        locations = locations.iterator(chunk_size = STREAM_QUERY_CHUNK_SIZE)
+
+    if format == "geojson":
+        features = (location_feature(location) for location in locations)
+        if stream:
+            response = ApiStreamingResponse(features, "locations", format, container = feature_collection(), key = "features")
+        else:
+            response = ApiResponse(feature_collection(list(features)), "locations", format)
+    else:
+        items = (location_item(location, fields) for location in locations)
+        if stream:
+            response = ApiStreamingResponse(items, "locations", format)
+        else:
+            response = ApiResponse(list(items), "locations", format)
+
+    if page:
+        add_next_link(response, request, locations, page)
+    return response
+
+
+@versioned_cache_page(SECONDS_IN_DAY, ("foodbank", "location", "need"))
 def location_search(request):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -612,74 +675,78 @@ def location_search(request):
     return ApiResponse(response_list, "locations", format)
 
 
-@cache_page(SECONDS_IN_WEEK)
+def donationpoint_feature(donationpoint):
+
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(donationpoint.long()), float(donationpoint.latt())]
+        },
+        "properties": {
+            "name": donationpoint.name,
+            "slug": donationpoint.slug,
+            "address": donationpoint.full_address(),
+            "url": "https://www.givefood.org.uk/needs/at/%s/donationpoint/%s/" % (donationpoint.foodbank_slug, donationpoint.slug),
+            "network": donationpoint.foodbank_network,
+            "telephone": donationpoint.phone_number,
+            "web": donationpoint.url_with_ref(),
+            "foodbank": donationpoint.foodbank_name,
+            "foodbank_slug": donationpoint.foodbank_slug,
+            "foodbank_url": "https://www.givefood.org.uk/needs/at/%s/" % (donationpoint.foodbank_slug),
+            "parliamentary_constituency": donationpoint.parliamentary_constituency_name,
+        }
+    }
+
+
+def deliveryaddress_feature(deliveryaddress):
+
+    return {
+        "type": "Feature",
+        "geometry": {
+            "type": "Point",
+            "coordinates": [float(deliveryaddress.delivery_long()), float(deliveryaddress.delivery_latt())]
+        },
+        "properties": {
+            "name": deliveryaddress.name + " delivery address",
+            "slug": deliveryaddress.slug,
+            "address": deliveryaddress.full_address(),
+            "url": "https://www.givefood.org.uk/needs/at/%s/" % (deliveryaddress.slug),
+            "network": deliveryaddress.network,
+            "telephone": deliveryaddress.phone_number,
+            "web": deliveryaddress.url_with_ref(),
+            "foodbank": deliveryaddress.name,
+            "foodbank_slug": deliveryaddress.slug,
+            "foodbank_url": "https://www.givefood.org.uk/needs/at/%s/" % (deliveryaddress.slug),
+            "parliamentary_constituency": deliveryaddress.parliamentary_constituency_name,
+        }
+    }
+
+
+@versioned_cache_page(SECONDS_IN_WEEK, ("donationpoint", "foodbank"))
 def donationpoints(request):
 
     format = request.GET.get("format", "geojson")
-    if format != "geojson":
+    if format not in ["geojson", "ndjson"]:
         return HttpResponseBadRequest()
 
     donationpoints = FoodbankDonationPoint.objects.filter(is_closed = False)
-
-    features = []
-    for donationpoint in donationpoints:
-        features.append(
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [float(donationpoint.long()), float(donationpoint.latt())]
-                },
-                "properties": {
-                    "name": donationpoint.name,
-                    "slug": donationpoint.slug,
-                    "address": donationpoint.full_address(),
-                    "url": "https://www.givefood.org.uk/needs/at/%s/donationpoint/%s/" % (donationpoint.foodbank_slug, donationpoint.slug),
-                    "network": donationpoint.foodbank_network,
-                    "telephone": donationpoint.phone_number,
-                    "web": donationpoint.url_with_ref(),
-                    "foodbank": donationpoint.foodbank_name,
-                    "foodbank_slug": donationpoint.foodbank_slug,
-                    "foodbank_url": "https://www.givefood.org.uk/needs/at/%s/" % (donationpoint.foodbank_slug),
-                    "parliamentary_constituency": donationpoint.parliamentary_constituency_name,
-                }
-            }
-        )
-
     deliveryaddresses = Foodbank.objects.filter(is_closed = False).exclude(delivery_address__exact='')
-    for deliveryaddress in deliveryaddresses:
-        features.append(
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [float(deliveryaddress.delivery_long()), float(deliveryaddress.delivery_latt())]
-                },
-                "properties": {
-                    "name": deliveryaddress.name + " delivery address",
-                    "slug": deliveryaddress.slug,
-                    "address": deliveryaddress.full_address(),
-                    "url": "https://www.givefood.org.uk/needs/at/%s/" % (deliveryaddress.slug),
-                    "network": deliveryaddress.network,
-                    "telephone": deliveryaddress.phone_number,
-                    "web": deliveryaddress.url_with_ref(),
-                    "foodbank": deliveryaddress.name,
-                    "foodbank_slug": deliveryaddress.slug,
-                    "foodbank_url": "https://www.givefood.org.uk/needs/at/%s/" % (deliveryaddress.slug),
-                    "parliamentary_constituency": deliveryaddress.parliamentary_constituency_name,
-                }
-            }
+
+    if wants_stream(request, format):
+        features = chain(
+            map(donationpoint_feature, donationpoints.iterator(chunk_size = STREAM_QUERY_CHUNK_SIZE)),
+            map(deliveryaddress_feature, deliveryaddresses.iterator(chunk_size = STREAM_QUERY_CHUNK_SIZE)),
         )
+        return ApiStreamingResponse(features, "donationpoints", format, container = feature_collection(), key = "features")
 
-    response_list = {
-        "type": "FeatureCollection",
-        "features": features
-    }
+    features = [donationpoint_feature(donationpoint) for donationpoint in donationpoints]
+    features.extend(deliveryaddress_feature(deliveryaddress) for deliveryaddress in deliveryaddresses)
 
-    return ApiResponse(response_list, "donationpoints", format)
+    return ApiResponse(feature_collection(features), "donationpoints", format)
 
 
-@cache_page(SECONDS_IN_DAY)
+@versioned_cache_page(SECONDS_IN_DAY, ("donationpoint", "foodbank", "need"))
 def donationpoint_search(request):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -775,7 +842,83 @@ def donationpoint_search(request):
     return ApiResponse(response_list, "donationpoints", format)
 
 
-@cache_page(SECONDS_IN_HOUR)
+def change_item(change):
+
+    if change.object_type == "foodbank":
+        self_url = "https://www.givefood.org.uk/api/2/foodbank/%s/" % (change.slug)
+    elif change.object_type == "need":
+        self_url = "https://www.givefood.org.uk/api/2/need/%s/" % (change.object_uuid)
+    elif change.object_type == "location":
+        self_url = "https://www.givefood.org.uk/needs/at/%s/%s/" % (change.foodbank_slug, change.slug)
+    else:
+        self_url = "https://www.givefood.org.uk/needs/at/%s/donationpoint/%s/" % (change.foodbank_slug, change.slug)
+
+    return {
+        "cursor":change.id,
+        "type":change.object_type,
+        "action":change.action,
+        "id":str(change.object_uuid),
+        "slug":change.slug,
+        "changed":datetime.datetime.fromtimestamp(change.created.timestamp()),
+        "foodbank": {
+            "slug":change.foodbank_slug,
+            "urls": {
+                "self":"https://www.givefood.org.uk/api/2/foodbank/%s/" % (change.foodbank_slug),
+                "html":"https://www.givefood.org.uk/needs/at/%s/" % (change.foodbank_slug),
+            },
+        },
+        "urls": {
+            "self":self_url,
+        },
+    }
+
+
+# How old a change has to be before the feed hands it out. Ids are taken
+# when a row is inserted, not when it's committed, so a change saved in a
+# transaction that commits after a later one has been read would otherwise
+# be behind a consumer's cursor, and never seen.
+CHANGES_LAG_SECONDS = 60
+
+
+# Short, as consumers poll the feed to keep up. Not versioned, as what
+# it hands out moves on with the lag as well as with the data.
+@cache_page(SECONDS_IN_MINUTE)
+def changes(request):
+
+    format = request.GET.get("format", DEFAULT_FORMAT)
+
+    try:
+        since = int(request.GET.get("since", 0))
+        limit = int(request.GET.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return HttpResponseBadRequest()
+    if since < 0 or limit < 1 or limit > MAX_PAGE_SIZE:
+        return HttpResponseBadRequest()
+
+    # One more than asked for, to know whether there is more to come
+    changes = list(DataChange.objects.filter(id__gt = since).order_by("id")[:limit + 1])
+
+    # Up to the first that's too new, so one isn't passed over for a later one
+    settled = timezone.now() - datetime.timedelta(seconds = CHANGES_LAG_SECONDS)
+    for index, change in enumerate(changes):
+        if change.created > settled:
+            changes = changes[:index]
+            break
+
+    more = len(changes) > limit
+    changes = changes[:limit]
+
+    response_dict = {
+        "since":since,
+        "cursor":changes[-1].id if changes else since,
+        "more":more,
+        "changes":[change_item(change) for change in changes],
+    }
+
+    return ApiResponse(response_dict, "changes", format)
+
+
+@versioned_cache_page(SECONDS_IN_HOUR, ("need", "foodbank"))
 def needs(request):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -805,7 +948,7 @@ def needs(request):
     return ApiResponse(response_list, "needs", format)
 
 
-@cache_page(SECONDS_IN_DAY)
+@versioned_cache_page(SECONDS_IN_DAY, ("need", "foodbank"))
 def need(request, id):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -830,7 +973,7 @@ def need(request, id):
     return ApiResponse(response_dict, "need", format)
 
 
-@cache_page(SECONDS_IN_DAY)
+@versioned_cache_page(SECONDS_IN_DAY, ("constituency",))
 def constituencies(request):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -853,7 +996,7 @@ def constituencies(request):
     return ApiResponse(response_list, "constituencies", format) 
 
 
-@cache_page(SECONDS_IN_WEEK)
+@versioned_cache_page(SECONDS_IN_WEEK, ("constituency", "foodbank", "location", "need"))
 def constituency(request, slug):
 
     format = request.GET.get("format", DEFAULT_FORMAT)
@@ -1,9 +1,9 @@
 import unicodecsv as csv
 
 from django.http import HttpResponse, JsonResponse
-from django.views.decorators.cache import cache_page
 
 from givefood.models import Foodbank, FoodbankChangeLine, FoodbankDonationPoint
+from givefood.utils.cache import versioned_cache_page
 from givefood.const.cache_times import SECONDS_IN_DAY, SECONDS_IN_HOUR
 
 DEFAULT_FORMAT = "json"
@@ -13,7 +13,7 @@ def index(request):
     return HttpResponse("Give Food API 3")
 
 
-@cache_page(SECONDS_IN_HOUR)
+@versioned_cache_page(SECONDS_IN_HOUR, ("donationpoint", "foodbank", "need"))
 def company(request, slug):
 
     if not FoodbankDonationPoint.objects.filter(company_slug=slug).exists():
@@ -86,7 +86,7 @@ def company(request, slug):
     return JsonResponse(response_list, safe=False)
 
 
-@cache_page(SECONDS_IN_DAY)
+@versioned_cache_page(SECONDS_IN_DAY, ("foodbank",))
 def slugfromid(request, uuid):
     try:
         foodbank = Foodbank.objects.only("slug").get(uuid=uuid)
@@ -641,5 +641,4 @@ class Command(BaseCommand):
 
         self.stdout.write(f"Deleted {deleted_count} old dumps")
 
-        decache(prefixes=[reverse("dumps:dump_index")])
-        decache(urls=[reverse("gfapi2:index")])
+        decache(urls=[reverse("gfapi2:index")], prefixes=[reverse("dumps:dump_index")])
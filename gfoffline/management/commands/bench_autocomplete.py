@@ -0,0 +1,60 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.test.client import RequestFactory
+
+from givefood.views import address_autocomplete
+
+
+DEFAULT_QUERIES = [
+    "lo", "lon", "london", "man", "manchester", "hackney", "brid", "upon",
+    "on-sea", "chester", "sw", "sw1a", "ab10 1", "ze2 9", "xyzzy",
+]
+
+
+class Command(BaseCommand):
+
+    help = 'Compare /aac/ latency answered from the autocomplete index against the SQL path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("queries", nargs="*", help="Queries to time (default: a mix of prefixes, substrings and postcodes)")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per query, the median is reported")
+        parser.add_argument("--index", type=str, default=None, help="Index to time (default: AUTOCOMPLETE_INDEX_PATH)")
+
+    def measure(self, query, repeat):
+        # The view's undecorated function, so cache_page doesn't answer
+        # every run after the first
+        view = address_autocomplete.__wrapped__
+        request = RequestFactory().get("/aac/", {"q": query})
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = view(request)
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings), response.content
+
+    def handle(self, *args, **options):
+
+        queries = options["queries"] or DEFAULT_QUERIES
+        repeat = options["repeat"]
+        index_path = options["index"] or settings.AUTOCOMPLETE_INDEX_PATH
+
+        self.stdout.write(f"{'query':<14} {'sql':>9} {'index':>9} {'speedup':>8}  same")
+        sql_total = index_total = 0
+        for query in queries:
+            with override_settings(AUTOCOMPLETE_INDEX_PATH = None):
+                sql_time, sql_content = self.measure(query, repeat)
+            with override_settings(AUTOCOMPLETE_INDEX_PATH = index_path):
+                index_time, index_content = self.measure(query, repeat)
+            sql_total += sql_time
+            index_total += index_time
+            self.stdout.write(
+                f"{query:<14} {sql_time * 1000:7.2f}ms {index_time * 1000:7.2f}ms "
+                f"{sql_time / index_time:7.1f}x  {'yes' if sql_content == index_content else 'no'}"
+            )
+        self.stdout.write(
+            f"{'total':<14} {sql_total * 1000:7.2f}ms {index_total * 1000:7.2f}ms {sql_total / index_total:7.1f}x"
+        )
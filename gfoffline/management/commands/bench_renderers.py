@@ -0,0 +1,111 @@
+import time
+from datetime import datetime, timezone
+from xml.dom.minidom import parseString
+
+import yaml
+from dicttoxml import dicttoxml
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+
+from gfapi2.renderers import RENDERERS, xml_item_name
+
+
+def synthetic_locations(rows):
+    """Rows shaped like /api/2/locations/, with made up values."""
+    for number in range(rows):
+        yield {
+            "id": "00000000-0000-0000-0000-%012d" % (number),
+            "name": "Location %s" % (number),
+            "slug": "location-%s" % (number),
+            "phone": "01234 %06d" % (number),
+            "email": "location%s@example.org" % (number),
+            "address": "%s High Street\nSometown & District\nAB1 2CD" % (number),
+            "postcode": "AB1 2CD",
+            "lat_lng": "51.%06d,-1.%06d" % (number, number),
+            "is_donation_point": number % 2 == 0,
+            "modified": datetime(2024, 1, 1, tzinfo = timezone.utc),
+            "foodbank": {
+                "name": "Food Bank %s" % (number // 10),
+                "slug": "food-bank-%s" % (number // 10),
+                "urls": {
+                    "self": "https://www.givefood.org.uk/api/2/foodbank/food-bank-%s/" % (number // 10),
+                    "html": "https://www.givefood.org.uk/needs/at/food-bank-%s/" % (number // 10),
+                },
+            },
+            "politics": {
+                "parliamentary_constituency": "Constituency %s" % (number % 650),
+                "mp": "A. Member",
+                "mp_party": "Party",
+            },
+        }
+
+
+def legacy_json(data, obj_name):
+    return JsonResponse(data, safe = False, json_dumps_params = {"indent": 2}).content
+
+
+def legacy_xml(data, obj_name):
+    xml = dicttoxml(data, attr_type = False, custom_root = obj_name, item_func = xml_item_name)
+    return parseString(xml).toprettyxml().encode("utf-8")
+
+
+def legacy_yaml(data, obj_name):
+    return yaml.dump(data, encoding = "utf-8", allow_unicode = True, default_flow_style = False)
+
+
+LEGACY = {
+    "json": legacy_json,
+    "xml": legacy_xml,
+    "yaml": legacy_yaml,
+}
+
+
+class Command(BaseCommand):
+
+    help = 'Measure API v2 renderer throughput per format on a synthetic locations payload.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Number of synthetic rows")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best is reported")
+        parser.add_argument("--legacy", action="store_true", help="Also time the serialisers ApiResponse used to call")
+
+    def measure(self, func, repeat):
+        best = None
+        size = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            size = func()
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return best, size
+
+    def report(self, label, rows, elapsed, size):
+        self.stdout.write(
+            f"{label:<16} {elapsed * 1000:9.1f}ms {rows / elapsed:12.0f} rows/s "
+            f"{size / elapsed / 1024 / 1024:8.1f} MB/s {size / 1024:10.0f} KB"
+        )
+
+    def handle(self, *args, **options):
+
+        rows = options["rows"]
+        repeat = options["repeat"]
+        data = list(synthetic_locations(rows))
+
+        self.stdout.write(f"{rows} rows, best of {repeat}")
+
+        for format in ("json", "xml", "yaml"):
+            renderer = RENDERERS[format]
+
+            elapsed, size = self.measure(lambda: len(renderer.render(data, "locations")), repeat)
+            self.report(f"{format} render", rows, elapsed, size)
+
+            elapsed, size = self.measure(
+                lambda: sum(len(chunk) for chunk in renderer.stream(iter(data), "locations")),
+                repeat,
+            )
+            self.report(f"{format} stream", rows, elapsed, size)
+
+            if options["legacy"]:
+                elapsed, size = self.measure(lambda: len(LEGACY[format](data, "locations")), repeat)
+                self.report(f"{format} legacy", rows, elapsed, size)
@@ -0,0 +1,228 @@
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import django
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from givefood.models import (
+    Foodbank,
+    FoodbankChangeLine,
+    FoodbankDonationPoint,
+    FoodbankLocation,
+    ParliamentaryConstituency,
+    Place,
+    Postcode,
+)
+
+
+RESULTS_VERSION = 1
+
+
+class Rollback(Exception):
+    pass
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output = True, text = True, check = True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class Command(BaseCommand):
+
+    help = 'Time the hot public pages, API and dump against the database, and write the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Cold runs per case (default: 5)")
+        parser.add_argument("--output", type=str, default=None, help="Where to write the results (default: benchmark-<commit>.json)")
+        parser.add_argument("--compare", type=str, default=None, help="Earlier results to compare these with")
+        parser.add_argument("--threshold", type=float, default=10.0, help="Percent slower that counts as a regression (default: 10)")
+        parser.add_argument("--only", nargs="*", default=None, help="Only run the cases with these names")
+        parser.add_argument("--no-dump", action="store_true", help="Skip the dump command, which takes a while")
+
+    def cases(self, options):
+        """
+        Name and callable for each case, picked from the data that's there.
+
+        The pages and API are requested through the test client, so the
+        whole middleware stack is included. The dump runs in a transaction
+        that's rolled back, and doesn't purge Cloudflare.
+        """
+        foodbank = Foodbank.objects.filter(is_closed = False).order_by("id").first()
+        constituency = ParliamentaryConstituency.objects.order_by("id").first()
+        if not foodbank or not constituency:
+            raise CommandError("There's nothing to benchmark. Run seed_benchmark on an empty database first.")
+
+        client = Client(HTTP_HOST = "localhost")
+
+        def get(path):
+            return lambda: client.get(path)
+
+        cases = [
+            ("homepage", get("/")),
+            ("wfbn_index", get("/needs/?lat_lng=%s" % (foodbank.lat_lng))),
+            ("foodbank", get("/needs/at/%s/" % (foodbank.slug))),
+            ("constituencies", get("/needs/in/constituencies/")),
+            ("constituency", get("/needs/in/constituency/%s/" % (constituency.slug))),
+            ("geojson", get("/needs/geo.json")),
+            ("foodbank_geojson", get("/needs/at/%s/geo.json" % (foodbank.slug))),
+            ("constituency_geojson", get("/needs/in/constituency/%s/geo.json" % (constituency.slug))),
+            ("api2_foodbanks", get("/api/2/foodbanks/")),
+            ("api2_foodbank", get("/api/2/foodbank/%s/" % (foodbank.slug))),
+            ("api2_foodbank_search", get("/api/2/foodbanks/search/?lat_lng=%s" % (foodbank.lat_lng))),
+            ("api2_locations", get("/api/2/locations/")),
+            ("api2_donationpoints", get("/api/2/donationpoints/")),
+            ("api2_needs", get("/api/2/needs/")),
+            ("api2_constituency", get("/api/2/constituency/%s/" % (constituency.slug))),
+            ("autocomplete_place", get("/aac/?q=lo")),
+            ("autocomplete_postcode", get("/aac/?q=ab1")),
+        ]
+        if not options["no_dump"]:
+            cases.append(("dump", self.dump))
+
+        if options["only"]:
+            cases = [(name, func) for name, func in cases if name in options["only"]]
+        return cases
+
+    def dump(self):
+        try:
+            with transaction.atomic():
+                with patch("gfdumps.management.commands.dump.decache"):
+                    call_command("dump", stdout = io.StringIO())
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run_case(self, func, repeat):
+        """
+        Latency cold and warm, queries and peak Python memory for one case.
+
+        Each cold run starts with the caches cleared, which is what a page
+        costs the first time it's asked for after a change. Memory is taken
+        on a run of its own, as tracemalloc slows everything it watches.
+        """
+        timings = []
+        queries = 0
+        status = size = None
+        for _ in range(repeat):
+            clear_caches()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = func()
+                timings.append(time.perf_counter() - start)
+            queries = len(captured)
+            if response is not None:
+                status = response.status_code
+                size = len(b"".join(response.streaming_content) if response.streaming else response.content)
+
+        start = time.perf_counter()
+        func()
+        warm = time.perf_counter() - start
+
+        clear_caches()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            "median_ms": round(statistics.median(timings) * 1000, 2),
+            "min_ms": round(timings[0] * 1000, 2),
+            "max_ms": round(timings[-1] * 1000, 2),
+            "warm_ms": round(warm * 1000, 2),
+            "queries": queries,
+            "peak_memory_kb": round(peak / 1024),
+            "status": status,
+            "bytes": size,
+        }
+
+    def dataset(self):
+        return {
+            "foodbanks": Foodbank.objects.count(),
+            "locations": FoodbankLocation.objects.count(),
+            "donationpoints": FoodbankDonationPoint.objects.count(),
+            "needlines": FoodbankChangeLine.objects.count(),
+            "constituencies": ParliamentaryConstituency.objects.count(),
+            "places": Place.objects.count(),
+            "postcodes": Postcode.objects.count(),
+        }
+
+    def compare(self, results, path, threshold):
+        with open(path) as f:
+            baseline = json.load(f)
+
+        self.stdout.write(f"\nAgainst {baseline.get('commit') or path}")
+        self.stdout.write(f"{'case':<24} {'before':>10} {'after':>10} {'change':>8} {'queries':>9}")
+        regressions = []
+        for name, after in results["cases"].items():
+            before = baseline["cases"].get(name)
+            if not before:
+                continue
+            change = (after["median_ms"] - before["median_ms"]) / before["median_ms"] * 100 if before["median_ms"] else 0
+            query_change = after["queries"] - before["queries"]
+            flag = ""
+            if change > threshold or query_change > 0:
+                regressions.append(name)
+                flag = "  slower"
+            self.stdout.write(
+                f"{name:<24} {before['median_ms']:8.1f}ms {after['median_ms']:8.1f}ms "
+                f"{change:+7.1f}% {query_change:+9d}{flag}"
+            )
+        if baseline.get("dataset") != results["dataset"]:
+            self.stdout.write("The datasets differ, so these aren't like for like.")
+        return regressions
+
+    def handle(self, *args, **options):
+
+        results = {
+            "version": RESULTS_VERSION,
+            "commit": git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "repeat": options["repeat"],
+            "dataset": self.dataset(),
+            "cases": {},
+        }
+
+        self.stdout.write(f"{'case':<24} {'median':>10} {'warm':>10} {'queries':>8} {'memory':>9}  status")
+        for name, func in self.cases(options):
+            result = self.run_case(func, options["repeat"])
+            results["cases"][name] = result
+            self.stdout.write(
+                f"{name:<24} {result['median_ms']:8.1f}ms {result['warm_ms']:8.1f}ms "
+                f"{result['queries']:8d} {result['peak_memory_kb']:7d}KB  {result['status'] or ''}"
+            )
+
+        output = options["output"] or "benchmark-%s.json" % (results["commit"] or "unknown")
+        with open(output, "w") as f:
+            json.dump(results, f, indent = 2)
+        self.stdout.write(f"Written to {output}")
+
+        if options["compare"]:
+            regressions = self.compare(results, options["compare"], options["threshold"])
+            if regressions:
+                self.stdout.write("Slower: %s" % (", ".join(regressions)))
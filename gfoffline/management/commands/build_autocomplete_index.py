@@ -0,0 +1,47 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from givefood.models import Place, Postcode
+from givefood.utils.autocomplete import build_autocomplete_index
+
+
+class Command(BaseCommand):
+
+    help = 'Build the memory mapped index /aac/ serves place and postcode autocomplete from.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", type=str, default=None, help="Where to write the index (default: AUTOCOMPLETE_INDEX_PATH)")
+
+    def handle(self, *args, **options):
+
+        path = options["output"] or settings.AUTOCOMPLETE_INDEX_PATH
+        if not path:
+            self.stderr.write("No --output given and AUTOCOMPLETE_INDEX_PATH isn't set")
+            return
+
+        # The same order _place_matches sorts by, so ranks agree with SQL
+        places = Place.objects.exclude(name = None).exclude(name = "").order_by(
+            F("population").desc(nulls_last = True), "name",
+        ).values_list("name", "lat_lng", "county")
+
+        # Bytewise, as the index binary searches, rather than the database
+        # collation's idea of order
+        postcodes = Postcode.objects.order_by(Collate("postcode_normalized", "C")).values_list(
+            "postcode_normalized", "postcode", "lat_lng", "county",
+        )
+
+        self.stdout.write(f"Building {path}")
+        counts = build_autocomplete_index(
+            path,
+            places.iterator(chunk_size = 10000),
+            postcodes.iterator(chunk_size = 10000),
+        )
+        self.stdout.write(
+            f"{counts['places']} places, {counts['prefixes']} precomputed prefixes, "
+            f"{counts['trigrams']} trigrams, {counts['postcodes']} postcodes, "
+            f"{os.path.getsize(path) / 1024 / 1024:.1f} MB"
+        )
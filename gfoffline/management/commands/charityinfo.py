@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 
+from givefood.utils.charities import load_charity_registers
 from givefood.utils.crawlers import foodbank_charity_crawl
 from givefood.models import Foodbank, CrawlSet
 
@@ -9,8 +10,23 @@ class Command(BaseCommand):
 
     help = 'Crawl charity details for all food banks with charity numbers.'
 
+    def add_arguments(self, parser):
+        parser.add_argument("--ew-dir", help = "Directory of the Charity Commission's register extract files")
+        parser.add_argument("--scotland-csv", help = "OSCR's charity register CSV")
+        parser.add_argument("--ni-csv", help = "The Charity Commission for Northern Ireland's register CSV")
+
     def handle(self, *args, **options):
 
+        # Given the register files, load them all in one pass rather than asking each API about each food bank
+        if options["ew_dir"] or options["scotland_csv"] or options["ni_csv"]:
+            loaded = load_charity_registers(
+                ew_dir = options["ew_dir"],
+                scotland_path = options["scotland_csv"],
+                ni_path = options["ni_csv"],
+            )
+            self.stdout.write(f"Updated {loaded['foodbanks']} food banks and {loaded['years']} charity years")
+            return
+
         crawl_set = CrawlSet(
             crawl_type = "charity",
         )
@@ -30,4 +46,4 @@ class Command(BaseCommand):
             the_counter += 1
 
         crawl_set.finish = timezone.now()
-        crawl_set.save()
\ No newline at end of file
+        crawl_set.save()
@@ -59,6 +59,7 @@ def _sql_managed_index_names():
 _REPAIR_MIGRATIONS = [
     "givefood.migrations.0009_repair_charityyear_pk",
     "givefood.migrations.0010_dedupe_places",
+    "givefood.migrations.0019_charityyear_foodbank_date_uniq",
 ]
 
 
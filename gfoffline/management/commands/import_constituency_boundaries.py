@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from givefood.utils.bulkload import load_constituency_boundaries
+
+
+class Command(BaseCommand):
+
+    help = "Set constituencies' boundaries from a GeoJSON file, matching each feature to a constituency by name"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'geojson_file',
+            type=str,
+            help='Path to the GeoJSON file, a FeatureCollection or one feature a line'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            stats = load_constituency_boundaries(options['geojson_file'])
+        except FileNotFoundError:
+            raise CommandError(f"GeoJSON file not found: {options['geojson_file']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {stats['updated']} constituencies from {stats['rows']} features "
+            f"in {stats['seconds']}s ({stats['rows_per_second']} features/sec)"
+        ))
+        if stats['unmatched']:
+            self.stdout.write(self.style.WARNING(f"  No boundary found for {stats['unmatched']} constituencies"))
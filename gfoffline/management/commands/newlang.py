@@ -1,10 +1,14 @@
 from django.core.management.base import BaseCommand, CommandError
 
-from givefood.utils.general import translate_need
+from givefood.utils.general import translate_needs
 from givefood.models import Foodbank
 from givefood.settings import LANGUAGES
 
 
+# Needs translated together, so lines they share are only sent once
+BATCH_SIZE = 100
+
+
 class Command(BaseCommand):
 
     help = 'Translates the latest_need for all Foodbanks to a specified language'
@@ -27,7 +31,7 @@ class Command(BaseCommand):
                 f'Supported languages: {", ".join(supported_languages)}'
             )
 
-        foodbanks = Foodbank.objects.all()
+        foodbanks = Foodbank.objects.select_related("latest_need")
         foodbank_count = foodbanks.count()
 
         self.stdout.write(
@@ -38,6 +42,7 @@ class Command(BaseCommand):
         counter = 0
         translated_count = 0
         skipped_count = 0
+        needs = []
 
         for foodbank in foodbanks:
             counter += 1
@@ -50,12 +55,17 @@ class Command(BaseCommand):
 
             # Check if foodbank has a latest_need
             if foodbank.latest_need:
-                # Translate the need asynchronously
-                translate_need(language_code, foodbank.latest_need)
+                needs.append(foodbank.latest_need)
                 translated_count += 1
             else:
                 skipped_count += 1
 
+            if len(needs) == BATCH_SIZE:
+                translate_needs(needs, [language_code])
+                needs = []
+
+        translate_needs(needs, [language_code])
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully translated {translated_count} needs. '
@@ -49,6 +49,8 @@ class Command(BaseCommand):
                 temperature = 0,
                 response_schema = response_schema,
                 response_mime_type = "application/json",
+                caller = "place_populations",
+                cache = True,
             )
 
             population = response["population"]
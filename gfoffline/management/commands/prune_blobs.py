@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from givefood.const.cache_times import SECONDS_IN_DAY
+from givefood.utils.blobs import prune_blobs
+
+
+class Command(BaseCommand):
+
+    help = 'Delete proxied images from the blob store that have not been written for a while. Anything still wanted is fetched again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90, help="Delete blobs older than this (default: 90)")
+
+    def handle(self, *args, **options):
+
+        removed = prune_blobs(options["days"] * SECONDS_IN_DAY)
+        self.stdout.write(f"Removed {removed} blobs")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from givefood.utils.cache import prune_changes
+
+
+class Command(BaseCommand):
+
+    help = 'Delete entries in the /api/2/changes/ feed older than a consumer is expected to have been away for.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=90, help="Delete changes older than this (default: 90)")
+
+    def handle(self, *args, **options):
+
+        removed = prune_changes(options["days"])
+        self.stdout.write(f"Removed {removed} changes")
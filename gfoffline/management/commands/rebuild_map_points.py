@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from givefood.models import Foodbank, FoodbankDonationPoint, FoodbankLocation, MapPoint
+
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+
+    help = 'Refill the map points table from the food banks, locations and donation points.'
+
+    def handle(self, *args, **options):
+
+        # In one transaction, so the maps never read a half built table
+        with transaction.atomic():
+            MapPoint.objects.all().delete()
+            for model in (Foodbank, FoodbankLocation, FoodbankDonationPoint):
+                points = []
+                for obj in model.objects.order_by("id").iterator(chunk_size = BATCH_SIZE):
+                    points.extend(MapPoint.points_for(obj))
+                    if len(points) >= BATCH_SIZE:
+                        MapPoint.objects.bulk_create(points)
+                        points = []
+                MapPoint.objects.bulk_create(points)
+
+        self.stdout.write("%s map points" % (MapPoint.objects.count()))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from givefood.models import Foodbank, FoodbankDonationPoint, FoodbankLocation, ParliamentaryConstituency
+
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+
+    help = 'Rebuild the stored schema.org JSON-LD of every food bank, location, donation point and constituency.'
+
+    def handle(self, *args, **options):
+
+        for model, queryset in [
+            (Foodbank, Foodbank.objects.select_related("latest_need")),
+            (FoodbankLocation, FoodbankLocation.objects.select_related("foodbank__latest_need")),
+            (FoodbankDonationPoint, FoodbankDonationPoint.objects.select_related("foodbank__latest_need")),
+            (ParliamentaryConstituency, ParliamentaryConstituency.objects.all()),
+        ]:
+            changed = []
+            rebuilt = 0
+            for obj in queryset.order_by("id").iterator(chunk_size = BATCH_SIZE):
+                if obj.update_schema_org_json():
+                    changed.append(obj)
+                    rebuilt += 1
+                if len(changed) >= BATCH_SIZE:
+                    model.objects.bulk_update(changed, ["schema_org_json"])
+                    changed = []
+            model.objects.bulk_update(changed, ["schema_org_json"])
+
+            self.stdout.write("%s %s changed" % (rebuilt, model._meta.verbose_name_plural))
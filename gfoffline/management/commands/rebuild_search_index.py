@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from givefood.models import (
+    Foodbank, FoodbankChange, FoodbankDonationPoint, FoodbankLocation, FoodbankSubscriber,
+    MobileSubscriber, ParliamentaryConstituency, SearchDocument, WebPushSubscription, WhatsappSubscriber,
+)
+
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+
+    help = 'Refill the admin search documents from the food banks, locations, donation points, constituencies, needs and subscriptions.'
+
+    def handle(self, *args, **options):
+
+        models = (
+            Foodbank, FoodbankLocation, FoodbankDonationPoint, ParliamentaryConstituency, FoodbankChange,
+            FoodbankSubscriber, WhatsappSubscriber, MobileSubscriber, WebPushSubscription,
+        )
+
+        # In one transaction, so the search never reads a half built table
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+            for model in models:
+                documents = []
+                for obj in model.objects.order_by("id").iterator(chunk_size = BATCH_SIZE):
+                    document = SearchDocument.document_for(obj)
+                    if document:
+                        documents.append(document)
+                    if len(documents) >= BATCH_SIZE:
+                        SearchDocument.objects.bulk_create(documents)
+                        documents = []
+                SearchDocument.objects.bulk_create(documents)
+
+        self.stdout.write("%s search documents" % (SearchDocument.objects.count()))
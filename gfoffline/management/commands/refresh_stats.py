@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from givefood.utils.stats import STATS, refresh_stats
+
+
+class Command(BaseCommand):
+
+    help = 'Work out the figures for the admin stats pages and store them as snapshots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Snapshots to refresh, of %s (default: all)" % ", ".join(STATS))
+
+    def handle(self, *args, **options):
+
+        unknown = set(options["names"]) - set(STATS)
+        if unknown:
+            raise CommandError("No such stats: %s" % ", ".join(sorted(unknown)))
+
+        for snapshot in refresh_stats(options["names"]):
+            self.stdout.write(f"{snapshot.name} in {snapshot.took_ms}ms")
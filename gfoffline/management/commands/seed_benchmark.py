@@ -0,0 +1,311 @@
+import json
+import random
+import string
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.text import slugify
+
+from givefood.const.general import COUNTRIES, FOODBANK_NETWORKS
+from givefood.const.item_types import ITEM_CATEGORIES, ITEM_CATEGORY_GROUPS
+from givefood.models import (
+    Foodbank,
+    FoodbankChange,
+    FoodbankChangeLine,
+    FoodbankDonationPoint,
+    FoodbankLocation,
+    ParliamentaryConstituency,
+    Place,
+    Postcode,
+)
+
+
+# Roughly the size of the live dataset, which is what the benchmarks are for
+FULL_SIZE = {
+    "constituencies": 650,
+    "foodbanks": 3000,
+    "locations": 10000,
+    "donationpoints": 40000,
+    "needs": 50000,
+    "needlines": 1000000,
+    "places": 45000,
+    "postcodes": 2700000,
+}
+
+BATCH_SIZE = 5000
+
+# Mainland UK, near enough
+LAT_RANGE = (50.0, 58.5)
+LNG_RANGE = (-5.5, 1.7)
+
+ITEMS = [
+    "Tinned tomatoes", "Tinned meat", "Tinned fish", "Pasta sauce", "Rice",
+    "UHT milk", "Tea bags", "Coffee", "Sugar", "Tinned fruit", "Custard",
+    "Cereal", "Toilet roll", "Shampoo", "Toothpaste", "Washing up liquid",
+    "Nappies", "Baby wipes", "Biscuits", "Squash", "Jam", "Instant mash",
+]
+
+
+def postcode_for(number):
+    """A unique, validly shaped postcode for each number."""
+    letters = string.ascii_uppercase
+    number, inward_letters = divmod(number, 26 * 26)
+    number, sector = divmod(number, 10)
+    number, district = divmod(number, 99)
+    number, area = divmod(number, 26 * 26)
+    return "%s%s%s %s%s%s" % (
+        letters[area // 26], letters[area % 26], district + 1,
+        sector, letters[inward_letters // 26], letters[inward_letters % 26],
+    )
+
+
+class Command(BaseCommand):
+
+    help = 'Fill an empty database with a synthetic dataset the size of the live one, for the benchmark command.'
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0, help="Fraction of the full size to seed (default: 1.0)")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed, so runs seed the same data")
+
+    def handle(self, *args, **options):
+
+        if Foodbank.objects.exists():
+            raise CommandError("There are already food banks in this database. Seed an empty one.")
+
+        self.random = random.Random(options["seed"])
+        self.sizes = {name: max(1, int(size * options["scale"])) for name, size in FULL_SIZE.items()}
+
+        for name, seeder in [
+            ("constituencies", self.seed_constituencies),
+            ("foodbanks", self.seed_foodbanks),
+            ("locations", self.seed_locations),
+            ("donationpoints", self.seed_donationpoints),
+            ("needs", self.seed_needs),
+            ("places", self.seed_places),
+            ("postcodes", self.seed_postcodes),
+        ]:
+            start = time.perf_counter()
+            with transaction.atomic():
+                seeder()
+            self.stdout.write(f"{name:<16} {self.sizes[name]:>9} in {time.perf_counter() - start:.1f}s")
+
+        # bulk_create skips save(), which keeps the map points and schema.org up to date
+        call_command("rebuild_map_points", stdout = self.stdout)
+        call_command("rebuild_schema_org", stdout = self.stdout)
+        call_command("rebuild_search_index", stdout = self.stdout)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def lat_lng(self):
+        lat = self.random.uniform(*LAT_RANGE)
+        lng = self.random.uniform(*LNG_RANGE)
+        return "%.6f,%.6f" % (lat, lng), lat, lng
+
+    def physical_place(self, number):
+        lat_lng, lat, lng = self.lat_lng()
+        constituency = self.random.choice(self.constituencies)
+        return {
+            "address": "%s High Street\nSometown" % (number),
+            "postcode": postcode_for(number),
+            "country": constituency.country,
+            "lat_lng": lat_lng,
+            "latitude": lat,
+            "longitude": lng,
+            "parliamentary_constituency": constituency,
+            "parliamentary_constituency_name": constituency.name,
+            "parliamentary_constituency_slug": constituency.slug,
+            "mp": constituency.mp,
+            "mp_party": constituency.mp_party,
+            "mp_parl_id": constituency.mp_parl_id,
+        }
+
+    def seed_constituencies(self):
+        constituencies = []
+        for number in range(self.sizes["constituencies"]):
+            lat_lng, lat, lng = self.lat_lng()
+            name = "Benchmark Constituency %s" % (number)
+            boundary = {
+                "type": "Feature",
+                "properties": {},
+                "geometry": {
+                    "type": "Polygon",
+                    "coordinates": [[
+                        [lng - 0.1, lat - 0.1], [lng + 0.1, lat - 0.1],
+                        [lng + 0.1, lat + 0.1], [lng - 0.1, lat + 0.1],
+                        [lng - 0.1, lat - 0.1],
+                    ]],
+                },
+            }
+            constituencies.append(ParliamentaryConstituency(
+                name = name,
+                slug = slugify(name),
+                country = self.random.choice(COUNTRIES),
+                mp = "A. Member %s" % (number),
+                mp_party = "Party",
+                mp_parl_id = number,
+                mp_display_name = "A. Member %s" % (number),
+                centroid = lat_lng,
+                latitude = lat,
+                longitude = lng,
+                boundary_geojson = json.dumps(boundary),
+            ))
+        self.constituencies = ParliamentaryConstituency.objects.bulk_create(constituencies, batch_size = BATCH_SIZE)
+
+    def seed_foodbanks(self):
+        foodbanks = []
+        for number in range(self.sizes["foodbanks"]):
+            name = "Benchmark Food Bank %s" % (number)
+            foodbanks.append(Foodbank(
+                name = name,
+                slug = slugify(name),
+                network = self.random.choice(FOODBANK_NETWORKS),
+                contact_email = "foodbank%s@example.org" % (number),
+                phone_number = "01234 %06d" % (number),
+                url = "https://foodbank%s.example.org/" % (number),
+                shopping_list_url = "https://foodbank%s.example.org/give-help/donate-food/" % (number),
+                # What the admin form saves for a blank one
+                delivery_address = "",
+                **self.physical_place(number),
+            ))
+        self.foodbanks = Foodbank.objects.bulk_create(foodbanks, batch_size = BATCH_SIZE)
+
+    def foodbank_fields(self, foodbank):
+        return {
+            "foodbank": foodbank,
+            "foodbank_name": foodbank.name,
+            "foodbank_slug": foodbank.slug,
+            "foodbank_network": foodbank.network,
+        }
+
+    def seed_locations(self):
+        locations = []
+        for number in range(self.sizes["locations"]):
+            foodbank = self.random.choice(self.foodbanks)
+            name = "Benchmark Location %s" % (number)
+            locations.append(FoodbankLocation(
+                name = name,
+                slug = slugify(name),
+                foodbank_email = foodbank.contact_email,
+                foodbank_phone_number = foodbank.phone_number,
+                **self.foodbank_fields(foodbank),
+                **self.physical_place(number),
+            ))
+        FoodbankLocation.objects.bulk_create(locations, batch_size = BATCH_SIZE)
+
+    def seed_donationpoints(self):
+        donationpoints = []
+        for number in range(self.sizes["donationpoints"]):
+            foodbank = self.random.choice(self.foodbanks)
+            name = "Benchmark Donation Point %s" % (number)
+            donationpoints.append(FoodbankDonationPoint(
+                name = name,
+                slug = slugify(name),
+                **self.foodbank_fields(foodbank),
+                **self.physical_place(number),
+            ))
+            if len(donationpoints) == BATCH_SIZE:
+                FoodbankDonationPoint.objects.bulk_create(donationpoints)
+                donationpoints = []
+        FoodbankDonationPoint.objects.bulk_create(donationpoints)
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE givefood_foodbank SET
+                    no_locations = (SELECT COUNT(*) FROM givefood_foodbanklocation WHERE foodbank_id = givefood_foodbank.id),
+                    no_donation_points = (SELECT COUNT(*) FROM givefood_foodbankdonationpoint WHERE foodbank_id = givefood_foodbank.id)
+            """)
+
+    def seed_needs(self):
+        lines_per_need = max(1, self.sizes["needlines"] // self.sizes["needs"])
+        needs = FoodbankChange.objects.bulk_create([
+            FoodbankChange(
+                foodbank = foodbank,
+                foodbank_name = foodbank.name,
+                change_text = "\n".join(self.random.sample(ITEMS, min(lines_per_need, len(ITEMS)))),
+                published = True,
+                input_method = "scrape",
+                is_categorised = True,
+            )
+            for foodbank in (self.random.choice(self.foodbanks) for _ in range(self.sizes["needs"]))
+        ], batch_size = BATCH_SIZE)
+
+        with connection.cursor() as cursor:
+            # bulk_create can't backdate created, which auto_now_add sets, so
+            # the needs are spread over the last two years afterwards
+            cursor.execute("""
+                UPDATE givefood_foodbankchange SET
+                    need_id_str = need_id::text,
+                    created = NOW() - (id %% 730) * INTERVAL '1 day',
+                    modified = NOW() - (id %% 730) * INTERVAL '1 day'
+                WHERE id >= %s
+            """, [needs[0].id])
+
+        lines = []
+        for need in needs:
+            for _ in range(lines_per_need):
+                category = self.random.choice(ITEM_CATEGORIES)
+                lines.append(FoodbankChangeLine(
+                    need = need,
+                    foodbank = need.foodbank,
+                    item = self.random.choice(ITEMS),
+                    type = "need",
+                    category = category,
+                    group = ITEM_CATEGORY_GROUPS[category],
+                    created = need.created,
+                ))
+            if len(lines) >= BATCH_SIZE:
+                FoodbankChangeLine.objects.bulk_create(lines)
+                lines = []
+        FoodbankChangeLine.objects.bulk_create(lines)
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE givefood_foodbankchangeline SET created = givefood_foodbankchange.created
+                FROM givefood_foodbankchange WHERE givefood_foodbankchange.id = givefood_foodbankchangeline.need_id
+            """)
+            cursor.execute("""
+                UPDATE givefood_foodbank SET latest_need_id = latest.id, last_need = latest.created
+                FROM (
+                    SELECT DISTINCT ON (foodbank_id) foodbank_id, id, created
+                    FROM givefood_foodbankchange ORDER BY foodbank_id, created DESC
+                ) AS latest
+                WHERE latest.foodbank_id = givefood_foodbank.id
+            """)
+
+    def seed_places(self):
+        places = []
+        for number in range(self.sizes["places"]):
+            lat_lng, lat, lng = self.lat_lng()
+            name = "%s%s" % (self.random.choice(["Upper ", "Lower ", "Great ", "Little ", ""]), "".join(self.random.choice(string.ascii_lowercase) for _ in range(7)).title())
+            county = "Benchmarkshire %s" % (number % 100)
+            places.append(Place(
+                gbpnid = number,
+                name = name,
+                name_slug = slugify(name),
+                lat_lng = lat_lng,
+                adcounty = county,
+                county = county,
+                county_slug = slugify(county),
+                type = "Town",
+                population = self.random.randint(100, 500000),
+            ))
+        Place.objects.bulk_create(places, batch_size = BATCH_SIZE)
+
+    def seed_postcodes(self):
+        postcodes = []
+        for number in range(self.sizes["postcodes"]):
+            postcode = postcode_for(number)
+            lat_lng, lat, lng = self.lat_lng()
+            postcodes.append(Postcode(
+                postcode = postcode,
+                postcode_normalized = postcode.replace(" ", ""),
+                lat_lng = lat_lng,
+                country = "England",
+            ))
+            if len(postcodes) == BATCH_SIZE:
+                Postcode.objects.bulk_create(postcodes)
+                postcodes = []
+        Postcode.objects.bulk_create(postcodes)
@@ -0,0 +1,51 @@
+import os
+
+from django.core.management.base import CommandError
+from django.utils.autoreload import DJANGO_AUTORELOAD_ENV, run_with_reloader
+from django_tasks_db.management.commands.db_worker import Command as DBWorkerCommand
+from django_tasks_db.management.commands.db_worker import Worker
+
+from givefood.utils.tasks import run_limited
+
+
+class LimitedWorker(Worker):
+    """db_worker's worker, running each task only within its queue's limits."""
+
+    def run_task(self, db_task_result):
+        run_limited(db_task_result, super().run_task)
+
+
+class Command(DBWorkerCommand):
+
+    help = "Run tasks as db_worker does, holding each queue to its concurrency and rate limits in TASK_QUEUE_LIMITS. A task over them waits in its queue."
+
+    def handle(self, *, verbosity, queue_name, interval, batch, backend_name, startup_delay, reload, max_tasks, worker_id, exclude_queues, **options):
+
+        self.configure_logging(verbosity)
+
+        if reload and batch:
+            reload = False
+
+        queue_names = queue_name.split(",")
+        excluded_queue_names = exclude_queues.split(",") if exclude_queues else []
+        if excluded_queue_names and "*" not in queue_names:
+            raise CommandError("--exclude-queues can only be used with --queue-name=*")
+
+        worker = LimitedWorker(
+            queue_names = queue_names,
+            interval = interval,
+            batch = batch,
+            backend_name = backend_name,
+            startup_delay = startup_delay,
+            max_tasks = max_tasks,
+            worker_id = worker_id,
+            excluded_queue_names = excluded_queue_names,
+        )
+
+        if reload:
+            if os.environ.get(DJANGO_AUTORELOAD_ENV) == "true":
+                worker.configure_signals()
+            run_with_reloader(worker.run)
+        else:
+            worker.configure_signals()
+            worker.run()
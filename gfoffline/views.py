@@ -96,6 +96,8 @@ def discrepancy_check(request):
                     detail_response = gemini(
                         prompt = detail_prompt,
                         temperature = 0.8,
+                        caller = "foodbank_details",
+                        cache = True,
                     )
                     detail_response = json.loads(detail_response)
 
@@ -192,6 +194,8 @@ def item_categorisation(line):
         ai_response = gemini(
             prompt = prompt,
             temperature = 0.1,
+            caller = "need_category",
+            cache = True,
         )
         if ai_response in ITEM_CATEGORIES:
             new_category = ai_response
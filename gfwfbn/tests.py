@@ -3,11 +3,12 @@ import threading
 
 import pytest
 from unittest.mock import patch, Mock
-from django.db import IntegrityError, connection
-from django.test import Client
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import Client, override_settings
 from django.urls import reverse
 from django.core.cache import cache
 from givefood.models import Foodbank, FoodbankDonationPoint, FoodbankChange, FoodbankHit, FoodbankLocation
+from givefood.utils.hits import hit_counter
 
 
 @pytest.fixture
@@ -439,8 +440,8 @@ class TestDonationPointPreloadHeaders:
 class TestFoodbankLocationMap:
     """Test the foodbank_location_map endpoint with boundary_geojson support"""
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_without_boundary(self, mock_get_cred, mock_requests_get, client):
         """Test that location map works without boundary_geojson."""
         # Setup mocks
@@ -509,8 +510,8 @@ class TestFoodbankLocationMap:
         assert params_dict['language'] == "en"  # Check language parameter
         assert 'path' not in params_dict  # No boundary path
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_with_boundary(self, mock_get_cred, mock_requests_get, client):
         """Test that location map includes boundary_geojson as a path."""
         # Setup mocks
@@ -587,8 +588,8 @@ class TestFoodbankLocationMap:
         # The coordinates should be rounded to 4 decimal places
         assert "51.5014,-0.1419" in path_param or "51.5014,-0.1420" in path_param
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_with_large_boundary_downsamples(self, mock_get_cred, mock_requests_get, client):
         """Test that location map downsamples large boundary polygons to avoid URL length issues."""
         # Setup mocks
@@ -679,8 +680,8 @@ class TestFoodbankLocationMap:
 class TestFoodbankMapSizes:
     """Test the foodbank_map endpoint with different sizes"""
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_foodbank_map_size_300(self, mock_get_cred, mock_requests_get, client):
         """Test that foodbank map with size 300 returns 150x150 at scale 2."""
         # Setup mocks
@@ -724,8 +725,8 @@ class TestFoodbankMapSizes:
         assert params_dict['size'] == "150x150"
         assert params_dict['scale'] == 2
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_foodbank_map_size_600(self, mock_get_cred, mock_requests_get, client):
         """Test that foodbank map with size 600 returns 600x400 at scale 1."""
         # Setup mocks
@@ -769,8 +770,8 @@ class TestFoodbankMapSizes:
         assert params_dict['size'] == "600x400"
         assert params_dict['scale'] == 1
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_foodbank_map_size_1080(self, mock_get_cred, mock_requests_get, client):
         """Test that foodbank map with size 1080 returns 540x360 at scale 2."""
         # Setup mocks
@@ -814,8 +815,8 @@ class TestFoodbankMapSizes:
         assert params_dict['size'] == "540x360"
         assert params_dict['scale'] == 2
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_foodbank_map_default_size(self, mock_get_cred, mock_requests_get, client):
         """Test that foodbank map.png (default) returns 600x400 at scale 1."""
         # Setup mocks
@@ -858,8 +859,8 @@ class TestFoodbankMapSizes:
         assert params_dict['size'] == "600x400"
         assert params_dict['scale'] == 1
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_foodbank_map_invalid_size(self, mock_get_cred, mock_requests_get, client):
         """Test that foodbank map with invalid size returns 400."""
         # Setup mocks
@@ -896,8 +897,8 @@ class TestFoodbankMapSizes:
 class TestFoodbankLocationMapSizes:
     """Test the foodbank_location_map endpoint with different sizes"""
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_size_300(self, mock_get_cred, mock_requests_get, client):
         """Test that location map with size 300 returns 150x150 at scale 2."""
         # Setup mocks
@@ -962,8 +963,8 @@ class TestFoodbankLocationMapSizes:
         assert params_dict['size'] == "150x150"
         assert params_dict['scale'] == 2
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_size_600(self, mock_get_cred, mock_requests_get, client):
         """Test that location map with size 600 returns 600x400 at scale 1."""
         # Setup mocks
@@ -1028,8 +1029,8 @@ class TestFoodbankLocationMapSizes:
         assert params_dict['size'] == "600x400"
         assert params_dict['scale'] == 1
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_size_1080(self, mock_get_cred, mock_requests_get, client):
         """Test that location map with size 1080 returns 540x360 at scale 2."""
         # Setup mocks
@@ -1094,8 +1095,8 @@ class TestFoodbankLocationMapSizes:
         assert params_dict['size'] == "540x360"
         assert params_dict['scale'] == 2
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_default_size(self, mock_get_cred, mock_requests_get, client):
         """Test that location map.png (default) returns 600x400 at scale 1."""
         # Setup mocks
@@ -1159,8 +1160,8 @@ class TestFoodbankLocationMapSizes:
         assert params_dict['size'] == "600x400"
         assert params_dict['scale'] == 1
 
-    @patch('gfwfbn.views.requests.get')
-    @patch('gfwfbn.views.get_cred')
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
     def test_location_map_invalid_size(self, mock_get_cred, mock_requests_get, client):
         """Test that location map with invalid size returns 400."""
         # Setup mocks
@@ -1214,6 +1215,101 @@ class TestFoodbankLocationMapSizes:
         assert response.status_code == 400
 
 
+@pytest.mark.django_db
+class TestProxiedImageBlobs:
+    """Test that proxied maps, photos and favicons are kept in the blob store"""
+
+    @pytest.fixture(autouse=True)
+    def blob_dir(self, tmp_path):
+        with override_settings(BLOB_CACHE_DIR=str(tmp_path)):
+            yield tmp_path
+
+    def _map_response(self, content=b"fake_map"):
+        response = Mock()
+        response.status_code = 200
+        response.content = content
+        return response
+
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
+    def test_map_fetched_once(self, mock_get_cred, mock_requests_get, client, create_test_foodbank):
+        """A second request for the same map is served from disk without calling Google."""
+        mock_get_cred.return_value = "test_api_key"
+        mock_requests_get.return_value = self._map_response()
+        foodbank = create_test_foodbank(name="Blob Map FB", slug="blob-map-fb")
+        url = reverse('wfbn:foodbank_map', kwargs={'slug': foodbank.slug})
+
+        first = client.get(url)
+        second = client.get(url)
+
+        assert first.content == b"fake_map"
+        assert b"".join(second.streaming_content) == b"fake_map"
+        assert second['Content-Type'] == 'image/png'
+        assert mock_requests_get.call_count == 1
+        # The API key is sent, but isn't part of what the map is stored by
+        assert dict(mock_requests_get.call_args[1]['params'])['key'] == "test_api_key"
+
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
+    def test_map_fetched_again_when_inputs_change(self, mock_get_cred, mock_requests_get, client, create_test_foodbank):
+        """Moving the food bank makes a new map."""
+        mock_get_cred.return_value = "test_api_key"
+        mock_requests_get.return_value = self._map_response()
+        foodbank = create_test_foodbank(name="Blob Map FB 2", slug="blob-map-fb-2")
+        url = reverse('wfbn:foodbank_map', kwargs={'slug': foodbank.slug})
+
+        client.get(url)
+        Foodbank.objects.filter(pk=foodbank.pk).update(lat_lng="52.0000,-1.0000")
+        mock_requests_get.return_value = self._map_response(b"moved_map")
+        response = client.get(url)
+
+        assert response.content == b"moved_map"
+        assert mock_requests_get.call_count == 2
+
+    @patch('givefood.utils.maps.requests.get')
+    @patch('givefood.utils.maps.get_cred')
+    def test_failed_map_not_stored(self, mock_get_cred, mock_requests_get, client, create_test_foodbank):
+        """A failed fetch is a 400 and is tried again next time."""
+        mock_get_cred.return_value = "test_api_key"
+        failed = Mock()
+        failed.status_code = 403
+        mock_requests_get.return_value = failed
+        foodbank = create_test_foodbank(name="Blob Map FB 3", slug="blob-map-fb-3")
+        url = reverse('wfbn:foodbank_map', kwargs={'slug': foodbank.slug})
+
+        assert client.get(url).status_code == 400
+        mock_requests_get.return_value = self._map_response()
+        assert client.get(url).content == b"fake_map"
+
+    @patch('gfwfbn.views.get_favicon')
+    def test_favicon_stored_by_domain(self, mock_get_favicon, client, create_test_foodbank):
+        """Food banks on the same domain share one stored favicon."""
+        mock_get_favicon.return_value = b"fake_favicon_data"
+        one = create_test_foodbank(name="Blob Favicon FB 1", slug="blob-favicon-fb-1", url="https://shared.example.com/one")
+        two = create_test_foodbank(name="Blob Favicon FB 2", slug="blob-favicon-fb-2", url="https://shared.example.com/two")
+
+        client.get(reverse('wfbn-generic:foodbank_favicon', kwargs={'slug': one.slug}))
+        response = client.get(reverse('wfbn-generic:foodbank_favicon', kwargs={'slug': two.slug}))
+
+        assert b"".join(response.streaming_content) == b"fake_favicon_data"
+        assert mock_get_favicon.call_count == 1
+
+    @patch('gfwfbn.views.photo_from_place_id')
+    def test_photo_stored_by_place(self, mock_photo, client, create_test_foodbank, blob_dir):
+        """A place photo is stored once, whatever ?size= a visitor sends."""
+        mock_photo.return_value = b"fake_photo"
+        foodbank = create_test_foodbank(name="Blob Photo FB", slug="blob-photo-fb", place_id="ChIJtest", place_has_photo=True)
+        url = reverse('wfbn-generic:foodbank_photo', kwargs={'slug': foodbank.slug})
+
+        client.get(url)
+        for size in (300, 301, "junk"):
+            response = client.get(url, {'size': size})
+            assert b"".join(response.streaming_content) == b"fake_photo"
+
+        assert mock_photo.call_count == 1
+        assert len([path for path in (blob_dir / "placephoto").rglob("*") if path.is_file()]) == 1
+
+
 @pytest.mark.django_db
 class TestRSSFeeds:
     """Test the combined RSS feed functionality"""
@@ -1630,9 +1726,8 @@ class TestIndexItemCategories:
         Test that the 'Other' category is not included in item_categories
         passed to the template for the By Item dropdown.
         """
-        # Mock find_locations and find_donationpoints to avoid geographic queries
-        with patch('gfwfbn.views.find_locations', return_value=[]), \
-             patch('gfwfbn.views.find_donationpoints', return_value=[]):
+        # Mock find_nearest to avoid geographic queries
+        with patch('gfwfbn.views.find_nearest', return_value={'locations': [], 'donationpoints': [], 'category': []}):
             
             # Make a request to the index with a lat_lng to trigger the view
             url = reverse('wfbn:index')
@@ -2220,7 +2315,15 @@ class TestDonationPointFavicon:
 
 @pytest.mark.django_db(transaction=True)
 class TestFoodbankHit:
-    """Test the hit counter, which upserts against a unique (foodbank, day) index"""
+    """Test the hit counter, which buffers hits and upserts them against a unique (foodbank, day) index"""
+
+    @pytest.fixture(autouse=True)
+    def fresh_counter(self):
+        # The counter lives for the whole process, so start each test without
+        # another test's pending hits or slug map
+        hit_counter.reset()
+        yield
+        hit_counter.reset()
 
     def _post(self, client, slug):
         return client.post(reverse('wfbn-generic:foodbank_hit', kwargs={'slug': slug}))
@@ -2230,6 +2333,7 @@ class TestFoodbankHit:
         foodbank = create_test_foodbank(name="Hit Test FB", slug="hit-test-fb")
 
         response = self._post(client, foodbank.slug)
+        hit_counter.flush()
 
         assert response.status_code == 204
         hit = FoodbankHit.objects.get(foodbank=foodbank, day=datetime.date.today())
@@ -2241,6 +2345,7 @@ class TestFoodbankHit:
 
         for _ in range(5):
             assert self._post(client, foodbank.slug).status_code == 204
+        hit_counter.flush()
 
         hits = FoodbankHit.objects.filter(foodbank=foodbank, day=datetime.date.today())
         assert hits.count() == 1
@@ -2254,6 +2359,7 @@ class TestFoodbankHit:
         self._post(client, one.slug)
         self._post(client, two.slug)
         self._post(client, two.slug)
+        hit_counter.flush()
 
         today = datetime.date.today()
         assert FoodbankHit.objects.get(foodbank=one, day=today).hits == 1
@@ -2271,7 +2377,8 @@ class TestFoodbankHit:
     def test_concurrent_hits_do_not_lose_increments(self, client, create_test_foodbank):
         """
         Overlapping requests must not lose counts. The previous read-then-write
-        implementation dropped increments here; the upsert is atomic.
+        implementation dropped increments here; the buffer is locked and the
+        upsert is atomic.
         """
         foodbank = create_test_foodbank(name="Hit Test FB 6", slug="hit-test-fb-6")
         errors = []
@@ -2291,6 +2398,7 @@ class TestFoodbankHit:
             thread.join()
 
         assert not errors
+        hit_counter.flush()
         hits = FoodbankHit.objects.filter(foodbank=foodbank, day=datetime.date.today())
         assert hits.count() == 1
         assert hits.first().hits == 20
@@ -2299,3 +2407,70 @@ class TestFoodbankHit:
         """An unknown food bank still 404s rather than silently counting nothing."""
         response = self._post(client, 'no-such-foodbank')
         assert response.status_code == 404
+
+    def test_hits_are_buffered_until_flushed(self, client, create_test_foodbank):
+        """Hits wait in memory and go out together as one row."""
+        foodbank = create_test_foodbank(name="Hit Test FB 7", slug="hit-test-fb-7")
+
+        for _ in range(3):
+            self._post(client, foodbank.slug)
+        assert not FoodbankHit.objects.filter(foodbank=foodbank).exists()
+
+        assert hit_counter.flush() == 1
+        assert FoodbankHit.objects.get(foodbank=foodbank, day=datetime.date.today()).hits == 3
+        assert hit_counter.flush() == 0
+
+    def test_flush_adds_to_existing_row(self, client, create_test_foodbank):
+        """A flush adds to the day's count rather than replacing it."""
+        foodbank = create_test_foodbank(name="Hit Test FB 8", slug="hit-test-fb-8")
+        today = datetime.date.today()
+        FoodbankHit.objects.create(foodbank=foodbank, day=today, hits=10)
+
+        self._post(client, foodbank.slug)
+        self._post(client, foodbank.slug)
+        hit_counter.flush()
+
+        assert FoodbankHit.objects.get(foodbank=foodbank, day=today).hits == 12
+
+    def test_flushes_once_interval_has_passed(self, client, create_test_foodbank):
+        """A hit arriving after the flush interval writes everything pending."""
+        foodbank = create_test_foodbank(name="Hit Test FB 9", slug="hit-test-fb-9")
+
+        self._post(client, foodbank.slug)
+        hit_counter.last_flush -= hit_counter.flush_seconds
+        self._post(client, foodbank.slug)
+
+        assert FoodbankHit.objects.get(foodbank=foodbank, day=datetime.date.today()).hits == 2
+
+    def test_slug_map_avoids_lookups(self, client, create_test_foodbank, django_assert_num_queries):
+        """Once the slug map is loaded, a hit doesn't touch the database."""
+        foodbank = create_test_foodbank(name="Hit Test FB 10", slug="hit-test-fb-10")
+        self._post(client, foodbank.slug)
+
+        with django_assert_num_queries(0):
+            assert self._post(client, foodbank.slug).status_code == 204
+
+    def test_deleted_foodbank_hits_are_dropped(self, client, create_test_foodbank):
+        """Hits for a food bank deleted before the flush don't fail the batch."""
+        kept = create_test_foodbank(name="Hit Test FB 11", slug="hit-test-fb-11")
+        gone = create_test_foodbank(name="Hit Test FB 12", slug="hit-test-fb-12")
+
+        self._post(client, kept.slug)
+        self._post(client, gone.slug)
+        gone.delete()
+        hit_counter.flush()
+
+        assert FoodbankHit.objects.get(foodbank=kept, day=datetime.date.today()).hits == 1
+        assert FoodbankHit.objects.count() == 1
+
+    def test_failed_flush_keeps_hits(self, client, create_test_foodbank):
+        """Hits that couldn't be written go out with the next flush."""
+        foodbank = create_test_foodbank(name="Hit Test FB 13", slug="hit-test-fb-13")
+        self._post(client, foodbank.slug)
+
+        with patch.object(connection, 'cursor', side_effect=DatabaseError):
+            with pytest.raises(DatabaseError):
+                hit_counter.flush()
+        hit_counter.flush()
+
+        assert FoodbankHit.objects.get(foodbank=foodbank, day=datetime.date.today()).hits == 1
@@ -1,10 +1,11 @@
-import json, requests, datetime, os
+import json, requests, os
 from urllib.parse import urlparse
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import HttpResponseRedirect, HttpResponse, HttpResponseForbidden, HttpResponseNotFound, JsonResponse, HttpResponseBadRequest, Http404
-from django.db import IntegrityError, connection
+from django.db import IntegrityError
 from django.template.loader import render_to_string
+from django.utils.cache import patch_response_headers
 from django.views.decorators.cache import cache_page, never_cache
 from django.template.defaultfilters import slugify
 from django.urls import reverse
@@ -14,13 +15,16 @@ from django.core.validators import validate_email
 from django import forms
 from django.utils.translation import gettext
 
-from givefood.const.general import SITE_DOMAIN
+from givefood.const.general import MAP_SIZE_CONFIG, SITE_DOMAIN
 from givefood.const.item_types import ITEM_CATEGORIES_CHOICES
 
-from givefood.models import CharityYear, Foodbank, FoodbankDonationPoint, FoodbankHit, FoodbankLocation, MobileSubscriber, ParliamentaryConstituency, FoodbankChange, FoodbankSubscriber, FoodbankArticle, Place
-from givefood.utils.cache import get_all_constituencies, get_cred
+from givefood.models import CharityYear, Foodbank, FoodbankDonationPoint, FoodbankLocation, MapPoint, MobileSubscriber, ParliamentaryConstituency, FoodbankChange, FoodbankSubscriber, FoodbankArticle, Place
+from givefood.utils.blobs import blob_response
+from givefood.utils.cache import get_all_constituencies, get_cred, get_fragment, versioned_cache_page
 from givefood.utils.general import get_favicon, get_screenshot, validate_turnstile
-from givefood.utils.geo import admin_regions_from_postcode, find_donationpoints, find_locations, find_locations_by_category, geocode, is_uk, photo_from_place_id
+from givefood.utils.geo import admin_regions_from_postcode, find_locations, find_nearest, geocode, geojson_dict, is_uk, photo_from_place_id
+from givefood.utils.hits import hit_counter
+from givefood.utils.maps import foodbank_map_params, location_map_params, static_map_response
 from givefood.utils.notifications import send_email
 from givefood.utils.text import get_user_ip
 from givefood.const.cache_times import SECONDS_IN_HOUR, SECONDS_IN_DAY, SECONDS_IN_WEEK
@@ -82,15 +86,17 @@ def index(request, lat_lng=None, page_title=None):
         lat_lng_is_uk = is_uk(lat_lng)
 
         if lat_lng_is_uk:
-            locations = find_locations(lat_lng, 20)
-            donationpoints = find_donationpoints(lat_lng, 20)
-            
             # If an item category is specified, find locations that need it
-            if item_category:
-                # Validate the category is in our list
-                valid_categories = [cat[0] for cat in ITEM_CATEGORIES_CHOICES]
-                if item_category in valid_categories:
-                    locations_by_category = find_locations_by_category(lat_lng, item_category, 20000, 20)
+            # Validate the category is in our list
+            valid_categories = [cat[0] for cat in ITEM_CATEGORIES_CHOICES]
+            category = item_category if item_category in valid_categories else None
+
+            # One query for all three lists
+            nearest = find_nearest(lat_lng, locations = 20, donationpoints = 20, category = category, category_quantity = 20, category_distance = 20000)
+            locations = nearest["locations"]
+            donationpoints = nearest["donationpoints"]
+            if category:
+                locations_by_category = nearest["category"]
     else:
         return redirect(reverse("index"), permanent=True)
 
@@ -204,7 +210,7 @@ def get_location(request):
     return redirect(redirect_url)
 
 
-@cache_page(SECONDS_IN_WEEK)
+@versioned_cache_page(SECONDS_IN_WEEK, ("foodbank", "location", "donationpoint", "constituency"))
 def geojson(request, slug = None, parlcon_slug = None, locslug = None):
     """
     GeoJSON for everything, a food bank, a parliamentary constituency, or a specific location
@@ -223,28 +229,19 @@ def geojson(request, slug = None, parlcon_slug = None, locslug = None):
     if slug:
         foodbank = get_object_or_404(Foodbank, slug = slug)
 
-    # Handle location-specific request
     if locslug:
-        # Query for the specific location with optimized field selection
-        locations = FoodbankLocation.objects.filter(slug = locslug, foodbank__slug = slug).only('name', 'foodbank_name', 'foodbank_slug', 'slug', 'address', 'postcode', 'lat_lng', 'boundary_geojson')
-        # Ensure the location exists (404 if not found)
-        if not locations.exists():
-            raise Http404("Location not found")
-        # Only return the location, not the foodbank or donation points
-        foodbanks = Foodbank.objects.none()
-        donationpoints = FoodbankDonationPoint.objects.none()
+        # Only the location, not the foodbank or donation points
+        points = MapPoint.objects.filter(point_type = "location", foodbank = foodbank, slug = locslug)
     elif slug:
-        foodbanks = Foodbank.objects.filter(slug = slug).only('slug', 'name', 'alt_name', 'address', 'postcode', 'lat_lng', 'delivery_address', 'delivery_lat_lng')
-        locations = FoodbankLocation.objects.filter(foodbank__slug = slug).only('name', 'foodbank_name', 'foodbank_slug', 'slug', 'address', 'postcode', 'lat_lng', 'boundary_geojson')
-        donationpoints = FoodbankDonationPoint.objects.filter(foodbank__slug = slug).only('name', 'foodbank_name', 'foodbank_slug', 'slug', 'address', 'postcode', 'lat_lng')
+        points = MapPoint.objects.filter(foodbank = foodbank)
     elif parlcon_slug:
-        foodbanks = Foodbank.objects.filter(parliamentary_constituency_slug = parlcon_slug, is_closed=False).only('slug', 'name', 'alt_name', 'address', 'postcode', 'lat_lng', 'delivery_address', 'delivery_lat_lng')
-        locations = FoodbankLocation.objects.filter(parliamentary_constituency_slug = parlcon_slug, is_closed=False).only('name', 'foodbank_name', 'foodbank_slug', 'slug', 'address', 'postcode', 'lat_lng', 'boundary_geojson')
-        donationpoints = FoodbankDonationPoint.objects.filter(parliamentary_constituency_slug = parlcon_slug, is_closed=False).only('name', 'foodbank_name', 'foodbank_slug', 'slug', 'address', 'postcode', 'lat_lng')
+        points = MapPoint.objects.filter(parliamentary_constituency_slug = parlcon_slug, is_closed = False)
     else:
-        foodbanks = Foodbank.objects.filter(is_closed=False).only('slug', 'name', 'alt_name', 'address', 'postcode', 'lat_lng', 'delivery_address', 'delivery_lat_lng')
-        locations = FoodbankLocation.objects.filter(is_closed=False).only('name', 'foodbank_name', 'foodbank_slug', 'slug', 'address', 'postcode', 'lat_lng', 'boundary_geojson')
-        donationpoints = FoodbankDonationPoint.objects.filter(is_closed=False).only('name', 'foodbank_name', 'foodbank_slug', 'slug', 'address', 'postcode', 'lat_lng')
+        points = MapPoint.objects.filter(is_closed = False)
+    points = sorted(points, key = MapPoint.map_order)
+
+    if locslug and not points:
+        raise Http404("Location not found")
 
     features = []
 
@@ -255,81 +252,27 @@ def geojson(request, slug = None, parlcon_slug = None, locslug = None):
         boundary["properties"]["type"] = "b"
         features.append(boundary)
 
-    for foodbank in foodbanks:
-        features.append({
-            "type":"Feature",
-            "geometry":{
-                "type":"Point",
-                "coordinates":[round(foodbank.long(), decimal_places), round(foodbank.latt(), decimal_places)],
-            },
-            "properties":{
-                "type":"f",
-                "name":foodbank.full_name(),
-                "address":foodbank.full_address(),
-                "url":reverse("wfbn:foodbank", kwargs={"slug":foodbank.slug}),
-            }
-        })
-        if foodbank.delivery_address:
-            features.append({
-                "type":"Feature",
-                "geometry":{
-                    "type":"Point",
-                    "coordinates":[round(foodbank.delivery_long(), decimal_places), round(foodbank.delivery_latt(), decimal_places)],
-                },
-                "properties":{
-                    "type":"f",
-                    "name":"%s Delivery Address" % (foodbank.full_name()),
-                    "address":foodbank.delivery_address,
-                    "url":reverse("wfbn:foodbank", kwargs={"slug":foodbank.slug}),
-                }
-            })
-    
-    for location in locations:
-        if location.boundary_geojson and not all_items:
-            boundary = location.boundary_geojson_dict()
+    # Locations that cover an area are drawn as it, other than on the
+    # everything map, where they're a point like the rest
+    boundaries = {}
+    if not all_items:
+        area_ids = [point.object_id for point in points if point.is_area]
+        if area_ids:
+            boundaries = dict(FoodbankLocation.objects.filter(id__in = area_ids).values_list("id", "boundary_geojson"))
+
+    for point in points:
+        if point.is_area and boundaries.get(point.object_id):
+            boundary = geojson_dict(boundaries[point.object_id])
             boundary["properties"] = {
                 "type":"lb",
-                "name":location.name,
-                "foodbank":location.foodbank_name,
-                "url":reverse("wfbn:foodbank_location", kwargs={"slug":location.foodbank_slug, "locslug":location.slug}),
+                "name":point.name,
+                "foodbank":point.foodbank_name,
+                "url":point.url_path(),
             }
             features.append(boundary)
         else:
-            features.append({
-                "type":"Feature",
-                "geometry":{
-                    "type":"Point",
-                    "coordinates":[round(location.long(), decimal_places), round(location.latt(), decimal_places)],
-                },
-                "properties":{
-                    "type":"l",
-                    "name":location.name,
-                    "foodbank":location.foodbank_name,
-                    "address":location.full_address(),
-                    "url":reverse("wfbn:foodbank_location", kwargs={"slug":location.foodbank_slug, "locslug":location.slug}),
-                }
-            })
-
-    for donationpoint in donationpoints:
-        features.append({
-            "type":"Feature",
-            "geometry":{
-                "type":"Point",
-                "coordinates":[round(donationpoint.long(), decimal_places), round(donationpoint.latt(), decimal_places)],
-            },
-            "properties":{
-                "type":"d",
-                "name":donationpoint.name,
-                "foodbank":donationpoint.foodbank_name,
-                "address":donationpoint.full_address(),
-                "url":reverse("wfbn:foodbank_donationpoint", kwargs={"slug":donationpoint.foodbank_slug, "dpslug":donationpoint.slug}),
-            }
-        })
-
-    # Remove address if all items (for download size)
-    if all_items:
-        for feature in features:
-            feature["properties"].pop("address", None)
+            # Without addresses if all items, for download size
+            features.append(point.geojson_feature(decimal_places, address = not all_items))
 
     response_dict = {
             "type": "FeatureCollection",
@@ -396,19 +339,6 @@ def foodbank(request, slug):
     return render(request, "wfbn/foodbank/index.html", template_vars)
 
 
-# Constants for map sizes
-MAP_SIZE_SMALL = 300
-MAP_SIZE_MEDIUM = 600
-MAP_SIZE_LARGE = 1080
-
-# Map size to dimensions and scale configuration
-MAP_SIZE_CONFIG = {
-    MAP_SIZE_SMALL: ("150x150", 2),    # Small: 150x150 at 2x scale (retina)
-    MAP_SIZE_MEDIUM: ("600x400", 1),   # Medium: 600x400 at 1x scale (default)
-    MAP_SIZE_LARGE: ("540x360", 2),    # Large: 540x360 at 2x scale (retina)
-}
-
-
 def get_map_dimensions_and_scale(size):
     """
     Helper function to get map dimensions and scale for a given size parameter.
@@ -436,7 +366,37 @@ def get_map_dimensions_and_scale(size):
     return MAP_SIZE_CONFIG.get(size, (None, None))
 
 
-@cache_page(SECONDS_IN_WEEK)
+def favicon_response(url):
+    """
+    Favicon PNG for a website, or the default if it hasn't got one.
+
+    Stored by domain, as that's all Google's favicon service is asked about,
+    and kept for a week as a site can change its icon.
+    """
+    if not url:
+        response = HttpResponse(DEFAULT_FAVICON, content_type='image/png')
+        patch_response_headers(response, SECONDS_IN_WEEK)
+        return response
+    return blob_response(
+        "favicon", [urlparse(url).netloc], "image/png",
+        lambda: get_favicon(url) or DEFAULT_FAVICON, max_age = SECONDS_IN_WEEK,
+    )
+
+
+def place_photo_response(place_id, size):
+    """
+    Google Places photo JPEG, stored by place id
+
+    Not by size as well: PlacePhoto keeps one photo per place, fetched at
+    the size first asked for, so every size is the same bytes. Keying on
+    the visitor's ?size= would store a copy for each value they sent.
+    """
+    response = blob_response("placephoto", [place_id], "image/jpeg", lambda: photo_from_place_id(place_id, size))
+    if response is None:
+        return HttpResponseNotFound()
+    return response
+
+
 def foodbank_map(request, slug, size=600):
     """
     Food bank map PNG
@@ -447,49 +407,14 @@ def foodbank_map(request, slug, size=600):
 
     foodbank = get_object_or_404(Foodbank, slug = slug)
 
-    # Main markers
-    main_markers = "icon:https://www.givefood.org.uk/static/img/mapmarkers/32/red.png|%s" % foodbank.lat_lng
-    if foodbank.delivery_address:
-        main_markers += "|%s" % (foodbank.delivery_lat_lng)
-
-    # Location markers
-    loc_markers = ""
-    if foodbank.no_locations != 0:
-        loc_markers += "icon:https://www.givefood.org.uk/static/img/mapmarkers/16/yellow.png|"
-        for location in foodbank.locations():
-            loc_markers += "%s|" % (location.lat_lng)
-
-    # Donation point markers
-    dp_markers = ""
-    if foodbank.no_donation_points != 0:
-        dp_markers += "icon:https://www.givefood.org.uk/static/img/mapmarkers/16/blue.png|"
-        for donationpoint in foodbank.donation_points():
-            dp_markers += "%s|" % (donationpoint.lat_lng)
-
-    base_url = "https://maps.googleapis.com/maps/api/staticmap"
-    params = [
-        ("center", foodbank.lat_lng),
-        ("size", dimensions),
-        ("scale", scale),
-        ("maptype", "roadmap"),
-        ("format", "png"),
-        ("language", request.LANGUAGE_CODE),
-        ("key", get_cred("gmap_static_key")),
-    ]
-    if dp_markers:
-        params.append(("markers", dp_markers))
-    if loc_markers:
-        params.append(("markers", loc_markers))
-    params.append(("markers", main_markers))
-
-    response = requests.get(base_url, params=params)
-    if response.status_code != 200:
+    # Normally already rendered by prerender_maps, and only fetched here if
+    # this variant hasn't been
+    response = static_map_response(foodbank_map_params(foodbank, size, request.LANGUAGE_CODE))
+    if response is None:
         return HttpResponseBadRequest()
-
-    return HttpResponse(response.content, content_type="image/png")
+    return response
 
 
-@cache_page(SECONDS_IN_WEEK)
 def foodbank_photo(request, slug):
     """
     Food bank photo JPEG
@@ -501,30 +426,18 @@ def foodbank_photo(request, slug):
     if not foodbank.place_has_photo:
         return HttpResponseNotFound()
     
-    photo = photo_from_place_id(foodbank.place_id, size)
-    
-    return HttpResponse(photo, content_type='image/jpeg')
+    return place_photo_response(foodbank.place_id, size)
 
 
-@cache_page(SECONDS_IN_WEEK)
 def foodbank_favicon(request, slug):
     """
     Food bank favicon PNG
     """
 
     foodbank = get_object_or_404(Foodbank, slug = slug)
+    return favicon_response(foodbank.url)
 
-    favicon = None
-    if foodbank.url:
-        favicon = get_favicon(foodbank.url)
-
-    if not favicon:
-        favicon = DEFAULT_FAVICON
-
-    return HttpResponse(favicon, content_type='image/png')
 
-
-@cache_page(SECONDS_IN_WEEK)
 def foodbank_screenshot(request, slug, page_name):
     """
     Food bank webpage screenshot
@@ -546,12 +459,12 @@ def foodbank_screenshot(request, slug, page_name):
     if not url:
         return HttpResponseNotFound()
     
-    photo = get_screenshot(url)
-
-    if photo:
-        return HttpResponse(photo, content_type='image/png')
-    else:
+    # The page can change without its URL changing, so a screenshot is
+    # only kept for as long as it used to be cached
+    response = blob_response("screenshot", [url], "image/png", lambda: get_screenshot(url), max_age = SECONDS_IN_WEEK)
+    if response is None:
         return HttpResponseNotFound()
+    return response
 
 
 @cache_page(SECONDS_IN_DAY)
@@ -580,6 +493,7 @@ def foodbank_locations(request,slug):
     template_vars = {
         "section":"locations",
         "foodbank":foodbank,
+        "locations":get_fragment("locations", [foodbank], lambda: list(foodbank.locations())),
         "map_config":map_config,
     }
 
@@ -612,6 +526,8 @@ def foodbank_donationpoints(request,slug):
     template_vars = {
         "section":"donationpoints",
         "foodbank":foodbank,
+        "location_donation_points":get_fragment("location_donation_points", [foodbank], lambda: list(foodbank.location_donation_points())),
+        "donation_points":get_fragment("donation_points", [foodbank], lambda: list(foodbank.donation_points())),
         "map_config":map_config,
     }
 
@@ -841,6 +757,8 @@ def foodbank_location(request, slug, locslug):
 
     foodbank = get_object_or_404(Foodbank.objects.select_related("latest_need"), slug = slug)
     location = get_object_or_404(FoodbankLocation, slug = locslug, foodbank = foodbank)
+    # Rather than loading it again for the schema.org, if it's not stored yet
+    location.foodbank = foodbank
 
     map_config = {
         "geojson":reverse("wfbn:foodbank_geojson", kwargs={"slug":foodbank.slug}),
@@ -863,7 +781,6 @@ def foodbank_location(request, slug, locslug):
     return render(request, "wfbn/foodbank/location.html", template_vars)
 
 
-@cache_page(SECONDS_IN_WEEK)
 def foodbank_location_map(request, slug, locslug, size=600):
     """
     Food bank location map PNG
@@ -875,59 +792,12 @@ def foodbank_location_map(request, slug, locslug, size=600):
     foodbank = get_object_or_404(Foodbank, slug = slug)
     location = get_object_or_404(FoodbankLocation, slug = locslug, foodbank = foodbank)
 
-    # Use zoom 12 if boundary exists to show more area, otherwise zoom 15
-    zoom = 11 if location.boundary_geojson else 15
-    
-    base_url = "https://maps.googleapis.com/maps/api/staticmap"
-    params = [
-        ("center", location.lat_lng),
-        ("zoom", zoom),
-        ("size", dimensions),
-        ("scale", scale),
-        ("maptype", "roadmap"),
-        ("format", "png"),
-        ("visual_refresh", "true"),
-        ("language", request.LANGUAGE_CODE),
-        ("key", get_cred("gmap_static_key")),
-    ]
-
-    # Add boundary polygon if it exists
-    if location.boundary_geojson:
-        try:
-            boundary_dict = location.boundary_geojson_dict()
-            if boundary_dict and boundary_dict.get("geometry") and boundary_dict["geometry"].get("type") == "Polygon":
-                coordinates = boundary_dict["geometry"]["coordinates"][0]  # Get outer ring
-                
-                # Simplify coordinates to reduce URL length
-                # 1. Reduce precision to 4 decimal places (~11m accuracy)
-                # 2. Downsample if too many points (keep every Nth point)
-                max_points = 100  # Limit to avoid URL length issues
-                if len(coordinates) > max_points:
-                    # Calculate step to reduce points, ensure step is at least 2
-                    step = max(2, len(coordinates) // max_points)
-                    simplified = [coordinates[i] for i in range(0, len(coordinates), step)]
-                    # Ensure last point is included (closes the polygon)
-                    if coordinates[-1] not in simplified:
-                        simplified.append(coordinates[-1])
-                    coordinates = simplified
-                
-                # Format: fillcolor:0xf7a72333 (orange with ~20% opacity) | color:0xf7a723ff (orange border) | weight:1
-                path_param = "fillcolor:0xf7a72333|color:0xf7a723ff|weight:1"
-                for coord in coordinates:
-                    # GeoJSON uses [lng, lat] order, Google Maps uses lat,lng
-                    # Round to 4 decimal places to reduce URL length
-                    path_param += "|%.4f,%.4f" % (coord[1], coord[0])
-                params.append(("path", path_param))
-        except (KeyError, IndexError, json.JSONDecodeError):
-            # If there's any error parsing the boundary, just continue without it
-            pass
-
-    response = requests.get(base_url, params=params)
-
-    return HttpResponse(response.content, content_type='image/png')
+    response = static_map_response(location_map_params(location, size, request.LANGUAGE_CODE))
+    if response is None:
+        return HttpResponseBadRequest()
+    return response
 
 
-@cache_page(SECONDS_IN_WEEK)
 def foodbank_location_photo(request, slug, locslug):
     """
     Food bank location photo JPEG
@@ -940,9 +810,7 @@ def foodbank_location_photo(request, slug, locslug):
     if not location.place_has_photo:
         return HttpResponseNotFound()
     
-    photo = photo_from_place_id(location.place_id, size)
-    
-    return HttpResponse(photo, content_type='image/jpeg')
+    return place_photo_response(location.place_id, size)
 
 
 @cache_page(SECONDS_IN_DAY)
@@ -953,6 +821,8 @@ def foodbank_donationpoint(request, slug, dpslug):
 
     foodbank = get_object_or_404(Foodbank.objects.select_related("latest_need"), slug = slug)
     donationpoint = get_object_or_404(FoodbankDonationPoint, slug = dpslug, foodbank = foodbank)
+    # Rather than loading it again for the schema.org, if it's not stored yet
+    donationpoint.foodbank = foodbank
 
     change_text = foodbank.latest_need.change_text
     if change_text == "Unknown" or change_text == "Nothing" or change_text == "Facebook":
@@ -1006,7 +876,6 @@ def foodbank_donationpoint_openinghours(request, slug, dpslug):
     return response
 
 
-@cache_page(SECONDS_IN_WEEK)
 def foodbank_donationpoint_photo(request, slug, dpslug):
     """
     Food bank donation point photo JPEG
@@ -1019,12 +888,9 @@ def foodbank_donationpoint_photo(request, slug, dpslug):
     if not donationpoint.place_has_photo:
         return HttpResponseNotFound()
     
-    photo = photo_from_place_id(donationpoint.place_id, size)
-    
-    return HttpResponse(photo, content_type='image/jpeg')
+    return place_photo_response(donationpoint.place_id, size)
 
 
-@cache_page(SECONDS_IN_WEEK)
 def foodbank_donationpoint_favicon(request, slug, dpslug):
     """
     Food bank donation point favicon PNG
@@ -1032,15 +898,7 @@ def foodbank_donationpoint_favicon(request, slug, dpslug):
 
     foodbank = get_object_or_404(Foodbank, slug = slug)
     donationpoint = get_object_or_404(FoodbankDonationPoint, slug = dpslug, foodbank = foodbank)
-
-    favicon = None
-    if donationpoint.url:
-        favicon = get_favicon(donationpoint.url)
-
-    if not favicon:
-        favicon = DEFAULT_FAVICON
-
-    return HttpResponse(favicon, content_type='image/png')
+    return favicon_response(donationpoint.url)
 
 
 @cache_page(SECONDS_IN_WEEK)
@@ -1207,23 +1065,13 @@ def foodbank_hit(request, slug):
     """
     Food bank hit counter
     """
-    foodbank_id = Foodbank.objects.filter(slug=slug).values_list("id", flat=True).first()
+    foodbank_id = hit_counter.foodbank_id(slug)
     if foodbank_id is None:
         raise Http404("Food bank not found")
-    day = datetime.date.today()
-
-    # Single atomic upsert, relying on the unique index over (foodbank, day).
-    # Reading the row and writing back hits + 1 lost increments whenever two
-    # requests overlapped, and the get_or_create it was paired with could
-    # itself race and create the duplicate rows it then had to clean up.
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """
-            INSERT INTO %s (foodbank_id, day, hits) VALUES (%%s, %%s, 1)
-            ON CONFLICT (foodbank_id, day) DO UPDATE SET hits = %s.hits + 1
-            """ % (FoodbankHit._meta.db_table, FoodbankHit._meta.db_table),
-            [foodbank_id, day],
-        )
+
+    # Counted in memory and upserted in batches every few seconds, rather
+    # than a write per page view against the same (foodbank, day) row.
+    hit_counter.record(foodbank_id)
 
     return HttpResponse(status=204)
 
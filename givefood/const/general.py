@@ -59,6 +59,54 @@ DISCREPANCY_STATUSES = [
 ]
 DISCREPANCY_STATUS_CHOICES = tuple((status, status) for status in DISCREPANCY_STATUSES)
 
+# What the changes feed reports on, keyed by model_name
+DATA_CHANGE_TYPES = {
+    "foodbank": "foodbank",
+    "foodbanklocation": "location",
+    "foodbankdonationpoint": "donationpoint",
+    "foodbankchange": "need",
+}
+DATA_CHANGE_TYPES_CHOICES = tuple((change_type, change_type) for change_type in DATA_CHANGE_TYPES.values())
+
+# What a DataVersion counts changes to. A view's ETag and cache key are made
+# from the versions of the scopes it reads.
+DATA_VERSION_SCOPES = tuple(DATA_CHANGE_TYPES.values()) + ("constituency",)
+DATA_VERSION_SCOPES_CHOICES = tuple((scope, scope) for scope in DATA_VERSION_SCOPES)
+
+DATA_CHANGE_ACTIONS = [
+    "created",
+    "updated",
+    "closed",
+    "deleted",
+]
+DATA_CHANGE_ACTIONS_CHOICES = tuple((action, action) for action in DATA_CHANGE_ACTIONS)
+
+# The rows of givefood_mappoint, and the type each is given in our GeoJSON.
+# A food bank's delivery address is a second point of the food bank's own.
+MAP_POINT_TYPES = {
+    "foodbank": "f",
+    "delivery": "f",
+    "location": "l",
+    "donationpoint": "d",
+}
+MAP_POINT_TYPES_CHOICES = tuple((point_type, point_type) for point_type in MAP_POINT_TYPES)
+# The order the maps list them in, so donation points are drawn on top
+MAP_POINT_ORDER = {"foodbank": 0, "delivery": 0, "location": 1, "donationpoint": 2}
+
+# The rows of givefood_searchdocument, by the model each is from
+SEARCH_DOCUMENT_TYPES = {
+    "foodbank": "foodbank",
+    "foodbanklocation": "location",
+    "foodbankdonationpoint": "donationpoint",
+    "parliamentaryconstituency": "constituency",
+    "foodbankchange": "need",
+    "foodbanksubscriber": "email",
+    "whatsappsubscriber": "whatsapp",
+    "mobilesubscriber": "mobile",
+    "webpushsubscription": "webpush",
+}
+SEARCH_DOCUMENT_TYPES_CHOICES = tuple((doc_type, doc_type) for doc_type in SEARCH_DOCUMENT_TYPES.values())
+
 CRAWL_TYPE_ICONS = {
     "need": '<span class="mdi mdi-cart"></span>',
     "article": '<span class="mdi mdi-newspaper"></span>',
@@ -143,6 +191,8 @@ ITEMS_MC_KEY = "all_items"
 PARLCON_MC_KEY = "all_parlcon"
 STATS_MC_KEY = "site_stats"
 CRED_MC_KEY_PREFIX = "cred_"
+FRAGMENT_MC_KEY_PREFIX = "frag_"
+DATA_VERSION_MC_KEY_PREFIX = "dataversion_"
 
 RICK_ASTLEY = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
 
@@ -207,4 +257,44 @@ DAYS_OF_WEEK = [
 
 PLACES_PER_SITEMAP = 10000
 
+# Constants for map sizes
+MAP_SIZE_SMALL = 300
+MAP_SIZE_MEDIUM = 600
+MAP_SIZE_LARGE = 1080
+
+# Map size to dimensions and scale configuration
+MAP_SIZE_CONFIG = {
+    MAP_SIZE_SMALL: ("150x150", 2),    # Small: 150x150 at 2x scale (retina)
+    MAP_SIZE_MEDIUM: ("600x400", 1),   # Medium: 600x400 at 1x scale (default)
+    MAP_SIZE_LARGE: ("540x360", 2),    # Large: 540x360 at 2x scale (retina)
+}
+
+# The language Google Static Maps is asked for in each of ours. Those it
+# doesn't localise, Welsh, Gaelic, Irish and Klingon, are served the
+# default language's map rather than storing identical copies of it.
+MAP_LANGUAGES = {
+    "en": "en",
+    "pl": "pl",
+    "bn": "bn",
+    "ro": "ro",
+    "pa": "pa",
+    "ur": "ur",
+    "ar": "ar",
+    "gu": "gu",
+    "es": "es",
+    "pt": "pt",
+    "it": "it",
+    "ta": "ta",
+    "fr": "fr",
+    "lt": "lt",
+    "zh-hans": "zh-CN",
+    "tr": "tr",
+    "bg": "bg",
+}
+
+# Food bank hits are counted in memory and written out at most this often
+HIT_FLUSH_SECONDS = 5
+# How long a worker trusts its slug to food bank id map before reloading it
+HIT_SLUG_MAP_SECONDS = 10 * 60
+
 BOT_USER_AGENT = "Mozilla/5.0 (compatible; GiveFoodBot/1.0; +https://www.givefood.org.uk/bot/)"
\ No newline at end of file
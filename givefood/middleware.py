@@ -1,10 +1,72 @@
+import json
+import logging
 import time
+from contextlib import ExitStack
 
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
 from django.http import HttpResponseForbidden
 from django.shortcuts import redirect
 from django.urls import resolve, reverse
 
 from givefood.utils.cache import get_cred
+from givefood.utils.timing import (
+    install_timing_hooks,
+    instrument_cache,
+    start_timings,
+    stop_timings,
+    time_db_query,
+)
+
+
+timing_logger = logging.getLogger("givefood.timing")
+
+
+# Time the request's database, cache, template and outbound HTTP work
+class ServerTiming:
+    """
+    Report what each request spent its time on in a Server-Timing header.
+
+    Only headers are touched, never the content, so streamed responses go
+    out as they're made. For those the numbers cover the work done before
+    the first byte. Requests slower than SERVER_TIMING_LOG_MS are also
+    logged as a JSON line to the givefood.timing logger, so slow views can
+    be found in production without waiting for Sentry to sample one.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_timing_hooks()
+
+    def __call__(self, request):
+
+        timings, token = start_timings()
+        try:
+            for alias in settings.CACHES:
+                instrument_cache(alias, caches[alias])
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(time_db_query))
+                response = self.get_response(request)
+        finally:
+            stop_timings(token)
+
+        response["Server-Timing"] = timings.header()
+
+        log_ms = getattr(settings, "SERVER_TIMING_LOG_MS", None)
+        total_ms = timings.total() * 1000
+        if log_ms is not None and total_ms >= log_ms:
+            line = {
+                "method": request.method,
+                "path": request.path,
+                "view": getattr(request.resolver_match, "view_name", None),
+                "status": response.status_code,
+            }
+            line.update(timings.as_dict())
+            timing_logger.info(json.dumps(line))
+
+        return response
 
 
 # Inject the render time into the response content
@@ -15,6 +77,11 @@ def RenderTime(get_response):
         t2 = time.time()
         duration = t2 - t1
         duration = round(duration * 1000, 3)
+        # A streamed response has no content to rewrite, and reading it
+        # here would consume the stream before it was sent. Only HTML pages
+        # carry the placeholder, so nothing else is searched or copied.
+        if response.streaming or "text/html" not in response.get("Content-Type", ""):
+            return response
         response.content = response.content.replace(
             b"PUTTHERENDERTIMEHERE", bytes(str(duration), "utf-8"), 1
         )
@@ -0,0 +1,34 @@
+# Add givefood_dataversion, a one row counter of changes to the public data.
+#
+# The API and GeoJSON views take their ETag and Last-Modified from it, so a
+# polling client's If-None-Match is answered with a 304 after a primary key
+# lookup, rather than after the view has read and serialised every food bank.
+#
+# The row is created here, so reading it is a plain get and bumping it a
+# plain UPDATE.
+
+from django.db import migrations, models
+
+
+def create_row(apps, schema_editor):
+    DataVersion = apps.get_model("givefood", "DataVersion")
+    DataVersion.objects.get_or_create(pk=1, defaults={"version": 1})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0012_autovacuum_insert_thresholds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('modified', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Add givefood_datachange, the append-only log behind /api/2/changes/.
+#
+# Mirrors of our data found out what had changed by polling /api/2/needs/ and
+# re-fetching every food bank document. Each save() or delete() of a food
+# bank, location, donation point or published need now appends a row here,
+# and the feed pages through them by id -- the primary key is the only index
+# it needs.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0013_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('object_type', models.CharField(choices=[('foodbank', 'foodbank'), ('location', 'location'), ('donationpoint', 'donationpoint'), ('need', 'need')], max_length=20)),
+                ('action', models.CharField(choices=[('created', 'created'), ('updated', 'updated'), ('closed', 'closed'), ('deleted', 'deleted')], max_length=10)),
+                ('object_uuid', models.UUIDField()),
+                ('slug', models.CharField(blank=True, max_length=100, null=True)),
+                ('foodbank_slug', models.CharField(blank=True, max_length=100, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Add givefood_mappoint, one row per point we put on a map.
+#
+# The GeoJSON views, sitemap and country pages each read food banks, their
+# delivery addresses, locations and donation points from three tables and
+# stitched them together, reversing a URL per row as they went. The models
+# now keep this copy of what they need up to date from save() and delete().
+#
+# It gets the same partial earthdistance GiST index as the three tables it
+# copies (see 0004), in raw SQL with state_operations=[] for the same reasons.
+#
+# The table is filled here in SQL rather than with the models, which won't
+# match this migration's schema for ever. The URLs are the wfbn ones without
+# a language prefix, as MapPoint.points_for() reverses them.
+# manage.py rebuild_map_points does the same from the models.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+FILL = r"""
+    INSERT INTO givefood_mappoint (
+        point_type, object_id, foodbank_id, foodbank_name, foodbank_slug,
+        name, alt_name, slug, address, latitude, longitude, country,
+        parliamentary_constituency_slug, is_closed, is_area, url, modified
+    )
+    SELECT
+        'foodbank', id, id, name, slug,
+        name, alt_name, slug, concat(address, E'\r\n', postcode), latitude, longitude, country,
+        parliamentary_constituency_slug, is_closed, false, '/needs/at/' || slug || '/', NOW()
+    FROM givefood_foodbank
+    UNION ALL
+    SELECT
+        'delivery', id, id, name, slug,
+        name, alt_name, slug, delivery_address,
+        split_part(delivery_lat_lng, ',', 1)::float8, split_part(delivery_lat_lng, ',', 2)::float8, country,
+        parliamentary_constituency_slug, is_closed, false, '/needs/at/' || slug || '/', NOW()
+    FROM givefood_foodbank
+    WHERE delivery_address <> '' AND delivery_lat_lng <> ''
+    UNION ALL
+    SELECT
+        'location', id, foodbank_id, foodbank_name, foodbank_slug,
+        name, NULL, slug, concat_ws(E'\r\n', NULLIF(address, ''), NULLIF(postcode, '')), latitude, longitude, country,
+        parliamentary_constituency_slug, is_closed, COALESCE(boundary_geojson, '') <> '',
+        '/needs/at/' || foodbank_slug || '/' || slug || '/', NOW()
+    FROM givefood_foodbanklocation
+    UNION ALL
+    SELECT
+        'donationpoint', id, foodbank_id, foodbank_name, foodbank_slug,
+        name, NULL, slug, concat(address, E'\r\n', postcode), latitude, longitude, country,
+        parliamentary_constituency_slug, is_closed, false,
+        '/needs/at/' || foodbank_slug || '/donationpoint/' || slug || '/', NOW()
+    FROM givefood_foodbankdonationpoint
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0014_datachange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('point_type', models.CharField(choices=[('foodbank', 'foodbank'), ('delivery', 'delivery'), ('location', 'location'), ('donationpoint', 'donationpoint')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('foodbank_name', models.CharField(max_length=100)),
+                ('foodbank_slug', models.CharField(max_length=100)),
+                ('name', models.CharField(max_length=100)),
+                ('alt_name', models.CharField(blank=True, max_length=100, null=True)),
+                ('slug', models.CharField(max_length=100)),
+                ('address', models.TextField(blank=True)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('country', models.CharField(choices=[('England', 'England'), ('Wales', 'Wales'), ('Scotland', 'Scotland'), ('Northern Ireland', 'Northern Ireland'), ('Isle of Man', 'Isle of Man'), ('Jersey', 'Jersey'), ('Guernsey', 'Guernsey')], max_length=50)),
+                ('parliamentary_constituency_slug', models.CharField(blank=True, max_length=50, null=True)),
+                ('is_closed', models.BooleanField(default=False)),
+                ('is_area', models.BooleanField(default=False)),
+                ('url', models.CharField(max_length=255)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('foodbank', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='givefood.foodbank')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['parliamentary_constituency_slug'], name='mappoint_parlcon_slug_idx'), models.Index(fields=['country', 'is_closed'], name='mappoint_country_closed_idx')],
+                'constraints': [models.UniqueConstraint(fields=('point_type', 'object_id'), name='mappoint_type_object_uniq')],
+            },
+        ),
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS mappoint_earth_open_idx ON givefood_mappoint USING gist (ll_to_earth(latitude, longitude)) WHERE (is_closed = false)',
+            reverse_sql='DROP INDEX IF EXISTS mappoint_earth_open_idx',
+            state_operations=[],
+        ),
+        migrations.RunSQL(FILL, migrations.RunSQL.noop),
+    ]
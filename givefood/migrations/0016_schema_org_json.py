@@ -0,0 +1,37 @@
+# Store each food bank's, location's, donation point's and constituency's
+# schema.org JSON-LD, rather than building it on every page render.
+#
+# The columns start empty. Pages build the JSON-LD as they did until a row
+# is next saved, or manage.py rebuild_schema_org fills them all.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0015_mappoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodbank',
+            name='schema_org_json',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='foodbanklocation',
+            name='schema_org_json',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='foodbankdonationpoint',
+            name='schema_org_json',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parliamentaryconstituency',
+            name='schema_org_json',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
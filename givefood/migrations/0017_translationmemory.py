@@ -0,0 +1,35 @@
+# Add givefood_translationmemory, one row per line of need text translated
+# into one language.
+#
+# Needs were translated whole, one Google request per text per language,
+# with nothing kept between needs. Lines now go through this table, so only
+# lines never seen in a language are sent.
+#
+# It's keyed on a hash of the line rather than the line, which a long one
+# would take past the size a btree index entry can be.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0016_schema_org_json'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('source', models.TextField()),
+                ('source_hash', models.CharField(editable=False, max_length=64)),
+                ('language', models.CharField(max_length=10)),
+                ('translation', models.TextField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('language', 'source_hash'), name='translationmemory_lang_hash_uniq')],
+            },
+        ),
+    ]
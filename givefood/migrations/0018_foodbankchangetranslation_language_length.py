@@ -0,0 +1,22 @@
+# Widen FoodbankChangeTranslation.language to fit zh-hans.
+#
+# At two characters every Simplified Chinese translation failed to save. That
+# failed only its own task while each language had one; translations are now
+# written for every language together, so it would fail them all.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0017_translationmemory'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='foodbankchangetranslation',
+            name='language',
+            field=models.CharField(max_length=10),
+        ),
+    ]
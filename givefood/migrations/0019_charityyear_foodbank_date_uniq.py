@@ -0,0 +1,39 @@
+# One CharityYear per food bank per financial year end.
+#
+# charityinfo --ew-dir/--scotland-csv/--ni-csv loads the regulators' register
+# extracts and upserts charity years with INSERT ... ON CONFLICT, which needs
+# a unique constraint to conflict on. Nothing stopped duplicates before: the
+# crawlers delete and reinsert a food bank's years, so two crawls of the same
+# food bank overlapping could leave a year in twice.
+#
+# The duplicates are deleted first, keeping the most recently inserted row of
+# each, as that's the one the last crawl wrote. They're the same figures
+# fetched twice, so the reverse doesn't put them back.
+
+from django.db import migrations, models
+
+
+# Read by `checkschema --preflight`, so the duplicates it finds are reported
+# as handled here rather than as a blocker you have to clear by hand first.
+REPAIRS = [("givefood_charityyear", ["foodbank_id", "date"])]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0018_foodbankchangetranslation_language_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=(
+                'DELETE FROM "givefood_charityyear" a USING "givefood_charityyear" b '
+                'WHERE a."foodbank_id" = b."foodbank_id" AND a."date" = b."date" AND a."id" < b."id";'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='charityyear',
+            constraint=models.UniqueConstraint(fields=('foodbank', 'date'), name='charityyear_foodbank_date_uniq'),
+        ),
+    ]
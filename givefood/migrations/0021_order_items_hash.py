@@ -0,0 +1,24 @@
+# Remember the hash of the items text an order's lines were parsed from.
+#
+# Order.save() sent the text to Gemini and rewrote every line on every save,
+# even when only the delivery details had changed. Now it only does that
+# when the hash differs. Existing orders have no hash, so each is parsed
+# once more the next time it's saved, and then not again until its text
+# changes.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0020_airesponse_aiusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Keep the admin stats pages' figures in a table rather than working them out
+# on every view.
+#
+# The editing, order, subscriber, need and subscriber graph pages counted,
+# summed and bucketed whole tables each time they were opened. They now read
+# a StatsSnapshot row, refreshed by the refresh_stats command or from the page.
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0021_order_items_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('computed', models.DateTimeField()),
+                ('took_ms', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
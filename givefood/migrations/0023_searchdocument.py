@@ -0,0 +1,41 @@
+# A table of what the admin search finds things by, searched in one query.
+#
+# The search ran a query per model, each an OR of icontains over up to twelve
+# columns, scanning the needs and subscriber tables whole. SearchDocument
+# holds the searched text of each food bank, location, donation point,
+# constituency, need and subscription, with a tsvector Postgres keeps from it
+# and a trigram index for matches within words. save() and delete() keep it
+# up to date; run manage.py rebuild_search_index once to fill it.
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0022_statssnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doc_type', models.CharField(choices=[('foodbank', 'foodbank'), ('location', 'location'), ('donationpoint', 'donationpoint'), ('constituency', 'constituency'), ('need', 'need'), ('email', 'email'), ('whatsapp', 'whatsapp'), ('mobile', 'mobile'), ('webpush', 'webpush')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('text', models.TextField()),
+                ('created', models.DateTimeField(blank=True, null=True)),
+                ('search_vector', models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('title', config='simple', weight='A'), '||', django.contrib.postgres.search.SearchVector('text', config='simple', weight='B'), django.contrib.postgres.search.SearchConfig('simple')), output_field=django.contrib.postgres.search.SearchVectorField())),
+                ('foodbank', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='givefood.foodbank')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='searchdoc_vector_idx'), django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('text'), name='gin_trgm_ops'), name='searchdoc_text_upper_trgm')],
+                'constraints': [models.UniqueConstraint(fields=('doc_type', 'object_id'), name='searchdoc_type_object_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# The token buckets that limit how fast each task queue's tasks start.
+#
+# manage.py task_worker takes a token from a queue's bucket before running
+# one of its tasks, and puts the task back to wait when there isn't one. One
+# row per queue, shared by every worker. See TASK_QUEUE_LIMITS in settings.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0023_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskQueueBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('queue_name', models.CharField(max_length=32, unique=True)),
+                ('tokens', models.FloatField()),
+                ('updated', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# The CDN purges waiting to be sent, and those sent in the last week.
+#
+# Saves add the URLs and prefixes they've changed here, and one purge sends
+# everything waiting. The unique constraint only covers paths still
+# waiting, so a path asked for again while it waits is added once.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0024_taskqueuebucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachePurge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=500)),
+                ('is_prefix', models.BooleanField(default=False)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('purged', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['purged'], name='cachepurge_purged_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('purged__isnull', True)), fields=('path', 'is_prefix'), name='cachepurge_waiting_uniq')],
+            },
+        ),
+    ]
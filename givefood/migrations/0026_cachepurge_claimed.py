@@ -0,0 +1,28 @@
+# Purges claim the rows they're sending, taking them out of the unique
+# constraint on waiting paths, so a path asked for again during the send
+# is added rather than dropped as already waiting.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0025_cachepurge'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='cachepurge',
+            name='cachepurge_waiting_uniq',
+        ),
+        migrations.AddField(
+            model_name='cachepurge',
+            name='claimed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='cachepurge',
+            constraint=models.UniqueConstraint(condition=models.Q(('claimed__isnull', True), ('purged__isnull', True)), fields=('path', 'is_prefix'), name='cachepurge_waiting_uniq'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Give givefood_dataversion a row per type of public data rather than one
+# for everything, so a change to one type leaves the cached responses for
+# the others alone.
+#
+# The old row is dropped and the new ones are created as they're first
+# read. The versions they start at are told apart from any handed out
+# before by their modified time, which is part of every ETag.
+
+from django.db import migrations, models
+
+
+def delete_rows(apps, schema_editor):
+    DataVersion = apps.get_model("givefood", "DataVersion")
+    DataVersion.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('givefood', '0026_cachepurge_claimed'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_rows, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='dataversion',
+            name='scope',
+            field=models.CharField(choices=[('foodbank', 'foodbank'), ('location', 'location'), ('donationpoint', 'donationpoint'), ('need', 'need'), ('constituency', 'constituency')], default='', max_length=20, unique=True),
+            preserve_default=False,
+        ),
+    ]
@@ -7,17 +7,20 @@ Re-exports every public model under its original name so existing imports
 into a `models/` package.
 """
 
-from givefood.models.analytics import CrawlItem, CrawlSet, FoodbankHit
+from givefood.models.analytics import AIUsage, CrawlItem, CrawlSet, FoodbankHit, StatsSnapshot
 from givefood.models.articles import FoodbankArticle
 from givefood.models.foodbank import (
-    Foodbank, FoodbankDonationPoint, FoodbankLocation,
+    Foodbank, FoodbankDonationPoint, FoodbankLocation, MapPoint, SearchDocument,
 )
 from givefood.models.geo import Place, PlacePhoto, Postcode
 from givefood.models.needs import (
     FoodbankChange, FoodbankChangeLine, FoodbankChangeTranslation,
-    FoodbankDiscrepancy,
+    FoodbankDiscrepancy, TranslationMemory,
+)
+from givefood.models.operations import (
+    AIResponse, CachePurge, CharityYear, DataChange, DataVersion, Dump, GfCredential,
+    SlugRedirect, TaskQueueBucket,
 )
-from givefood.models.operations import CharityYear, Dump, GfCredential, SlugRedirect
 from givefood.models.orders import Order, OrderGroup, OrderItem, OrderLine
 from givefood.models.political import ParliamentaryConstituency
 from givefood.models.subscribers import (
@@ -26,10 +29,15 @@ from givefood.models.subscribers import (
 )
 
 __all__ = [
+    "AIResponse",
+    "AIUsage",
+    "CachePurge",
     "CharityYear",
     "ConstituencySubscriber",
     "CrawlItem",
     "CrawlSet",
+    "DataChange",
+    "DataVersion",
     "Dump",
     "Foodbank",
     "FoodbankArticle",
@@ -42,6 +50,7 @@ __all__ = [
     "FoodbankLocation",
     "FoodbankSubscriber",
     "GfCredential",
+    "MapPoint",
     "MobileSubscriber",
     "Order",
     "OrderGroup",
@@ -51,7 +60,11 @@ __all__ = [
     "Place",
     "PlacePhoto",
     "Postcode",
+    "SearchDocument",
     "SlugRedirect",
+    "StatsSnapshot",
+    "TaskQueueBucket",
+    "TranslationMemory",
     "WebPushSubscription",
     "WhatsappSubscriber",
 ]
@@ -5,6 +5,7 @@ from datetime import timedelta
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 from givefood.const.general import CRAWL_TYPE_ICON_DEFAULT, CRAWL_TYPE_ICONS
@@ -31,6 +32,55 @@ class FoodbankHit(models.Model):
         ]
 
 
+class AIUsage(models.Model):
+    """
+    A day's Gemini and OpenRouter use by one caller of one model.
+
+    Live calls carry their tokens and time; cache hits and calls coalesced
+    into one already in flight are counted, but cost nothing.
+    """
+
+    day = models.DateField()
+    caller = models.CharField(max_length=50)
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    calls = models.PositiveIntegerField(default=0)
+    cache_hits = models.PositiveIntegerField(default=0)
+    coalesced = models.PositiveIntegerField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    latency_ms = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        app_label = 'givefood'
+        constraints = [
+            # record_ai_usage() upserts against this
+            models.UniqueConstraint(
+                fields=['day', 'caller', 'provider', 'model'],
+                name='aiusage_day_caller_provider_model_uniq',
+            ),
+        ]
+
+
+class StatsSnapshot(models.Model):
+    """
+    The last computed figures for one of the admin stats pages.
+
+    Built by givefood.utils.stats on a schedule or on demand, so the pages
+    read one row rather than counting and summing whole tables. data is a
+    list of [label, value] pairs, as jsonb doesn't keep the order of an
+    object's keys.
+    """
+
+    name = models.CharField(max_length=50, unique=True)
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    computed = models.DateTimeField()
+    took_ms = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        app_label = 'givefood'
+
+
 class CrawlSet(models.Model):
 
     start = models.DateTimeField(auto_now_add=True, editable=False)
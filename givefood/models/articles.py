@@ -13,7 +13,7 @@ from django.urls import reverse, translate_url
 from givefood.models.base import TimestampedModel
 from givefood.models.foodbank import Foodbank
 from givefood.settings import LANGUAGES
-from givefood.utils.cache import decache_async
+from givefood.utils.cache import queue_decache
 
 
 class FoodbankArticle(TimestampedModel):
@@ -76,7 +76,7 @@ class FoodbankArticle(TimestampedModel):
             urls = [index_url]
             for language in LANGUAGES:
                 urls.append(translate_url(index_url, language[0]))
-            decache_async.enqueue(urls)
+            queue_decache(urls)
 
     def __str__(self):
         return "%s - %s" % (self.title, self.foodbank_name)
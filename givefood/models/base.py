@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import json
 import uuid
 
+from django.conf import settings
 from django.db import models
 from django.core.validators import RegexValidator
+from django.utils.translation import override
 
 from givefood.const.general import COUNTRIES_CHOICES, POSTCODE_REGEX
 
@@ -46,6 +49,96 @@ class UUIDModel(models.Model):
         abstract = True
 
 
+class SchemaOrgModel(models.Model):
+    """
+    Stores the schema.org JSON-LD that `schema_org()` builds, so pages emit
+    a string rather than building nested dicts on every render.
+
+    Subclasses refresh it with `update_schema_org_json()` when they're saved;
+    the places that nest them are refreshed by the `update_schema_org` task.
+    """
+
+    schema_org_json = models.TextField(null=True, blank=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def schema_org_str(self):
+        # In the default language, as the URLs in it would otherwise have the
+        # prefix of whichever language was active when it was saved
+        with override(settings.LANGUAGE_CODE):
+            return json.dumps(self.schema_org(), separators=(",", ":"), sort_keys=True)
+
+    def update_schema_org_json(self):
+        """Rebuild the stored JSON-LD, returning whether it changed."""
+        schema_org_json = self.schema_org_str()
+        changed = schema_org_json != self.schema_org_json
+        self.schema_org_json = schema_org_json
+        return changed
+
+    def stored_schema_org_str(self):
+        # Rows from before it was stored are built here until rebuild_schema_org has filled them
+        return self.schema_org_json or self.schema_org_str()
+
+
+class PublicDataModel(models.Model):
+    """
+    Remembers the values a row was loaded with, so `save()` can tell
+    whether anything the API shows of it has changed, or whether the fields
+    something else is made from have.
+
+    Every field is public other than those named in `PRIVATE_FIELDS`: dates
+    the crawlers and checks write, and values that follow from other rows
+    which record their own changes.
+    """
+
+    PRIVATE_FIELDS = ()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance.field_values()
+        return instance
+
+    def field_values(self):
+        # From __dict__, so deferred fields aren't loaded to be compared
+        return {field.attname: self.__dict__[field.attname] for field in self._meta.concrete_fields if field.attname in self.__dict__}
+
+    def loaded_value(self, name, default=None):
+        """The value field name had when loaded or last saved."""
+        return getattr(self, "_loaded_values", {}).get(name, default)
+
+    def public_changed(self):
+        """Whether a public field differs from when the row was loaded or last saved."""
+        return self.fields_changed(*[
+            field.name for field in self._meta.concrete_fields
+            if field.attname not in self.PRIVATE_FIELDS and field.name not in self.PRIVATE_FIELDS
+        ])
+
+    def fields_changed(self, *names):
+        """Whether any of the named fields differ from when the row was loaded or last saved."""
+        loaded_values = getattr(self, "_loaded_values", None)
+        if self._state.adding or loaded_values is None:
+            return True
+        for name in names:
+            field = self._meta.get_field(name)
+            if field.attname not in self.__dict__:
+                continue
+            if field.attname not in loaded_values:
+                return True
+            # to_python as save() sets some from strings, e.g. latitude from lat_lng
+            if field.to_python(self.__dict__[field.attname]) != field.to_python(loaded_values[field.attname]):
+                return True
+        return False
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = self.field_values()
+
+
 class PhysicalPlace(models.Model):
     """
     A physical UK place: postal address, geocoded coordinates, and the
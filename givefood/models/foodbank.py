@@ -12,27 +12,35 @@ import requests
 from furl import furl
 from requests import PreparedRequest
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models import Max, Min
+from django.db.models import F, Max, Min, Q, Window
+from django.db.models.functions import RowNumber, Upper
 from django.template.defaultfilters import slugify
 from django.urls import reverse, translate_url
 from django.utils import timezone
-from django.utils.translation import get_language
+from django.utils.translation import get_language, override
 from django.utils.translation import gettext as _
 
 from givefood.const.general import (
-    COUNTRIES_CHOICES, DAYS_OF_WEEK, DONATION_POINT_COMPANIES_CHOICES,
-    DONT_APPEND_FOOD_BANK, FOODBANK_NETWORK_CHOICES, IFAN_SCHEMA,
-    PACKAGING_WEIGHT_PC, POSTCODE_REGEX, QUERYSTRING_RUBBISH, SITE_DOMAIN,
-    TRUSSELL_TRUST_SCHEMA,
+    COUNTRIES_CHOICES, DATA_CHANGE_TYPES, DAYS_OF_WEEK,
+    DONATION_POINT_COMPANIES_CHOICES, DONT_APPEND_FOOD_BANK,
+    FOODBANK_NETWORK_CHOICES, IFAN_SCHEMA, MAP_POINT_ORDER, MAP_POINT_TYPES,
+    MAP_POINT_TYPES_CHOICES, PACKAGING_WEIGHT_PC, POSTCODE_REGEX,
+    QUERYSTRING_RUBBISH, SEARCH_DOCUMENT_TYPES, SEARCH_DOCUMENT_TYPES_CHOICES,
+    SITE_DOMAIN, TRUSSELL_TRUST_SCHEMA,
 )
 from givefood.models.base import (
-    EditableModel, PhysicalPlace, TimestampedModel, UUIDModel,
+    EditableModel, PhysicalPlace, PublicDataModel, SchemaOrgModel,
+    TimestampedModel, UUIDModel,
 )
-from givefood.settings import LANGUAGES
-from givefood.utils.cache import decache_async
+from givefood.settings import LANGUAGE_CODE, LANGUAGES
+from givefood.utils.cache import queue_decache, record_change
+from givefood.utils.maps import queue_map_prerender
+from givefood.utils.schema import queue_schema_org_update
 from givefood.utils.geo import (
     admin_regions_from_postcode, find_foodbanks, geocode, geojson_dict,
     place_has_photo, pluscode, validate_postcode,
@@ -52,7 +60,33 @@ def _get_bank_holidays():
     return _BANK_HOLIDAYS_CACHE
 
 
-class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
+def foodbank_full_name(name, alt_name = None):
+    """
+    A food bank's name as it's shown in the current language.
+
+    The Welsh name is used in Welsh where there is one. Otherwise "Foodbank"
+    is appended, or prepended in Welsh and Gaelic, unless the name already
+    says what it is.
+    """
+    current_language = get_language()
+    if current_language == "cy" and alt_name:
+        return alt_name
+    if name in DONT_APPEND_FOOD_BANK:
+        return name
+    if current_language == "cy" or current_language == "gd":
+        return "%s %s" % (_("Foodbank"), name)
+    return "%s %s" % (name, _("Foodbank"))
+
+
+class Foodbank(PublicDataModel, TimestampedModel, EditableModel, UUIDModel, SchemaOrgModel, PhysicalPlace):
+
+    # Checks' dates, and what follows from its needs, which record their own changes
+    PRIVATE_FIELDS = (
+        "modified", "edited", "schema_org_json", "notification_email",
+        "last_order", "last_social_media_check", "last_need", "last_rfi", "last_crawl",
+        "last_discrepancy_check", "last_need_check", "last_charity_check",
+        "latest_need", "days_between_needs",
+    )
 
     # Name
     # Unique because the database has enforced it all along via
@@ -240,7 +274,7 @@ class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
         schema_dict["sameAs"] = []
         schema_dict["sameAs"].append(self.url)
         schema_dict["sameAs"].append("%s%s" % (SITE_DOMAIN, reverse("uuid_redir", kwargs={"pk": self.uuid})))
-        if self.place_id:
+        if self.place_id and self.plus_code_global:
             schema_dict["sameAs"].append("https://www.google.co.uk/maps/place/%s/" % quote_plus(self.plus_code_global))
         if self.charity_number:
             schema_dict["sameAs"].append(self.charity_register_url())
@@ -255,28 +289,11 @@ class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
                 schema_dict["seeks"] = seeks
         return schema_dict
 
-    def schema_org_str(self):
-        return json.dumps(self.schema_org(), indent=4, sort_keys=True)
-
     def full_name_en(self):
-        current_language = get_language()
-        if self.name in DONT_APPEND_FOOD_BANK:
-            return self.name
-        else:
-            if current_language == "cy" or current_language == "gd":
-                return "%s %s" % (_("Foodbank"), self.name)
-            else:
-                return "%s %s" % (self.name, _("Foodbank"))
+        return foodbank_full_name(self.name)
 
     def full_name(self):
-        current_language = get_language()
-        if current_language == "cy":
-            if self.alt_name:
-                return self.alt_name
-            else:
-                return self.full_name_en()
-        else:
-            return self.full_name_en()
+        return foodbank_full_name(self.name, self.alt_name)
 
     def latt(self):
         return float(self.lat_lng.split(",")[0])
@@ -606,6 +623,11 @@ class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
         from givefood.models.orders import Order
         from givefood.models.subscribers import FoodbankSubscriber
 
+        # Whose schema.org lists this food bank's locations
+        location_constituency_ids = list(FoodbankLocation.objects.filter(foodbank = self).values_list("parliamentary_constituency_id", flat = True))
+
+        MapPoint.objects.filter(foodbank = self).delete()
+        SearchDocument.objects.filter(foodbank = self).delete()
         FoodbankHit.objects.filter(foodbank = self).delete()
         FoodbankChangeLine.objects.filter(foodbank = self).delete()
         FoodbankChange.objects.filter(foodbank = self).delete()
@@ -621,6 +643,8 @@ class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
         Order.objects.filter(foodbank = self).update(foodbank=None)
 
         super(Foodbank, self).delete(*args, **kwargs)
+        record_change(self, "deleted")
+        queue_schema_org_update(constituency_ids = [self.parliamentary_constituency_id] + location_constituency_ids)
 
 
     def save(self, do_decache=True, do_geoupdate=True, *args, **kwargs):
@@ -656,6 +680,9 @@ class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
         else:
             self.delivery_lat_lng = None
 
+        # Which, if it changes, needs to drop this food bank from its schema.org
+        old_constituency_id = self.parliamentary_constituency_id
+
         if do_geoupdate:
 
             # Photo?
@@ -712,7 +739,29 @@ class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
         except FoodbankChange.DoesNotExist:
             self.latest_need = None
 
+        self.update_schema_org_json()
+
+        adding = self._state.adding
+        public_changed = self.public_changed()
+        # What its map is drawn from. A location or donation point that
+        # moves queues the map itself, as the counts don't change.
+        markers_changed = self.fields_changed("lat_lng", "delivery_lat_lng", "no_locations", "no_donation_points")
         super(Foodbank, self).save(*args, **kwargs)
+        if public_changed:
+            record_change(self, "created" if adding else None)
+        MapPoint.update_for(self)
+        SearchDocument.update_for(self)
+
+        # Rebuild the schema.org of its locations, donation points and
+        # constituencies, or just the constituencies if it has no others
+        if self.no_locations or self.no_donation_points:
+            queue_schema_org_update(self.id, [old_constituency_id])
+        else:
+            queue_schema_org_update(constituency_ids = [old_constituency_id, self.parliamentary_constituency_id])
+
+        # Render the map in the background if its markers have changed
+        if markers_changed:
+            queue_map_prerender(self)
 
         if do_decache:
 
@@ -755,10 +804,12 @@ class Foodbank(TimestampedModel, EditableModel, UUIDModel, PhysicalPlace):
 
             urls = translated_urls + api_urls
             urls.append(reverse("md_index"))
-            decache_async.enqueue(urls, prefixes)
+            queue_decache(urls, prefixes)
+
 
+class FoodbankLocation(PublicDataModel, EditableModel, UUIDModel, SchemaOrgModel, PhysicalPlace):
 
-class FoodbankLocation(EditableModel, UUIDModel, PhysicalPlace):
+    PRIVATE_FIELDS = ("modified", "edited", "schema_org_json")
 
     foodbank = models.ForeignKey(Foodbank, on_delete=models.DO_NOTHING)
     foodbank_name = models.CharField(max_length=100, editable=False)
@@ -883,9 +934,6 @@ class FoodbankLocation(EditableModel, UUIDModel, PhysicalPlace):
                 schema_dict["seeks"] = seeks
         return schema_dict
 
-    def schema_org_str(self):
-        return json.dumps(self.schema_org(), indent=4, sort_keys=True)
-
     def full_name(self):
         return "%s, %s" % (self.name, self.foodbank.full_name())
 
@@ -928,7 +976,11 @@ class FoodbankLocation(EditableModel, UUIDModel, PhysicalPlace):
 
     def delete(self, *args, **kwargs):
 
+        MapPoint.remove_for(self)
+        SearchDocument.remove_for(self)
         super(FoodbankLocation, self).delete(*args, **kwargs)
+        record_change(self, "deleted")
+        queue_schema_org_update(constituency_ids = [self.parliamentary_constituency_id])
         # Resave the parent food bank
         self.foodbank.save(do_geoupdate=False)
 
@@ -957,6 +1009,9 @@ class FoodbankLocation(EditableModel, UUIDModel, PhysicalPlace):
         if self.phone_number:
             self.phone_number = self.phone_number.replace(" ","")
 
+        # Which, if it changes, needs to drop this location from its schema.org
+        old_constituency_id = self.parliamentary_constituency_id
+
         if do_geoupdate:
 
             # Photo?
@@ -995,14 +1050,36 @@ class FoodbankLocation(EditableModel, UUIDModel, PhysicalPlace):
             self.plus_code_compound = pluscodes["compound"]
             self.plus_code_global = pluscodes["global"]
 
+        self.update_schema_org_json()
+
+        adding = self._state.adding
+        public_changed = self.public_changed()
+        # Its marker on the food bank's map, and its own map
+        markers_changed = self.fields_changed("lat_lng", "boundary_geojson")
         super(FoodbankLocation, self).save(*args, **kwargs)
+        if public_changed:
+            record_change(self, "created" if adding else None)
+        MapPoint.update_for(self)
+        SearchDocument.update_for(self)
+
+        # The constituencies it's in and was in list it in their schema.org
+        queue_schema_org_update(constituency_ids = [old_constituency_id, self.parliamentary_constituency_id])
+
+        # The location's own map and the food bank's, for a move or a new boundary
+        if markers_changed:
+            queue_map_prerender(self.foodbank)
 
         # Resave the parent food bank
         if do_foodbank_resave:
             self.foodbank.save(do_geoupdate=False)
+        else:
+            # Which would have moved on the version its page fragments are cached under
+            Foodbank.objects.filter(id = self.foodbank_id).update(modified = timezone.now())
 
 
-class FoodbankDonationPoint(EditableModel, UUIDModel, PhysicalPlace):
+class FoodbankDonationPoint(PublicDataModel, EditableModel, UUIDModel, SchemaOrgModel, PhysicalPlace):
+
+    PRIVATE_FIELDS = ("modified", "edited", "schema_org_json")
 
     foodbank = models.ForeignKey(Foodbank, on_delete=models.DO_NOTHING)
     foodbank_name = models.CharField(max_length=100, editable=False)
@@ -1147,9 +1224,6 @@ class FoodbankDonationPoint(EditableModel, UUIDModel, PhysicalPlace):
 
         return schema_dict
 
-    def schema_org_str(self):
-        return json.dumps(self.schema_org(), indent=4, sort_keys=True)
-
     def opening_hours_days(self):
 
         if not self.opening_hours:
@@ -1261,7 +1335,10 @@ class FoodbankDonationPoint(EditableModel, UUIDModel, PhysicalPlace):
 
     def delete(self, *args, **kwargs):
 
+        MapPoint.remove_for(self)
+        SearchDocument.remove_for(self)
         super(FoodbankDonationPoint, self).delete(*args, **kwargs)
+        record_change(self, "deleted")
         # Resave the parent food bank
         self.foodbank.save(do_geoupdate=False)
 
@@ -1360,11 +1437,373 @@ class FoodbankDonationPoint(EditableModel, UUIDModel, PhysicalPlace):
             self.plus_code_compound = pluscodes["compound"]
             self.plus_code_global = pluscodes["global"]
 
+        self.update_schema_org_json()
+
+        adding = self._state.adding
+        public_changed = self.public_changed()
+        # Its marker on the food bank's map
+        markers_changed = self.fields_changed("lat_lng")
         super(FoodbankDonationPoint, self).save(*args, **kwargs)
+        if public_changed:
+            record_change(self, "created" if adding else None)
+        MapPoint.update_for(self)
+        SearchDocument.update_for(self)
 
         # Decache donation points API
-        decache_async.enqueue(prefixes=["/api/3/donationpoints/"])
+        queue_decache(prefixes=["/api/3/donationpoints/"])
+
+        if markers_changed:
+            queue_map_prerender(self.foodbank)
 
         # Resave the parent food bank
         if do_foodbank_resave:
             self.foodbank.save(do_geoupdate=False)
+        else:
+            # Which would have moved on the version its page fragments are cached under
+            Foodbank.objects.filter(id = self.foodbank_id).update(modified = timezone.now())
+
+
+class MapPoint(models.Model):
+    """
+    A point on the map: a food bank, its delivery address, a location or a
+    donation point.
+
+    The GeoJSON, sitemap and country pages used to query all three tables
+    and stitch them together. This is a copy of just what they need, kept
+    up to date from save() and delete() on each, so they read one table in
+    one query. url is stored without a language prefix -- url_path() adds
+    it. manage.py rebuild_map_points refills it from scratch.
+    """
+
+    point_type = models.CharField(max_length=20, choices=MAP_POINT_TYPES_CHOICES)
+    # The id of the food bank, location or donation point, going by point_type
+    object_id = models.BigIntegerField()
+
+    foodbank = models.ForeignKey(Foodbank, on_delete=models.DO_NOTHING)
+    foodbank_name = models.CharField(max_length=100)
+    foodbank_slug = models.CharField(max_length=100)
+
+    name = models.CharField(max_length=100)
+    alt_name = models.CharField(max_length=100, null=True, blank=True)
+    slug = models.CharField(max_length=100)
+    address = models.TextField(blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    country = models.CharField(max_length=50, choices=COUNTRIES_CHOICES)
+    parliamentary_constituency_slug = models.CharField(max_length=50, null=True, blank=True)
+    is_closed = models.BooleanField(default=False)
+    is_area = models.BooleanField(default=False)
+    url = models.CharField(max_length=255)
+
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'givefood'
+        constraints = [
+            models.UniqueConstraint(fields=['point_type', 'object_id'], name='mappoint_type_object_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['parliamentary_constituency_slug'], name='mappoint_parlcon_slug_idx'),
+            models.Index(fields=['country', 'is_closed'], name='mappoint_country_closed_idx'),
+        ]
+
+    def __str__(self):
+        return "%s %s" % (self.point_type, self.name)
+
+    @classmethod
+    def points_for(cls, obj):
+        """
+        The points a food bank, location or donation point puts on the map,
+        unsaved.
+
+        Only fields on obj itself are read, not its food bank, so a rebuild
+        doesn't query per row.
+        """
+        model_name = obj._meta.model_name
+        common = {
+            "object_id": obj.id,
+            "latitude": obj.latitude,
+            "longitude": obj.longitude,
+            "country": obj.country,
+            "parliamentary_constituency_slug": obj.parliamentary_constituency_slug,
+            "is_closed": obj.is_closed,
+        }
+
+        with override(LANGUAGE_CODE):
+            if model_name == "foodbank":
+                url = reverse("wfbn:foodbank", kwargs={"slug":obj.slug})
+                foodbank = {
+                    "foodbank_id": obj.id,
+                    "foodbank_name": obj.name,
+                    "foodbank_slug": obj.slug,
+                    "name": obj.name,
+                    "alt_name": obj.alt_name,
+                    "slug": obj.slug,
+                    "url": url,
+                }
+                points = [cls(point_type = "foodbank", address = obj.full_address(), **foodbank, **common)]
+                if obj.delivery_address and obj.delivery_lat_lng:
+                    lat, lng = obj.delivery_lat_lng.split(",")
+                    common.update(latitude = float(lat), longitude = float(lng))
+                    points.append(cls(point_type = "delivery", address = obj.delivery_address, **foodbank, **common))
+                return points
+
+            if model_name == "foodbanklocation":
+                point_type = "location"
+                url = reverse("wfbn:foodbank_location", kwargs={"slug":obj.foodbank_slug, "locslug":obj.slug})
+            else:
+                point_type = "donationpoint"
+                url = reverse("wfbn:foodbank_donationpoint", kwargs={"slug":obj.foodbank_slug, "dpslug":obj.slug})
+
+        return [cls(
+            point_type = point_type,
+            foodbank_id = obj.foodbank_id,
+            foodbank_name = obj.foodbank_name,
+            foodbank_slug = obj.foodbank_slug,
+            name = obj.name,
+            slug = obj.slug,
+            address = obj.full_address(),
+            is_area = bool(getattr(obj, "boundary_geojson", None)),
+            url = url,
+            **common,
+        )]
+
+    @classmethod
+    def point_types_for(cls, obj):
+        if obj._meta.model_name == "foodbank":
+            return ["foodbank", "delivery"]
+        return [DATA_CHANGE_TYPES[obj._meta.model_name]]
+
+    @classmethod
+    def update_for(cls, obj):
+        """Upsert obj's points, and drop a delivery address that's gone."""
+        points = cls.points_for(obj)
+        stale_types = set(cls.point_types_for(obj)) - {point.point_type for point in points}
+        if stale_types:
+            cls.objects.filter(point_type__in = stale_types, object_id = obj.id).delete()
+        cls.objects.bulk_create(
+            points,
+            update_conflicts = True,
+            unique_fields = ["point_type", "object_id"],
+            update_fields = [
+                field.name for field in cls._meta.concrete_fields
+                if field.name not in ("id", "point_type", "object_id")
+            ],
+        )
+
+    @classmethod
+    def remove_for(cls, obj):
+        cls.objects.filter(point_type__in = cls.point_types_for(obj), object_id = obj.id).delete()
+
+    def full_name(self):
+        if self.point_type == "foodbank":
+            return foodbank_full_name(self.name, self.alt_name)
+        if self.point_type == "delivery":
+            return "%s Delivery Address" % (foodbank_full_name(self.name, self.alt_name))
+        return self.name
+
+    def map_order(self):
+        """Food banks, then locations, then donation points, which are drawn on top."""
+        return MAP_POINT_ORDER[self.point_type]
+
+    def url_path(self):
+        """The page's URL in the current language."""
+        language = get_language()
+        if language and language != LANGUAGE_CODE:
+            return "/%s%s" % (language, self.url)
+        return self.url
+
+    def geojson_feature(self, decimal_places = 6, address = True):
+        """The point as a GeoJSON Feature, as the maps in gfwfbn read them."""
+        properties = {
+            "type": MAP_POINT_TYPES[self.point_type],
+            "name": self.full_name(),
+        }
+        if self.point_type in ("location", "donationpoint"):
+            properties["foodbank"] = self.foodbank_name
+        if address:
+            properties["address"] = self.address
+        properties["url"] = self.url_path()
+        return {
+            "type": "Feature",
+            "geometry": {
+                "type": "Point",
+                "coordinates": [round(self.longitude, decimal_places), round(self.latitude, decimal_places)],
+            },
+            "properties": properties,
+        }
+
+
+class SearchDocument(models.Model):
+    """
+    What the admin search finds a food bank, location, donation point,
+    constituency, need or subscription by.
+
+    The search used to run a query per model, each an OR of icontains over
+    up to twelve columns, which scanned the needs and subscriber tables
+    whole. This is a copy of just the searched text of each, kept up to date
+    from save() and delete() like MapPoint, and searched in one query by
+    search(). The text is matched by words through search_vector, which
+    Postgres keeps from title and text, and as a substring through a
+    trigram index, which finds the parts of postcodes, emails and URLs the
+    old search did. manage.py rebuild_search_index refills it from scratch.
+    """
+
+    doc_type = models.CharField(max_length=20, choices=SEARCH_DOCUMENT_TYPES_CHOICES)
+    # The id of the object, going by doc_type
+    object_id = models.BigIntegerField()
+    foodbank = models.ForeignKey(Foodbank, on_delete=models.DO_NOTHING, null=True, blank=True)
+
+    title = models.CharField(max_length=255)
+    # Every searched field, a line each
+    text = models.TextField()
+    # Breaks ties in rank, newest first
+    created = models.DateTimeField(null=True, blank=True)
+
+    search_vector = models.GeneratedField(
+        expression=SearchVector("title", weight="A", config="simple") + SearchVector("text", weight="B", config="simple"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        app_label = 'givefood'
+        constraints = [
+            models.UniqueConstraint(fields=['doc_type', 'object_id'], name='searchdoc_type_object_uniq'),
+        ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='searchdoc_vector_idx'),
+            # Serves text__icontains, which is UPPER(text) LIKE '%SUBSTR%' (requires pg_trgm)
+            GinIndex(OpClass(Upper('text'), name='gin_trgm_ops'), name='searchdoc_text_upper_trgm'),
+        ]
+
+    def __str__(self):
+        return "%s %s" % (self.doc_type, self.title)
+
+    @classmethod
+    def document_for(cls, obj):
+        """
+        The document obj is found by, unsaved, or None if it shouldn't be
+        found. Only fields on obj itself are read.
+        """
+        model_name = obj._meta.model_name
+        doc_type = SEARCH_DOCUMENT_TYPES[model_name]
+
+        if model_name == "foodbank":
+            title = obj.name
+            fields = [
+                obj.slug, obj.name, obj.address, obj.postcode, obj.url, obj.shopping_list_url, obj.rss_url,
+                obj.news_url, obj.donation_points_url, obj.locations_url, obj.contacts_url, obj.charity_name,
+            ]
+        elif model_name == "foodbanklocation":
+            title = obj.name
+            fields = [obj.slug, obj.name, obj.address, obj.postcode]
+        elif model_name == "foodbankdonationpoint":
+            title = obj.name
+            fields = [obj.name, obj.address, obj.postcode]
+        elif model_name == "parliamentaryconstituency":
+            title = obj.name
+            fields = [obj.name, obj.mp]
+        elif model_name == "foodbankchange":
+            title = obj.foodbank_name or ""
+            fields = [obj.change_text, obj.excess_change_text]
+        elif model_name == "foodbanksubscriber":
+            if not obj.confirmed:
+                return None
+            title = obj.email
+            fields = [obj.email]
+        elif model_name == "whatsappsubscriber":
+            title = obj.phone_number
+            fields = [obj.phone_number]
+        elif model_name == "mobilesubscriber":
+            title = obj.device_id
+            fields = [obj.device_id]
+        else:
+            title = obj.endpoint
+            fields = [obj.endpoint]
+
+        return cls(
+            doc_type = doc_type,
+            object_id = obj.id,
+            foodbank_id = obj.id if model_name == "foodbank" else getattr(obj, "foodbank_id", None),
+            title = (title or "")[:255],
+            text = "\n".join(field for field in fields if field),
+            created = getattr(obj, "created", None),
+        )
+
+    @classmethod
+    def update_for(cls, *objs):
+        """Upsert the documents of objs, and drop those that shouldn't be found any more."""
+        documents = []
+        stale = []
+        for obj in objs:
+            document = cls.document_for(obj)
+            if document:
+                documents.append(document)
+            else:
+                stale.append(obj)
+        for obj in stale:
+            cls.remove_for(obj)
+        cls.objects.bulk_create(
+            documents,
+            update_conflicts = True,
+            unique_fields = ["doc_type", "object_id"],
+            update_fields = ["foodbank", "title", "text", "created"],
+        )
+
+    @classmethod
+    def remove_for(cls, obj):
+        cls.objects.filter(doc_type = SEARCH_DOCUMENT_TYPES[obj._meta.model_name], object_id = obj.id).delete()
+
+    @classmethod
+    def search(cls, query, limit = 100):
+        """
+        What query finds, as {doc_type: [object, ...]}, best match first and
+        up to limit of each type.
+
+        The documents are matched and ranked in one query, then each type's
+        objects are loaded by id. Matches by word rank above matches only
+        within a word, and ties go to the newest.
+        """
+        from givefood.models.political import ParliamentaryConstituency
+        from givefood.models.needs import FoodbankChange
+        from givefood.models.subscribers import (
+            FoodbankSubscriber, MobileSubscriber, WebPushSubscription, WhatsappSubscriber,
+        )
+
+        querysets = {
+            "foodbank": Foodbank.objects.all(),
+            "location": FoodbankLocation.objects.all(),
+            "donationpoint": FoodbankDonationPoint.objects.all(),
+            "constituency": ParliamentaryConstituency.objects.all(),
+            "need": FoodbankChange.objects.all(),
+            "email": FoodbankSubscriber.objects.filter(confirmed = True).select_related("foodbank"),
+            "whatsapp": WhatsappSubscriber.objects.select_related("foodbank"),
+            "mobile": MobileSubscriber.objects.select_related("foodbank"),
+            "webpush": WebPushSubscription.objects.select_related("foodbank"),
+        }
+        results = {doc_type: [] for doc_type in querysets}
+        if not query:
+            return results
+
+        search_query = SearchQuery(query, config = "simple", search_type = "websearch")
+        rank = SearchRank(F("search_vector"), search_query)
+        matches = cls.objects.filter(
+            Q(search_vector = search_query) | Q(text__icontains = query)
+        ).annotate(
+            row = Window(
+                RowNumber(),
+                partition_by = F("doc_type"),
+                order_by = [rank.desc(), F("created").desc(nulls_last = True), F("id").desc()],
+            ),
+        ).filter(row__lte = limit).order_by("doc_type", "row").values_list("doc_type", "object_id")
+
+        object_ids = {}
+        for doc_type, object_id in matches:
+            object_ids.setdefault(doc_type, []).append(object_id)
+
+        for doc_type, ids in object_ids.items():
+            # A document whose object has gone, through a queryset delete, is skipped
+            objects = querysets[doc_type].in_bulk(ids)
+            results[doc_type] = [objects[object_id] for object_id in ids if object_id in objects]
+        return results
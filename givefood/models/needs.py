@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import hashlib
 import unicodedata
 import uuid
 
@@ -18,10 +19,10 @@ from givefood.const.general import (
 from givefood.const.item_types import (
     ITEM_CATEGORIES_CHOICES, ITEM_CATEGORY_GROUPS, ITEM_GROUPS_CHOICES,
 )
-from givefood.models.base import TimestampedModel
-from givefood.models.foodbank import Foodbank
-from givefood.settings import LANGUAGES, LANGUAGES_SKIP_TRANSLATE
-from givefood.utils.general import translate_need_async
+from givefood.models.base import CreatedModel, PublicDataModel, TimestampedModel
+from givefood.models.foodbank import Foodbank, SearchDocument
+from givefood.utils.cache import record_change
+from givefood.utils.general import translate_needs_async
 from givefood.utils.text import clean_foodbank_need_text, diff_html
 
 
@@ -47,10 +48,16 @@ class FoodbankDiscrepancy(TimestampedModel):
         super(FoodbankDiscrepancy, self).save(*args, **kwargs)
 
 
-class FoodbankChange(TimestampedModel):
+class FoodbankChange(PublicDataModel, TimestampedModel):
 
     # This is known on the frontend as a 'need'
 
+    # Only the text, the food bank and whether it's published are in the API
+    PRIVATE_FIELDS = (
+        "modified", "distill_id", "name", "uri", "change_text_original", "excess_change_text_original",
+        "nonpertinent", "notified", "input_method", "is_categorised",
+    )
+
     need_id = models.UUIDField(default=uuid.uuid4, editable=False)
     need_id_str = models.CharField(max_length=36, editable=False)
 
@@ -296,9 +303,18 @@ class FoodbankChange(TimestampedModel):
         if self.excess_change_text:
             self.excess_change_text = clean_foodbank_need_text(self.excess_change_text)
 
+        public_changed = self.public_changed()
+        was_published = self.loaded_value("published", False)
         super(FoodbankChange, self).save(*args, **kwargs)
-
-        if self.foodbank and self.published and do_foodbank_save:
+        if self.published and public_changed:
+            record_change(self, "updated" if was_published else "created")
+        elif was_published and not self.published:
+            # Gone from the API, so consumers drop it as if deleted
+            record_change(self, "deleted")
+        SearchDocument.update_for(self)
+
+        # Unpublishing changes the food bank's latest need too
+        if self.foodbank and (self.published or was_published) and do_foodbank_save:
             self.foodbank.save(do_geoupdate=False)
 
         # Translation behavior:
@@ -311,16 +327,17 @@ class FoodbankChange(TimestampedModel):
             do_translate = self.published
 
         if self.published and do_translate:
-            for language in LANGUAGES:
-                language_code = language[0]
-                if language_code != "en" and language_code not in LANGUAGES_SKIP_TRANSLATE:
-                    translate_need_async.enqueue(language_code, self.need_id_str)
+            # One task for every language, rather than one per language
+            translate_needs_async.enqueue([self.need_id_str])
 
     def delete(self, *args, **kwargs):
 
         FoodbankChangeLine.objects.filter(need = self).delete()
         FoodbankChangeTranslation.objects.filter(need = self).delete()
+        SearchDocument.remove_for(self)
         super(FoodbankChange, self).delete(*args, **kwargs)
+        if self.published:
+            record_change(self, "deleted")
         if self.foodbank:
             if self.published:
                 self.foodbank.save(do_geoupdate=False)
@@ -336,8 +353,8 @@ class FoodbankChange(TimestampedModel):
             # need endpoint all get() on it.
             models.Index(fields=['need_id'], name='need_need_id_idx'),
             # need_id_str is the same value again, and it is what the async
-            # tasks look up by. Publishing one need enqueues a translate task
-            # per language, so this get() runs ~20 times per publish.
+            # tasks look up by. translate_needs_async filters a batch of
+            # needs on it with need_id_str__in.
             models.Index(fields=['need_id_str'], name='need_need_id_str_idx'),
         ]
 
@@ -346,7 +363,7 @@ class FoodbankChangeTranslation(models.Model):
 
     need = models.ForeignKey(FoodbankChange, editable=False, on_delete=models.DO_NOTHING)
     foodbank = models.ForeignKey(Foodbank, editable=False, on_delete=models.DO_NOTHING)
-    language = models.CharField(max_length = 2)
+    language = models.CharField(max_length = 10)
     change_text = models.TextField()
     excess_change_text = models.TextField(null=True, blank=True)
 
@@ -358,6 +375,64 @@ class FoodbankChangeTranslation(models.Model):
         app_label = 'givefood'
 
 
+class TranslationMemory(CreatedModel):
+    """
+    One line of need text, translated into one language.
+
+    Shopping list lines like "Tinned Fish" or "UHT Milk" repeat across
+    thousands of needs, so needs are translated a line at a time and each
+    line is only ever sent to Google once per language.
+    """
+
+    source = models.TextField()
+    source_hash = models.CharField(max_length=64, editable=False)
+    language = models.CharField(max_length=10)
+    translation = models.TextField()
+
+    def __str__(self):
+        return "%s - %s" % (self.language, self.source)
+
+    @staticmethod
+    def normalise(line):
+        return " ".join(line.split())
+
+    @staticmethod
+    def hash(source):
+        # Rather than the source itself, which a long line would take past
+        # the size a btree index entry can be
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def recall(cls, languages, sources):
+        """The remembered translations of the normalised sources into the languages, keyed by (language, source)."""
+        hashes = [cls.hash(source) for source in sources]
+        return {
+            (language, source): translation
+            for language, source, translation in cls.objects.filter(
+                language__in = languages, source_hash__in = hashes,
+            ).values_list("language", "source", "translation")
+        }
+
+    @classmethod
+    def remember(cls, translations):
+        """Store a dict of (language, normalised source) to translation. Lines remembered meanwhile are left as they are."""
+        cls.objects.bulk_create([
+            cls(source = source, source_hash = cls.hash(source), language = language, translation = translation)
+            for (language, source), translation in translations.items()
+        ], ignore_conflicts = True)
+
+    def save(self, *args, **kwargs):
+        self.source = self.normalise(self.source)
+        self.source_hash = self.hash(self.source)
+        super(TranslationMemory, self).save(*args, **kwargs)
+
+    class Meta:
+        app_label = 'givefood'
+        constraints = [
+            models.UniqueConstraint(fields=['language', 'source_hash'], name='translationmemory_lang_hash_uniq'),
+        ]
+
+
 
 class FoodbankChangeLine(models.Model):
 
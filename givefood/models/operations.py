@@ -3,6 +3,7 @@
 
 from django.db import models
 
+from givefood.const.general import DATA_CHANGE_ACTIONS_CHOICES, DATA_CHANGE_TYPES_CHOICES, DATA_VERSION_SCOPES_CHOICES
 from givefood.models.base import CreatedModel, TimestampedModel
 from givefood.models.foodbank import Foodbank
 
@@ -14,6 +15,35 @@ class CharityYear(CreatedModel):
     income = models.IntegerField(null=True, blank=True, help_text="Income in pounds")
     expenditure = models.IntegerField(null=True, blank=True, help_text="Expenditure in pounds")
 
+    class Meta:
+        constraints = [
+            # One figure per food bank per year, so the register load can upsert on it
+            models.UniqueConstraint(fields=["foodbank", "date"], name="charityyear_foodbank_date_uniq"),
+        ]
+
+
+class AIResponse(CreatedModel):
+    """
+    A reply from Gemini or OpenRouter, kept so the same request is answered again without calling them.
+
+    Keyed by a hash of everything that decides the reply: the provider, the
+    model, the prompt, the response schema, the temperature and the seed. See
+    givefood.utils.ai.
+    """
+
+    key = models.CharField(max_length=64, unique=True)
+    provider = models.CharField(max_length=20)
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    hits = models.PositiveIntegerField(default=0)
+    last_hit = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'givefood'
+
 
 class GfCredential(CreatedModel):
 
@@ -41,6 +71,95 @@ class Dump(CreatedModel):
         super(Dump, self).save(*args, **kwargs)
 
 
+class DataVersion(models.Model):
+    """
+    A counter of changes to one type of public data.
+
+    There's a row for each of food banks, locations, donation points, needs
+    and constituencies, bumped when a save or delete changes what the API
+    shows of one. The API and GeoJSON views build their ETag, Last-Modified
+    and cache key from the rows for the data they read, so a conditional
+    request is answered without running the view's querysets, and a change
+    to needs leaves the cached constituency pages alone.
+    """
+
+    scope = models.CharField(max_length=20, choices=DATA_VERSION_SCOPES_CHOICES, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = 'givefood'
+
+
+class DataChange(CreatedModel):
+    """
+    One entry in the append-only log behind /api/2/changes/.
+
+    A row is written from save() when it changes something public, and from
+    delete(), on food banks, locations, donation points and published
+    needs. The id is the feed's cursor, so consumers page through it in the
+    order the changes were made. Rows are kept for 90 days, by the
+    prune_changes command.
+    """
+
+    object_type = models.CharField(max_length=20, choices=DATA_CHANGE_TYPES_CHOICES)
+    action = models.CharField(max_length=10, choices=DATA_CHANGE_ACTIONS_CHOICES)
+    object_uuid = models.UUIDField()
+    slug = models.CharField(max_length=100, null=True, blank=True)
+    foodbank_slug = models.CharField(max_length=100, null=True, blank=True)
+
+    class Meta:
+        app_label = 'givefood'
+
+
+class TaskQueueBucket(models.Model):
+    """
+    The token bucket limiting how fast a task queue's tasks start.
+
+    Shared by every worker process, and taken from and refilled in one
+    statement by givefood.utils.tasks.take_token.
+    """
+
+    queue_name = models.CharField(max_length=32, unique=True)
+    tokens = models.FloatField()
+    updated = models.DateTimeField()
+
+    class Meta:
+        app_label = 'givefood'
+
+
+class CachePurge(models.Model):
+    """
+    A URL or prefix waiting to be purged from the CDN, or purged recently.
+
+    Saves add what they've changed here rather than purging it themselves,
+    and givefood.utils.cache.purge_pending sends everything waiting at once.
+    There's only one waiting row for each path, so a path changed by many
+    saves in a row is purged once. A purge claims the rows it's sending,
+    which takes them out of waiting, so a path changed again while they're
+    being sent waits for the next purge rather than being taken as sent.
+    """
+
+    path = models.CharField(max_length=500)
+    is_prefix = models.BooleanField(default=False)
+    created = models.DateTimeField(auto_now_add=True)
+    claimed = models.DateTimeField(null=True, blank=True)
+    purged = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        app_label = 'givefood'
+        constraints = [
+            models.UniqueConstraint(
+                fields=["path", "is_prefix"],
+                condition=models.Q(claimed__isnull=True, purged__isnull=True),
+                name="cachepurge_waiting_uniq",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["purged"], name="cachepurge_purged_idx"),
+        ]
+
+
 class SlugRedirect(TimestampedModel):
 
     old_slug = models.CharField(max_length=200, unique=True, db_index=True)
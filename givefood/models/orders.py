@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import hashlib
 import html
 from datetime import datetime
 
@@ -20,8 +21,8 @@ from givefood.const.item_types import (
 from givefood.models.base import TimestampedModel
 from givefood.models.foodbank import Foodbank
 from givefood.utils.ai import gemini
-from givefood.utils.cache import decache_async
-from givefood.utils.text import get_calories
+from givefood.utils.cache import queue_decache
+from givefood.utils.text import get_calories, get_item_calories
 
 
 class Order(TimestampedModel):
@@ -29,6 +30,7 @@ class Order(TimestampedModel):
     order_id = models.CharField(max_length=100, editable=False)
     foodbank = models.ForeignKey(Foodbank, null=True, blank=True, on_delete=models.SET_NULL)
     items_text = models.TextField()
+    items_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
     need = models.ForeignKey("FoodbankChange", null=True, blank=True, on_delete=models.DO_NOTHING)
     country = models.CharField(max_length=50, choices=COUNTRIES_CHOICES, editable=False)
     order_group = models.ForeignKey("OrderGroup", null=True, blank=True, on_delete=models.DO_NOTHING)
@@ -94,10 +96,20 @@ class Order(TimestampedModel):
             order_line.delete()
         super(Order, self).delete(*args, **kwargs)
 
-    def save(self, do_foodbank_save = True, *args, **kwargs):
+    @staticmethod
+    def hash_items_text(items_text):
+        return hashlib.sha256(items_text.encode("utf-8")).hexdigest()
+
+    def save(self, do_foodbank_save = True, do_reparse = False, *args, **kwargs):
         # Save first to get an ID if this is a new order
         is_new = self.pk is None
 
+        # The lines, and the totals from them, are only worked out again when the text they're parsed
+        # from has changed, so resaving an order for anything else doesn't go to Gemini or rewrite them.
+        # do_reparse does it anyway, e.g. after an item's calories have been corrected.
+        items_hash = self.hash_items_text(self.items_text)
+        reparse = is_new or do_reparse or items_hash != self.items_hash
+
         # For new unassigned orders, use a temporary unique order_id
         if is_new and not self.foodbank:
             import uuid as uuid_module
@@ -115,11 +127,12 @@ class Order(TimestampedModel):
             0,
         )
 
-        self.weight = 0
-        self.calories = 0
-        self.cost = 0
-        self.no_lines = 0
-        self.no_items = 0
+        if reparse:
+            self.weight = 0
+            self.calories = 0
+            self.cost = 0
+            self.no_lines = 0
+            self.no_items = 0
 
         # Denorm country
         if self.foodbank:
@@ -129,9 +142,38 @@ class Order(TimestampedModel):
 
         super(Order, self).save(*args, **kwargs)
 
-        # Delete all the existing orderlines
-        order_lines = OrderLine.objects.filter(order = self).delete()
+        if reparse:
+            self.update_lines(items_hash, *args, **kwargs)
+        else:
+            # Lines carry the delivery date, which may be all that's changed
+            OrderLine.objects.filter(order = self).exclude(delivery_date = self.delivery_date).update(delivery_date = self.delivery_date)
+
+        # Update order_id for new unassigned orders now that we have a pk
+        if is_new and not self.foodbank:
+            provider_slug = slugify(self.delivery_provider) if self.delivery_provider else "none"
+            self.order_id = f"gf-unassigned-{self.pk}-{provider_slug}-{self.delivery_date}"
+            # Use update to avoid recursive save calls
+            Order.objects.filter(pk=self.pk).update(order_id=self.order_id)
+
+        # Update last order date on foodbank. Only the admin shows it, so it's written on its own
+        # rather than resaving the food bank, which would decache and rebuild everything about it.
+        if do_foodbank_save and self.foodbank:
+            last_order = Order.objects.filter(foodbank = self.foodbank).order_by("-delivery_datetime").values_list("delivery_date", flat = True).first()
+            if last_order != self.foodbank.last_order:
+                Foodbank.objects.filter(id = self.foodbank.id).update(last_order = last_order)
+                self.foodbank.last_order = last_order
+
+        # Decache OrderGroup public pages if this order belongs to a public OrderGroup
+        if self.order_group and self.order_group.public:
+            urls = [
+                reverse("managed_donation", kwargs={"slug": self.order_group.slug, "key": self.order_group.key}),
+                reverse("managed_donation_geojson", kwargs={"slug": self.order_group.slug, "key": self.order_group.key}),
+                reverse("managed_donation_items", kwargs={"slug": self.order_group.slug, "key": self.order_group.key}),
+            ]
+            queue_decache(urls)
 
+    def update_lines(self, items_hash, *args, **kwargs):
+        """Parse items_text into lines, replace the order's lines with them in one insert, and total them up."""
         # Parse the order text
         prompt = render_to_string(
             "admin/prompts/orderline_prompt.txt",
@@ -142,6 +184,8 @@ class Order(TimestampedModel):
         order_lines = gemini(
             prompt = prompt,
             temperature = 1,
+            caller = "order_lines",
+            cache = True,
             response_mime_type= "application/json",
             response_schema = {
                 "type": "array",
@@ -164,6 +208,15 @@ class Order(TimestampedModel):
         order_cost = 0
         order_items = 0
 
+        for order_line in order_lines:
+            order_line["name"] = html.unescape(order_line["name"])
+
+        # Every line's calories and category from a query or two, rather than a few for each line
+        names = [order_line["name"] for order_line in order_lines]
+        item_calories = get_item_calories(names)
+        categories = OrderLine.categories(names)
+
+        new_order_lines = []
         for order_line in order_lines:
 
             line_weight = 0
@@ -171,19 +224,15 @@ class Order(TimestampedModel):
 
             line_weight = order_line["weight"] * order_line["quantity"]
             line_cost = order_line["item_cost"] * order_line["quantity"]
-            order_line["name"] = html.unescape(order_line["name"])
-
-            try:
-                order_line["calories"] = get_calories(order_line["name"], order_line["weight"], order_line["quantity"])
-            except OrderLine.DoesNotExist:
-                order_line["calories"] = 0
+            order_line["calories"] = get_calories(order_line["name"], order_line["weight"], order_line["quantity"], item_calories)
 
             order_cost = order_cost + line_cost
             order_items = order_items + order_line["quantity"]
             order_calories = order_calories + order_line["calories"]
             order_weight = order_weight + line_weight
 
-            new_order_line = OrderLine(
+            category = categories[order_line["name"]]
+            new_order_lines.append(OrderLine(
                 order = self,
                 name = order_line.get("name"),
                 quantity = order_line["quantity"],
@@ -191,8 +240,15 @@ class Order(TimestampedModel):
                 line_cost = line_cost,
                 weight = line_weight,
                 calories = order_line["calories"],
-            )
-            new_order_line.save()
+                category = category,
+                group = ITEM_CATEGORY_GROUPS.get(category, "Other"),
+                delivery_date = self.delivery_date,
+            ))
+
+        # Only now, so the lines being replaced could categorise their replacements.
+        # bulk_create skips OrderLine.save(), so the lines have everything it would have set.
+        OrderLine.objects.filter(order = self).delete()
+        OrderLine.objects.bulk_create(new_order_lines)
 
         # Order aggregated stats
         self.weight = order_weight
@@ -200,30 +256,10 @@ class Order(TimestampedModel):
         self.cost = order_cost
         self.no_lines = len(order_lines)
         self.no_items = order_items
+        self.items_hash = items_hash
 
         super(Order, self).save(*args, **kwargs)
 
-        # Update order_id for new unassigned orders now that we have a pk
-        if is_new and not self.foodbank:
-            provider_slug = slugify(self.delivery_provider) if self.delivery_provider else "none"
-            self.order_id = f"gf-unassigned-{self.pk}-{provider_slug}-{self.delivery_date}"
-            # Use update to avoid recursive save calls
-            Order.objects.filter(pk=self.pk).update(order_id=self.order_id)
-
-        # Update last order date on foodbank
-        if do_foodbank_save and self.foodbank:
-            self.foodbank.last_order = Order.objects.filter(foodbank = self.foodbank).order_by("-delivery_date")[0].delivery_date
-            self.foodbank.save(do_geoupdate=False)
-
-        # Decache OrderGroup public pages if this order belongs to a public OrderGroup
-        if self.order_group and self.order_group.public:
-            urls = [
-                reverse("managed_donation", kwargs={"slug": self.order_group.slug, "key": self.order_group.key}),
-                reverse("managed_donation_geojson", kwargs={"slug": self.order_group.slug, "key": self.order_group.key}),
-                reverse("managed_donation_items", kwargs={"slug": self.order_group.slug, "key": self.order_group.key}),
-            ]
-            decache_async.enqueue(urls)
-
     def lines(self):
         return OrderLine.objects.filter(order = self).order_by("-weight")
 
@@ -245,35 +281,53 @@ class OrderLine(models.Model):
 
     delivery_date = models.DateField(editable=False)
 
-    def save(self, *args, **kwargs):
+    @staticmethod
+    def categories(names):
+        """
+        The category for each item name.
+
+        From the latest order line with the same name, then the latest need
+        line with it, and only if neither has been categorised from Gemini.
+        """
         from givefood.models.needs import FoodbankChangeLine
+
+        names = set(names)
+        if not names:
+            return {}
+        categories = dict(
+            OrderLine.objects.filter(name__in=names).exclude(category="").order_by("name", "-id").distinct("name").values_list("name", "category")
+        )
+        uncategorised = names - set(categories)
+        if uncategorised:
+            categories.update(
+                FoodbankChangeLine.objects.filter(item__in=uncategorised).exclude(category="").order_by("item", "-created").distinct("item").values_list("item", "category")
+            )
+        for name in sorted(names - set(categories)):
+            prompt = render_to_string(
+                "categorisation_prompt.txt",
+                {
+                    "item": name,
+                    "item_categories": ITEM_CATEGORIES,
+                }
+            )
+            ai_response = gemini(
+                prompt=prompt,
+                temperature=0.1,
+                caller="orderline_category",
+                cache=True,
+            )
+            if ai_response in ITEM_CATEGORIES:
+                categories[name] = ai_response
+            else:
+                categories[name] = "Other"
+        return categories
+
+    def save(self, *args, **kwargs):
         self.delivery_date = self.order.delivery_date
         if self.quantity:
             self.item_cost = self.line_cost // self.quantity
         if not self.category:
-            try:
-                prev_line = OrderLine.objects.filter(name=self.name).exclude(category="").latest("id")
-                self.category = prev_line.category
-            except OrderLine.DoesNotExist:
-                try:
-                    prev_need_line = FoodbankChangeLine.objects.filter(item=self.name).exclude(category="").latest("created")
-                    self.category = prev_need_line.category
-                except FoodbankChangeLine.DoesNotExist:
-                    prompt = render_to_string(
-                        "categorisation_prompt.txt",
-                        {
-                            "item": self.name,
-                            "item_categories": ITEM_CATEGORIES,
-                        }
-                    )
-                    ai_response = gemini(
-                        prompt=prompt,
-                        temperature=0.1,
-                    )
-                    if ai_response in ITEM_CATEGORIES:
-                        self.category = ai_response
-                    else:
-                        self.category = "Other"
+            self.category = OrderLine.categories([self.name])[self.name]
             if not self.group:
                 self.group = ITEM_CATEGORY_GROUPS.get(self.category, "Other")
         super(OrderLine, self).save(*args, **kwargs)
@@ -1,17 +1,21 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import json
 from urllib.parse import quote_plus
 
 from django.db import models
 from django.template.defaultfilters import slugify
 
 from givefood.const.general import COUNTRIES_CHOICES
+from givefood.models.base import PublicDataModel, SchemaOrgModel
+from givefood.models.foodbank import SearchDocument
+from givefood.utils.cache import bump_data_version
 from givefood.utils.geo import find_parlcons, geojson_dict
 
 
-class ParliamentaryConstituency(models.Model):
+class ParliamentaryConstituency(PublicDataModel, SchemaOrgModel):
+
+    PRIVATE_FIELDS = ("schema_org_json",)
 
     name = models.CharField(max_length=50, null=True, blank=True)
     slug = models.CharField(max_length=50, editable=False)
@@ -67,9 +71,6 @@ class ParliamentaryConstituency(models.Model):
 
         return schema_dict
 
-    def schema_org_str(self):
-        return json.dumps(self.schema_org(), indent=4, sort_keys=True)
-
     def boundary_geojson_dict(self):
         return geojson_dict(self.boundary_geojson)
 
@@ -161,7 +162,15 @@ class ParliamentaryConstituency(models.Model):
         self.latitude = self.centroid.split(",")[0]
         self.longitude = self.centroid.split(",")[1]
 
+        public_changed = self.public_changed()
         super(ParliamentaryConstituency, self).save(*args, **kwargs)
+        if public_changed:
+            bump_data_version("constituency")
+        SearchDocument.update_for(self)
+
+        # After saving, as it's built from the food banks and locations in it
+        if self.update_schema_org_json():
+            ParliamentaryConstituency.objects.filter(id = self.id).update(schema_org_json = self.schema_org_json)
 
     class Meta:
         app_label = 'givefood'
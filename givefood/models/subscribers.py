@@ -8,7 +8,7 @@ from django.template.defaultfilters import slugify
 from django.utils import timezone
 
 from givefood.models.base import CreatedModel
-from givefood.models.foodbank import Foodbank, FoodbankDonationPoint
+from givefood.models.foodbank import Foodbank, FoodbankDonationPoint, SearchDocument
 from givefood.models.political import ParliamentaryConstituency
 from givefood.utils.cache import get_cred
 
@@ -59,6 +59,12 @@ class FoodbankSubscriber(CreatedModel):
         self.foodbank_name = self.foodbank.name
 
         super(FoodbankSubscriber, self).save(*args, **kwargs)
+        # Found by the admin search once confirmed
+        SearchDocument.update_for(self)
+
+    def delete(self, *args, **kwargs):
+        SearchDocument.remove_for(self)
+        super(FoodbankSubscriber, self).delete(*args, **kwargs)
 
 
 class ConstituencySubscriber(CreatedModel):
@@ -109,6 +115,14 @@ class WebPushSubscription(CreatedModel):
     def __str__(self):
         return f"WebPush: {self.foodbank.name} - {self.endpoint[:50]}..."
 
+    def save(self, *args, **kwargs):
+        super(WebPushSubscription, self).save(*args, **kwargs)
+        SearchDocument.update_for(self)
+
+    def delete(self, *args, **kwargs):
+        SearchDocument.remove_for(self)
+        super(WebPushSubscription, self).delete(*args, **kwargs)
+
 
 class MobileSubscriber(CreatedModel):
 
@@ -130,6 +144,14 @@ class MobileSubscriber(CreatedModel):
             models.Index(fields=['foodbank', '-created']),
         ]
 
+    def save(self, *args, **kwargs):
+        super(MobileSubscriber, self).save(*args, **kwargs)
+        SearchDocument.update_for(self)
+
+    def delete(self, *args, **kwargs):
+        SearchDocument.remove_for(self)
+        super(MobileSubscriber, self).delete(*args, **kwargs)
+
 
 class WhatsappSubscriber(CreatedModel):
     """
@@ -158,3 +180,8 @@ class WhatsappSubscriber(CreatedModel):
         if self.foodbank:
             self.foodbank_name = self.foodbank.name
         super(WhatsappSubscriber, self).save(*args, **kwargs)
+        SearchDocument.update_for(self)
+
+    def delete(self, *args, **kwargs):
+        SearchDocument.remove_for(self)
+        super(WhatsappSubscriber, self).delete(*args, **kwargs)
@@ -38,6 +38,11 @@ LOGGING = {
             "level": "DEBUG",
             "propagate": True,
         },
+        "givefood.timing": {
+            "handlers": ["file"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
@@ -89,6 +94,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "givefood.middleware.ServerTiming",
     "django.middleware.security.SecurityMiddleware",
     "django.middleware.gzip.GZipMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -108,11 +114,31 @@ MIDDLEWARE = [
 
 TASKS = {
     "default": {
-        "BACKEND": "django_tasks_db.DatabaseBackend",
-        "QUEUES": [],
+        "BACKEND": "givefood.utils.tasks.DatabaseBackend",
+        "QUEUES": ["default", "decache", "email", "maps", "needcheck", "schema", "translate"],
     }
 }
 
+# What manage.py task_worker lets each queue do. concurrency is how many of
+# its tasks run at once across every worker. rate and burst are a token
+# bucket: tasks start at rate a second, with up to burst at once after a
+# quiet spell. A task over either limit waits, rather than failing. With
+# coalesce, enqueueing a task identical to one still waiting adds nothing.
+# Queues not listed have no limits.
+TASK_QUEUE_LIMITS = {
+    # Cloudflare's purge API
+    "decache": {"concurrency": 1, "rate": 0.5, "burst": 5, "coalesce": True},
+    # SMTP
+    "email": {"concurrency": 1, "rate": 1, "burst": 10},
+    # Google Static Maps
+    "maps": {"concurrency": 1, "rate": 1, "burst": 5, "coalesce": True},
+    # Food bank sites and OpenRouter
+    "needcheck": {"concurrency": 4, "rate": 2, "burst": 4, "coalesce": True},
+    "schema": {"concurrency": 2, "coalesce": True},
+    # Google Translate
+    "translate": {"concurrency": 2, "rate": 1, "burst": 5, "coalesce": True},
+}
+
 ROOT_URLCONF = "givefood.urls"
 
 TEMPLATES = [
@@ -149,6 +175,18 @@ DATABASES = {
 }
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField" 
 
+# Built by the build_autocomplete_index command. /aac/ falls back to the
+# database while the file isn't there.
+AUTOCOMPLETE_INDEX_PATH = os.getenv("AUTOCOMPLETE_INDEX_PATH", os.path.join(BASE_DIR, "givefood", "data", "autocomplete.idx"))
+
+# Proxied maps, photos, favicons and screenshots are kept here. Point it at
+# a volume to keep them across deploys.
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", os.path.join(BASE_DIR, "blobcache"))
+
+# Requests taking at least this many milliseconds have their Server-Timing
+# breakdown logged to givefood.timing. 0 logs every request.
+SERVER_TIMING_LOG_MS = int(os.getenv("SERVER_TIMING_LOG_MS", 1000))
+
 
 CACHES = {
     'default': {
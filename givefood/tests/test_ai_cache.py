@@ -0,0 +1,192 @@
+"""
+Tests for the AI call layer: the response cache, coalescing, batching and usage accounting.
+"""
+import threading
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from givefood.models import AIResponse, AIUsage
+from givefood.utils import ai
+from givefood.utils.ai import coalesce, gemini, gemini_batch, openrouter
+
+
+def usage(prompt_tokens=10, completion_tokens=5):
+    return SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=completion_tokens)
+
+
+def fake_openrouter(content, status_code=200):
+    response = MagicMock(status_code=status_code)
+    response.json.return_value = {
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "cost": 0.01},
+    }
+    return response
+
+
+@pytest.mark.django_db
+class TestGeminiCache:
+    """Test gemini() answers a repeated request from the cache."""
+
+    def test_repeat_from_cache(self):
+        """The same request is sent once, and the second is answered from AIResponse."""
+        with patch("givefood.utils.ai._gemini_request", return_value=([{"name": "Pasta"}], usage())) as request:
+            first = gemini("Parse this", 1, response_schema={"type": "array"}, caller="order_lines", cache=True)
+            second, second_usage = gemini("Parse this", 1, response_schema={"type": "array"}, caller="order_lines", cache=True, return_usage=True)
+
+        assert first == second == [{"name": "Pasta"}]
+        assert second_usage is None
+        assert request.call_count == 1
+        assert AIResponse.objects.get().hits == 1
+
+        account = AIUsage.objects.get(caller="order_lines")
+        assert (account.calls, account.cache_hits, account.prompt_tokens, account.completion_tokens) == (1, 1, 10, 5)
+
+    def test_keyed_by_everything_that_decides_the_reply(self):
+        """A different temperature, schema, model or seed is a different request."""
+        with patch("givefood.utils.ai._gemini_request", return_value=("Pasta", usage())) as request:
+            gemini("Categorise", 0.1, cache=True)
+            gemini("Categorise", 0.2, cache=True)
+            gemini("Categorise", 0.1, response_schema={"type": "string"}, cache=True)
+            gemini("Categorise", 0.1, model="gemini-2.5-pro", cache=True)
+            gemini("Categorise", 0.1, seed=1, cache=True)
+            gemini("Categorise", 0.1, cache=True)
+
+        assert request.call_count == 5
+
+    def test_empty_reply_not_cached(self):
+        """A reply of None is sent again next time."""
+        with patch("givefood.utils.ai._gemini_request", return_value=(None, usage())) as request:
+            gemini("Categorise", 0, cache=True)
+            gemini("Categorise", 0, cache=True)
+
+        assert request.call_count == 2
+        assert not AIResponse.objects.exists()
+
+    def test_accounted_without_cache(self):
+        """A caller without the cache is still accounted for, and nothing is kept."""
+        with patch("givefood.utils.ai._gemini_request", return_value=("Pasta", usage())):
+            gemini("Categorise", 0, caller="need_category")
+            gemini("Categorise", 0, caller="need_category")
+
+        assert not AIResponse.objects.exists()
+        assert AIUsage.objects.get(caller="need_category").calls == 2
+
+
+@pytest.mark.django_db
+class TestGeminiBatch:
+    """Test gemini_batch() sends what isn't cached concurrently, once per prompt."""
+
+    def test_batch(self, django_assert_max_num_queries):
+        """Results come back in order, from one cache read, with repeats sent once."""
+        with patch("givefood.utils.ai._gemini_request", return_value=({"population": 1}, usage())):
+            gemini("Town A", 0, cache=True)
+
+        def request(prompt, *args):
+            return {"population": len(prompt)}, usage()
+
+        with patch("givefood.utils.ai._gemini_request", side_effect=request) as mock_request, django_assert_max_num_queries(4):
+            results = gemini_batch(["Town A", "City B", "Town A", "Village C"], 0, caller="place_populations")
+
+        assert results == [{"population": 1}, {"population": 6}, {"population": 1}, {"population": 9}]
+        assert sorted(call.args[0] for call in mock_request.call_args_list) == ["City B", "Village C"]
+        assert AIResponse.objects.count() == 3
+
+        account = AIUsage.objects.get(caller="place_populations")
+        assert (account.calls, account.cache_hits, account.coalesced) == (2, 2, 0)
+
+    def test_failure_is_none(self):
+        """A prompt whose request fails is None, and isn't cached."""
+        def request(prompt, *args):
+            if prompt == "Broken":
+                raise RuntimeError("Server error")
+            return "Fine", usage()
+
+        with patch("givefood.utils.ai._gemini_request", side_effect=request):
+            assert gemini_batch(["Working", "Broken"], 0) == ["Fine", None]
+
+        assert list(AIResponse.objects.values_list("response", flat=True)) == ['"Fine"']
+
+
+@pytest.mark.django_db
+class TestOpenrouterCache:
+    """Test openrouter() caches usable replies only."""
+
+    def test_repeat_from_cache(self):
+        """A repeat is a 200 of the same body, without the usage it didn't cost."""
+        schema = {"type": "object"}
+        with patch("givefood.utils.ai._openrouter_request", return_value=fake_openrouter('{"needed": []}')) as request:
+            openrouter("Needs", 0, "openai/gpt-oss-120b", response_schema=schema, seed=1, caller="need_check", cache=True)
+            response = openrouter("Needs", 0, "openai/gpt-oss-120b", response_schema=schema, seed=1, caller="need_check", cache=True)
+
+        assert request.call_count == 1
+        assert response.status_code == 200
+        assert response.json()["choices"][0]["message"]["content"] == '{"needed": []}'
+        assert "usage" not in response.json()
+        assert AIUsage.objects.get(caller="need_check").prompt_tokens == 100
+
+    def test_unusable_not_cached(self):
+        """Errors, prose when JSON was asked for, and replies failing valid() are sent again."""
+        schema = {"type": "object"}
+        replies = [
+            (fake_openrouter("", status_code=500), None),
+            (fake_openrouter("There are no needs"), None),
+            (fake_openrouter('{"needed": []}'), lambda response: False),
+        ]
+        for reply, valid in replies:
+            with patch("givefood.utils.ai._openrouter_request", return_value=reply):
+                openrouter("Needs", 0, "openai/gpt-oss-120b", response_schema=schema, cache=True, valid=valid)
+
+        assert not AIResponse.objects.exists()
+
+
+class TestCoalesce:
+    """Test identical requests in flight at once share one call."""
+
+    def test_second_waits_for_first(self):
+        """A caller asking while the same key is in flight gets the first caller's reply."""
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "reply"
+
+        results = {}
+        leader = threading.Thread(target=lambda: results.setdefault("leader", coalesce("key", fetch)))
+        leader.start()
+        started.wait(5)
+
+        # Hold the first call until the second is waiting on it
+        future = ai._inflight["key"]
+        result = future.result
+        waiting = threading.Event()
+
+        def wait_for_result(*args, **kwargs):
+            waiting.set()
+            return result(*args, **kwargs)
+
+        future.result = wait_for_result
+        follower = threading.Thread(target=lambda: results.setdefault("follower", coalesce("key", fetch)))
+        follower.start()
+        waiting.wait(5)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        assert calls == [1]
+        assert results == {"leader": ("reply", False), "follower": ("reply", True)}
+
+    def test_failure_shared(self):
+        """A failed call raises for its caller, and the next call tries again."""
+        def fail():
+            raise RuntimeError("Server error")
+
+        with pytest.raises(RuntimeError):
+            coalesce("key", fail)
+        assert coalesce("key", lambda: "reply") == ("reply", False)
+
@@ -0,0 +1,92 @@
+"""
+Tests for the seed_benchmark and benchmark management commands.
+"""
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from gfoffline.management.commands.seed_benchmark import postcode_for
+from givefood.models import Foodbank, FoodbankChangeLine, FoodbankLocation, Postcode
+
+
+SCALE = "0.001"
+
+
+@pytest.mark.django_db
+class TestSeedBenchmark:
+    """Test seeding the synthetic dataset."""
+
+    def test_seeds_every_table(self):
+        """A small scale seeds some of everything, with counts and latest needs filled in."""
+        call_command("seed_benchmark", "--scale", SCALE, stdout=StringIO())
+
+        assert Foodbank.objects.count() == 3
+        assert FoodbankLocation.objects.count() == 10
+        assert FoodbankChangeLine.objects.count() == 1000
+        assert Postcode.objects.count() == 2700
+
+        foodbank = Foodbank.objects.filter(no_locations__gt=0).first()
+        assert foodbank.no_locations == FoodbankLocation.objects.filter(foodbank=foodbank).count()
+        assert Foodbank.objects.filter(latest_need__isnull=True).count() == 0
+
+    def test_refuses_a_database_with_food_banks(self):
+        """Seeding doesn't add to a database that already has data in it."""
+        call_command("seed_benchmark", "--scale", SCALE, stdout=StringIO())
+        with pytest.raises(CommandError):
+            call_command("seed_benchmark", "--scale", SCALE, stdout=StringIO())
+
+    def test_postcodes_unique(self):
+        """Each number gives a different postcode of a valid length."""
+        postcodes = [postcode_for(number) for number in range(0, 3000000, 997)]
+        assert len(set(postcodes)) == len(postcodes)
+        assert all(len(postcode) <= 8 for postcode in postcodes)
+
+
+@pytest.mark.django_db
+class TestBenchmark:
+    """Test running the benchmarks."""
+
+    def test_nothing_to_benchmark(self):
+        """An empty database is an error rather than a run of 404s."""
+        with pytest.raises(CommandError):
+            call_command("benchmark", stdout=StringIO())
+
+    def test_writes_results(self, tmp_path):
+        """Each case is timed, and the results are written as JSON."""
+        call_command("seed_benchmark", "--scale", SCALE, stdout=StringIO())
+        output = tmp_path / "results.json"
+
+        call_command(
+            "benchmark", "--repeat", "1", "--output", str(output),
+            "--only", "foodbank", "api2_foodbank", "geojson", "dump",
+            stdout=StringIO(),
+        )
+
+        results = json.loads(output.read_text())
+        assert results["dataset"]["foodbanks"] == 3
+        assert set(results["cases"]) == {"foodbank", "api2_foodbank", "geojson", "dump"}
+        for result in results["cases"].values():
+            assert result["median_ms"] > 0
+            assert result["queries"] > 0
+        assert results["cases"]["foodbank"]["status"] == 200
+
+    def test_compare(self, tmp_path):
+        """Comparing with earlier results flags cases that got slower or ran more queries."""
+        call_command("seed_benchmark", "--scale", SCALE, stdout=StringIO())
+        output = tmp_path / "results.json"
+        call_command("benchmark", "--repeat", "1", "--output", str(output), "--only", "geojson", stdout=StringIO())
+
+        baseline = json.loads(output.read_text())
+        baseline["cases"]["geojson"]["median_ms"] = 0.001
+        baseline_path = tmp_path / "baseline.json"
+        baseline_path.write_text(json.dumps(baseline))
+
+        stdout = StringIO()
+        call_command(
+            "benchmark", "--repeat", "1", "--output", str(output), "--only", "geojson",
+            "--compare", str(baseline_path), stdout=stdout,
+        )
+        assert "Slower: geojson" in stdout.getvalue()
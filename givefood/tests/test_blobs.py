@@ -0,0 +1,126 @@
+"""
+Tests for the disk store behind the proxied map, photo, favicon and screenshot images.
+"""
+import os
+import time
+
+import pytest
+from django.http import FileResponse
+from django.test import override_settings
+
+from givefood.utils.blobs import blob_path, blob_response, prune_blobs, read_blob, write_blob
+
+
+@pytest.fixture
+def blob_dir(tmp_path):
+    with override_settings(BLOB_CACHE_DIR=str(tmp_path)):
+        yield tmp_path
+
+
+class TestBlobStore:
+    """Test blob paths, reads and writes."""
+
+    def test_path_is_keyed_by_inputs(self, blob_dir):
+        """The same inputs give the same path, and any change a different one."""
+        path = blob_path("staticmap", [("center", "51.5,-0.1"), ("language", "en")])
+        assert path == blob_path("staticmap", [("center", "51.5,-0.1"), ("language", "en")])
+        assert path != blob_path("staticmap", [("center", "51.5,-0.1"), ("language", "cy")])
+        assert path != blob_path("favicon", [("center", "51.5,-0.1"), ("language", "en")])
+        assert path.startswith(os.path.join(str(blob_dir), "staticmap"))
+
+    def test_no_store_configured(self):
+        """Without BLOB_CACHE_DIR there is nowhere to keep blobs."""
+        with override_settings(BLOB_CACHE_DIR=None):
+            assert blob_path("staticmap", ["anything"]) is None
+
+    def test_write_then_read(self, blob_dir):
+        """A written blob reads back, and leaves no temporary file behind."""
+        path = blob_path("favicon", ["example.com"])
+        write_blob(path, b"icon")
+
+        with read_blob(path) as f:
+            assert f.read() == b"icon"
+        assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+    def test_read_missing(self, blob_dir):
+        """A blob never written reads as None."""
+        assert read_blob(blob_path("favicon", ["example.com"])) is None
+
+    def test_read_expired(self, blob_dir):
+        """A blob older than max_age reads as None."""
+        path = blob_path("favicon", ["example.com"])
+        write_blob(path, b"icon")
+        old = time.time() - 100
+        os.utime(path, (old, old))
+
+        assert read_blob(path, max_age=50) is None
+        with read_blob(path, max_age=200) as f:
+            assert f.read() == b"icon"
+
+    def test_prune(self, blob_dir):
+        """Pruning removes old blobs and keeps recent ones."""
+        old_path = blob_path("favicon", ["old.example.com"])
+        new_path = blob_path("favicon", ["new.example.com"])
+        write_blob(old_path, b"old")
+        write_blob(new_path, b"new")
+        old = time.time() - 1000
+        os.utime(old_path, (old, old))
+
+        assert prune_blobs(500) == 1
+        assert not os.path.exists(old_path)
+        assert os.path.exists(new_path)
+
+
+class TestBlobResponse:
+    """Test responding from the store."""
+
+    def test_miss_fetches_and_stores(self, blob_dir):
+        """A miss calls fetch, responds with its bytes and stores them."""
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return b"png"
+
+        response = blob_response("staticmap", ["a"], "image/png", fetch)
+        assert response.content == b"png"
+        assert response["Content-Type"] == "image/png"
+        assert "max-age=" in response["Cache-Control"]
+
+        response = blob_response("staticmap", ["a"], "image/png", fetch)
+        assert isinstance(response, FileResponse)
+        assert b"".join(response.streaming_content) == b"png"
+        assert response["Content-Type"] == "image/png"
+        assert "Content-Disposition" not in response
+        assert "max-age=" in response["Cache-Control"]
+        assert len(calls) == 1
+
+    def test_changed_inputs_fetch_again(self, blob_dir):
+        """Different inputs are a miss even when the kind is the same."""
+        blob_response("staticmap", ["a"], "image/png", lambda: b"one")
+        response = blob_response("staticmap", ["b"], "image/png", lambda: b"two")
+        assert response.content == b"two"
+
+    def test_nothing_fetched(self, blob_dir):
+        """A failed fetch gives None and stores nothing, so it's tried again."""
+        assert blob_response("screenshot", ["a"], "image/png", lambda: False) is None
+        assert not os.path.exists(blob_path("screenshot", ["a"]))
+
+    def test_without_store(self):
+        """Without a store every request fetches."""
+        with override_settings(BLOB_CACHE_DIR=None):
+            calls = []
+
+            def fetch():
+                calls.append(1)
+                return b"png"
+
+            blob_response("staticmap", ["a"], "image/png", fetch)
+            blob_response("staticmap", ["a"], "image/png", fetch)
+        assert len(calls) == 2
+
+    def test_unwritable_store_still_responds(self, blob_dir):
+        """A store that can't be written to doesn't stop the image being sent."""
+        (blob_dir / "staticmap").write_text("a file where a directory should be")
+        response = blob_response("staticmap", ["a"], "image/png", lambda: b"png")
+        assert response.content == b"png"
@@ -0,0 +1,191 @@
+"""
+Tests for the COPY loaders for places, postcodes and constituency boundaries.
+"""
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.utils.text import slugify
+
+from givefood.models import ParliamentaryConstituency, Place, Postcode
+from givefood.utils.bulkload import load_constituency_boundaries, load_places, load_postcodes
+from givefood.utils.cache import get_data_versions
+
+PLACE_HEADER = [
+    'GBPNID', 'Place Name', 'Latitude', 'Longitude', 'Historic County', 'Administrative County',
+    'District', 'Unitary Authority Area', 'Police Area', 'Country', 'Type',
+]
+POSTCODE_HEADER = ['Postcode', 'In Use?', 'Latitude', 'Longitude', 'County', 'Country', 'Police force']
+
+
+@pytest.fixture
+def write_file():
+    paths = []
+
+    def write(content, suffix='.csv'):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+            if isinstance(content, str):
+                f.write(content)
+            else:
+                csv.writer(f).writerows(content)
+        paths.append(path)
+        return path
+
+    yield write
+    for path in paths:
+        os.unlink(path)
+
+
+def place_row(gbpnid, name, adcounty='Greater London', uniauth=''):
+    return [gbpnid, name, '51.5', '-0.1', 'Middlesex', adcounty, 'Camden', uniauth, 'Metropolitan', 'England', 'Town']
+
+
+@pytest.mark.django_db
+class TestLoadPlaces:
+    """Test places are loaded as Place.save() would have made them."""
+
+    def test_slugs_as_slugify(self, write_file):
+        """Slugs made in SQL are what slugify() makes, accents, punctuation and all."""
+        names = ["Ynys Môn", "Bishop’s Stortford", "St. Mary's -- Hill_", "Llanfair  Pwllgwyngyll", "Æbbe Straße"]
+        path = write_file([PLACE_HEADER] + [place_row(number + 1, name, uniauth=name) for number, name in enumerate(names)])
+
+        load_places(path)
+
+        for place in Place.objects.all():
+            assert place.name_slug == slugify(place.name)
+            assert place.county_slug == slugify(place.county)
+
+    def test_county(self, write_file):
+        """The unitary authority if there is one, or the administrative county, or none at all."""
+        path = write_file([
+            PLACE_HEADER,
+            place_row(1, 'Camden Town', uniauth='Camden'),
+            place_row(2, 'Hampstead'),
+            place_row(3, 'Nowhere', adcounty=''),
+        ])
+
+        load_places(path)
+
+        counties = {place.gbpnid: (place.county, place.county_slug) for place in Place.objects.all()}
+        assert counties == {1: ('Camden', 'camden'), 2: ('Greater London', 'greater-london'), 3: (None, slugify(None))}
+
+    def test_replace(self, write_file):
+        """Places in the file are updated, keeping their population, and those not in it are deleted."""
+        kept = Place(gbpnid=1, name='Old Name', lat_lng='51.5,-0.1', adcounty='Greater London', population=5000)
+        kept.save()
+        Place(gbpnid=2, name='Gone', lat_lng='51.5,-0.1', adcounty='Greater London').save()
+        path = write_file([PLACE_HEADER, place_row(1, 'New Name'), place_row(3, 'Added')])
+
+        stats = load_places(path)
+
+        assert (stats['imported'], stats['deleted']) == (2, 1)
+        kept.refresh_from_db()
+        assert (kept.name, kept.name_slug, kept.population) == ('New Name', 'new-name', 5000)
+        assert set(Place.objects.values_list('gbpnid', flat=True)) == {1, 3}
+
+    def test_skipped(self, write_file):
+        path = write_file([
+            PLACE_HEADER,
+            place_row('', 'No Id'),
+            place_row('abc', 'Bad Id'),
+            place_row(1, ''),
+            place_row(2, 'Too Long ' * 20),
+            place_row(3, 'Fine'),
+        ])
+
+        stats = load_places(path)
+
+        assert stats['missing_field_counts'] == {'gbpnid': 2, 'name': 1, 'latitude': 0, 'longitude': 0}
+        assert stats['errors'] == 1
+        assert list(Place.objects.values_list('name', flat=True)) == ['Fine']
+
+    def test_command_dry_run(self, write_file):
+        path = write_file([PLACE_HEADER, place_row(1, 'Dry')])
+        out = StringIO()
+
+        call_command('import_places', '--csv-file', path, '--dry-run', stdout=out)
+
+        assert not Place.objects.exists()
+        assert 'Would import: 1' in out.getvalue()
+        assert 'rows/sec' in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestLoadPostcodes:
+    """Test what the postcode loader adds to import_postcodes."""
+
+    def test_update(self, write_file):
+        Postcode.objects.create(postcode='SW1A 1AA', lat_lng='1,1', country='England')
+        path = write_file([POSTCODE_HEADER, ['SW1A 1AA', 'Yes', '51.5', '-0.14', 'Greater London', 'England', 'Met']])
+
+        load_postcodes(path)
+        assert Postcode.objects.get().lat_lng == '1,1'
+
+        stats = load_postcodes(path, update=True)
+        assert stats['imported'] == 1
+        postcode = Postcode.objects.get()
+        assert (postcode.lat_lng, postcode.county, postcode.police) == ('51.5,-0.14', 'Greater London', 'Met')
+
+    def test_duplicate_in_file(self, write_file):
+        """The second of a postcode is skipped as existing, as it was when the import kept a set of them."""
+        row = ['ab1 2cd', 'Yes', '57.1', '-2.1', '', 'Scotland', '']
+        path = write_file([POSTCODE_HEADER, row, row])
+
+        stats = load_postcodes(path)
+
+        assert (stats['imported'], stats['skipped_existing']) == (1, 1)
+        assert Postcode.objects.get().postcode_normalized == 'AB12CD'
+
+    def test_too_long(self, write_file):
+        path = write_file([POSTCODE_HEADER, ['SW1A 1AAAAAA', 'Yes', '51.5', '-0.14', '', 'England', '']])
+
+        stats = load_postcodes(path)
+
+        assert stats['errors'] == 1
+        assert not Postcode.objects.exists()
+
+
+@pytest.mark.django_db
+class TestLoadConstituencyBoundaries:
+    """Test boundaries are matched to constituencies by a property holding their name."""
+
+    def make_constituency(self, name):
+        constituency = ParliamentaryConstituency(name=name, country='England', centroid='51.5,-0.14', mp_parl_id=1)
+        constituency.save()
+        return constituency
+
+    def feature(self, name):
+        return {"type": "Feature", "properties": {"PCON24NM": name, "code": "E1"}, "geometry": {"type": "Polygon", "coordinates": []}}
+
+    def test_feature_per_line(self, write_file):
+        """The format the admin loader has always read, with trailing commas."""
+        matched = self.make_constituency('Holborn and St Pancras')
+        unmatched = self.make_constituency('Islington North')
+        path = write_file('{"type":"FeatureCollection","features":[\n%s,\n%s\n]}x' % (
+            json.dumps(self.feature('Holborn and St Pancras')),
+            json.dumps(self.feature('Somewhere Else')),
+        ), suffix='.geojson')
+        version = get_data_versions(['constituency'])['constituency'][0]
+
+        stats = load_constituency_boundaries(path)
+
+        assert (stats['rows'], stats['updated'], stats['unmatched']) == (2, 1, 1)
+        matched.refresh_from_db()
+        assert matched.boundary_geojson_dict()['properties']['PCON24NM'] == 'Holborn and St Pancras'
+        unmatched.refresh_from_db()
+        assert unmatched.boundary_geojson is None
+        assert get_data_versions(['constituency'])['constituency'][0] == version + 1
+
+    def test_feature_collection(self, write_file):
+        constituency = self.make_constituency('Islington North')
+        path = write_file(json.dumps({"type": "FeatureCollection", "features": [self.feature('Islington North')]}), suffix='.geojson')
+
+        call_command('import_constituency_boundaries', path, stdout=StringIO())
+
+        constituency.refresh_from_db()
+        assert constituency.boundary_geojson_dict()['geometry']['type'] == 'Polygon'
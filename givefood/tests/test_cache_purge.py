@@ -0,0 +1,204 @@
+"""
+Tests for the CDN purge: paths gathered in CachePurge, collapsed, sent in concurrent batches and retried.
+"""
+import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from django.utils import timezone
+from django_tasks.base import TaskResultStatus
+from django_tasks_db.models import DBTaskResult
+
+from givefood.models import CachePurge
+from givefood.utils.cache import (
+    PURGE_CHUNK_SIZE,
+    collapse_purge,
+    decache,
+    purge_pending,
+    purge_stats,
+    queue_decache,
+)
+
+
+def cloudflare_response(status_code=200, success=True, headers=None):
+    response = Mock(status_code=status_code, headers=headers or {}, text="")
+    response.json.return_value = {"success": success}
+    return response
+
+
+@pytest.mark.django_db
+class TestQueueDecache:
+    """Test saves' paths are gathered for one purge."""
+
+    def test_deduplicated_into_one_task(self):
+        queue_decache(["/", "/needs/"], ["/api/2/foodbanks/"])
+        queue_decache(["/needs/", "/cy/"], ["/api/2/foodbanks/"])
+
+        assert CachePurge.objects.filter(is_prefix=False).count() == 3
+        assert CachePurge.objects.filter(is_prefix=True).count() == 1
+        task = DBTaskResult.objects.get(task_path=purge_pending.module_path)
+        assert task.run_after > timezone.now()
+
+    def test_again_once_purged(self):
+        """A path already purged is waiting again when asked for again."""
+        queue_decache(["/needs/"])
+        CachePurge.objects.update(purged=timezone.now())
+
+        queue_decache(["/needs/"])
+
+        assert CachePurge.objects.filter(path="/needs/", purged__isnull=True).count() == 1
+
+    def test_nothing(self):
+        queue_decache()
+        assert not DBTaskResult.objects.exists()
+
+
+class TestCollapsePurge:
+    """Test the fewest URLs and prefixes that cover everything are sent."""
+
+    def test_covered_by_prefix(self):
+        urls, prefixes = collapse_purge(
+            ["/api/2/foodbanks/?format=csv", "/needs/", "/needs/"],
+            ["/api/2/", "/api/2/foodbanks/", "/needs/at/"],
+        )
+        assert urls == ["/needs/"]
+        assert prefixes == ["/api/2/", "/needs/at/"]
+
+    def test_query_strings_to_prefix(self):
+        urls, prefixes = collapse_purge(["/api/1/foodbanks/", "/api/1/foodbanks/?format=csv", "/api/1/foodbanks/x/"])
+        assert urls == []
+        assert prefixes == ["/api/1/foodbanks/"]
+
+    def test_top_level_kept(self):
+        """Purging /cy/ as a prefix would purge every Welsh page."""
+        urls, prefixes = collapse_purge(["/cy/", "/cy/?ref=x"])
+        assert urls == ["/cy/", "/cy/?ref=x"]
+        assert prefixes == []
+
+
+@pytest.mark.django_db
+class TestDecache:
+    """Test purge requests are batched, checked and retried."""
+
+    def test_batches(self):
+        urls = ["/needs/%s/" % number for number in range(PURGE_CHUNK_SIZE + 1)]
+        with patch("givefood.utils.cache.requests.post", return_value=cloudflare_response()) as post:
+            sent = decache(urls, ["/api/2/"])
+
+        assert post.call_count == 3
+        assert sent["requests"] == 3
+        assert sent["failed_urls"] == []
+        sizes = sorted(len(call.kwargs["json"].get("files", call.kwargs["json"].get("prefixes"))) for call in post.call_args_list)
+        assert sizes == [1, 1, PURGE_CHUNK_SIZE]
+
+    def test_rate_limited_retried(self):
+        responses = [cloudflare_response(429, headers={"Retry-After": "2"}), cloudflare_response()]
+        with patch("givefood.utils.cache.requests.post", side_effect=responses), patch("givefood.utils.cache.time.sleep") as sleep:
+            sent = decache(["/needs/"])
+
+        sleep.assert_called_once_with(2)
+        assert sent["failed_urls"] == []
+
+    def test_failed(self):
+        """Erroring or unreachable, the paths are returned as failed."""
+        with patch("givefood.utils.cache.requests.post", return_value=cloudflare_response(503, success=False)), patch("givefood.utils.cache.time.sleep"):
+            assert decache(["/needs/"])["failed_urls"] == ["/needs/"]
+
+        with patch("givefood.utils.cache.requests.post", side_effect=requests.ConnectionError), patch("givefood.utils.cache.time.sleep"):
+            assert decache(prefixes=["/api/2/"])["failed_prefixes"] == ["/api/2/"]
+
+    def test_refused(self):
+        """Refused, the paths are returned as refused, without trying again."""
+        with patch("givefood.utils.cache.requests.post", return_value=cloudflare_response(400, success=False)) as post:
+            sent = decache(["/needs/"])
+
+        assert post.call_count == 1
+        assert sent["failed_urls"] == []
+        assert sent["refused_urls"] == ["/needs/"]
+
+
+@pytest.mark.django_db
+class TestPurgePending:
+    """Test the purge task sends what's waiting and keeps what failed."""
+
+    def test_purged(self):
+        queue_decache(["/needs/", "/api/2/foodbanks/?format=csv"], ["/api/2/"])
+        with patch("givefood.utils.cache.requests.post", return_value=cloudflare_response()) as post:
+            result = purge_pending.call()
+
+        assert result == {"paths": 3, "requests": 2, "failed": 0, "refused": 0}
+        assert post.call_count == 2
+        assert not CachePurge.objects.filter(purged__isnull=True).exists()
+
+    def test_failed_left_waiting(self):
+        """Paths under a failed prefix wait for the purge queued to try again."""
+        queue_decache(["/needs/", "/api/2/foodbanks/?format=csv"], ["/api/2/"])
+        DBTaskResult.objects.all().delete()
+
+        def post(url, headers, json, timeout):
+            if "files" in json:
+                return cloudflare_response()
+            return cloudflare_response(503, success=False)
+
+        with patch("givefood.utils.cache.requests.post", side_effect=post), patch("givefood.utils.cache.time.sleep"):
+            purge_pending.call()
+
+        waiting = set(CachePurge.objects.filter(purged__isnull=True).values_list("path", flat=True))
+        assert waiting == {"/api/2/", "/api/2/foodbanks/?format=csv"}
+        assert DBTaskResult.objects.filter(task_path=purge_pending.module_path).exists()
+
+    def test_refused_not_retried(self):
+        """Paths Cloudflare refused are marked purged rather than sent every purge."""
+        queue_decache(["/needs/"], ["/api/2/"])
+        DBTaskResult.objects.all().delete()
+
+        def post(url, headers, json, timeout):
+            if "files" in json:
+                return cloudflare_response()
+            return cloudflare_response(403, success=False)
+
+        with patch("givefood.utils.cache.requests.post", side_effect=post):
+            result = purge_pending.call()
+
+        assert result == {"paths": 2, "requests": 2, "failed": 0, "refused": 1}
+        assert not CachePurge.objects.filter(purged__isnull=True).exists()
+        assert not DBTaskResult.objects.filter(task_path=purge_pending.module_path).exists()
+
+    def test_queued_during_send(self):
+        """A path changed again while it's being sent is still waiting afterwards."""
+        queue_decache(["/needs/"])
+
+        def post(url, headers, json, timeout):
+            queue_decache(["/needs/"])
+            return cloudflare_response()
+
+        with patch("givefood.utils.cache.requests.post", side_effect=post):
+            purge_pending.call()
+
+        assert CachePurge.objects.filter(path="/needs/", purged__isnull=False).count() == 1
+        assert CachePurge.objects.filter(path="/needs/", purged__isnull=True, claimed__isnull=True).count() == 1
+
+    def test_stale_claim_sent(self):
+        """Rows claimed by a purge that never finished are sent by the next."""
+        queue_decache(["/needs/"])
+        CachePurge.objects.update(claimed=timezone.now() - datetime.timedelta(hours=1))
+
+        with patch("givefood.utils.cache.requests.post", return_value=cloudflare_response()):
+            result = purge_pending.call()
+
+        assert result["paths"] == 1
+        assert not CachePurge.objects.filter(purged__isnull=True).exists()
+
+    def test_stats(self):
+        now = timezone.now()
+        queue_decache(["/needs/", "/cy/"])
+        CachePurge.objects.filter(path="/needs/").update(created=now - datetime.timedelta(seconds=30), purged=now)
+        DBTaskResult.objects.filter(task_path=purge_pending.module_path).update(
+            status=TaskResultStatus.SUCCESSFUL, finished_at=now, return_value={"paths": 1, "requests": 1, "failed": 0, "refused": 0},
+        )
+
+        stats = purge_stats(now - datetime.timedelta(days=1))
+
+        assert (stats["waiting"], stats["purged_count"], stats["requests"], stats["failed"], stats["refused"]) == (1, 1, 1, 0, 0)
+        assert stats["latency"] == 30
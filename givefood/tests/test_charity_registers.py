@@ -0,0 +1,191 @@
+"""
+Tests for loading the charity regulators' register extracts from disk.
+"""
+import datetime
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+
+from givefood.models import CharityYear, Foodbank
+from givefood.utils.charities import load_charity_registers, parse_date, parse_money
+
+
+def make_foodbank(name, country, charity_number, **kwargs):
+    foodbank = Foodbank(
+        name=name,
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country=country,
+        lat_lng="51.5014,-0.1419",
+        network="Independent",
+        url="https://test.example.com",
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+        charity_number=charity_number,
+        **kwargs,
+    )
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def write_tsv(path, header, rows):
+    path.write_text("\n".join("\t".join(row) for row in [header] + rows) + "\n", encoding="utf-8")
+
+
+@pytest.fixture
+def ew_dir(tmp_path):
+    write_tsv(
+        tmp_path / "publicextract.charity.txt",
+        ["organisation_number", "registered_charity_number", "linked_charity_number", "charity_name", "charity_type",
+         "date_of_registration", "charity_contact_postcode", "charity_contact_web", "charity_activities"],
+        [
+            ["5001", "1100001", "0", "ENGLISH FOOD BANK", "CIO", "2010-03-01 00:00:00", "SW1A 1AA", "https://efb.example.com", "Relieving food poverty"],
+            ["5002", "1100001", "1", "ENGLISH FOOD BANK LINKED", "", "", "", "", "Something else"],
+            ["5003", "1199999", "0", "NOT A FOOD BANK", "Trust", "2001-01-01 00:00:00", "", "", ""],
+        ],
+    )
+    write_tsv(
+        tmp_path / "publicextract.charity_classification.txt",
+        ["registered_charity_number", "linked_charity_number", "classification_type", "classification_description"],
+        [
+            ["1100001", "0", "What", "The Prevention Or Relief Of Poverty"],
+            ["1100001", "0", "Who", "Children/young People"],
+            ["1100001", "0", "What", "General Charitable Purposes"],
+        ],
+    )
+    write_tsv(
+        tmp_path / "publicextract.charity_annual_return_history.txt",
+        ["registered_charity_number", "linked_charity_number", "fin_period_end_date", "total_gross_income", "total_gross_expenditure"],
+        [
+            ["1100001", "0", "2023-03-31 00:00:00", "120000", "110000"],
+            ["1100001", "0", "2024-03-31 00:00:00", "150000.00", "140000"],
+        ],
+    )
+    return tmp_path
+
+
+@pytest.fixture
+def no_http():
+    with patch("requests.get", side_effect=AssertionError("No HTTP")), patch("requests.post", side_effect=AssertionError("No HTTP")):
+        yield
+
+
+@pytest.mark.django_db
+class TestLoadCharityRegisters:
+    """Test food banks and their charity years are loaded from the register files."""
+
+    def test_england_and_wales(self, ew_dir, no_http):
+        """Charity details come from the main charity's rows, and each year is a CharityYear."""
+        foodbank = make_foodbank("English Food Bank", "England", "1100001")
+
+        assert load_charity_registers(ew_dir=ew_dir) == {"foodbanks": 1, "years": 2}
+
+        foodbank.refresh_from_db()
+        assert foodbank.charity_id == "5001"
+        assert foodbank.charity_name == "ENGLISH FOOD BANK"
+        assert foodbank.charity_type == "CIO"
+        assert foodbank.charity_reg_date == datetime.date(2010, 3, 1)
+        assert foodbank.charity_objectives == "Relieving food poverty"
+        assert foodbank.charity_purpose == "The Prevention Or Relief Of Poverty\nGeneral Charitable Purposes\n"
+        assert foodbank.last_charity_check is not None
+        years = CharityYear.objects.filter(foodbank=foodbank).order_by("date")
+        assert [(year.date, year.income, year.expenditure) for year in years] == [
+            (datetime.date(2023, 3, 31), 120000, 110000),
+            (datetime.date(2024, 3, 31), 150000, 140000),
+        ]
+
+    def test_years_upserted(self, ew_dir, no_http):
+        """A year already stored is updated rather than added again, and older years are kept."""
+        foodbank = make_foodbank("English Food Bank", "England", "1100001")
+        CharityYear(foodbank=foodbank, date=datetime.date(2024, 3, 31), income=1, expenditure=1).save()
+        CharityYear(foodbank=foodbank, date=datetime.date(2019, 3, 31), income=5, expenditure=5).save()
+
+        load_charity_registers(ew_dir=ew_dir)
+        load_charity_registers(ew_dir=ew_dir)
+
+        years = {year.date: year.income for year in CharityYear.objects.filter(foodbank=foodbank)}
+        assert years == {
+            datetime.date(2019, 3, 31): 5,
+            datetime.date(2023, 3, 31): 120000,
+            datetime.date(2024, 3, 31): 150000,
+        }
+
+    def test_only_own_country(self, ew_dir, no_http):
+        """A food bank is only loaded from its own country's register, and closed ones aren't."""
+        scottish = make_foodbank("Scottish Food Bank", "Scotland", "1100001")
+        closed = make_foodbank("Closed Food Bank", "Wales", "1100001", is_closed=True)
+
+        assert load_charity_registers(ew_dir=ew_dir) == {"foodbanks": 0, "years": 0}
+        scottish.refresh_from_db()
+        closed.refresh_from_db()
+        assert scottish.charity_name is None
+        assert closed.charity_name is None
+
+    def test_scotland(self, tmp_path, no_http):
+        """OSCR's register gives the charity and its latest year."""
+        foodbank = make_foodbank("Scottish Food Bank", "Scotland", "sc012345")
+        path = tmp_path / "oscr.csv"
+        path.write_text(
+            "Charity Number,Charity Name,Registered Date,Postcode,Website,Purposes,Objectives,Year End,Most recent year income,Most recent year expenditure\n"
+            "SC012345,Scottish Food Bank,01/04/2012,G1 1AA,https://sfb.example.com,\"'The prevention or relief of poverty','The advancement of health'\",Feeding people,31/03/2024,\"£80,000\",75000\n",
+            encoding="utf-8",
+        )
+
+        load_charity_registers(scotland_path=path)
+
+        foodbank.refresh_from_db()
+        assert foodbank.charity_name == "Scottish Food Bank"
+        assert foodbank.charity_reg_date == datetime.date(2012, 4, 1)
+        assert foodbank.charity_purpose == "The prevention or relief of poverty\nThe advancement of health\n"
+        year = CharityYear.objects.get(foodbank=foodbank)
+        assert (year.date, year.income, year.expenditure) == (datetime.date(2024, 3, 31), 80000, 75000)
+
+    def test_northern_ireland(self, tmp_path, no_http):
+        """CCNI's register is matched without the NIC prefix, and subsidiaries are skipped."""
+        foodbank = make_foodbank("Ulster Food Bank", "Northern Ireland", "NIC100123")
+        path = tmp_path / "ccni.csv"
+        path.write_text(
+            "Reg charity number,Sub charity number,Charity name,Date registered,Website,Charitable purposes,What the charity does,Date for financial year ending,Total income,Total spending\n"
+            "100123,1,Ulster Subsidiary,01/01/2015,,,,,,\n"
+            "100123,0,Ulster Food Bank,02/02/2014,https://ufb.example.com,Relief of poverty,\"Provides food,Gives advice\",31/12/2023,50000,45000\n",
+            encoding="utf-8",
+        )
+
+        load_charity_registers(ni_path=path)
+
+        foodbank.refresh_from_db()
+        assert foodbank.charity_name == "Ulster Food Bank"
+        assert foodbank.charity_objectives == "Relief of poverty"
+        assert foodbank.charity_purpose == "Provides food\nGives advice"
+        assert CharityYear.objects.get(foodbank=foodbank).date == datetime.date(2023, 12, 31)
+
+    def test_command(self, ew_dir, no_http):
+        """charityinfo loads from the files when given them, rather than crawling."""
+        foodbank = make_foodbank("English Food Bank", "England", "1100001")
+        stdout = StringIO()
+
+        with patch("gfoffline.management.commands.charityinfo.foodbank_charity_crawl") as crawl:
+            call_command("charityinfo", ew_dir=str(ew_dir), stdout=stdout)
+
+        crawl.assert_not_called()
+        assert "Updated 1 food banks and 2 charity years" in stdout.getvalue()
+        foodbank.refresh_from_db()
+        assert foodbank.charity_name == "ENGLISH FOOD BANK"
+
+
+class TestParsing:
+    """Test the registers' dates and figures are read."""
+
+    def test_dates(self):
+        assert parse_date("2024-03-31 00:00:00") == datetime.date(2024, 3, 31)
+        assert parse_date("2024-03-31T00:00:00") == datetime.date(2024, 3, 31)
+        assert parse_date("31/03/2024") == datetime.date(2024, 3, 31)
+        assert parse_date("") is None
+        assert parse_date("not a date") is None
+
+    def test_money(self):
+        assert parse_money("£1,234.56") == 1234
+        assert parse_money("") is None
+        assert parse_money("n/a") is None
@@ -0,0 +1,191 @@
+"""
+Tests for ETag, Last-Modified and 304 responses on the API and GeoJSON views.
+"""
+import pytest
+from unittest.mock import patch
+
+from django.utils import timezone
+
+from givefood.models import DataChange, DataVersion, Foodbank
+from givefood.utils.cache import bump_data_version, get_data_versions
+
+
+def get_version(scope):
+    return get_data_versions([scope])[scope][0]
+
+
+def make_foodbank():
+    foodbank = Foodbank(
+        name="Conditional",
+        slug="conditional",
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country="England",
+        lat_lng="51.5014,-0.1419",
+        latitude=51.5014,
+        longitude=-0.1419,
+        network="Independent",
+        url="https://test.example.com",
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+    )
+    with patch('givefood.models.foodbank.queue_decache'):
+        foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+@pytest.mark.django_db
+class TestDataVersion:
+    """Test the data version counter."""
+
+    def test_bump_increments(self):
+        """Test that bumping moves the version on."""
+        version = get_version("foodbank")
+        bump_data_version("foodbank")
+        assert get_version("foodbank") == version + 1
+
+    def test_bump_is_scoped(self):
+        """Test that bumping one type of data leaves the others' versions alone."""
+        version = get_version("constituency")
+        bump_data_version("foodbank", "need")
+        assert get_version("constituency") == version
+
+    def test_missing_row_is_created(self):
+        """Test that the version still works if its row has gone."""
+        DataVersion.objects.all().delete()
+        bump_data_version("foodbank")
+        assert get_version("foodbank") >= 1
+
+    def test_read_from_cache(self, django_assert_num_queries):
+        """Test that a version that's been read is read again without a query."""
+        get_version("foodbank")
+        with django_assert_num_queries(0):
+            get_version("foodbank")
+
+    def test_foodbank_save_bumps(self):
+        """Test that saving a food bank changes the version."""
+        version = get_version("foodbank")
+        make_foodbank()
+        assert get_version("foodbank") > version
+
+    def test_private_save_doesnt_bump(self):
+        """Test that a crawler noting when it last looked changes nothing public."""
+        foodbank = Foodbank.objects.get(pk = make_foodbank().pk)
+        version = get_version("foodbank")
+        changes = DataChange.objects.count()
+
+        foodbank.last_crawl = timezone.now()
+        with patch('givefood.models.foodbank.queue_decache'):
+            foodbank.save(do_geoupdate=False, do_decache=False)
+
+        assert get_version("foodbank") == version
+        assert DataChange.objects.count() == changes
+
+    def test_public_save_bumps(self):
+        """Test that a change to a loaded food bank's public fields is recorded."""
+        foodbank = Foodbank.objects.get(pk = make_foodbank().pk)
+        version = get_version("foodbank")
+
+        foodbank.phone_number = "01234567890"
+        with patch('givefood.models.foodbank.queue_decache'):
+            foodbank.save(do_geoupdate=False, do_decache=False)
+
+        assert get_version("foodbank") > version
+
+    def test_foodbank_delete_bumps(self):
+        """Test that deleting a food bank changes the version."""
+        foodbank = make_foodbank()
+        version = get_version("foodbank")
+        foodbank.delete()
+        assert get_version("foodbank") > version
+
+
+@pytest.mark.django_db
+class TestConditionalRequests:
+    """Test the validators and 304s on the versioned views."""
+
+    @pytest.mark.parametrize("path", [
+        "/api/2/foodbanks/",
+        "/api/2/foodbanks/?format=geojson",
+        "/api/2/constituencies/",
+        "/api/2/locations/",
+        "/api/2/needs/",
+        "/api/1/foodbanks/",
+        "/needs/geo.json",
+        "/needs/at/conditional/geo.json",
+    ])
+    def test_validators_and_304(self, client, path):
+        """Test that responses carry validators, and a matching If-None-Match gets a 304."""
+        make_foodbank()
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response["ETag"].startswith('"')
+        assert "Last-Modified" in response
+
+        response = client.get(path, HTTP_IF_NONE_MATCH=response["ETag"])
+        assert response.status_code == 304
+        assert response.content == b""
+        assert "ETag" in response
+
+    def test_304_runs_no_view_queries(self, client, django_assert_num_queries):
+        """Test that a 304 reads the data version from the cache."""
+        make_foodbank()
+        etag = client.get("/api/2/foodbanks/")["ETag"]
+        with django_assert_num_queries(0):
+            response = client.get("/api/2/foodbanks/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    def test_weak_etag_matches(self, client):
+        """Test that the weak form GZipMiddleware turns the ETag into still matches."""
+        make_foodbank()
+        etag = client.get("/api/2/foodbanks/")["ETag"]
+        response = client.get("/api/2/foodbanks/", HTTP_IF_NONE_MATCH="W/" + etag)
+        assert response.status_code == 304
+
+    def test_if_modified_since(self, client):
+        """Test that If-Modified-Since at the Last-Modified gets a 304."""
+        make_foodbank()
+        response = client.get("/api/2/foodbanks/")
+        response = client.get("/api/2/foodbanks/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        assert response.status_code == 304
+
+    def test_etag_differs_by_url(self, client):
+        """Test that each representation has its own ETag."""
+        make_foodbank()
+        json_etag = client.get("/api/2/foodbanks/")["ETag"]
+        xml_etag = client.get("/api/2/foodbanks/?format=xml")["ETag"]
+        assert json_etag != xml_etag
+
+    def test_change_invalidates_etag_and_cache(self, client):
+        """Test that a save gives a new ETag and a fresh body, not the cached one."""
+        foodbank = make_foodbank()
+        response = client.get("/api/2/foodbanks/")
+        etag = response["ETag"]
+        assert b"Renamed" not in response.content
+
+        foodbank.name = "Renamed"
+        with patch('givefood.models.foodbank.queue_decache'):
+            foodbank.save(do_geoupdate=False, do_decache=False)
+
+        response = client.get("/api/2/foodbanks/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert b"Renamed" in response.content
+
+    def test_change_leaves_other_types_alone(self, client):
+        """Test that a food bank save doesn't move on the constituency list's ETag."""
+        foodbank = make_foodbank()
+        etag = client.get("/api/2/constituencies/")["ETag"]
+
+        foodbank.name = "Renamed"
+        with patch('givefood.models.foodbank.queue_decache'):
+            foodbank.save(do_geoupdate=False, do_decache=False)
+
+        response = client.get("/api/2/constituencies/", HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+    def test_errors_have_no_validators(self, client):
+        """Test that a 404 isn't given an ETag."""
+        response = client.get("/api/2/foodbank/does-not-exist/")
+        assert response.status_code == 404
+        assert "ETag" not in response
@@ -7,7 +7,7 @@ from givefood.models import Foodbank, FoodbankDonationPoint
 class TestDonationPointDecaching:
     """Test that FoodbankDonationPoint triggers decaching of /api/3/donationpoints/ when saved."""
 
-    @patch('givefood.models.foodbank.decache_async')
+    @patch('givefood.models.foodbank.queue_decache')
     def test_save_triggers_decaching(self, mock_decache):
         """Test that saving a donation point triggers decaching of the donationpoints API prefix."""
         # Create a food bank
@@ -37,8 +37,8 @@ class TestDonationPointDecaching:
         )
         donation_point.save(do_geoupdate=False, do_foodbank_resave=False, do_photo_update=False)
 
-        # Verify that decache_async.enqueue was called with the donationpoints prefix
-        assert mock_decache.enqueue.called
-        call_args = mock_decache.enqueue.call_args
+        # Verify that queue_decache was called with the donationpoints prefix
+        assert mock_decache.called
+        call_args = mock_decache.call_args
         prefixes = call_args[1].get("prefixes") or call_args[0][0] if call_args[0] else call_args[1].get("prefixes")
         assert "/api/3/donationpoints/" in prefixes
@@ -2,13 +2,14 @@ import pytest
 from unittest.mock import patch, call
 from django.utils.translation import activate
 from givefood.models import Foodbank, FoodbankChange, FoodbankChangeTranslation
+from givefood.utils.general import translation_languages
 
 
 @pytest.mark.django_db
 class TestFoodbankChangeTranslation:
     """Test that FoodbankChange triggers translation when published."""
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_save_with_published_true_triggers_translation(self, mock_translate):
         """Test that saving a need with published=True triggers translation."""
         # Create a food bank
@@ -36,18 +37,10 @@ class TestFoodbankChangeTranslation:
         )
         need.save()
 
-        # Verify that translate_need_async.enqueue was called for non-English languages
-        # The LANGUAGES setting should have multiple languages, we expect calls for each non-en language
-        assert mock_translate.enqueue.called
-        # Check that it was called with the need_id_str
-        calls = mock_translate.enqueue.call_args_list
-        # Should be called for each non-English language
-        assert len(calls) > 0
-        # Verify the need_id_str is passed in each call
-        for call_args in calls:
-            assert call_args[0][1] == str(need.need_id)
-
-    @patch('givefood.models.needs.translate_need_async')
+        # Verify that translate_needs_async.enqueue was called once, for every language
+        mock_translate.enqueue.assert_called_once_with([str(need.need_id)])
+
+    @patch('givefood.models.needs.translate_needs_async')
     def test_save_with_published_false_does_not_trigger_translation(self, mock_translate):
         """Test that saving a need with published=False does not trigger translation."""
         # Create a food bank
@@ -75,10 +68,10 @@ class TestFoodbankChangeTranslation:
         )
         need.save()
 
-        # Verify that translate_need_async.enqueue was NOT called
+        # Verify that translate_needs_async.enqueue was NOT called
         assert not mock_translate.enqueue.called
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_update_to_published_true_triggers_translation(self, mock_translate):
         """Test that updating a need to published=True triggers translation."""
         # Create a food bank
@@ -113,14 +106,10 @@ class TestFoodbankChangeTranslation:
         need.published = True
         need.save()
 
-        # Verify that translate_need_async.enqueue was called
-        assert mock_translate.enqueue.called
-        calls = mock_translate.enqueue.call_args_list
-        assert len(calls) > 0
-        for call_args in calls:
-            assert call_args[0][1] == str(need.need_id)
+        # Verify that translate_needs_async.enqueue was called
+        mock_translate.enqueue.assert_called_once_with([str(need.need_id)])
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_save_with_do_translate_false_does_not_trigger_translation(self, mock_translate):
         """Test that saving with do_translate=False prevents translation even when published=True."""
         # Create a food bank
@@ -148,10 +137,10 @@ class TestFoodbankChangeTranslation:
         )
         need.save(do_translate=False)
 
-        # Verify that translate_need_async.enqueue was NOT called
+        # Verify that translate_needs_async.enqueue was NOT called
         assert not mock_translate.enqueue.called
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_save_without_foodbank_does_not_crash(self, mock_translate):
         """Test that saving a need without a foodbank doesn't crash."""
         # Create a need without a foodbank
@@ -164,7 +153,7 @@ class TestFoodbankChangeTranslation:
         # Should not crash, and translation might or might not be called
         # (depending on implementation - it's valid either way)
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_save_does_not_translate_skipped_languages(self, mock_translate):
         """Test that saving a need does not trigger translation for languages in LANGUAGES_SKIP_TRANSLATE (e.g. tlh/Klingon)."""
         foodbank = Foodbank(
@@ -190,19 +179,20 @@ class TestFoodbankChangeTranslation:
         )
         need.save()
 
-        # Verify that translate_need_async.enqueue was NOT called for "tlh"
-        calls = mock_translate.enqueue.call_args_list
-        translated_languages = [call_args[0][0] for call_args in calls]
-        assert "tlh" not in translated_languages
-        # But it should still be called for other non-English languages
-        assert len(translated_languages) > 0
+        # Verify that the task doesn't translate into "tlh"
+        assert mock_translate.enqueue.called
+        languages = translation_languages()
+        assert "tlh" not in languages
+        assert "en" not in languages
+        # But it should still translate into other non-English languages
+        assert len(languages) > 0
 
 
 @pytest.mark.django_db
 class TestFoodbankChangeGetText:
     """Test that FoodbankChange.get_text() handles missing translations."""
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_get_text_fallback_to_english_when_translation_missing(self, mock_translate):
         """Test that get_text falls back to English when translation doesn't exist."""
         # Create a food bank
@@ -244,7 +234,7 @@ class TestFoodbankChangeGetText:
         # Reset to English
         activate('en')
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_get_text_uses_translation_when_available(self, mock_translate):
         """Test that get_text uses translation when it exists."""
         # Create a food bank
@@ -295,7 +285,7 @@ class TestFoodbankChangeGetText:
         # Reset to English
         activate('en')
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_get_text_returns_english_when_language_is_english(self, mock_translate):
         """Test that get_text returns English text when language is English."""
         # Create a food bank
@@ -334,7 +324,7 @@ class TestFoodbankChangeGetText:
         excess_text = need.get_excess_text()
         assert excess_text == "Bread\nMilk"
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_get_text_uses_prefetched_translations(self, mock_translate):
         """Test that get_text uses prefetched translations when available to avoid N+1 queries."""
         from django.db.models import Prefetch
@@ -392,7 +382,7 @@ class TestFoodbankChangeGetText:
         # Reset to English
         activate('en')
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_get_text_returns_empty_string_when_text_is_none(self, mock_translate):
         """Test that get_text returns empty string when change_text or excess_change_text is None."""
         foodbank = Foodbank(
@@ -428,7 +418,7 @@ class TestFoodbankChangeGetText:
         change_text = need.get_change_text()
         assert change_text == ""
 
-    @patch('givefood.models.needs.translate_need_async')
+    @patch('givefood.models.needs.translate_needs_async')
     def test_get_text_fallback_to_english_when_translation_has_empty_text(self, mock_translate):
         """Test that get_text falls back to English when translation record exists but has empty/None text."""
         foodbank = Foodbank(
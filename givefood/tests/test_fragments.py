@@ -0,0 +1,135 @@
+"""
+Tests for get_fragment, the cache for parts of food bank pages shared across languages.
+"""
+import pytest
+from django.core.cache import cache
+from django.utils.translation import activate, get_language, override
+
+from givefood.models import Foodbank, FoodbankLocation
+from givefood.utils.cache import fragment_key, get_fragment
+
+
+def make_foodbank(name="Fragment Food Bank"):
+    foodbank = Foodbank(
+        name=name,
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country="England",
+        lat_lng="51.5014,-0.1419",
+        network="Independent",
+        url="https://test.example.com",
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+    )
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def make_location(foodbank, name="Fragment Location"):
+    location = FoodbankLocation(
+        foodbank=foodbank,
+        name=name,
+        address="2 Test Street",
+        postcode="SW1A 2AA",
+        lat_lng="51.5024,-0.1429",
+        country="England",
+    )
+    location.save(do_geoupdate=False, do_foodbank_resave=False)
+    return location
+
+
+class Builder:
+    """Counts builds, and remembers the language each was in."""
+
+    def __init__(self):
+        self.languages = []
+
+    def __call__(self):
+        self.languages.append(get_language())
+        return "built %s" % len(self.languages)
+
+
+@pytest.mark.django_db
+class TestGetFragment:
+    """Test fragments are built once per version, and shared across languages."""
+
+    def setup_method(self):
+        cache.clear()
+
+    def test_shared_built_once(self):
+        """A shared fragment is built once, in English, for every language."""
+        foodbank = make_foodbank()
+        build = Builder()
+
+        for language in ("en", "cy", "pl", "ar"):
+            with override(language):
+                assert get_fragment("test", [foodbank], build) == "built 1"
+
+        assert build.languages == ["en"]
+
+    def test_not_shared_per_language(self):
+        """A fragment that isn't shared is built once for each language."""
+        foodbank = make_foodbank()
+        build = Builder()
+
+        for language in ("en", "cy", "en"):
+            with override(language):
+                get_fragment("test", [foodbank], build, shared=False)
+
+        assert build.languages == ["en", "cy"]
+        assert fragment_key("test", [foodbank], "cy") != fragment_key("test", [foodbank], "en")
+
+    def test_save_is_a_new_version(self):
+        """Saving the object moves the fragment on to a new key."""
+        foodbank = make_foodbank()
+        build = Builder()
+        get_fragment("test", [foodbank], build)
+
+        foodbank.save(do_geoupdate=False, do_decache=False)
+
+        assert get_fragment("test", [foodbank], build) == "built 2"
+
+    def test_child_save_moves_foodbank_on(self):
+        """Saving a location without resaving its food bank still moves the food bank's fragments on."""
+        foodbank = make_foodbank()
+        before = fragment_key("locations", [foodbank])
+
+        make_location(foodbank)
+
+        foodbank.refresh_from_db()
+        assert fragment_key("locations", [foodbank]) != before
+
+    def test_keyed_by_every_object(self):
+        """A fragment from two objects is a different fragment for each pair."""
+        foodbank = make_foodbank()
+        first = make_location(foodbank, "First Location")
+        second = make_location(foodbank, "Second Location")
+        foodbank.refresh_from_db()
+
+        assert fragment_key("schema_org", [foodbank, first]) != fragment_key("schema_org", [foodbank, second])
+
+
+@pytest.mark.django_db
+class TestFragmentViews:
+    """Test the food bank pages that use fragments."""
+
+    def setup_method(self):
+        cache.clear()
+
+    def teardown_method(self):
+        # A /cy/ request leaves Welsh active for the tests after
+        activate("en")
+
+    def test_location_list_follows_edits(self, client):
+        """The locations page lists a location added after it was first rendered."""
+        foodbank = make_foodbank()
+        make_location(foodbank, "First Location")
+        Foodbank.objects.filter(id=foodbank.id).update(no_locations=1)
+        assert "First Location" in client.get("/needs/at/fragment-food-bank/locations/").content.decode()
+
+        # Without resaving the food bank, which would clear the whole cache
+        make_location(foodbank, "Second Location")
+        Foodbank.objects.filter(id=foodbank.id).update(no_locations=2)
+        content = client.get("/cy/needs/at/fragment-food-bank/locations/").content.decode()
+        assert "First Location" in content
+        assert "Second Location" in content
@@ -0,0 +1,233 @@
+"""
+Tests for MapPoint, the one table behind the maps and sitemap, and the views that read it.
+"""
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils.translation import override
+
+from givefood.models import Foodbank, FoodbankDonationPoint, FoodbankLocation, MapPoint, ParliamentaryConstituency
+
+
+def make_foodbank(name="Map Food Bank", **kwargs):
+    defaults = {
+        "address": "1 Test Street",
+        "postcode": "SW1A 1AA",
+        "country": "England",
+        "lat_lng": "51.5014,-0.1419",
+        "network": "Independent",
+        "url": "https://test.example.com",
+        "shopping_list_url": "https://test.example.com/shopping",
+        "contact_email": "test@example.com",
+        "parliamentary_constituency_slug": "cities-of-london-and-westminster",
+    }
+    defaults.update(kwargs)
+    foodbank = Foodbank(name=name, **defaults)
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def make_location(foodbank, name="Map Location", **kwargs):
+    location = FoodbankLocation(
+        foodbank=foodbank,
+        name=name,
+        address="2 Test Street",
+        postcode="SW1A 2AA",
+        lat_lng="51.5024,-0.1429",
+        country="Wales",
+        **kwargs,
+    )
+    location.save(do_geoupdate=False, do_foodbank_resave=False)
+    return location
+
+
+def make_donationpoint(foodbank, name="Map Shop"):
+    donationpoint = FoodbankDonationPoint(
+        foodbank=foodbank,
+        name=name,
+        address="3 Test Street",
+        postcode="SW1A 3AA",
+        lat_lng="51.5034,-0.1439",
+        country="England",
+    )
+    donationpoint.save(do_geoupdate=False, do_foodbank_resave=False, do_photo_update=False)
+    return donationpoint
+
+
+def points():
+    return {(point.point_type, point.name): point for point in MapPoint.objects.all()}
+
+
+@pytest.mark.django_db
+class TestMapPointSync:
+    """Test MapPoint is kept in step with the tables it copies."""
+
+    def test_saves_add_points(self):
+        """Each food bank, location and donation point has a point, with its URL and address."""
+        foodbank = make_foodbank()
+        location = make_location(foodbank)
+        donationpoint = make_donationpoint(foodbank)
+
+        saved = points()
+        assert set(saved) == {
+            ("foodbank", "Map Food Bank"),
+            ("location", "Map Location"),
+            ("donationpoint", "Map Shop"),
+        }
+
+        point = saved[("foodbank", "Map Food Bank")]
+        assert point.object_id == foodbank.id
+        assert point.url == "/needs/at/map-food-bank/"
+        assert point.address == "1 Test Street\r\nSW1A 1AA"
+        assert point.latitude == pytest.approx(51.5014)
+        assert point.parliamentary_constituency_slug == "cities-of-london-and-westminster"
+
+        point = saved[("location", "Map Location")]
+        assert point.object_id == location.id
+        assert point.foodbank_id == foodbank.id
+        assert point.foodbank_name == "Map Food Bank"
+        assert point.country == "Wales"
+        assert point.url == "/needs/at/map-food-bank/map-location/"
+
+        point = saved[("donationpoint", "Map Shop")]
+        assert point.object_id == donationpoint.id
+        assert point.url == "/needs/at/map-food-bank/donationpoint/map-shop/"
+
+    def test_resave_updates_in_place(self):
+        """Saving again updates the point rather than adding another."""
+        foodbank = make_foodbank()
+        location = make_location(foodbank)
+
+        location.name = "Moved Location"
+        location.lat_lng = "52.0000,-1.0000"
+        location.save(do_geoupdate=False, do_foodbank_resave=False)
+
+        location_points = MapPoint.objects.filter(point_type="location")
+        assert location_points.count() == 1
+        assert location_points[0].name == "Moved Location"
+        assert location_points[0].latitude == 52.0
+        assert location_points[0].url == "/needs/at/map-food-bank/moved-location/"
+
+    def test_delivery_address(self):
+        """A delivery address is a point of its own, which goes when the address does."""
+        with patch("givefood.models.foodbank.geocode", return_value="51.6000,-0.2000"):
+            foodbank = make_foodbank(delivery_address="Warehouse\nSW1A 4AA")
+
+        delivery = MapPoint.objects.get(point_type="delivery")
+        assert delivery.object_id == foodbank.id
+        assert delivery.latitude == 51.6
+        assert delivery.address == "Warehouse\nSW1A 4AA"
+
+        foodbank.delivery_address = ""
+        foodbank.save(do_geoupdate=False, do_decache=False)
+        assert not MapPoint.objects.filter(point_type="delivery").exists()
+        assert MapPoint.objects.filter(point_type="foodbank").exists()
+
+    def test_closing_is_copied(self):
+        """A closed food bank's point is marked closed."""
+        foodbank = make_foodbank()
+        foodbank.is_closed = True
+        foodbank.save(do_geoupdate=False, do_decache=False)
+        assert MapPoint.objects.get(point_type="foodbank").is_closed
+
+    def test_deletes_remove_points(self):
+        """Deleting a location or food bank takes its points with it."""
+        foodbank = make_foodbank()
+        location = make_location(foodbank)
+        make_donationpoint(foodbank)
+
+        location.delete()
+        assert ("location", "Map Location") not in points()
+
+        foodbank.delete()
+        assert not MapPoint.objects.exists()
+
+    def test_rebuild(self):
+        """rebuild_map_points refills the table to what the saves would have left."""
+        foodbank = make_foodbank()
+        make_location(foodbank, boundary_geojson='{"type":"Feature","geometry":{"type":"Polygon","coordinates":[]},"properties":{}}')
+        make_donationpoint(foodbank)
+        before = {key: (point.url, point.address, point.is_area) for key, point in points().items()}
+
+        MapPoint.objects.all().delete()
+        call_command("rebuild_map_points", stdout=StringIO())
+
+        after = {key: (point.url, point.address, point.is_area) for key, point in points().items()}
+        assert after == before
+        assert after[("location", "Map Location")][2] is True
+
+
+@pytest.mark.django_db
+class TestMapPointViews:
+    """Test the views that read MapPoint."""
+
+    def test_url_path_in_welsh(self):
+        """URLs are stored unprefixed and prefixed for the language being served."""
+        make_foodbank()
+        point = MapPoint.objects.get(point_type="foodbank")
+        assert point.url_path() == "/needs/at/map-food-bank/"
+        with override("cy"):
+            assert point.url_path() == "/cy/needs/at/map-food-bank/"
+
+    def test_geojson_in_one_query(self, client, django_assert_max_num_queries):
+        """The everything map reads one table, whatever is on it."""
+        cache.clear()
+        foodbank = make_foodbank()
+        make_location(foodbank)
+        make_donationpoint(foodbank)
+
+        with django_assert_max_num_queries(3):
+            response = client.get("/needs/geo.json")
+
+        features = response.json()["features"]
+        assert [feature["properties"]["type"] for feature in features] == ["f", "l", "d"]
+        assert features[0]["properties"] == {"type": "f", "name": "Map Food Bank Foodbank", "url": "/needs/at/map-food-bank/"}
+        assert features[1]["properties"]["foodbank"] == "Map Food Bank"
+        assert features[1]["geometry"]["coordinates"] == [-0.1429, 51.5024]
+
+    def test_constituency_geojson(self, client):
+        """The constituency map has its outline and the open points in it."""
+        cache.clear()
+        ParliamentaryConstituency(
+            name="Cities of London and Westminster",
+            slug="cities-of-london-and-westminster",
+            country="England",
+            centroid="51.5014,-0.1419",
+            mp="A. Member",
+            mp_party="Party",
+            mp_parl_id=1,
+            mp_display_name="A. Member",
+            boundary_geojson='{"type":"Feature","geometry":{"type":"Polygon","coordinates":[]},"properties":{}}',
+        ).save()
+        make_foodbank()
+        make_foodbank(name="Closed Map Food Bank", is_closed=True)
+
+        features = client.get("/needs/in/constituency/cities-of-london-and-westminster/geo.json").json()["features"]
+        assert [(feature["properties"]["type"], feature["properties"].get("name")) for feature in features] == [
+            ("b", None),
+            ("f", "Map Food Bank Foodbank"),
+        ]
+
+    def test_country_geojson(self, client):
+        """The country map has the points in that country, with addresses."""
+        cache.clear()
+        foodbank = make_foodbank()
+        make_location(foodbank)
+
+        features = client.get("/wales/geo.json").json()["features"]
+        assert [feature["properties"]["name"] for feature in features] == ["Map Location"]
+        assert features[0]["properties"]["address"] == "2 Test Street\r\nSW1A 2AA"
+
+    def test_sitemap(self, client):
+        """The sitemap lists open location and donation point pages."""
+        cache.clear()
+        foodbank = make_foodbank()
+        make_location(foodbank)
+        make_donationpoint(foodbank)
+
+        content = client.get("/sitemap.xml").content.decode()
+        assert "/needs/at/map-food-bank/map-location/</loc>" in content
+        assert "/needs/at/map-food-bank/donationpoint/map-shop/</loc>" in content
@@ -0,0 +1,221 @@
+"""
+Tests for static map parameters and their background prerendering.
+"""
+from unittest.mock import Mock, patch
+
+import pytest
+from django.test import override_settings
+
+from givefood.const.general import MAP_SIZE_CONFIG, MAP_SIZE_MEDIUM
+from givefood.models import Foodbank, FoodbankLocation
+from givefood.utils.maps import (
+    foodbank_map_params,
+    is_map_stored,
+    location_map_params,
+    prerender_maps,
+    queue_map_prerender,
+)
+
+
+LANGUAGES = [("en", "English"), ("cy", "Cymraeg"), ("pl", "Polski")]
+
+
+@pytest.fixture
+def blob_dir(tmp_path):
+    with override_settings(BLOB_CACHE_DIR=str(tmp_path), LANGUAGES=LANGUAGES):
+        yield tmp_path
+
+
+@pytest.fixture
+def foodbank():
+    foodbank = Foodbank(
+        name="Map Test",
+        slug="map-test",
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country="England",
+        lat_lng="51.5014,-0.1419",
+        latitude=51.5014,
+        longitude=-0.1419,
+        network="Independent",
+        url="https://test.example.com",
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+    )
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def add_location(foodbank, name="Map Test Location", lat_lng="51.5100,-0.1300"):
+    location = FoodbankLocation(
+        foodbank=foodbank,
+        name=name,
+        address="2 Test Street",
+        postcode="SW1A 1AA",
+        lat_lng=lat_lng,
+        country="England",
+    )
+    location.save(do_geoupdate=False, do_foodbank_resave=False)
+    return location
+
+
+def map_response(content=b"map"):
+    response = Mock()
+    response.status_code = 200
+    response.content = content
+    return response
+
+
+@pytest.mark.django_db
+class TestMapParams:
+    """Test the parameters maps are requested and stored by."""
+
+    def test_no_api_key(self, foodbank):
+        """The key isn't part of what a map is stored by."""
+        params = dict(foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "en"))
+        assert "key" not in params
+        assert params["center"] == "51.5014,-0.1419"
+        assert params["language"] == "en"
+
+    def test_unlocalised_language_shares_default(self, foodbank):
+        """A language Google doesn't draw maps in gets the default language's map."""
+        assert foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "cy") == foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "en")
+        assert foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "tlh") == foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "en")
+        assert dict(foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "pl"))["language"] == "pl"
+        assert dict(foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "zh-hans"))["language"] == "zh-CN"
+
+    def test_invalid_size(self, foodbank):
+        """A size that isn't one of the map sizes has no parameters."""
+        assert foodbank_map_params(foodbank, 999, "en") is None
+
+    def test_location_markers(self, foodbank):
+        """Adding a location changes the food bank's map."""
+        before = foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "en")
+        add_location(foodbank)
+        foodbank.refresh_from_db()
+        foodbank.no_locations = foodbank.get_no_locations()
+        assert foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "en") != before
+
+    def test_location_zoom(self, foodbank):
+        """A location without a boundary is zoomed in."""
+        location = add_location(foodbank)
+        assert dict(location_map_params(location, MAP_SIZE_MEDIUM, "en"))["zoom"] == 15
+
+
+@pytest.mark.django_db
+class TestPrerenderMaps:
+    """Test rendering maps ahead of them being asked for."""
+
+    def test_no_store_queues_nothing(self, foodbank):
+        """Without a blob store there's nowhere to render to."""
+        with patch("givefood.utils.maps.prerender_maps") as mock_task:
+            assert queue_map_prerender(foodbank) is False
+        assert not mock_task.enqueue.called
+
+    def test_new_foodbank_queues_map(self, blob_dir):
+        """Adding a food bank queues a render of its map."""
+        with patch("givefood.utils.maps.prerender_maps") as mock_task:
+            foodbank = Foodbank(
+                name="New Map",
+                address="1 Test Street",
+                postcode="SW1A 1AA",
+                country="England",
+                lat_lng="51.5014,-0.1419",
+                network="Independent",
+                url="https://test.example.com",
+                shopping_list_url="https://test.example.com/shopping",
+                contact_email="test@example.com",
+            )
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        mock_task.enqueue.assert_called_once_with(foodbank.id)
+
+    def test_unmoved_save_queues_nothing(self, blob_dir, foodbank):
+        """A save that leaves the markers where they were doesn't check or queue anything."""
+        foodbank = Foodbank.objects.get(pk=foodbank.pk)
+        foodbank.phone_number = "01234567890"
+        with patch("givefood.utils.maps.prerender_maps") as mock_task, patch("givefood.utils.maps.is_map_stored") as mock_stored:
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        assert not mock_task.enqueue.called
+        assert not mock_stored.called
+
+    def test_moved_foodbank_queues_map(self, blob_dir, foodbank):
+        """Moving a food bank's marker queues a render."""
+        foodbank = Foodbank.objects.get(pk=foodbank.pk)
+        foodbank.lat_lng = "51.6000,-0.2000"
+        with patch("givefood.utils.maps.prerender_maps") as mock_task:
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        mock_task.enqueue.assert_called_once_with(foodbank.id)
+
+    @patch("givefood.utils.maps.get_cred", return_value="test_api_key")
+    @patch("givefood.utils.maps.requests.get")
+    def test_renders_every_size(self, mock_get, mock_get_cred, blob_dir, foodbank):
+        """Every size of the food bank's and its locations' maps is stored in the default language."""
+        mock_get.return_value = map_response()
+        location = add_location(foodbank)
+
+        rendered = prerender_maps.call(foodbank.id)
+
+        assert rendered == 2 * len(MAP_SIZE_CONFIG)
+        for size in MAP_SIZE_CONFIG:
+            # Welsh shares the English map
+            for language in ("en", "cy"):
+                assert is_map_stored(foodbank_map_params(foodbank, size, language))
+                assert is_map_stored(location_map_params(location, size, language))
+            # Left for its first request
+            assert not is_map_stored(foodbank_map_params(foodbank, size, "pl"))
+
+    @patch("givefood.utils.maps.get_cred", return_value="test_api_key")
+    @patch("givefood.utils.maps.requests.get")
+    def test_unchanged_maps_not_fetched_again(self, mock_get, mock_get_cred, blob_dir, foodbank):
+        """A second run fetches nothing, and a resave with the same markers queues nothing."""
+        mock_get.return_value = map_response()
+        prerender_maps.call(foodbank.id)
+        mock_get.reset_mock()
+
+        assert prerender_maps.call(foodbank.id) == 0
+        assert not mock_get.called
+        with patch("givefood.utils.maps.prerender_maps") as mock_task:
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        assert not mock_task.enqueue.called
+
+    @patch("givefood.utils.maps.get_cred", return_value="test_api_key")
+    @patch("givefood.utils.maps.requests.get")
+    def test_moved_location_queues_render(self, mock_get, mock_get_cred, blob_dir, foodbank):
+        """Moving a location makes its map new, so a render is queued."""
+        mock_get.return_value = map_response()
+        location = add_location(foodbank)
+        prerender_maps.call(foodbank.id)
+
+        location.lat_lng = "51.6000,-0.2000"
+        with patch("givefood.utils.maps.prerender_maps") as mock_task:
+            location.save(do_geoupdate=False, do_foodbank_resave=False)
+        mock_task.enqueue.assert_called_once_with(foodbank.id)
+
+    @patch("givefood.utils.maps.get_cred", return_value="test_api_key")
+    @patch("givefood.utils.maps.requests.get")
+    def test_failed_fetch_skipped(self, mock_get, mock_get_cred, blob_dir, foodbank):
+        """A map Google won't give us is left for the view to try again."""
+        failed = Mock()
+        failed.status_code = 500
+        mock_get.return_value = failed
+
+        assert prerender_maps.call(foodbank.id) == 0
+        assert not is_map_stored(foodbank_map_params(foodbank, MAP_SIZE_MEDIUM, "en"))
+
+    def test_deleted_foodbank(self, blob_dir):
+        """A food bank gone before its render ran is nothing to do."""
+        assert prerender_maps.call(999999) == 0
+
+    @patch("givefood.utils.maps.get_cred", return_value="test_api_key")
+    @patch("givefood.utils.maps.requests.get")
+    def test_view_serves_prerendered_map(self, mock_get, mock_get_cred, blob_dir, foodbank, client):
+        """map.png is answered from the prerendered file without calling Google."""
+        mock_get.return_value = map_response(b"prerendered")
+        prerender_maps.call(foodbank.id)
+        mock_get.reset_mock()
+
+        response = client.get("/needs/at/map-test/map.png")
+
+        assert response.status_code == 200
+        assert b"".join(response.streaming_content) == b"prerendered"
+        assert not mock_get.called
@@ -4,9 +4,13 @@ Tests for the givefood middleware.
 import pytest
 import django.db.utils
 from django.test import RequestFactory
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from unittest.mock import Mock, patch, MagicMock
-from givefood.middleware import GeoJSONPreload, LoginRequiredAccess, RenderTime
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from givefood.middleware import GeoJSONPreload, LoginRequiredAccess, RenderTime, ServerTiming
+from givefood.utils.timing import http_service
 
 
 @pytest.mark.django_db
@@ -306,6 +310,27 @@ PUTTHERENDERTIMEHERE
             "Should replace only the first PUTTHERENDERTIMEHERE"
         )
 
+    def test_streaming_response_passes_through(self):
+        """Test that a streamed response is left unread for the server to send."""
+        def test_view(request):
+            return StreamingHttpResponse(iter([b"PUTTHERENDERTIMEHERE", b"rest"]))
+
+        middleware = RenderTime(test_view)
+        response = middleware(RequestFactory().get('/'))
+
+        assert response.streaming
+        assert b"".join(response.streaming_content) == b"PUTTHERENDERTIMEHERErest"
+
+    def test_non_html_response_untouched(self):
+        """Test that only HTML is searched for the placeholder."""
+        def test_view(request):
+            return HttpResponse(b'{"t": "PUTTHERENDERTIMEHERE"}', content_type='application/json')
+
+        middleware = RenderTime(test_view)
+        response = middleware(RequestFactory().get('/'))
+
+        assert response.content == b'{"t": "PUTTHERENDERTIMEHERE"}'
+
 
 @pytest.mark.django_db
 class TestLoginRequiredAccessMiddleware:
@@ -346,3 +371,115 @@ class TestLoginRequiredAccessMiddleware:
             middleware(request)
 
         assert 'next_url' not in request.session
+
+
+def server_timing_entries(response):
+    """The Server-Timing header as a dict of metric name to its parameters."""
+    entries = {}
+    for entry in response['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        entries[name] = dict(param.split('=', 1) for param in params)
+    return entries
+
+
+@pytest.mark.django_db
+class TestServerTimingMiddleware:
+    """Test the ServerTiming middleware."""
+
+    def test_database_queries_timed(self):
+        """Test that the request's queries are counted and timed."""
+        def test_view(request):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.execute("SELECT 2")
+            return HttpResponse('OK')
+
+        response = ServerTiming(test_view)(RequestFactory().get('/'))
+        entries = server_timing_entries(response)
+
+        assert entries['db']['desc'] == '"2"'
+        assert float(entries['db']['dur']) >= 0
+        assert float(entries['total']['dur']) >= float(entries['db']['dur'])
+
+    def test_cache_hits_and_misses(self):
+        """Test that cache lookups are counted as hits and misses per alias."""
+        cache.set('server-timing-test', 'value')
+
+        def test_view(request):
+            assert cache.get('server-timing-test') == 'value'
+            assert cache.get('server-timing-missing', 'default') == 'default'
+            assert cache.get_many(['server-timing-test', 'server-timing-missing']) == {'server-timing-test': 'value'}
+            return HttpResponse('OK')
+
+        response = ServerTiming(test_view)(RequestFactory().get('/'))
+
+        assert server_timing_entries(response)['cache-default']['desc'] == '"2 hit 2 miss"'
+
+    def test_cache_outside_request_unchanged(self):
+        """Test that an instrumented cache behaves as before outside a request."""
+        ServerTiming(lambda request: HttpResponse('OK'))(RequestFactory().get('/'))
+
+        cache.set('server-timing-test', None)
+        assert cache.get('server-timing-test', 'default') is None
+        assert cache.get('server-timing-missing', 'default') == 'default'
+
+    def test_template_render_timed(self, client):
+        """Test that a rendered page reports template time."""
+        response = client.get('/about-us/')
+
+        assert response.status_code == 200
+        assert 'tpl' in server_timing_entries(response)
+
+    def test_outbound_http_grouped_by_service(self):
+        """Test that requests made by the view are timed by who they went to."""
+        import requests
+
+        def test_view(request):
+            with patch('requests.adapters.HTTPAdapter.send', return_value=Mock(status_code=200, history=[], is_redirect=False, headers={})):
+                requests.get('https://api.postcodes.io/postcodes/SW1A1AA')
+                requests.get('https://maps.googleapis.com/maps/api/staticmap')
+                requests.get('https://maps.googleapis.com/maps/api/geocode/json')
+            return HttpResponse('OK')
+
+        response = ServerTiming(test_view)(RequestFactory().get('/'))
+        entries = server_timing_entries(response)
+
+        assert entries['http-postcodes']['desc'] == '"1"'
+        assert entries['http-google']['desc'] == '"2"'
+
+    def test_http_service(self):
+        """Test that hosts are grouped by service."""
+        assert http_service('https://api.openrouter.ai/v1') == 'openrouter'
+        assert http_service('https://openrouter.ai/api/v1/chat/completions') == 'openrouter'
+        assert http_service('https://api.cloudflare.com/client/v4/zones') == 'cloudflare'
+        assert http_service('https://example.com/') == 'http'
+        assert http_service('https://notgoogle.com/') == 'http'
+
+    def test_streaming_response_not_read(self):
+        """Test that a streamed response gets the header and keeps its stream."""
+        def test_view(request):
+            return StreamingHttpResponse(iter([b"one", b"two"]))
+
+        response = ServerTiming(test_view)(RequestFactory().get('/'))
+
+        assert 'total' in server_timing_entries(response)
+        assert b"".join(response.streaming_content) == b"onetwo"
+
+    def test_slow_requests_logged(self, caplog):
+        """Test that requests over SERVER_TIMING_LOG_MS are logged as JSON."""
+        import json
+
+        with override_settings(SERVER_TIMING_LOG_MS=0), caplog.at_level('INFO', logger='givefood.timing'):
+            ServerTiming(lambda request: HttpResponse('OK'))(RequestFactory().get('/slow/'))
+
+        line = json.loads(caplog.records[-1].getMessage())
+        assert line['path'] == '/slow/'
+        assert line['status'] == 200
+        assert 'total_ms' in line
+
+    def test_fast_requests_not_logged(self, caplog):
+        """Test that requests under SERVER_TIMING_LOG_MS aren't logged."""
+        with override_settings(SERVER_TIMING_LOG_MS=60000), caplog.at_level('INFO', logger='givefood.timing'):
+            ServerTiming(lambda request: HttpResponse('OK'))(RequestFactory().get('/'))
+
+        assert not caplog.records
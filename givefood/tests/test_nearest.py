@@ -0,0 +1,173 @@
+"""
+Tests for find_nearest, the one query behind the nearest food bank, location and donation point searches.
+"""
+import pytest
+
+from givefood.models import Foodbank, FoodbankChange, FoodbankChangeLine, FoodbankDonationPoint, FoodbankLocation
+from givefood.utils.geo import find_donationpoints, find_locations, find_locations_by_category, find_nearest
+
+
+SEARCH = "51.5000,-0.1000"
+
+
+def make_foodbank(name, lat_lng, **kwargs):
+    lat, lng = lat_lng.split(",")
+    foodbank = Foodbank(
+        name=name,
+        slug=name.lower().replace(" ", "-"),
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country="England",
+        lat_lng=lat_lng,
+        latitude=float(lat),
+        longitude=float(lng),
+        network="Independent",
+        url="https://%s.example.com" % name.lower().replace(" ", ""),
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+        phone_number="01234 567890",
+        **kwargs,
+    )
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def make_location(foodbank, name, lat_lng, **kwargs):
+    location = FoodbankLocation(
+        foodbank=foodbank,
+        name=name,
+        address="2 Test Street",
+        postcode="SW1A 1AA",
+        lat_lng=lat_lng,
+        country="England",
+        **kwargs,
+    )
+    location.save(do_geoupdate=False, do_foodbank_resave=False)
+    return location
+
+
+def make_donationpoint(foodbank, name, lat_lng):
+    donationpoint = FoodbankDonationPoint(
+        foodbank=foodbank,
+        name=name,
+        address="3 Test Street",
+        postcode="SW1A 1AA",
+        lat_lng=lat_lng,
+        url="https://shop.example.com/",
+    )
+    donationpoint.save(do_geoupdate=False, do_foodbank_resave=False, do_photo_update=False)
+    return donationpoint
+
+
+def give_need(foodbank, categories):
+    need = FoodbankChange(foodbank=foodbank, change_text="\n".join(categories), published=False)
+    need.save()
+    for category in categories:
+        FoodbankChangeLine(need=need, item=category, type="need", category=category).save()
+    Foodbank.objects.filter(id=foodbank.id).update(latest_need=need)
+    return need
+
+
+@pytest.fixture
+def places():
+    """Two food banks with locations and donation points, at known distances from SEARCH."""
+    near = make_foodbank("Near Food Bank", "51.5010,-0.1000")
+    far = make_foodbank("Far Food Bank", "51.6000,-0.1000")
+    make_foodbank("Closed Food Bank", "51.5001,-0.1000", is_closed=True)
+    give_need(near, ["Pasta", "Rice"])
+    give_need(far, ["Tinned Tomatoes"])
+    return {
+        "near": near,
+        "far": far,
+        "near_location": make_location(near, "Near Location", "51.5020,-0.1000"),
+        "far_location": make_location(far, "Far Location", "51.6100,-0.1000", is_donation_point=True),
+        "near_donationpoint": make_donationpoint(near, "Near Shop", "51.5005,-0.1000"),
+        "far_donationpoint": make_donationpoint(far, "Far Shop", "51.7000,-0.1000"),
+    }
+
+
+@pytest.mark.django_db
+class TestFindNearest:
+    """Test the nearest places search."""
+
+    def test_locations_nearest_first(self, places):
+        """Food banks and locations come back together, nearest first, without closed ones."""
+        results = find_locations(SEARCH, 10)
+
+        assert [(place.type, place.name) for place in results] == [
+            ("organisation", "Near Food Bank"),
+            ("location", "Near Location"),
+            ("organisation", "Far Food Bank"),
+            ("location", "Far Location"),
+        ]
+        assert results[0].distance == pytest.approx(111, abs=2)
+        assert [place.distance for place in results] == sorted(place.distance for place in results)
+
+    def test_locations_attributes(self, places):
+        """Results carry the attributes the templates and API read."""
+        foodbank, location = find_locations(SEARCH, 2)
+
+        assert foodbank.foodbank_slug == "near-food-bank"
+        assert foodbank.html_url == "https://www.givefood.org.uk/needs/at/near-food-bank/"
+        assert foodbank.homepage.startswith("https://nearfoodbank.example.com")
+        assert foodbank.distance_km == pytest.approx(foodbank.distance / 1000)
+
+        assert location.html_url == "https://www.givefood.org.uk/needs/at/near-food-bank/near-location/"
+        assert location.phone_number == location.foodbank.phone_number
+        assert location.latest_need.change_text == "Pasta\nRice"
+        assert location.foodbank.name == "Near Food Bank"
+
+    def test_quantity_and_skip_first(self, places):
+        """quantity limits the combined list, and skip_first drops the nearest."""
+        assert [place.name for place in find_locations(SEARCH, 2)] == ["Near Food Bank", "Near Location"]
+        assert [place.name for place in find_locations(SEARCH, 2, skip_first=True)] == ["Near Location", "Far Food Bank"]
+
+    def test_donationpoints(self, places):
+        """Donation points and donation point locations come back together, with their page URLs."""
+        results = find_donationpoints(SEARCH, 10)
+
+        assert [(place.type, place.name) for place in results] == [
+            ("donationpoint", "Near Shop"),
+            ("location", "Far Location"),
+            ("donationpoint", "Far Shop"),
+        ]
+        assert results[0].url == "/needs/at/near-food-bank/donationpoint/near-shop/"
+        assert results[0].homepage_url == "https://shop.example.com/"
+        assert results[1].url == "/needs/at/far-food-bank/far-location/"
+
+    def test_donationpoints_for_foodbank(self, places):
+        """A food bank limits donation points to its own."""
+        results = find_donationpoints(SEARCH, 10, foodbank=places["far"])
+        assert [place.name for place in results] == ["Far Location", "Far Shop"]
+
+    def test_by_category(self, places):
+        """Only places whose food bank's latest need has the category, within the distance."""
+        results = find_locations_by_category(SEARCH, "Pasta", 20000, 10)
+        assert [place.name for place in results] == ["Near Food Bank", "Near Location"]
+
+        results = find_locations_by_category(SEARCH, "Tinned Tomatoes", 20000, 10)
+        assert [place.name for place in results] == ["Far Food Bank", "Far Location"]
+
+        assert find_locations_by_category(SEARCH, "Tinned Tomatoes", 5000, 10) == []
+
+    def test_all_lists_in_four_queries(self, places, django_assert_num_queries):
+        """The search page's three lists take one search query and one per table loaded."""
+        with django_assert_num_queries(4):
+            results = find_nearest(SEARCH, locations=20, donationpoints=20, category="Pasta")
+
+        assert len(results["locations"]) == 4
+        assert len(results["donationpoints"]) == 3
+        assert len(results["category"]) == 2
+
+    def test_place_in_two_lists_is_two_objects(self, places):
+        """A location in more than one list doesn't share the attributes each list sets."""
+        results = find_nearest(SEARCH, locations=20, donationpoints=20)
+
+        as_location = [place for place in results["locations"] if place.name == "Far Location"][0]
+        as_donationpoint = [place for place in results["donationpoints"] if place.name == "Far Location"][0]
+        assert as_location is not as_donationpoint
+        assert not hasattr(as_location, "photo_url")
+
+    def test_nothing_asked_for(self):
+        """No lists asked for makes no query."""
+        assert find_nearest(SEARCH) == {"locations": [], "donationpoints": [], "category": []}
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import date
-from givefood.models import Foodbank, FoodbankChange, FoodbankChangeLine, Order, OrderGroup, OrderLine
+from givefood.models import Foodbank, FoodbankChange, FoodbankChangeLine, Order, OrderGroup, OrderItem, OrderLine
 from givefood.const.item_types import ITEM_CATEGORY_GROUPS
 
 
@@ -9,7 +9,7 @@ from givefood.const.item_types import ITEM_CATEGORY_GROUPS
 class TestOrderGroupDecaching:
     """Test that Order triggers decaching of OrderGroup public pages when saved."""
 
-    @patch('givefood.models.orders.decache_async')
+    @patch('givefood.models.orders.queue_decache')
     @patch('givefood.models.orders.gemini')
     def test_save_with_public_order_group_triggers_decaching(self, mock_gemini, mock_decache):
         """Test that saving an order with a public OrderGroup triggers decaching."""
@@ -52,10 +52,10 @@ class TestOrderGroupDecaching:
         )
         order.save(do_foodbank_save=False)
 
-        # Verify that decache_async.enqueue was called
-        assert mock_decache.enqueue.called
-        # Get the URLs that were passed to decache_async.enqueue
-        call_args = mock_decache.enqueue.call_args
+        # Verify that queue_decache was called
+        assert mock_decache.called
+        # Get the URLs that were passed to queue_decache
+        call_args = mock_decache.call_args
         urls = call_args[0][0]
         
         # Verify the correct URLs were decached
@@ -64,7 +64,7 @@ class TestOrderGroupDecaching:
         assert f"/donate/managed/{order_group.slug}-{order_group.key}/geo.json" in urls[1]
         assert f"/donate/managed/{order_group.slug}-{order_group.key}/items/" in urls[2]
 
-    @patch('givefood.models.orders.decache_async')
+    @patch('givefood.models.orders.queue_decache')
     @patch('givefood.models.orders.gemini')
     def test_save_with_non_public_order_group_does_not_trigger_decaching(self, mock_gemini, mock_decache):
         """Test that saving an order with a non-public OrderGroup does not trigger decaching."""
@@ -107,10 +107,10 @@ class TestOrderGroupDecaching:
         )
         order.save(do_foodbank_save=False)
 
-        # Verify that decache_async.enqueue was NOT called
-        assert not mock_decache.enqueue.called
+        # Verify that queue_decache was NOT called
+        assert not mock_decache.called
 
-    @patch('givefood.models.orders.decache_async')
+    @patch('givefood.models.orders.queue_decache')
     @patch('givefood.models.orders.gemini')
     def test_save_without_order_group_does_not_trigger_decaching(self, mock_gemini, mock_decache):
         """Test that saving an order without an OrderGroup does not trigger decaching."""
@@ -144,8 +144,8 @@ class TestOrderGroupDecaching:
         )
         order.save(do_foodbank_save=False)
 
-        # Verify that decache_async.enqueue was NOT called
-        assert not mock_decache.enqueue.called
+        # Verify that queue_decache was NOT called
+        assert not mock_decache.called
 
 
 @pytest.mark.django_db
@@ -571,3 +571,114 @@ class TestOrderLineItemCost:
         order_line.save()
 
         assert order_line.item_cost == 52
+
+
+def fake_order_gemini(lines):
+    """A gemini() that parses any order text into lines, and categorises every item as Pasta."""
+    def gemini(prompt, temperature, response_schema=None, **kwargs):
+        if response_schema:
+            return [dict(line) for line in lines]
+        return "Pasta"
+    return MagicMock(side_effect=gemini)
+
+
+@pytest.mark.django_db
+class TestOrderLineParsing:
+    """Test Order.save() parses its lines only when the items text changes, and writes them in bulk."""
+
+    lines = [
+        {"name": "Fusilli 500g", "quantity": 4, "item_cost": 50, "weight": 500},
+        {"name": "Baked Beans 400g", "quantity": 6, "item_cost": 40, "weight": 400},
+    ]
+
+    def _create_foodbank(self):
+        foodbank = Foodbank(
+            name="Test FB Parsing",
+            slug="test-fb-parsing",
+            address="Test Address",
+            postcode="SW1A 1AA",
+            country="England",
+            lat_lng="51.5014,-0.1419",
+            latitude=51.5014,
+            longitude=-0.1419,
+            network="Independent",
+            url="https://test.example.com",
+            shopping_list_url="https://test.example.com/shopping",
+            contact_email="test@example.com",
+        )
+        foodbank.save(do_geoupdate=False, do_decache=False)
+        return foodbank
+
+    def _create_order(self, foodbank, delivery_date=date(2026, 1, 5)):
+        order = Order(
+            foodbank=foodbank,
+            items_text="4x Fusilli\n6x Beans",
+            delivery_date=delivery_date,
+            delivery_hour=10,
+        )
+        order.save(do_foodbank_save=False)
+        return order
+
+    def test_lines_written_in_bulk(self, django_assert_max_num_queries):
+        """Lines get their calories, category and delivery date without a query each."""
+        foodbank = self._create_foodbank()
+        OrderItem(name="Fusilli 500g", calories=350).save()
+        with patch("givefood.models.orders.gemini", fake_order_gemini(self.lines)):
+            first = self._create_order(foodbank)
+        # Categories come from the latest line with the same name
+        OrderLine.objects.filter(order=first, name="Baked Beans 400g").update(category="Baked Beans", group=ITEM_CATEGORY_GROUPS["Baked Beans"])
+
+        with patch("givefood.models.orders.gemini", fake_order_gemini(self.lines * 10)), django_assert_max_num_queries(12):
+            order = self._create_order(foodbank, delivery_date=date(2026, 2, 5))
+
+        lines = {line.name: line for line in OrderLine.objects.filter(order=order)}
+        assert OrderLine.objects.filter(order=order).count() == 20
+        assert lines["Fusilli 500g"].calories == 350 * 5 * 4
+        assert lines["Fusilli 500g"].category == "Pasta"
+        assert lines["Baked Beans 400g"].category == "Baked Beans"
+        assert lines["Baked Beans 400g"].group == ITEM_CATEGORY_GROUPS["Baked Beans"]
+        assert lines["Baked Beans 400g"].delivery_date == date(2026, 2, 5)
+        assert order.no_items == 100
+        assert order.calories == 350 * 5 * 4 * 10
+
+    def test_unchanged_text_not_parsed_again(self):
+        """Resaving with the same text keeps the lines, and only moves their delivery date."""
+        foodbank = self._create_foodbank()
+        with patch("givefood.models.orders.gemini", fake_order_gemini(self.lines)):
+            order = self._create_order(foodbank)
+        line_ids = set(OrderLine.objects.filter(order=order).values_list("id", flat=True))
+
+        with patch("givefood.models.orders.gemini") as mock_gemini:
+            order = Order.objects.get(id=order.id)
+            order.delivery_date = date(2026, 1, 12)
+            order.save(do_foodbank_save=False)
+
+        mock_gemini.assert_not_called()
+        assert set(OrderLine.objects.filter(order=order).values_list("id", flat=True)) == line_ids
+        assert set(OrderLine.objects.filter(order=order).values_list("delivery_date", flat=True)) == {date(2026, 1, 12)}
+        assert Order.objects.get(id=order.id).no_lines == 2
+
+    def test_changed_text_parsed_again(self):
+        """A change to the text, or do_reparse, parses the lines again."""
+        foodbank = self._create_foodbank()
+        with patch("givefood.models.orders.gemini", fake_order_gemini(self.lines)):
+            order = self._create_order(foodbank)
+
+        with patch("givefood.models.orders.gemini", fake_order_gemini(self.lines[:1])) as mock_gemini:
+            order.items_text = "4x Fusilli"
+            order.save(do_foodbank_save=False)
+            assert OrderLine.objects.filter(order=order).count() == 1
+
+            order.save(do_foodbank_save=False, do_reparse=True)
+            assert mock_gemini.call_count == 2
+
+    def test_last_order_without_foodbank_resave(self):
+        """The food bank's last order date is written without resaving the food bank."""
+        foodbank = self._create_foodbank()
+        with patch("givefood.models.orders.gemini", fake_order_gemini(self.lines)), patch.object(Foodbank, "save") as foodbank_save:
+            Order(foodbank=foodbank, items_text="Later", delivery_date=date(2026, 3, 1), delivery_hour=10).save()
+            Order(foodbank=foodbank, items_text="Earlier", delivery_date=date(2026, 2, 1), delivery_hour=10).save()
+
+        foodbank_save.assert_not_called()
+        foodbank.refresh_from_db()
+        assert foodbank.last_order == date(2026, 3, 1)
@@ -4,7 +4,7 @@ FoodbankDonationPoint, and ParliamentaryConstituency models.
 """
 import json
 import pytest
-from unittest.mock import patch, MagicMock, PropertyMock
+from unittest.mock import patch, MagicMock
 
 
 OPENING_HOURS_SAMPLE = "Monday: 9:00 AM – 5:00 PM\nTuesday: 9:00 AM – 5:00 PM\nWednesday: 9:00 AM – 5:00 PM\nThursday: 9:00 AM – 5:00 PM\nFriday: 9:00 AM – 5:00 PM\nSaturday: Closed\nSunday: Closed"
@@ -352,3 +352,170 @@ class TestParliamentaryConstituencySchemaOrg:
         result = ParliamentaryConstituency.schema_org(mock)
         assert result["@context"] == "https://schema.org"
         assert result["@type"] == "AdministrativeArea"
+
+
+def _save_foodbank(name="Stored Food Bank", **kwargs):
+    from givefood.models import Foodbank
+    foodbank = Foodbank(
+        name=name,
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country="England",
+        lat_lng="51.5014,-0.1419",
+        network="Independent",
+        url="https://test.example.com",
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+        **kwargs,
+    )
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def _save_location(foodbank, constituency=None):
+    from givefood.models import FoodbankLocation
+    location = FoodbankLocation(
+        foodbank=foodbank,
+        name="Stored Location",
+        address="2 Test Street",
+        postcode="SW1A 2AA",
+        lat_lng="51.5024,-0.1429",
+        country="England",
+        parliamentary_constituency=constituency,
+    )
+    location.save(do_geoupdate=False, do_foodbank_resave=False)
+    return location
+
+
+def _save_constituency():
+    from givefood.models import ParliamentaryConstituency
+    constituency = ParliamentaryConstituency(
+        name="Stored Constituency",
+        country="England",
+        centroid="51.5014,-0.1419",
+        mp="A. Member",
+        mp_party="Party",
+        mp_parl_id=1,
+        mp_display_name="A. Member",
+    )
+    constituency.save()
+    return constituency
+
+
+def _give_need(foodbank, text):
+    from givefood.models import FoodbankChange
+    need = FoodbankChange(foodbank=foodbank, change_text=text, published=False)
+    need.save()
+    FoodbankChange.objects.filter(id=need.id).update(published=True)
+    foodbank.save(do_geoupdate=False, do_decache=False)
+
+
+@pytest.mark.django_db
+class TestStoredSchemaOrg:
+    """Test the JSON-LD stored on save, and its rebuilding when what it nests changes."""
+
+    def test_stored_on_save(self):
+        """Saving stores compact JSON-LD, which is what pages emit."""
+        foodbank = _save_foodbank()
+
+        assert "\n" not in foodbank.schema_org_json
+        assert json.loads(foodbank.schema_org_json)["name"] == "Stored Food Bank Foodbank"
+        assert foodbank.stored_schema_org_str() == foodbank.schema_org_json
+
+    def test_stored_in_default_language(self):
+        """Saving while another language is active doesn't put its prefix on the URLs."""
+        from django.utils.translation import override
+        with override("cy"):
+            foodbank = _save_foodbank()
+        assert json.loads(foodbank.schema_org_json)["@id"] == "https://www.givefood.org.uk/needs/at/stored-food-bank/"
+
+    def test_built_when_not_stored(self):
+        """A row from before the column was filled builds it as it renders."""
+        from givefood.models import Foodbank
+        foodbank = _save_foodbank()
+        Foodbank.objects.filter(id=foodbank.id).update(schema_org_json=None)
+        foodbank.refresh_from_db()
+        assert json.loads(foodbank.stored_schema_org_str())["name"] == "Stored Food Bank Foodbank"
+
+    def test_foodbank_save_queues_update(self):
+        """Saving a food bank queues what nests it to be rebuilt, and nothing when nothing does."""
+        foodbank = _save_foodbank()
+        with patch("givefood.utils.schema.update_schema_org") as mock_task:
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        assert not mock_task.enqueue.called
+
+        constituency = _save_constituency()
+        foodbank.parliamentary_constituency = constituency
+        with patch("givefood.utils.schema.update_schema_org") as mock_task:
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        mock_task.enqueue.assert_called_once_with(None, [constituency.id])
+
+        _save_location(foodbank)
+        with patch("givefood.utils.schema.update_schema_org") as mock_task:
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        mock_task.enqueue.assert_called_once_with(foodbank.id, [constituency.id])
+
+    def test_need_reaches_location(self):
+        """A new need on the food bank reaches its location's JSON-LD when the task runs."""
+        from givefood.models import FoodbankLocation
+        from givefood.utils.schema import update_schema_org
+        foodbank = _save_foodbank()
+        location = _save_location(foodbank)
+        assert "seeks" not in json.loads(location.schema_org_json)
+
+        _give_need(foodbank, "Pasta\nRice")
+        assert update_schema_org.call(foodbank.id) == 1
+
+        location = FoodbankLocation.objects.get(id=location.id)
+        assert [seek["itemOffered"]["name"] for seek in json.loads(location.schema_org_json)["seeks"]] == ["Pasta", "Rice"]
+
+        # Nothing has changed since, so nothing is written
+        assert update_schema_org.call(foodbank.id) == 0
+
+    def test_constituency_lists_open_places(self):
+        """A constituency's JSON-LD has the open food banks and locations in it."""
+        from givefood.models import Foodbank, ParliamentaryConstituency
+        from givefood.utils.schema import update_schema_org
+        constituency = _save_constituency()
+        foodbank = _save_foodbank(parliamentary_constituency=constituency)
+        _save_location(foodbank, constituency)
+        update_schema_org.call(foodbank.id)
+
+        constituency = ParliamentaryConstituency.objects.get(id=constituency.id)
+        assert [place["name"] for place in json.loads(constituency.schema_org_json)["containsPlace"]] == [
+            "Stored Food Bank Foodbank",
+            "Stored Location, Stored Food Bank Foodbank",
+        ]
+
+        Foodbank.objects.filter(id=foodbank.id).update(is_closed=True)
+        update_schema_org.call(constituency_ids=[constituency.id])
+        constituency = ParliamentaryConstituency.objects.get(id=constituency.id)
+        assert [place["name"] for place in json.loads(constituency.schema_org_json)["containsPlace"]] == [
+            "Stored Location, Stored Food Bank Foodbank",
+        ]
+
+    def test_page_emits_stored(self, client):
+        """The food bank page emits the stored string rather than building it."""
+        from django.core.cache import cache
+        from givefood.models import Foodbank
+        cache.clear()
+        foodbank = _save_foodbank()
+        Foodbank.objects.filter(id=foodbank.id).update(schema_org_json='{"stored":true}')
+
+        assert '{"stored":true}' in client.get("/needs/at/stored-food-bank/").content.decode()
+
+    def test_rebuild_command(self):
+        """rebuild_schema_org fills rows that have none."""
+        from io import StringIO
+        from django.core.management import call_command
+        from givefood.models import Foodbank, FoodbankLocation
+        foodbank = _save_foodbank()
+        location = _save_location(foodbank)
+        stored = FoodbankLocation.objects.get(id=location.id).schema_org_json
+        Foodbank.objects.update(schema_org_json=None)
+        FoodbankLocation.objects.update(schema_org_json=None)
+
+        call_command("rebuild_schema_org", stdout=StringIO())
+
+        assert Foodbank.objects.get(id=foodbank.id).schema_org_json
+        assert FoodbankLocation.objects.get(id=location.id).schema_org_json == stored
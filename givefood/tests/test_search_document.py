@@ -0,0 +1,152 @@
+"""
+Tests for the admin search documents: kept up to date on save and delete, and searched in one ranked query.
+"""
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from givefood.models import (
+    Foodbank,
+    FoodbankChange,
+    FoodbankLocation,
+    FoodbankSubscriber,
+    SearchDocument,
+    WhatsappSubscriber,
+)
+
+
+def make_foodbank(name, **kwargs):
+    foodbank = Foodbank(
+        name=name,
+        address="1 Test Street",
+        postcode="SW1A 1AA",
+        country="England",
+        lat_lng="51.5014,-0.1419",
+        network="Independent",
+        url="https://test.example.com",
+        shopping_list_url="https://test.example.com/shopping",
+        contact_email="test@example.com",
+        **kwargs,
+    )
+    foodbank.save(do_geoupdate=False, do_decache=False)
+    return foodbank
+
+
+def make_need(foodbank, change_text, excess_change_text=None):
+    need = FoodbankChange(foodbank=foodbank, change_text=change_text, excess_change_text=excess_change_text, published=False)
+    need.save()
+    return need
+
+
+@pytest.mark.django_db
+class TestSearchDocumentUpkeep:
+    """Test documents follow the objects they're from."""
+
+    def test_foodbank(self):
+        """A food bank's document has every searched field, and follows changes."""
+        foodbank = make_foodbank("Document Food Bank", charity_name="Document Charity")
+
+        document = SearchDocument.objects.get(doc_type="foodbank", object_id=foodbank.id)
+        assert document.title == "Document Food Bank"
+        assert "Document Charity" in document.text
+        assert "https://test.example.com/shopping" in document.text
+
+        foodbank.name = "Renamed Food Bank"
+        foodbank.save(do_geoupdate=False, do_decache=False)
+        assert SearchDocument.objects.get(doc_type="foodbank", object_id=foodbank.id).title == "Renamed Food Bank"
+
+    def test_need_deleted(self):
+        foodbank = make_foodbank("Need Food Bank")
+        need = make_need(foodbank, "Pasta\nRice")
+        assert SearchDocument.objects.filter(doc_type="need", object_id=need.id).exists()
+
+        need.delete()
+        assert not SearchDocument.objects.filter(doc_type="need", object_id=need.id).exists()
+
+    def test_email_only_once_confirmed(self):
+        """Email subscribers are found once they've confirmed, as before."""
+        foodbank = make_foodbank("Subscriber Food Bank")
+        subscriber = FoodbankSubscriber.objects.create(foodbank=foodbank, email="Someone@Example.com")
+        assert not SearchDocument.objects.filter(doc_type="email").exists()
+
+        subscriber.confirmed = True
+        subscriber.save()
+        assert SearchDocument.objects.get(doc_type="email").text == "someone@example.com"
+
+    def test_foodbank_deleted(self):
+        """Deleting a food bank drops its documents and those of everything it had."""
+        foodbank = make_foodbank("Deleted Food Bank")
+        make_need(foodbank, "Pasta")
+        WhatsappSubscriber.objects.create(foodbank=foodbank, phone_number="+447700900000")
+
+        foodbank.delete()
+        assert not SearchDocument.objects.exists()
+
+
+@pytest.mark.django_db
+class TestSearch:
+    """Test SearchDocument.search()."""
+
+    def test_word_and_substring(self):
+        """Whole words match in any order, and any part of a field matches too."""
+        foodbank = make_foodbank("Riverside Food Bank")
+        location = FoodbankLocation(foodbank=foodbank, name="Church Hall", address="2 Test Road", postcode="AB12 3CD", lat_lng="51.5,-0.14")
+        location.save(do_geoupdate=False, do_foodbank_resave=False)
+
+        assert SearchDocument.search("bank riverside")["foodbank"] == [foodbank]
+        assert SearchDocument.search("versid")["foodbank"] == [foodbank]
+        assert SearchDocument.search("b12 3")["location"] == [location]
+        assert SearchDocument.search("nothing like it")["foodbank"] == []
+
+    def test_ranked(self, django_assert_max_num_queries):
+        """Word matches come before substring matches, then the newest, from one search query."""
+        foodbank = make_foodbank("Ranked Food Bank")
+        older = make_need(foodbank, "Tinned Tomatoes")
+        newer = make_need(foodbank, "Tinned Tomatoes\nRice")
+        within_word = make_need(foodbank, "Tomatoesauce")
+
+        with django_assert_max_num_queries(2):
+            results = SearchDocument.search("tomatoes")
+
+        assert results["need"] == [newer, older, within_word]
+
+    def test_limit_per_type(self):
+        """Each type has up to limit results, so a common word doesn't crowd out the rest."""
+        foodbank = make_foodbank("Limited Food Bank")
+        for number in range(3):
+            make_need(foodbank, "Limited %s" % number)
+
+        results = SearchDocument.search("limited", limit=2)
+
+        assert len(results["need"]) == 2
+        assert results["foodbank"] == [foodbank]
+
+    def test_gone_skipped(self):
+        """A document left by a queryset delete isn't a result."""
+        foodbank = make_foodbank("Gone Food Bank")
+        subscriber = WhatsappSubscriber.objects.create(foodbank=foodbank, phone_number="+447700900123")
+        WhatsappSubscriber.objects.filter(id=subscriber.id).delete()
+
+        assert SearchDocument.search("7700900123")["whatsapp"] == []
+
+    def test_empty_query(self):
+        make_foodbank("Any Food Bank")
+        assert SearchDocument.search("")["foodbank"] == []
+        assert SearchDocument.search(None)["foodbank"] == []
+
+
+@pytest.mark.django_db
+class TestRebuildSearchIndex:
+    """Test rebuild_search_index refills the documents."""
+
+    def test_rebuild(self):
+        foodbank = make_foodbank("Rebuilt Food Bank")
+        need = make_need(foodbank, "Pasta")
+        SearchDocument.objects.all().delete()
+        stdout = StringIO()
+
+        call_command("rebuild_search_index", stdout=stdout)
+
+        assert "2 search documents" in stdout.getvalue()
+        assert SearchDocument.search("pasta")["need"] == [need]
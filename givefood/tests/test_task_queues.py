@@ -0,0 +1,180 @@
+"""
+Tests for the task queue controls: coalescing duplicate tasks, concurrency slots, rate limits and queue stats.
+"""
+import datetime
+from unittest.mock import Mock
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from django_tasks.base import TaskResultStatus
+from django_tasks_db.models import DBTaskResult
+
+from givefood.models import TaskQueueBucket
+from givefood.utils.cache import decache_async
+from givefood.utils.notifications import send_email_async
+from givefood.utils.schema import update_schema_org
+from givefood.utils.tasks import queue_slot, queue_stats, run_limited, take_token
+
+
+def make_result(queue_name="decache", **kwargs):
+    return DBTaskResult.objects.create(
+        task_path="givefood.utils.cache.decache_async",
+        args_kwargs={"args": [], "kwargs": {}},
+        backend_name="default",
+        queue_name=queue_name,
+        run_after=timezone.now(),
+        **kwargs,
+    )
+
+
+@pytest.mark.django_db
+class TestCoalescing:
+    """Test a task identical to one still waiting is enqueued once."""
+
+    def test_duplicate_waiting(self):
+        first = decache_async.enqueue(["/needs/"], ["/api/"])
+        second = decache_async.enqueue(["/needs/"], ["/api/"])
+
+        assert first.id == second.id
+        assert DBTaskResult.objects.filter(queue_name="decache").count() == 1
+
+    def test_duplicate_waiting_async(self):
+        """aenqueue() coalesces too, rather than going straight to the database."""
+        first = decache_async.enqueue(["/needs/"], ["/api/"])
+        second = async_to_sync(decache_async.aenqueue)(["/needs/"], ["/api/"])
+
+        assert first.id == second.id
+        assert DBTaskResult.objects.filter(queue_name="decache").count() == 1
+
+    def test_different_arguments(self):
+        decache_async.enqueue(["/needs/"])
+        decache_async.enqueue(["/needs/in/"])
+        assert DBTaskResult.objects.filter(queue_name="decache").count() == 2
+
+    def test_not_once_started(self):
+        """A task already running may have missed what the new one is for, so it's queued again."""
+        first = decache_async.enqueue(["/needs/"])
+        DBTaskResult.objects.filter(id=first.id).update(status=TaskResultStatus.RUNNING)
+
+        second = decache_async.enqueue(["/needs/"])
+
+        assert first.id != second.id
+
+    def test_only_coalescing_queues(self):
+        """Email isn't coalesced, as two identical emails may both be meant."""
+        email = {"to": "someone@example.com", "subject": "Hello", "body": "Hello"}
+        send_email_async.enqueue(**email)
+        send_email_async.enqueue(**email)
+        assert DBTaskResult.objects.filter(queue_name="email").count() == 2
+
+
+@pytest.mark.django_db
+class TestTakeToken:
+    """Test the token bucket."""
+
+    def test_burst_then_wait(self):
+        """A full bucket gives burst tokens, then says how long until the next."""
+        assert [take_token("translate", 1, 3) for _ in range(3)] == [0, 0, 0]
+
+        wait = take_token("translate", 1, 3)
+        assert 0 < wait <= 1
+
+    def test_refills(self):
+        take_token("translate", 2, 1)
+        TaskQueueBucket.objects.filter(queue_name="translate").update(updated=timezone.now() - datetime.timedelta(seconds=1))
+
+        assert take_token("translate", 2, 1) == 0
+        # Filled to burst, not beyond
+        assert TaskQueueBucket.objects.get(queue_name="translate").tokens < 1
+
+
+@pytest.mark.django_db(transaction=True)
+class TestQueueSlot:
+    """Test concurrency slots are shared advisory locks."""
+
+    def test_slots(self):
+        with queue_slot("email", 1) as first:
+            # Another connection, as another worker would be
+            other = connection.copy()
+            try:
+                with other.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s), 0)", ["task_queue:email"])
+                    assert cursor.fetchone()[0] is False
+            finally:
+                other.close()
+            assert first is True
+
+        with queue_slot("email", 1) as again:
+            assert again is True
+
+    def test_no_limit(self):
+        with queue_slot("default") as slot:
+            assert slot is True
+
+
+@pytest.mark.django_db
+class TestRunLimited:
+    """Test a worker runs a task within its queue's limits, or puts it back."""
+
+    @override_settings(TASK_QUEUE_LIMITS={"decache": {"rate": 1, "burst": 1}})
+    def test_rate_limited(self):
+        """With no token left the task goes back to wait, rather than running or failing."""
+        run = Mock()
+        first = make_result(status=TaskResultStatus.RUNNING, started_at=timezone.now())
+        second = make_result(status=TaskResultStatus.RUNNING, started_at=timezone.now())
+
+        assert run_limited(first, run) is True
+        assert run_limited(second, run) is False
+
+        run.assert_called_once_with(first)
+        second.refresh_from_db()
+        assert second.status == TaskResultStatus.READY
+        assert second.started_at is None
+        assert second.run_after > timezone.now()
+
+    @override_settings(TASK_QUEUE_LIMITS={})
+    def test_unlimited(self):
+        run = Mock()
+        result = make_result(queue_name="default", status=TaskResultStatus.RUNNING)
+        assert run_limited(result, run) is True
+        run.assert_called_once_with(result)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTaskWorker:
+    """Test the task_worker command, which closes connections between tasks as db_worker does."""
+
+    def test_batch(self):
+        """task_worker runs what's waiting and stops, as db_worker --batch does."""
+        result = update_schema_org.enqueue(None, [])
+
+        call_command("task_worker", batch=True, queue_name="*", startup_delay=False, verbosity=0)
+
+        assert DBTaskResult.objects.get(id=result.id).status == TaskResultStatus.SUCCESSFUL
+
+
+@pytest.mark.django_db
+class TestQueueStats:
+    """Test each queue's depth and latency are reported."""
+
+    def test_stats(self):
+        now = timezone.now()
+        make_result(status=TaskResultStatus.READY)
+        make_result(status=TaskResultStatus.READY)
+        finished = make_result(status=TaskResultStatus.SUCCESSFUL, started_at=now, finished_at=now + datetime.timedelta(seconds=3))
+        DBTaskResult.objects.filter(id=finished.id).update(enqueued_at=now - datetime.timedelta(seconds=2))
+        make_result(queue_name="email", status=TaskResultStatus.SUCCESSFUL, started_at=now, finished_at=now - datetime.timedelta(days=2))
+
+        stats = queue_stats(now - datetime.timedelta(days=1))
+
+        assert len(stats) == 1
+        decache = stats[0]
+        assert decache["queue_name"] == "decache"
+        assert (decache["waiting"], decache["running"], decache["finished"], decache["failed"]) == (2, 0, 1, 0)
+        assert decache["wait"] == 2
+        assert decache["run"] == 3
+        assert decache["oldest_enqueued"] is not None
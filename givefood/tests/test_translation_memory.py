@@ -0,0 +1,137 @@
+"""
+Tests for translating need text a line at a time through the translation memory.
+"""
+from unittest.mock import Mock, patch
+
+import pytest
+
+from givefood.models import Foodbank, FoodbankChange, FoodbankChangeTranslation, TranslationMemory
+from givefood.utils.general import get_translations, translate_need, translate_needs, translate_needs_async, translate_text
+
+
+def fake_google(response_for=lambda text: "[%s]" % text, status_code=200):
+    """A requests.post that translates each q with response_for, and records what it was sent."""
+    def post(url, params=None, data=None):
+        post.calls.append(list(data["q"]))
+        response = Mock(status_code=status_code)
+        response.json.return_value = {"data": {"translations": [{"translatedText": response_for(text)} for text in data["q"]]}}
+        return response
+    post.calls = []
+    return post
+
+
+@pytest.fixture
+def google():
+    post = fake_google()
+    with patch("givefood.utils.general.requests.post", post), patch("givefood.utils.general.get_cred", return_value="key"):
+        yield post
+
+
+@pytest.mark.django_db
+class TestGetTranslations:
+    """Test batching texts into POSTs."""
+
+    def test_batched(self, google):
+        """Texts go as many to a POST as the API takes, and come back in order."""
+        texts = ["Item %s" % number for number in range(130)]
+        assert get_translations("cy", texts) == ["[Item %s]" % number for number in range(130)]
+        assert [len(batch) for batch in google.calls] == [128, 2]
+
+    def test_failed(self):
+        """A failed request gives None for each of its texts."""
+        with patch("givefood.utils.general.requests.post", fake_google(status_code=403)), patch("givefood.utils.general.get_cred", return_value="key"):
+            assert get_translations("cy", ["Pasta", "Rice"]) == [None, None]
+
+
+@pytest.mark.django_db
+class TestTranslateText:
+    """Test need text goes through the translation memory."""
+
+    def test_only_unseen_lines_sent(self, google):
+        """Lines seen before in a language aren't sent again, and all of them seen is no request."""
+        assert translate_text("cy", "Tinned Fish\nUHT Milk") == "[Tinned Fish]\n[UHT Milk]"
+        assert translate_text("cy", "UHT Milk\nRice\nTinned Fish") == "[UHT Milk]\n[Rice]\n[Tinned Fish]"
+        assert translate_text("cy", "Rice\nUHT Milk") == "[Rice]\n[UHT Milk]"
+
+        assert google.calls == [["Tinned Fish", "UHT Milk"], ["Rice"]]
+
+    def test_per_language(self, google):
+        """A line remembered in one language is still sent for another."""
+        translate_text("cy", "Pasta")
+        translate_text("pl", "Pasta")
+        assert google.calls == [["Pasta"], ["Pasta"]]
+
+    def test_normalised(self, google):
+        """Lines differing only by whitespace are the same line, sent once."""
+        assert translate_text("cy", "  Tinned   Fish \r\n\r\nTinned Fish") == "[Tinned Fish]\n\n[Tinned Fish]"
+        assert google.calls == [["Tinned Fish"]]
+        assert TranslationMemory.objects.get().source == "Tinned Fish"
+
+    def test_failure_not_remembered(self):
+        """A line Google didn't translate makes the text None, and is tried again next time."""
+        with patch("givefood.utils.general.requests.post", fake_google(status_code=500)), patch("givefood.utils.general.get_cred", return_value="key"):
+            assert translate_text("cy", "Pasta") is None
+        assert not TranslationMemory.objects.exists()
+
+
+@pytest.mark.django_db
+class TestTranslateNeed:
+    """Test translating a whole need."""
+
+    def make_need(self, change_text="Pasta\nRice", excess_change_text="Beans"):
+        foodbank = Foodbank.objects.filter(name="Translation Food Bank").first() or Foodbank(
+            name="Translation Food Bank",
+            address="1 Test Street",
+            postcode="SW1A 1AA",
+            country="England",
+            lat_lng="51.5014,-0.1419",
+            network="Independent",
+            url="https://test.example.com",
+            shopping_list_url="https://test.example.com/shopping",
+            contact_email="test@example.com",
+        )
+        if not foodbank.pk:
+            foodbank.save(do_geoupdate=False, do_decache=False)
+        need = FoodbankChange(foodbank=foodbank, change_text=change_text, excess_change_text=excess_change_text, published=False)
+        need.save()
+        return need
+
+    def test_change_and_excess(self, google):
+        """Both texts are translated, and stored as the need's translation."""
+        need = self.make_need()
+        translate_need("cy", need)
+
+        translation = FoodbankChangeTranslation.objects.get(need=need, language="cy")
+        assert translation.change_text == "[Pasta]\n[Rice]"
+        assert translation.excess_change_text == "[Beans]"
+
+    def test_failure_leaves_english(self):
+        """A need that couldn't be translated has no translation, so shows in English."""
+        need = self.make_need()
+        with patch("givefood.utils.general.requests.post", fake_google(status_code=500)), patch("givefood.utils.general.get_cred", return_value="key"):
+            assert translate_need("cy", need) is None
+        assert not FoodbankChangeTranslation.objects.filter(need=need).exists()
+
+    def test_needs_in_every_language_at_once(self, google, django_assert_max_num_queries):
+        """Needs and languages are translated together: a request per language, and one write."""
+        first = self.make_need()
+        second = self.make_need(change_text="Rice\nTea", excess_change_text=None)
+        translate_needs([first], ["cy"])
+        google.calls.clear()
+
+        with django_assert_max_num_queries(6):
+            translated = translate_needs([first, second], ["cy", "pl"])
+
+        assert len(translated) == 4
+        assert sorted(google.calls) == [["Beans", "Pasta", "Rice", "Tea"], ["Tea"]]
+        assert FoodbankChangeTranslation.objects.get(need=second, language="pl").change_text == "[Rice]\n[Tea]"
+        assert FoodbankChangeTranslation.objects.filter(need=first, language="cy").count() == 1
+
+    def test_task(self, google):
+        """The task translates into every language we translate into, and no others."""
+        need = self.make_need()
+        translate_needs_async.call([need.need_id_str])
+
+        languages = set(FoodbankChangeTranslation.objects.filter(need=need).values_list("language", flat=True))
+        assert "zh-hans" in languages
+        assert not languages & {"en", "tlh"}
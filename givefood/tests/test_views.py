@@ -1,6 +1,7 @@
 """
 Tests for the main givefood views.
 """
+import io
 import json
 import pytest
 from django.test import Client, override_settings
@@ -741,6 +742,101 @@ class TestAddressAutocomplete:
             "Places should be ordered by population descending"
 
 
+@pytest.mark.django_db
+class TestAddressAutocompleteIndex:
+    """Test /aac/ answered from the memory mapped index, against the SQL it replaces."""
+
+    @pytest.fixture
+    def build(self, tmp_path):
+        """Build an index from the database, returning a function to fetch /aac/ both ways."""
+        from django.core.cache import cache
+        from django.core.management import call_command
+
+        path = str(tmp_path / "autocomplete.idx")
+
+        def get(query, index=True):
+            # /aac/ is cache_page'd by URL, and both ways share the URL
+            cache.clear()
+            with override_settings(AUTOCOMPLETE_INDEX_PATH=path if index else None):
+                return json.loads(Client().get('/aac/', {'q': query}).content)
+
+        def _build():
+            call_command('build_autocomplete_index', output=path, stdout=io.StringIO())
+            return get
+
+        get.path = path
+
+        return _build
+
+    def _place(self, gbpnid, name, population=None, county='Testshire'):
+        return Place.objects.create(
+            gbpnid=gbpnid, name=name, population=population,
+            lat_lng='51.%04d,-0.1278' % gbpnid, adcounty=county,
+        )
+
+    def test_matches_sql(self, build):
+        """Prefix, substring and postcode results are the same as the SQL path's."""
+        self._place(91001, 'Readington', population=100)
+        self._place(91002, 'Readborough', population=90000)
+        self._place(91003, 'Readless')
+        self._place(91004, 'Barnet', population=100)
+        self._place(91005, 'Great Barnwell', population=500000)
+        self._place(91006, 'Upper Chester', population=100)
+        self._place(91007, 'Aberdeen', population=100)
+        self._place(91008, 'Oxford', population=100)
+        Postcode.objects.create(postcode='SW1A 1AA', lat_lng='51.5015,-0.1419', country='England')
+        get = build()
+
+        for query in ['read', 'READ', 'barn', 'chester', 'aberd', 'ox', 'xf', 'sw1', 'sw1a 1', 'nothing', '%%', '__']:
+            assert get(query) == get(query, index=False), query
+
+    def test_common_prefix_uses_precomputed_top(self, build, monkeypatch):
+        """A prefix matching many places is answered from its precomputed ranks."""
+        from givefood.utils import autocomplete
+        monkeypatch.setattr(autocomplete, 'PREFIX_SCAN_LIMIT', 3)
+        for i in range(15):
+            self._place(91100 + i, 'Testville %02d' % i, population=i)
+        get = build()
+
+        with override_settings(AUTOCOMPLETE_INDEX_PATH=get.path):
+            assert autocomplete.get_autocomplete_index().prefixes.find(b'TESTVILLE') is not None
+
+        data = get('testville')
+        assert [item['n'] for item in data] == ['Testville %02d' % i for i in range(14, 4, -1)]
+        assert data == get('testville', index=False)
+
+    def test_substring_skips_prefix_matches(self, build):
+        """The substring pass leaves out names the prefix pass already found."""
+        self._place(91200, 'Winchester', population=100)
+        self._place(91201, 'Darwin', population=1000)
+        get = build()
+
+        assert [item['n'] for item in get('win')] == ['Winchester', 'Darwin']
+
+    def test_rebuild_is_picked_up(self, build):
+        """A rebuilt index replaces the old one without a restart."""
+        self._place(91300, 'Firstplace', population=100)
+        get = build()
+        assert [item['n'] for item in get('firstplace')] == ['Firstplace']
+
+        self._place(91301, 'Firstplace Green', population=200)
+        get = build()
+        assert [item['n'] for item in get('firstplace')] == ['Firstplace Green', 'Firstplace']
+
+    def test_missing_or_broken_index_falls_back_to_sql(self, tmp_path):
+        """Without a readable index the database answers."""
+        from django.core.cache import cache
+        self._place(91400, 'Fallback', population=100)
+        broken = tmp_path / "broken.idx"
+        broken.write_bytes(b"not an index")
+
+        for path in [str(tmp_path / "missing.idx"), str(broken)]:
+            cache.clear()
+            with override_settings(AUTOCOMPLETE_INDEX_PATH=path):
+                data = json.loads(Client().get('/aac/?q=fallback').content)
+            assert [item['n'] for item in data] == ['Fallback']
+
+
 @pytest.mark.django_db
 class TestMarkdownPages:
     """Test /md pages."""
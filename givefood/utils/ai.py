@@ -1,11 +1,20 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import datetime
+import hashlib
 import json
 import logging
+import threading
+from collections import Counter, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import monotonic, sleep
 
 import requests
-from time import sleep
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
 
 from google import genai
 from google.genai import types
@@ -14,18 +23,249 @@ from google.genai.errors import ServerError
 from givefood.utils.cache import get_cred
 
 
-def gemini(prompt, temperature, response_mime_type = "application/json", response_schema = None, model = "gemini-2.5-flash", timeout = None, return_usage = False):
+# Requests in flight at once from gemini_batch()
+AI_MAX_WORKERS = 8
+
+# A live reply: value is what the caller gets back, text is what's cached, or None if it shouldn't be
+Reply = namedtuple("Reply", ["value", "text", "prompt_tokens", "completion_tokens", "usage"])
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def ai_cache_key(provider, model, prompt, **options):
+    """The AIResponse key for a request: a hash of everything that decides its reply."""
+    request = json.dumps([provider, model, prompt, options], sort_keys = True, default = str)
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def coalesce(key, fetch):
+    """
+    Run fetch() once for every thread asking for key at the same time.
+
+    The first caller makes the request and the rest wait for its reply,
+    rather than sending the same prompt again while it's still running.
+    Returns the reply, and whether it was someone else's.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result(), True
+
+    try:
+        future.set_result(fetch())
+    except Exception as exception:
+        future.set_exception(exception)
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+    return future.result(), False
+
+
+def record_ai_usage(caller, provider, model, calls = 0, cache_hits = 0, coalesced = 0, prompt_tokens = 0, completion_tokens = 0, latency_ms = 0):
+    """Add to today's AIUsage row for the caller and model, in one upsert."""
+    from givefood.models import AIUsage
+
+    usage_table = AIUsage._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO %s (day, caller, provider, model, calls, cache_hits, coalesced, prompt_tokens, completion_tokens, latency_ms)
+            VALUES (%%s, %%s, %%s, %%s, %%s, %%s, %%s, %%s, %%s, %%s)
+            ON CONFLICT (day, caller, provider, model) DO UPDATE SET
+                calls = %s.calls + EXCLUDED.calls,
+                cache_hits = %s.cache_hits + EXCLUDED.cache_hits,
+                coalesced = %s.coalesced + EXCLUDED.coalesced,
+                prompt_tokens = %s.prompt_tokens + EXCLUDED.prompt_tokens,
+                completion_tokens = %s.completion_tokens + EXCLUDED.completion_tokens,
+                latency_ms = %s.latency_ms + EXCLUDED.latency_ms
+            """ % ((usage_table,) * 7),
+            [
+                datetime.date.today(), (caller or "")[:50], provider, model[:100],
+                calls, cache_hits, coalesced, prompt_tokens, completion_tokens, latency_ms,
+            ],
+        )
+
+
+def cached_ai_call(provider, model, key, fetch, load, caller = None, cache = True):
+    """
+    Answer a request from the AIResponse cache, or make it with fetch() and cache the reply.
+
+    fetch() makes the request and returns a Reply. load() turns a cached
+    reply's text back into what the caller gets. Identical requests in flight
+    at once share one call. Every call is added to the caller's AIUsage.
+    Returns the value, and the Reply if it was made live for this caller.
+    """
+    from givefood.models import AIResponse
+
+    if cache:
+        cached = AIResponse.objects.filter(key = key).values_list("response", flat = True).first()
+        if cached is not None:
+            AIResponse.objects.filter(key = key).update(hits = F("hits") + 1, last_hit = timezone.now())
+            record_ai_usage(caller, provider, model, cache_hits = 1)
+            return load(cached), None
+
+    started = monotonic()
+    reply, coalesced = coalesce(key, fetch)
+    if coalesced:
+        record_ai_usage(caller, provider, model, coalesced = 1)
+        return reply.value, None
+
+    latency_ms = int((monotonic() - started) * 1000)
+    if cache and reply.text is not None:
+        AIResponse.objects.bulk_create([AIResponse(
+            key = key,
+            provider = provider,
+            model = model,
+            response = reply.text,
+            prompt_tokens = reply.prompt_tokens,
+            completion_tokens = reply.completion_tokens,
+            latency_ms = latency_ms,
+        )], ignore_conflicts = True)
+    record_ai_usage(caller, provider, model, calls = 1, prompt_tokens = reply.prompt_tokens, completion_tokens = reply.completion_tokens, latency_ms = latency_ms)
+    return reply.value, reply
+
+
+def _gemini_reply(result, usage):
+    """A Reply from Gemini's parsed result, cacheable if it's JSON and isn't empty."""
+    text = None
+    if result is not None:
+        try:
+            text = json.dumps(result)
+        except (TypeError, ValueError):
+            pass
+    return Reply(
+        result,
+        text,
+        getattr(usage, "prompt_token_count", 0) or 0,
+        getattr(usage, "candidates_token_count", 0) or 0,
+        usage,
+    )
+
+
+def gemini(prompt, temperature, response_mime_type = "application/json", response_schema = None, model = "gemini-2.5-flash", timeout = None, return_usage = False, seed = None, caller = None, cache = False):
     """Send a prompt to Google Gemini and return the parsed response.
 
     timeout: optional client-side request timeout in seconds. When set, a stalled request fails
         instead of hanging forever.
     return_usage: when True, return a (result, usage_metadata) tuple so callers can read token
-        counts. usage_metadata may be None if the API didn't report it.
+        counts. usage_metadata may be None if the API didn't report it, and is None for a reply
+        from the cache.
+    seed: pins sampling, so the same prompt tends to give the same reply.
+    caller: names who's calling in AIUsage. Calls without one or cache aren't accounted for.
+    cache: answer from AIResponse if this exact request has been made before, and keep the reply
+        if it hasn't. Replies that are None or aren't JSON aren't kept.
+    """
+    request = (prompt, temperature, response_mime_type, response_schema, model, timeout, seed)
+    if not caller and not cache:
+        result, usage = _gemini_request(*request)
+    else:
+        key = ai_cache_key("gemini", model, prompt, temperature = temperature, response_mime_type = response_mime_type, response_schema = response_schema, seed = seed)
+        result, reply = cached_ai_call(
+            "gemini", model, key,
+            lambda: _gemini_reply(*_gemini_request(*request)),
+            json.loads,
+            caller = caller,
+            cache = cache,
+        )
+        usage = reply.usage if reply else None
+
+    if return_usage:
+        return result, usage
+    return result
+
+
+def gemini_batch(prompts, temperature, caller = None, cache = True, max_workers = AI_MAX_WORKERS, **kwargs):
     """
+    gemini() for each of a list of prompts, sent concurrently, returning their results in order.
+
+    The cache is read for every prompt in one query, and prompts that appear
+    more than once are sent once. Only the requests run in the pool; the
+    cache and AIUsage are written from this thread when they've all come
+    back. A prompt whose request fails is None in the results, and isn't
+    cached.
+    """
+    from givefood.models import AIResponse
+
+    if not prompts:
+        return []
+
+    model = kwargs.get("model", "gemini-2.5-flash")
+    options = {
+        "response_mime_type": kwargs.get("response_mime_type", "application/json"),
+        "response_schema": kwargs.get("response_schema"),
+        "seed": kwargs.get("seed"),
+    }
+    keys = [ai_cache_key("gemini", model, prompt, temperature = temperature, **options) for prompt in prompts]
+
+    results = {}
+    if cache:
+        results = {key: json.loads(text) for key, text in AIResponse.objects.filter(key__in = set(keys)).values_list("key", "response")}
+        if results:
+            AIResponse.objects.filter(key__in = list(results)).update(hits = F("hits") + 1, last_hit = timezone.now())
+    cache_hits = sum(1 for key in keys if key in results)
+
+    to_send = {}
+    for key, prompt in zip(keys, prompts):
+        if key not in results:
+            to_send.setdefault(key, prompt)
+
+    def send(key):
+        started = monotonic()
+        try:
+            (reply, coalesced) = coalesce(key, lambda: _gemini_reply(*_gemini_request(
+                to_send[key], temperature, options["response_mime_type"], options["response_schema"], model, kwargs.get("timeout"), options["seed"],
+            )))
+        except Exception:
+            logging.exception("Gemini batch request failed")
+            return key, None, False, 0
+        return key, reply, coalesced, int((monotonic() - started) * 1000)
+
+    usage = Counter()
+    new_responses = []
+    if to_send:
+        with ThreadPoolExecutor(max_workers = min(max_workers, len(to_send))) as executor:
+            for key, reply, coalesced, latency_ms in executor.map(send, list(to_send)):
+                if reply is None:
+                    results[key] = None
+                    continue
+                results[key] = reply.value
+                if coalesced:
+                    usage["coalesced"] += 1
+                    continue
+                usage["calls"] += 1
+                usage["prompt_tokens"] += reply.prompt_tokens
+                usage["completion_tokens"] += reply.completion_tokens
+                usage["latency_ms"] += latency_ms
+                if cache and reply.text is not None:
+                    new_responses.append(AIResponse(
+                        key = key,
+                        provider = "gemini",
+                        model = model,
+                        response = reply.text,
+                        prompt_tokens = reply.prompt_tokens,
+                        completion_tokens = reply.completion_tokens,
+                        latency_ms = latency_ms,
+                    ))
+
+    AIResponse.objects.bulk_create(new_responses, ignore_conflicts = True)
+    # Repeats of a prompt sent once cost nothing more, the same as a cache hit
+    usage["coalesced"] += len(keys) - cache_hits - len(to_send)
+    record_ai_usage(caller, "gemini", model, cache_hits = cache_hits, **usage)
+
+    return [results[key] for key in keys]
+
+
+def _gemini_request(prompt, temperature, response_mime_type, response_schema, model, timeout, seed):
+    """Make the request to Gemini, returning its parsed result and usage metadata."""
     client = genai.Client(api_key = get_cred("gemini_api_key"))
 
     config = types.GenerateContentConfig(
         temperature = temperature,
+        seed = seed,
         response_mime_type = response_mime_type,
         response_schema = response_schema,
         thinking_config = types.ThinkingConfig(thinking_budget = 0),
@@ -78,12 +318,10 @@ def gemini(prompt, temperature, response_mime_type = "application/json", respons
         else:
             result = text.strip() if text else text
 
-    if return_usage:
-        return result, response.usage_metadata
-    return result
+    return result, response.usage_metadata
 
 
-def openrouter(prompt, temperature, model, response_schema = None, response_format_type = "json_schema", cred_name = "openrouter_needtestbed", seed = None, reasoning = None):
+def openrouter(prompt, temperature, model, response_schema = None, response_format_type = "json_schema", cred_name = "openrouter_needtestbed", seed = None, reasoning = None, caller = None, cache = False, valid = None):
     """Send a prompt to the OpenRouter API and return the raw response.
 
     Pass `seed` to make the call reproducible: OpenRouter routes a seeded request stickily to one
@@ -95,7 +333,63 @@ def openrouter(prompt, temperature, model, response_schema = None, response_form
 
     When a response format is requested, routing is restricted to providers that actually support
     it (see below) — otherwise the caller silently gets prose back instead of JSON.
+
+    caller and cache are as for gemini(). Only a 200 is cached, and when a response format is
+    requested only one whose content is JSON; pass `valid`, a function of the response, to be
+    stricter. A reply from the cache is a 200 Response of the same body, without its usage, as it
+    cost nothing.
     """
+    request = (prompt, temperature, model, response_schema, response_format_type, cred_name, seed, reasoning)
+    if not caller and not cache:
+        return _openrouter_request(*request)
+
+    def fetch():
+        response = _openrouter_request(*request)
+        body = None
+        if response.status_code == 200:
+            try:
+                body = response.json()
+            except ValueError:
+                pass
+        usage = (body or {}).get("usage") or {}
+        text = None
+        if body is not None and _openrouter_cacheable(body, response_schema, response_format_type) and (valid is None or valid(response)):
+            text = json.dumps({name: value for name, value in body.items() if name != "usage"})
+        return Reply(response, text, usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0, usage)
+
+    key = ai_cache_key("openrouter", model, prompt, temperature = temperature, response_schema = response_schema, response_format_type = response_format_type, seed = seed, reasoning = reasoning)
+    response, reply = cached_ai_call("openrouter", model, key, fetch, _openrouter_cached_response, caller = caller, cache = cache)
+    return response
+
+
+def _openrouter_cacheable(body, response_schema, response_format_type):
+    """Whether a 200's body has an answer worth keeping: some content, and JSON if JSON was asked for."""
+    try:
+        content = body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        return False
+    if not content:
+        return False
+    if (response_schema and response_format_type == "json_schema") or response_format_type == "json_object":
+        try:
+            json.loads(content)
+        except (json.JSONDecodeError, TypeError):
+            return False
+    return True
+
+
+def _openrouter_cached_response(text):
+    """A Response for a reply from the cache, as the request would have returned it."""
+    response = requests.models.Response()
+    response.status_code = 200
+    response._content = text.encode("utf-8")
+    response.encoding = "utf-8"
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+def _openrouter_request(prompt, temperature, model, response_schema, response_format_type, cred_name, seed, reasoning):
+    """Make the request to OpenRouter, returning the raw response."""
     key = get_cred(cred_name)
 
     payload = {
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memory mapped index for address_autocomplete.
+
+The SQL behind /aac/ is up to three queries per keystroke: a prefix and a
+substring pass over 260k places, and a prefix scan over 2.7m postcodes. The
+index answers the same questions from a single file built offline by the
+build_autocomplete_index command, so a keystroke never reaches PostgreSQL.
+
+The file is opened with mmap, so every gunicorn worker shares the one copy in
+the page cache and opening it costs nothing up front. It holds:
+
+- Places in rank order -- population descending, places without one last,
+  then name -- the same order the SQL sorts by, so a lower rank always wins.
+- Upper cased place names sorted bytewise, each with its rank. A prefix is a
+  contiguous range, found by binary search.
+- The top ranks for every prefix matching more than PREFIX_SCAN_LIMIT
+  places, so a short, common prefix doesn't mean sorting thousands of ranks.
+  Rarer prefixes have small enough ranges to sort as they are.
+- A trigram table of rank ordered postings for substring matches. Walking
+  the rarest trigram of the query in rank order finds the best matches first
+  and can stop as soon as it has enough.
+- Normalised postcodes sorted bytewise, for prefix ranges like the places.
+
+Strings live in blobs with a uint32 offset array alongside, and the arrays
+are read in place through memoryview casts, nothing is unpickled or copied.
+"""
+
+import bisect
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from array import array
+from itertools import groupby
+
+from django.conf import settings
+
+
+MAGIC = b"GFAAC001"
+
+SECTIONS = (
+    "place_records",
+    "place_record_offsets",
+    "place_keys",
+    "place_key_offsets",
+    "place_key_ranks",
+    "prefixes",
+    "prefix_offsets",
+    "prefix_top",
+    "trigrams",
+    "trigram_offsets",
+    "posting_offsets",
+    "postings",
+    "postcode_keys",
+    "postcode_key_offsets",
+    "postcode_records",
+    "postcode_record_offsets",
+)
+
+HEADER = struct.Struct("<8s" + "QQ" * len(SECTIONS))
+
+# Prefixes matching more places than this get their top ranks precomputed
+PREFIX_SCAN_LIMIT = 200
+# How many ranks are kept per precomputed prefix, the most /aac/ ever shows
+TOP_K = 10
+
+NO_RANK = 0xFFFFFFFF
+SEPARATOR = "\x1f"
+
+logger = logging.getLogger(__name__)
+
+
+def place_key(name):
+    return name.upper()
+
+
+def postcode_key(postcode):
+    return postcode.upper().replace(" ", "")
+
+
+def trigrams(key):
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+def upper_bound(prefix):
+    # 0xFF never appears in UTF-8, so it sorts after anything the prefix
+    # could be followed by.
+    return prefix + b"\xff"
+
+
+class StringTable:
+    """A blob of strings and the uint32 offsets of each, as a sequence of bytes."""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]])
+
+    def prefix_range(self, prefix):
+        return bisect.bisect_left(self, prefix), bisect.bisect_left(self, upper_bound(prefix))
+
+    def find(self, key):
+        index = bisect.bisect_left(self, key)
+        if index < len(self) and self[index] == key:
+            return index
+        return None
+
+
+class AutocompleteIndex:
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+        view = memoryview(self.mmap)
+        fields = HEADER.unpack_from(view)
+        if fields[0] != MAGIC:
+            raise ValueError("%s is not an autocomplete index" % (path))
+
+        sections = {}
+        for number, name in enumerate(SECTIONS):
+            offset, length = fields[1 + number * 2], fields[2 + number * 2]
+            sections[name] = view[offset:offset + length]
+
+        def ints(name):
+            return sections[name].cast("I")
+
+        self.place_records = StringTable(sections["place_records"], ints("place_record_offsets"))
+        self.place_keys = StringTable(sections["place_keys"], ints("place_key_offsets"))
+        self.place_key_ranks = ints("place_key_ranks")
+        self.prefixes = StringTable(sections["prefixes"], ints("prefix_offsets"))
+        self.prefix_top = ints("prefix_top")
+        self.trigrams = StringTable(sections["trigrams"], ints("trigram_offsets"))
+        self.posting_offsets = ints("posting_offsets")
+        self.postings = ints("postings")
+        self.postcode_keys = StringTable(sections["postcode_keys"], ints("postcode_key_offsets"))
+        self.postcode_records = StringTable(sections["postcode_records"], ints("postcode_record_offsets"))
+
+    def _record(self, table, index):
+        name, lat_lng, county = table[index].decode("utf-8").split(SEPARATOR)
+        return name, lat_lng or None, county or None
+
+    def _ranked_places(self, ranks):
+        return [self._record(self.place_records, rank) for rank in ranks]
+
+    def place_prefix(self, query, limit):
+        """Places whose name starts with query, best ranked first."""
+        key = place_key(query).encode("utf-8")
+
+        index = self.prefixes.find(key)
+        if index is not None:
+            top = self.prefix_top[index * TOP_K:(index + 1) * TOP_K]
+            return self._ranked_places([rank for rank in top if rank != NO_RANK][:limit])
+
+        start, end = self.place_keys.prefix_range(key)
+        return self._ranked_places(sorted(self.place_key_ranks[start:end])[:limit])
+
+    def place_substring(self, query, limit):
+        """Places with query inside their name but not at the start, best ranked first."""
+        key = place_key(query)
+
+        postings = []
+        for trigram in trigrams(key):
+            index = self.trigrams.find(trigram.encode("utf-8"))
+            if index is None:
+                return []
+            postings.append((self.posting_offsets[index], self.posting_offsets[index + 1]))
+        if not postings:
+            return []
+        start, end = min(postings, key = lambda posting: posting[1] - posting[0])
+
+        results = []
+        for rank in self.postings[start:end]:
+            record = self._record(self.place_records, rank)
+            name = place_key(record[0])
+            if key in name and not name.startswith(key):
+                results.append(record)
+                if len(results) == limit:
+                    break
+        return results
+
+    def postcode_prefix(self, query, limit):
+        """Postcodes starting with query, ignoring spaces, in postcode order."""
+        start, end = self.postcode_keys.prefix_range(postcode_key(query).encode("utf-8"))
+        return [self._record(self.postcode_records, index) for index in range(start, min(end, start + limit))]
+
+
+_lock = threading.Lock()
+_loaded = (None, None)
+
+
+def get_autocomplete_index():
+    """
+    The index at settings.AUTOCOMPLETE_INDEX_PATH, or None to use SQL.
+
+    The file is stat'ed on each call, so a rebuild swapped into place is
+    picked up without restarting workers.
+    """
+    global _loaded
+
+    path = getattr(settings, "AUTOCOMPLETE_INDEX_PATH", None)
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    signature = (path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if _loaded[0] != signature:
+            try:
+                _loaded = (signature, AutocompleteIndex(path))
+            except (OSError, ValueError, struct.error):
+                logger.exception("Couldn't open autocomplete index %s", path)
+                _loaded = (signature, None)
+        return _loaded[1]
+
+
+class IndexWriter:
+    """Writes sections one after another, then the header pointing at them."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sections = {}
+        f.write(b"\0" * HEADER.size)
+
+    def _align(self):
+        padding = -self.f.tell() % 8
+        if padding:
+            self.f.write(b"\0" * padding)
+
+    def write(self, name, data):
+        self._align()
+        offset = self.f.tell()
+        if hasattr(data, "read"):
+            data.seek(0)
+            shutil.copyfileobj(data, self.f)
+        else:
+            self.f.write(data)
+        self.sections[name] = (offset, self.f.tell() - offset)
+
+    def close(self):
+        fields = []
+        for name in SECTIONS:
+            fields.extend(self.sections[name])
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, *fields))
+
+
+def string_table(strings):
+    offsets = array("I", [0])
+    data = bytearray()
+    for string in strings:
+        data += string
+        offsets.append(len(data))
+    return bytes(data), offsets.tobytes()
+
+
+def record(*values):
+    return SEPARATOR.join(value or "" for value in values).encode("utf-8")
+
+
+def build_autocomplete_index(path, places, postcodes):
+    """
+    Write an index to path.
+
+    places is (name, lat_lng, county) in rank order. postcodes is
+    (postcode_normalized, postcode, lat_lng, county) in postcode_normalized
+    order, and may be an iterator over millions of rows -- it is written out
+    as it is read. The file is built alongside and renamed into place, so
+    readers never see half of one.
+    """
+    places = [place for place in places if place[0]]
+
+    keys = sorted(
+        (place_key(name).encode("utf-8"), rank) for rank, (name, lat_lng, county) in enumerate(places)
+    )
+
+    prefixes = []
+    stack = [(0, len(keys), 1)]
+    while stack:
+        start, end, length = stack.pop()
+        for prefix, group in groupby(range(start, end), key = lambda i: keys[i][0].decode("utf-8")[:length]):
+            group = list(group)
+            if len(group) <= PREFIX_SCAN_LIMIT or len(prefix) < length:
+                continue
+            ranks = sorted(keys[i][1] for i in group)[:TOP_K]
+            prefixes.append((prefix.encode("utf-8"), ranks + [NO_RANK] * (TOP_K - len(ranks))))
+            stack.append((group[0], group[-1] + 1, length + 1))
+    prefixes.sort()
+
+    postings = {}
+    for rank, (name, lat_lng, county) in enumerate(places):
+        for trigram in trigrams(place_key(name)):
+            postings.setdefault(trigram.encode("utf-8"), array("I")).append(rank)
+    trigram_keys = sorted(postings)
+    posting_offsets = array("I", [0])
+    for trigram in trigram_keys:
+        posting_offsets.append(posting_offsets[-1] + len(postings[trigram]))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok = True)
+    descriptor, temp_path = tempfile.mkstemp(dir = directory, suffix = ".tmp")
+    try:
+        # mkstemp's 0600 would hide it from workers running as another user
+        os.chmod(temp_path, 0o644)
+        with os.fdopen(descriptor, "wb") as f:
+            writer = IndexWriter(f)
+
+            data, offsets = string_table(record(*place) for place in places)
+            writer.write("place_records", data)
+            writer.write("place_record_offsets", offsets)
+
+            data, offsets = string_table(key for key, rank in keys)
+            writer.write("place_keys", data)
+            writer.write("place_key_offsets", offsets)
+            writer.write("place_key_ranks", array("I", [rank for key, rank in keys]).tobytes())
+
+            data, offsets = string_table(prefix for prefix, ranks in prefixes)
+            writer.write("prefixes", data)
+            writer.write("prefix_offsets", offsets)
+            writer.write("prefix_top", array("I", [rank for prefix, ranks in prefixes for rank in ranks]).tobytes())
+
+            data, offsets = string_table(trigram_keys)
+            writer.write("trigrams", data)
+            writer.write("trigram_offsets", offsets)
+            writer.write("posting_offsets", posting_offsets.tobytes())
+            writer.write("postings", b"".join(postings[trigram].tobytes() for trigram in trigram_keys))
+
+            # Too many postcodes to hold as one string, so keys and records
+            # are spooled to their own files and copied in afterwards.
+            key_offsets = array("I", [0])
+            record_offsets = array("I", [0])
+            with tempfile.TemporaryFile() as key_file, tempfile.TemporaryFile() as record_file:
+                for key, postcode, lat_lng, county in postcodes:
+                    key_offsets.append(key_offsets[-1] + key_file.write(key.encode("utf-8")))
+                    record_offsets.append(record_offsets[-1] + record_file.write(record(postcode, lat_lng, county)))
+                writer.write("postcode_keys", key_file)
+                writer.write("postcode_key_offsets", key_offsets.tobytes())
+                writer.write("postcode_records", record_file)
+                writer.write("postcode_record_offsets", record_offsets.tobytes())
+
+            writer.close()
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    return {
+        "places": len(places),
+        "prefixes": len(prefixes),
+        "trigrams": len(trigram_keys),
+        "postcodes": len(key_offsets) - 1,
+    }
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import patch_response_headers
+
+from givefood.const.cache_times import SECONDS_IN_WEEK
+
+
+logger = logging.getLogger(__name__)
+
+
+def blob_path(kind, inputs):
+    """
+    Where the blob made from these inputs lives, or None if there's no store.
+
+    The name is a hash of everything that goes into making the image --
+    coordinates, size, markers, language, place id -- so a change to any of
+    them is a different file, and an unchanged one is never fetched twice.
+    """
+    root = getattr(settings, "BLOB_CACHE_DIR", None)
+    if not root:
+        return None
+    digest = hashlib.sha256(json.dumps([kind, inputs], sort_keys = True, default = str).encode("utf-8")).hexdigest()
+    return os.path.join(root, kind, digest[:2], digest)
+
+
+def read_blob(path, max_age = None):
+    """An open file for the blob, or None if it isn't stored or is older than max_age seconds."""
+    try:
+        f = open(path, "rb")
+    except OSError:
+        # Not there, or the store is unreadable -- either way, fetch it
+        return None
+    if max_age is not None and time.time() - os.fstat(f.fileno()).st_mtime > max_age:
+        f.close()
+        return None
+    return f
+
+
+def write_blob(path, content):
+    """Store a blob, written alongside and renamed so no reader sees part of one."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok = True)
+    descriptor, temp_path = tempfile.mkstemp(dir = directory, prefix = ".")
+    try:
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(content)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def blob_response(kind, inputs, content_type, fetch, max_age = None, cache_timeout = SECONDS_IN_WEEK):
+    """
+    Respond with a proxied image from the disk store, fetching it on a miss.
+
+    These images used to be cache_page'd, so each worker held its own copy
+    of every map and photo in LocMemCache and all of them were fetched from
+    Google or Cloudflare again after a restart. A stored blob is sent as a
+    FileResponse, which gunicorn hands to sendfile() rather than reading it
+    into Python.
+
+    fetch() is only called on a miss, and returns the bytes or something
+    falsy if there's nothing to send, in which case this returns None and
+    nothing is stored. max_age is for images that can change while their
+    inputs don't, like favicons and screenshots of a page.
+    """
+    path = blob_path(kind, inputs)
+    f = read_blob(path, max_age) if path else None
+
+    if f:
+        response = FileResponse(f, content_type = content_type)
+        # FileResponse names the file after the blob's hash otherwise
+        del response["Content-Disposition"]
+    else:
+        content = fetch()
+        if not content:
+            return None
+        if path:
+            try:
+                write_blob(path, content)
+            except OSError:
+                logger.warning("Couldn't store %s blob at %s", kind, path, exc_info = True)
+        response = HttpResponse(content, content_type = content_type)
+
+    patch_response_headers(response, cache_timeout)
+    return response
+
+
+def prune_blobs(older_than):
+    """Delete stored blobs not written for older_than seconds. Returns how many went."""
+    root = getattr(settings, "BLOB_CACHE_DIR", None)
+    if not root:
+        return 0
+
+    cutoff = time.time() - older_than
+    removed = 0
+    for directory, subdirectories, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Loading postcodes, places and constituency boundaries in bulk with COPY.
+
+The imports used to read each file row by row in Python, and either save
+each row through the model or bulk_create it in batches after checking it
+against a set of every postcode already loaded. Here the file is streamed
+into a temporary table with COPY, untouched, and everything else -- which
+rows to skip and why, the normalised postcode, the slugs, and the insert
+or update itself -- is a handful of set-based statements over that table.
+
+Each loader returns its counts, with the rows read, the seconds taken and
+the rows per second.
+"""
+
+import csv
+import io
+import json
+from time import monotonic
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Bytes read from the file for each write to COPY
+COPY_READ_SIZE = 1024 * 1024
+
+
+def copy_csv(cursor, csv_file, table):
+    """
+    COPY a CSV file, header and all, into a new temporary table of text
+    columns, one per column of the file and in its order.
+
+    Returns the file's headers mapped to the table's column names. The
+    table is dropped at the end of the transaction, if the loader hasn't
+    dropped it already.
+    """
+    with open(csv_file, "r", encoding = "utf-8-sig", newline = "") as f:
+        headers = next(csv.reader(f), [])
+
+    columns = {}
+    for number, header in enumerate(headers):
+        columns.setdefault(header.strip(), "c%s" % number)
+    cursor.execute("CREATE TEMPORARY TABLE %s (%s) ON COMMIT DROP" % (
+        table,
+        ", ".join("c%s text" % number for number in range(len(headers))),
+    ))
+
+    with open(csv_file, "rb") as f:
+        cursor.copy_expert(
+            "COPY %s FROM STDIN WITH (FORMAT csv, HEADER true, ENCODING 'UTF8')" % (table),
+            f,
+            size = COPY_READ_SIZE,
+        )
+    return columns
+
+
+def copy_rows(cursor, table, columns, rows):
+    """COPY rows made in Python into a new temporary text table with the given columns."""
+    cursor.execute("CREATE TEMPORARY TABLE %s (%s) ON COMMIT DROP" % (
+        table,
+        ", ".join("%s text" % column for column in columns),
+    ))
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert("COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (table, ", ".join(columns)), buffer, size = COPY_READ_SIZE)
+
+
+def field(columns, header):
+    """SQL for a staged CSV column, trimmed, with blanks as NULL. NULL if the file hasn't got it."""
+    if header not in columns:
+        return "NULL::text"
+    return "NULLIF(btrim(%s), '')" % (columns[header])
+
+
+def slugify_sql(value):
+    """
+    SQL giving what django.utils.text.slugify() gives for value.
+
+    Decomposed, then anything left that isn't ASCII dropped, so accents
+    come off letters as slugify() takes them off. A NULL is the string
+    "None", as str(None) is what slugify() slugifies.
+    """
+    value = "regexp_replace(normalize(COALESCE(%s, 'None'), NFKD), '[^\\x01-\\x7f]', '', 'g')" % (value)
+    value = "regexp_replace(lower(%s), '[^\\w\\s-]', '', 'g')" % (value)
+    value = "regexp_replace(%s, '[-\\s]+', '-', 'g')" % (value)
+    return "btrim(%s, '-_')" % (value)
+
+
+def too_long(values):
+    """SQL for whether any of the (expression, max length) pairs doesn't fit its column."""
+    return " OR ".join("length(%s) > %s" % (value, max_length) for value, max_length in values)
+
+
+def timed(stats, started):
+    stats["seconds"] = round(monotonic() - started, 2)
+    stats["rows_per_second"] = int(stats["rows"] / stats["seconds"]) if stats["seconds"] else stats["rows"]
+    return stats
+
+
+def load_postcodes(csv_file, dry_run = False, update = False):
+    """
+    Load the postcodes in use from a postcodes CSV file.
+
+    Rows are skipped, in this order, if they're not in use, have no
+    postcode, are already loaded (unless update, when they're updated),
+    have no latitude or longitude, or have no country, and counted under
+    why. Rows with a value too long for its column are errors.
+    """
+    from givefood.models import Postcode
+
+    started = monotonic()
+    table = Postcode._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        columns = copy_csv(cursor, csv_file, "postcode_staging")
+
+        postcode = field(columns, "Postcode")
+        latitude = field(columns, "Latitude")
+        longitude = field(columns, "Longitude")
+        country = field(columns, "Country")
+        values = {
+            "county": (field(columns, "County"), 100),
+            "district": (field(columns, "District"), 100),
+            "ward": (field(columns, "Ward"), 100),
+            "region": (field(columns, "Region"), 100),
+            "lsoa": (field(columns, "LSOA Code"), 20),
+            "msoa": (field(columns, "MSOA Code"), 20),
+            "police": (field(columns, "Police force"), 100),
+        }
+        lat_lng = "%s || ',' || %s" % (latitude, longitude)
+        # Already loaded only matters when it means skipping
+        existing = "false" if update else "existing.id IS NOT NULL"
+
+        cursor.execute("""
+            CREATE TEMPORARY TABLE postcode_load ON COMMIT DROP AS
+            SELECT
+                CASE
+                    WHEN {in_use} IS DISTINCT FROM 'Yes' THEN 'not_in_use'
+                    WHEN {postcode} IS NULL THEN 'postcode'
+                    WHEN {existing} THEN 'existing'
+                    WHEN {latitude} IS NULL OR {longitude} IS NULL THEN 'coordinates'
+                    WHEN {country} IS NULL THEN 'country'
+                    WHEN {too_long} THEN 'error'
+                END AS skip,
+                {latitude} IS NULL AS no_latitude,
+                {longitude} IS NULL AS no_longitude,
+                {postcode} AS postcode,
+                upper(replace({postcode}, ' ', '')) AS postcode_normalized,
+                {lat_lng} AS lat_lng,
+                {country} AS country,
+                {values}
+            FROM postcode_staging
+            LEFT JOIN {table} existing ON existing.postcode = {postcode}
+        """.format(
+            in_use = field(columns, "In Use?"),
+            postcode = postcode,
+            existing = existing,
+            latitude = latitude,
+            longitude = longitude,
+            country = country,
+            too_long = too_long([(postcode, 9), (lat_lng, 100), (country, 50)] + list(values.values())),
+            lat_lng = lat_lng,
+            values = ", ".join("%s AS %s" % (value, name) for name, (value, max_length) in values.items()),
+            table = table,
+        ))
+
+        cursor.execute("""
+            SELECT
+                count(*),
+                count(*) FILTER (WHERE skip IS NULL),
+                count(*) FILTER (WHERE skip = 'not_in_use'),
+                count(*) FILTER (WHERE skip = 'existing'),
+                count(*) FILTER (WHERE skip = 'postcode'),
+                count(*) FILTER (WHERE skip = 'coordinates' AND no_latitude),
+                count(*) FILTER (WHERE skip = 'coordinates' AND no_longitude),
+                count(*) FILTER (WHERE skip IN ('postcode', 'coordinates', 'country')),
+                count(*) FILTER (WHERE skip = 'country'),
+                count(*) FILTER (WHERE skip = 'error')
+            FROM postcode_load
+        """)
+        (rows, to_load, not_in_use, skipped_existing, missing_postcode, missing_latitude,
+            missing_longitude, missing_data, missing_country, errors) = cursor.fetchone()
+
+        stats = {
+            "rows": rows,
+            "imported": 0,
+            "would_import": to_load if dry_run else 0,
+            "skipped_not_in_use": not_in_use,
+            "skipped_existing": skipped_existing,
+            "skipped_missing_data": missing_data,
+            "missing_field_counts": {
+                "postcode": missing_postcode,
+                "latitude": missing_latitude,
+                "longitude": missing_longitude,
+                "country": missing_country,
+            },
+            "errors": errors,
+        }
+
+        if not dry_run:
+            fields = ["postcode", "postcode_normalized", "lat_lng", "country"] + list(values)
+            if update:
+                # DISTINCT ON, as DO UPDATE can't touch a row twice in one statement. Not
+                # otherwise, as it sorts every row and DO NOTHING skips repeats anyway.
+                cursor.execute("""
+                    INSERT INTO {table} ({fields})
+                    SELECT DISTINCT ON (postcode) {fields}
+                    FROM postcode_load
+                    WHERE skip IS NULL
+                    ORDER BY postcode
+                    ON CONFLICT (postcode) DO UPDATE SET {updates}
+                """.format(
+                    table = table,
+                    fields = ", ".join(fields),
+                    updates = ", ".join("%s = EXCLUDED.%s" % (name, name) for name in fields[1:]),
+                ))
+            else:
+                cursor.execute("""
+                    INSERT INTO {table} ({fields})
+                    SELECT {fields}
+                    FROM postcode_load
+                    WHERE skip IS NULL
+                    ON CONFLICT (postcode) DO NOTHING
+                """.format(table = table, fields = ", ".join(fields)))
+            stats["imported"] = cursor.rowcount
+            # The same postcode twice in the file is already loaded the second time
+            stats["skipped_existing"] += to_load - cursor.rowcount
+
+        # Now rather than at commit, in case this is inside a longer transaction
+        cursor.execute("DROP TABLE postcode_staging, postcode_load")
+
+    return timed(stats, started)
+
+
+def load_places(csv_file, dry_run = False, replace = True):
+    """
+    Load places from a places CSV file, as Place.save() would have made them.
+
+    Places are matched on gbpnid, updated if they're already loaded and
+    added if not, keeping their population and when they were checked.
+    With replace, places not in the file are deleted. Rows with no
+    gbpnid, name, latitude or longitude, or a gbpnid that isn't a number,
+    are skipped. Rows with a value too long for its column are errors.
+    """
+    from givefood.models import Place
+
+    started = monotonic()
+    table = Place._meta.db_table
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        columns = copy_csv(cursor, csv_file, "place_staging")
+
+        gbpnid = field(columns, "GBPNID")
+        name = field(columns, "Place Name")
+        latitude = field(columns, "Latitude")
+        longitude = field(columns, "Longitude")
+        values = {
+            "histcounty": field(columns, "Historic County"),
+            "adcounty": field(columns, "Administrative County"),
+            "district": field(columns, "District"),
+            "uniauth": field(columns, "Unitary Authority Area"),
+            "police": field(columns, "Police Area"),
+            "region": field(columns, "Country"),
+            "type": field(columns, "Type"),
+        }
+        lat_lng = "%s || ',' || %s" % (latitude, longitude)
+        # As Place.save(), the unitary authority if there is one, or the administrative county
+        county = "COALESCE(%s, %s)" % (values["uniauth"], values["adcounty"])
+
+        cursor.execute("""
+            CREATE TEMPORARY TABLE place_load ON COMMIT DROP AS
+            SELECT
+                CASE
+                    WHEN {gbpnid} IS NULL THEN 'gbpnid'
+                    WHEN {name} IS NULL THEN 'name'
+                    WHEN {latitude} IS NULL THEN 'latitude'
+                    WHEN {longitude} IS NULL THEN 'longitude'
+                    WHEN {gbpnid} !~ '{integer}' THEN 'gbpnid'
+                    WHEN {too_long} THEN 'error'
+                END AS skip,
+                CASE WHEN {gbpnid} ~ '{integer}' THEN {gbpnid}::integer END AS gbpnid,
+                {name} AS name,
+                {lat_lng} AS lat_lng,
+                {county} AS county,
+                {name_slug} AS name_slug,
+                {county_slug} AS county_slug,
+                {values}
+            FROM place_staging
+        """.format(
+            gbpnid = gbpnid,
+            # Up to nine digits, so it fits an integer column
+            integer = "^[-+]?[0-9]{1,9}$",
+            name = name,
+            latitude = latitude,
+            longitude = longitude,
+            too_long = too_long([(name, 100), (lat_lng, 100), (slugify_sql(name), 100), (slugify_sql(county), 100)] + [(value, 100) for value in values.values()]),
+            lat_lng = lat_lng,
+            county = county,
+            name_slug = slugify_sql(name),
+            county_slug = slugify_sql(county),
+            values = ", ".join("%s AS %s" % (value, value_name) for value_name, value in values.items()),
+        ))
+
+        cursor.execute("""
+            SELECT
+                count(*),
+                count(*) FILTER (WHERE skip IS NULL),
+                count(*) FILTER (WHERE skip = 'gbpnid'),
+                count(*) FILTER (WHERE skip = 'name'),
+                count(*) FILTER (WHERE skip = 'latitude'),
+                count(*) FILTER (WHERE skip = 'longitude'),
+                count(*) FILTER (WHERE skip = 'error')
+            FROM place_load
+        """)
+        rows, to_load, missing_gbpnid, missing_name, missing_latitude, missing_longitude, errors = cursor.fetchone()
+        cursor.execute("SELECT count(*) FROM %s" % (table))
+        existing = cursor.fetchone()[0]
+
+        stats = {
+            "rows": rows,
+            "existing": existing,
+            "imported": 0,
+            "deleted": 0,
+            "would_import": to_load if dry_run else 0,
+            "skipped_missing_data": missing_gbpnid + missing_name + missing_latitude + missing_longitude,
+            "missing_field_counts": {
+                "gbpnid": missing_gbpnid,
+                "name": missing_name,
+                "latitude": missing_latitude,
+                "longitude": missing_longitude,
+            },
+            "errors": errors,
+        }
+
+        if not dry_run and to_load:
+            fields = ["gbpnid", "name", "lat_lng", "county", "name_slug", "county_slug"] + list(values)
+            now = timezone.now()
+            # The last row for a gbpnid wins, as it would have saving them in turn
+            cursor.execute("""
+                INSERT INTO {table} (created, modified, {fields})
+                SELECT DISTINCT ON (gbpnid) %s, %s, {fields}
+                FROM (SELECT *, row_number() OVER () AS line FROM place_load WHERE skip IS NULL) rows
+                ORDER BY gbpnid, line DESC
+                ON CONFLICT (gbpnid) DO UPDATE SET modified = EXCLUDED.modified, {updates}
+            """.format(
+                table = table,
+                fields = ", ".join(fields),
+                updates = ", ".join("%s = EXCLUDED.%s" % (field_name, field_name) for field_name in fields[1:]),
+            ), [now, now])
+            stats["imported"] = cursor.rowcount
+
+            if replace:
+                cursor.execute("""
+                    DELETE FROM {table} place
+                    WHERE NOT EXISTS (SELECT 1 FROM place_load WHERE place_load.skip IS NULL AND place_load.gbpnid = place.gbpnid)
+                """.format(table = table))
+                stats["deleted"] = cursor.rowcount
+
+        cursor.execute("DROP TABLE place_staging, place_load")
+
+    return timed(stats, started)
+
+
+def boundary_features(geojson_file):
+    """
+    Each feature in a GeoJSON file, either a FeatureCollection or one
+    feature a line as the constituency boundary files have been.
+    """
+    with open(geojson_file, "r", encoding = "utf-8") as f:
+        text = f.read()
+
+    try:
+        collection = json.loads(text)
+    except ValueError:
+        collection = None
+    if isinstance(collection, dict):
+        return collection.get("features", [collection])
+
+    features = []
+    for line in text.splitlines():
+        line = line.strip().rstrip(",")
+        if not line.startswith("{"):
+            continue
+        try:
+            features.append(json.loads(line))
+        except ValueError:
+            continue
+    return features
+
+
+def load_constituency_boundaries(geojson_file):
+    """
+    Set each constituency's boundary from a GeoJSON file of them.
+
+    A feature is a constituency's when one of its properties is the
+    constituency's name, whatever the property's called in that year's
+    file. Constituencies are only updated, never added, and the data
+    version is bumped once for them all.
+    """
+    from givefood.models import ParliamentaryConstituency
+    from givefood.utils.cache import bump_data_version
+
+    started = monotonic()
+    features = boundary_features(geojson_file)
+
+    rows = []
+    for feature in features:
+        geojson = json.dumps(feature, separators = (",", ":"))
+        for value in set((feature.get("properties") or {}).values()):
+            if isinstance(value, str) and value.strip():
+                rows.append([value.strip(), geojson])
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        copy_rows(cursor, "boundary_staging", ["name", "geojson"], rows)
+        cursor.execute("""
+            UPDATE {table} parlcon
+            SET boundary_geojson = boundary.geojson
+            FROM (SELECT DISTINCT ON (name) name, geojson FROM boundary_staging ORDER BY name) boundary
+            WHERE parlcon.name = boundary.name
+        """.format(table = ParliamentaryConstituency._meta.db_table))
+        updated = cursor.rowcount
+        cursor.execute("SELECT count(*) FROM %s" % (ParliamentaryConstituency._meta.db_table))
+        constituencies = cursor.fetchone()[0]
+        cursor.execute("DROP TABLE boundary_staging")
+
+    if updated:
+        bump_data_version("constituency")
+
+    return timed({
+        "rows": len(features),
+        "updated": updated,
+        "unmatched": constituencies - updated,
+    }, started)
@@ -1,12 +1,29 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import datetime
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
 import requests
 
+from django.conf import settings
 from django.core.cache import cache
+from django.db.models import Avg, Count, F, IntegerField, Max, Min, Q, Sum, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import get_language, override
+from django.views.decorators.cache import cache_page
 from django_tasks import task
 
-from givefood.const.general import FB_MC_KEY, LOC_MC_KEY, PARLCON_MC_KEY, FB_OPEN_MC_KEY, LOC_OPEN_MC_KEY, CRED_MC_KEY_PREFIX, STATS_MC_KEY
+from givefood.const.cache_times import SECONDS_IN_DAY, SECONDS_IN_MINUTE
+from givefood.const.general import FB_MC_KEY, LOC_MC_KEY, PARLCON_MC_KEY, FB_OPEN_MC_KEY, LOC_OPEN_MC_KEY, CRED_MC_KEY_PREFIX, DATA_VERSION_MC_KEY_PREFIX, FRAGMENT_MC_KEY_PREFIX, STATS_MC_KEY
 
 
 def get_slug_redirects():
@@ -146,16 +163,376 @@ def get_all_constituencies():
     return all_parlcon
 
 
+# How long a data version is read from the cache before DataVersion is checked again
+DATA_VERSION_TIMEOUT = SECONDS_IN_MINUTE
+
+
+def get_data_versions(scopes):
+    """
+    Return {scope: (version, modified)} for each scope, from the cache or DataVersion.
+
+    Versions are read on every API and GeoJSON hit, so they're kept in the
+    cache. bump_data_version() sets the new one there, and the timeout is
+    short so a worker that set an older one after it is soon put right.
+    """
+    from givefood.models import DataVersion
+
+    keys = {scope: "%s%s" % (DATA_VERSION_MC_KEY_PREFIX, scope) for scope in scopes}
+    cached = cache.get_many(keys.values())
+    versions = {scope: cached[key] for scope, key in keys.items() if key in cached}
+
+    missing = [scope for scope in scopes if scope not in versions]
+    if missing:
+        rows = {data_version.scope: data_version for data_version in DataVersion.objects.filter(scope__in = missing)}
+        for scope in missing:
+            if scope not in rows:
+                rows[scope], created = DataVersion.objects.get_or_create(scope = scope, defaults = {"version": 1})
+            versions[scope] = (rows[scope].version, rows[scope].modified)
+        cache.set_many({keys[scope]: versions[scope] for scope in missing}, DATA_VERSION_TIMEOUT)
+
+    return versions
+
+
+def bump_data_version(*scopes):
+    """Record that the public data in scopes has changed, invalidating the ETags that read it."""
+    from givefood.models import DataVersion
+
+    for scope in scopes:
+        updated = DataVersion.objects.filter(scope = scope).update(version = F("version") + 1, modified = timezone.now())
+        if not updated:
+            DataVersion.objects.get_or_create(scope = scope, defaults = {"version": 1})
+
+    cache.delete_many(["%s%s" % (DATA_VERSION_MC_KEY_PREFIX, scope) for scope in scopes])
+    get_data_versions(scopes)
+
+
+def record_change(obj, action = None):
+    """
+    Append a change to obj to the /api/2/changes/ feed, and bump its type's data version.
+
+    action is "created" or "deleted" when the caller says so, and otherwise
+    "closed" or "updated" depending on whether obj is closed.
+    """
+    from givefood.const.general import DATA_CHANGE_TYPES
+    from givefood.models import DataChange
+
+    if action is None:
+        action = "closed" if getattr(obj, "is_closed", False) else "updated"
+
+    model_name = obj._meta.model_name
+    if model_name == "foodbank":
+        object_uuid, slug, foodbank_slug = obj.uuid, obj.slug, obj.slug
+    elif model_name == "foodbankchange":
+        object_uuid, slug = obj.need_id, None
+        foodbank_slug = obj.foodbank.slug if obj.foodbank_id else None
+    else:
+        object_uuid, slug, foodbank_slug = obj.uuid, obj.slug, obj.foodbank_slug
+
+    DataChange.objects.create(
+        object_type = DATA_CHANGE_TYPES[model_name],
+        action = action,
+        object_uuid = object_uuid,
+        slug = slug,
+        foodbank_slug = foodbank_slug,
+    )
+    bump_data_version(DATA_CHANGE_TYPES[model_name])
+
+
+def prune_changes(days):
+    """Delete /api/2/changes/ entries older than days, returning how many went."""
+    from givefood.models import DataChange
+
+    deleted, by_model = DataChange.objects.filter(created__lt = timezone.now() - datetime.timedelta(days = days)).delete()
+    return deleted
+
+
+def fragment_key(name, objs, language = None):
+    """
+    Cache key for a fragment made from objs, at the version each is at.
+
+    The version is the object's modified time, which every save moves on, so
+    a new save is a new key and the old fragment is never read again.
+    """
+    versions = ["%s.%s.%s" % (obj._meta.model_name, obj.pk, int(obj.modified.timestamp() * 1000000)) for obj in objs]
+    key = "%s%s:%s" % (FRAGMENT_MC_KEY_PREFIX, name, ":".join(versions))
+    if language:
+        key = "%s:%s" % (key, language)
+    return key
+
+
+def get_fragment(name, objs, build, shared = True, timeout = SECONDS_IN_DAY):
+    """
+    A part of a page that's built once per version of the objects it's from.
+
+    cache_page keys a whole page by language, so on a miss everything on it
+    is rebuilt for each of the languages we serve. A shared fragment -- the
+    lists of locations and donation points -- has nothing translated in it,
+    so it's built once, in the default language, and every language uses
+    it. One that isn't shared is cached per language.
+    """
+    if shared:
+        key = fragment_key(name, objs)
+    else:
+        key = fragment_key(name, objs, get_language() or settings.LANGUAGE_CODE)
+
+    fragment = cache.get(key)
+    if fragment is None:
+        if shared:
+            with override(settings.LANGUAGE_CODE):
+                fragment = build()
+        else:
+            fragment = build()
+        cache.set(key, fragment, timeout)
+    return fragment
+
+
+def versioned_cache_page(timeout, scopes):
+    """
+    cache_page for the API and GeoJSON views, plus ETag, Last-Modified and 304s.
+
+    scopes are the types of data the view reads, from DATA_VERSION_SCOPES.
+    The validators come from their versions rather than from the response
+    body, so If-None-Match and If-Modified-Since are checked before the view
+    -- or the cache -- is touched at all, usually without a query. The ETag
+    covers the full path and the language, as those are what the response
+    varies on.
+
+    The versions are also the cache_page key prefix. A cached body can't
+    outlive the versions it was built at, so it always agrees with its ETag,
+    and a change is seen by every worker within DATA_VERSION_TIMEOUT rather
+    than when its local cache happens to expire. A change only moves on the
+    views that read its type of data, and the bodies of the rest stay cached.
+    """
+
+    def decorator(view_func):
+
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+
+            versions = get_data_versions(scopes)
+            # The timestamps as well as the counts, so a recreated row can't
+            # bring back versions that were handed out before
+            version = "-".join("%s.%s" % (versions[scope][0], int(versions[scope][1].timestamp() * 1000000)) for scope in scopes)
+            etag = '"%s"' % (hashlib.md5(("%s:%s:%s" % (version, request.get_full_path(), get_language())).encode("utf-8")).hexdigest())
+            last_modified = int(max(modified for data_version, modified in versions.values()).timestamp())
+
+            if request.method in ("GET", "HEAD"):
+                response = get_conditional_response(request, etag = etag, last_modified = last_modified)
+                if response is not None:
+                    if response.status_code != 304:
+                        return response
+                    response["ETag"] = etag
+                    response["Last-Modified"] = http_date(last_modified)
+                    return response
+
+            response = cache_page(timeout, key_prefix = "v%s" % (version))(view_func)(request, *args, **kwargs)
+
+            if request.method in ("GET", "HEAD") and response.status_code == 200:
+                response["ETag"] = etag
+                response["Last-Modified"] = http_date(last_modified)
+            return response
+
+        return wrapped_view
+
+    return decorator
+
+
+# How long a purge waits after the first path is added to it, for more to join
+PURGE_WINDOW_SECONDS = 30
+# Cloudflare takes up to 30 URLs, or 30 prefixes, in a purge request
+PURGE_CHUNK_SIZE = 30
+# Purge requests sent at once
+PURGE_MAX_WORKERS = 4
+# Tries at a purge request that's rate limited or errors, backing off between them
+PURGE_TRIES = 4
+# How long purged paths are kept for purge_stats()
+PURGE_KEEP_DAYS = 7
+# How long a purge has to send the rows it's claimed before another sends them
+PURGE_CLAIM_SECONDS = 10 * 60
+
+# What became of a purge request: purged, failed in a way trying again
+# could fix (rate limited, Cloudflare erroring or unreachable), or refused,
+# which it would be every time (a path it won't take, a bad token)
+PURGE_PURGED = "purged"
+PURGE_FAILED = "failed"
+PURGE_REFUSED = "refused"
+
+CDN_DOMAIN = "www.givefood.org.uk"
+
+
+def queue_decache(urls = None, prefixes = None):
+    """
+    Add URLs and URL prefixes to the CDN purge that's waiting to go.
+
+    A save used to queue a purge of its own, and a bulk edit hundreds of
+    overlapping ones. Now the paths are added to CachePurge, where a path
+    already waiting isn't added again, and one purge_pending task sends
+    them all PURGE_WINDOW_SECONDS after the first. The decache queue
+    coalesces, so queueing it again while it waits queues nothing more.
+    """
+    from givefood.models import CachePurge
+
+    purges = [CachePurge(path = url) for url in urls or []]
+    purges += [CachePurge(path = prefix, is_prefix = True) for prefix in prefixes or []]
+    if not purges:
+        return
+
+    CachePurge.objects.bulk_create(purges, ignore_conflicts = True)
+    run_after = timezone.now() + datetime.timedelta(seconds = PURGE_WINDOW_SECONDS)
+    purge_pending.using(run_after = run_after).enqueue()
+
+
 @task(queue_name="decache", priority=20)
 def decache_async(urls = None, prefixes = None):
-    """Async task to purge URLs and prefixes from the Cloudflare and local caches."""
-    decache(urls = urls, prefixes = prefixes)
+    """Async task to purge URLs and prefixes from the Cloudflare and local caches, now by way of queue_decache."""
+    queue_decache(urls = urls, prefixes = prefixes)
     return True
 
 
+@task(queue_name="decache", priority=20)
+def purge_pending():
+    """
+    Purge every path waiting in CachePurge from the Cloudflare and local caches.
+
+    The waiting rows are claimed before they're sent, and a send takes
+    seconds, so a save in the meantime adds its path as waiting again
+    rather than finding it already waiting and being marked purged with
+    the rows sent before it changed. Paths in a request that failed are
+    put back waiting, and another purge is queued to try them again. Paths
+    in a request Cloudflare refused are marked purged, as sending them again
+    would be refused again, every purge, for good.
+    """
+    from givefood.models import CachePurge
+
+    now = timezone.now()
+    CachePurge.objects.filter(purged__lt = now - datetime.timedelta(days = PURGE_KEEP_DAYS)).delete()
+
+    # Rows claimed by a purge that didn't finish are sent again
+    unclaimed = Q(claimed__isnull = True) | Q(claimed__lt = now - datetime.timedelta(seconds = PURGE_CLAIM_SECONDS))
+    waiting = list(CachePurge.objects.filter(unclaimed, purged__isnull = True).values_list("id", "path", "is_prefix"))
+    if not waiting:
+        return {"paths": 0, "requests": 0, "failed": 0, "refused": 0}
+    CachePurge.objects.filter(id__in = [purge_id for purge_id, path, is_prefix in waiting]).update(claimed = now)
+
+    urls = [path for purge_id, path, is_prefix in waiting if not is_prefix]
+    prefixes = [path for purge_id, path, is_prefix in waiting if is_prefix]
+    sent = decache(urls = urls, prefixes = prefixes)
+
+    failed_urls = set(sent["failed_urls"])
+    failed_prefixes = sent["failed_prefixes"]
+    if sent["refused_urls"] or sent["refused_prefixes"]:
+        logging.error(
+            "Cloudflare refused to purge %s, not trying them again",
+            ", ".join(sent["refused_prefixes"] + sent["refused_urls"]),
+        )
+    purged_ids = []
+    failed = []
+    for purge_id, path, is_prefix in waiting:
+        if (not is_prefix and path in failed_urls) or any(purge_path(path).startswith(prefix) for prefix in failed_prefixes):
+            failed.append((purge_id, path, is_prefix))
+        else:
+            purged_ids.append(purge_id)
+    CachePurge.objects.filter(id__in = purged_ids).update(purged = timezone.now())
+
+    if failed:
+        # Unclaiming them could clash with the same path added since, so
+        # they're added again, which also queues the purge to retry them
+        CachePurge.objects.filter(id__in = [purge_id for purge_id, path, is_prefix in failed]).delete()
+        queue_decache(
+            urls = [path for purge_id, path, is_prefix in failed if not is_prefix],
+            prefixes = [path for purge_id, path, is_prefix in failed if is_prefix],
+        )
+
+    return {
+        "paths": len(waiting),
+        "requests": sent["requests"],
+        "failed": len(failed_urls) + len(failed_prefixes),
+        "refused": len(sent["refused_urls"]) + len(sent["refused_prefixes"]),
+    }
+
+
+def purge_path(url):
+    """A URL without its query string, which is what a prefix purge matches."""
+    return url.split("?")[0]
+
+
+def collapse_purge(urls = None, prefixes = None):
+    """
+    The fewest URLs and prefixes that purge everything asked for.
+
+    Duplicates go, as do prefixes under another prefix, and URLs under a
+    prefix, whatever their query string, as Cloudflare purges every query
+    string of what a prefix covers. URLs that are one path with different
+    query strings become a prefix of that path, which costs one purge
+    rather than one each. Not for a top level path such as /cy/, where
+    that prefix would purge a whole language.
+    """
+    urls = set(urls or [])
+    prefixes = set(prefixes or [])
+
+    paths = {}
+    for url in urls:
+        paths.setdefault(purge_path(url), set()).add(url)
+    for path, variants in paths.items():
+        if len(variants) > 1 and path.strip("/").count("/") > 0:
+            prefixes.add(path)
+
+    # A prefix sorts before everything it's a prefix of
+    kept_prefixes = []
+    for prefix in sorted(prefixes):
+        if not any(prefix.startswith(kept) for kept in kept_prefixes):
+            kept_prefixes.append(prefix)
+
+    kept_urls = sorted(url for url in urls if not any(purge_path(url).startswith(prefix) for prefix in kept_prefixes))
+    return kept_urls, kept_prefixes
+
+
+def send_purge(api_url, headers, key, items):
+    """
+    Send one purge request, trying again with backoff when Cloudflare rate
+    limits it or errors. Returns PURGE_PURGED, PURGE_FAILED when it was
+    still rate limited or erroring after PURGE_TRIES, or PURGE_REFUSED
+    when Cloudflare answered that it won't purge it.
+    """
+    for attempt in range(PURGE_TRIES):
+        response = None
+        try:
+            response = requests.post(api_url, headers = headers, json = {key: items}, timeout = 30)
+        except requests.RequestException:
+            logging.warning("Cloudflare purge request failed", exc_info = True)
+
+        if response is not None and response.status_code != 429 and response.status_code < 500:
+            try:
+                success = response.json().get("success", False)
+            except ValueError:
+                success = False
+            if not success:
+                logging.warning("Cloudflare purge refused: %s %s", response.status_code, response.text[:500])
+                return PURGE_REFUSED
+            return PURGE_PURGED
+
+        if attempt < PURGE_TRIES - 1:
+            wait = 2 ** attempt
+            if response is not None:
+                try:
+                    wait = max(wait, int(response.headers.get("Retry-After", 0)))
+                except ValueError:
+                    pass
+            time.sleep(wait)
+
+    return PURGE_FAILED
+
+
 def decache(urls = None, prefixes = None):
-    """Purge specific URLs and/or URL prefixes from the Cloudflare CDN cache and clear the local cache."""
-    domain = "www.givefood.org.uk"
+    """
+    Purge specific URLs and/or URL prefixes from the Cloudflare CDN cache now, and clear the local cache.
+
+    They're collapsed to the fewest that cover them all, and sent
+    PURGE_CHUNK_SIZE at a time in requests made at once. Returns how many
+    of each and how many requests were sent, and the URLs and prefixes in
+    requests that failed and in those Cloudflare refused.
+    """
+    urls, prefixes = collapse_purge(urls, prefixes)
 
     cf_zone_id = get_cred("cf_zone_id")
     cf_api_key = get_cred("cf_api_key")
@@ -165,31 +542,76 @@ def decache(urls = None, prefixes = None):
     }
     api_url = "https://api.cloudflare.com/client/v4/zones/%s/purge_cache" % (cf_zone_id)
 
-    if prefixes:
-        full_prefixes = []
-        for prefix in prefixes:
-            full_prefixes.append("%s%s" % (domain, prefix))
+    batches = []
+    for x in range(0, len(prefixes), PURGE_CHUNK_SIZE):
+        batches.append(("prefixes", prefixes[x:x+PURGE_CHUNK_SIZE]))
+    for x in range(0, len(urls), PURGE_CHUNK_SIZE):
+        batches.append(("files", urls[x:x+PURGE_CHUNK_SIZE]))
+
+    def send(batch):
+        key, paths = batch
+        if key == "prefixes":
+            items = ["%s%s" % (CDN_DOMAIN, path) for path in paths]
+        else:
+            items = ["https://%s%s" % (CDN_DOMAIN, path) for path in paths]
+        return send_purge(api_url, headers, key, items)
+
+    unpurged = {
+        (PURGE_FAILED, "files"): [],
+        (PURGE_FAILED, "prefixes"): [],
+        (PURGE_REFUSED, "files"): [],
+        (PURGE_REFUSED, "prefixes"): [],
+    }
+    if batches:
+        with ThreadPoolExecutor(max_workers = min(PURGE_MAX_WORKERS, len(batches))) as executor:
+            for (key, paths), outcome in zip(batches, executor.map(send, batches)):
+                if outcome != PURGE_PURGED:
+                    unpurged[(outcome, key)].extend(paths)
 
-        requests.post(api_url, headers = headers, json = {
-            "prefixes": full_prefixes,
-        })
-    
-    if urls:
-        full_urls = []
-        for url in urls:
-            full_urls.append("%s%s%s" % ("https://", domain, url))
+    cache.clear()
+    return {
+        "urls": len(urls),
+        "prefixes": len(prefixes),
+        "requests": len(batches),
+        "failed_urls": unpurged[(PURGE_FAILED, "files")],
+        "failed_prefixes": unpurged[(PURGE_FAILED, "prefixes")],
+        "refused_urls": unpurged[(PURGE_REFUSED, "files")],
+        "refused_prefixes": unpurged[(PURGE_REFUSED, "prefixes")],
+    }
 
-        # We can only uncache 30 URLs at a time
-        url_limit = 30
-        url_lists = [full_urls[x:x+url_limit] for x in range(0, len(full_urls), url_limit)]
 
-        for urls in url_lists:
-            requests.post(api_url, headers = headers, json = {
-                "files": urls,
-            })
+def purge_stats(since):
+    """
+    Paths waiting to be purged and how long the oldest has, and of those
+    purged since, how many and how long after being asked for, in seconds,
+    with the purge requests sent, and the paths that failed or were refused.
+    """
+    from django_tasks_db.models import DBTaskResult
 
-    cache.clear()
-    return True
+    from givefood.models import CachePurge
+
+    purged = Q(purged__gte = since)
+    stats = CachePurge.objects.aggregate(
+        waiting = Count("id", filter = Q(purged__isnull = True)),
+        oldest_waiting = Min("created", filter = Q(purged__isnull = True)),
+        purged_count = Count("id", filter = purged),
+        latency = Avg(F("purged") - F("created"), filter = purged),
+        max_latency = Max(F("purged") - F("created"), filter = purged),
+    )
+    for field in ("latency", "max_latency"):
+        if stats[field] is not None:
+            stats[field] = round(stats[field].total_seconds(), 1)
+
+    stats.update(DBTaskResult.objects.filter(
+        task_path = purge_pending.module_path,
+        finished_at__gte = since,
+        return_value__isnull = False,
+    ).aggregate(
+        requests = Coalesce(Sum(Cast(KeyTextTransform("requests", "return_value"), IntegerField())), Value(0)),
+        failed = Coalesce(Sum(Cast(KeyTextTransform("failed", "return_value"), IntegerField())), Value(0)),
+        refused = Coalesce(Sum(Cast(KeyTextTransform("refused", "return_value"), IntegerField())), Value(0)),
+    ))
+    return stats
 
 
 def get_cred(cred_name):
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Load the charity regulators' full register extracts, rather than asking
+their APIs about one food bank at a time.
+
+The crawlers in crawlers.py make three or more requests per food bank and
+rewrite its CharityYear rows one save() at a time. Each regulator also
+publishes its whole register as files, which are downloaded separately and
+read from disk here. Each file is streamed once and joined against every
+food bank's charity number, and the changes are written in bulk.
+
+Food banks are updated from the register for their country only, the same
+as the crawlers, and only for the files given.
+"""
+
+import csv
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from django.db import transaction
+from django.utils import timezone
+
+from givefood.utils.cache import bump_data_version
+
+
+# England & Wales: the Charity Commission's tab separated "public extract",
+# one file per table
+EW_CHARITY_FILE = "publicextract.charity.txt"
+EW_CLASSIFICATION_FILE = "publicextract.charity_classification.txt"
+EW_ANNUAL_RETURN_FILE = "publicextract.charity_annual_return_history.txt"
+
+# Scotland: OSCR's charity register download, one row per charity with its latest year
+SCOTLAND_COLUMNS = {
+    "number": "Charity Number",
+    "name": "Charity Name",
+    "reg_date": "Registered Date",
+    "postcode": "Postcode",
+    "website": "Website",
+    "purposes": "Purposes",
+    "objectives": "Objectives",
+    "year_end": "Year End",
+    "income": "Most recent year income",
+    "expenditure": "Most recent year expenditure",
+}
+
+# Northern Ireland: the Charity Commission for Northern Ireland's register
+# export, one row per charity and subsidiary with its latest year
+NI_COLUMNS = {
+    "number": "Reg charity number",
+    "sub_number": "Sub charity number",
+    "name": "Charity name",
+    "reg_date": "Date registered",
+    "website": "Website",
+    "purposes": "Charitable purposes",
+    "does": "What the charity does",
+    "year_end": "Date for financial year ending",
+    "income": "Total income",
+    "expenditure": "Total spending",
+}
+
+CHARITY_FIELDS = [
+    "charity_id", "charity_name", "charity_type", "charity_reg_date", "charity_postcode",
+    "charity_website", "charity_objectives", "charity_purpose", "last_charity_check",
+]
+
+BATCH_SIZE = 1000
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d %B %Y", "%d %b %Y"]
+
+
+def read_register(path, delimiter = ","):
+    """Stream the rows of a register extract as dicts."""
+    # Objectives and activities can be longer than csv's default field limit
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline = "", encoding = "utf-8-sig") as register_file:
+        if delimiter == "\t":
+            reader = csv.DictReader(register_file, delimiter = delimiter, quoting = csv.QUOTE_NONE)
+        else:
+            reader = csv.DictReader(register_file, delimiter = delimiter)
+        for row in reader:
+            yield {key.strip(): (value or "").strip() for key, value in row.items() if key}
+
+
+def parse_date(value):
+    """A date from any of the formats the registers use, ignoring any time, or None."""
+    if not value:
+        return None
+    value = value.split("T")[0].split(" 00:00")[0].strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_money(value):
+    """Whole pounds from a register's figure, or None."""
+    value = re.sub(r"[£,\s]", "", value or "")
+    if not value:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+def set_charity_field(foodbank, field, value):
+    # A long value would fail the whole bulk update, rather than just this food bank
+    max_length = foodbank._meta.get_field(field).max_length
+    if value and max_length:
+        value = value[:max_length]
+    setattr(foodbank, field, value or None)
+
+
+class RegisterLoad:
+    """The food banks and charity years one load has changed, written together by save()."""
+
+    def __init__(self):
+        self.foodbanks = {}
+        self.years = {}
+        self.now = timezone.now()
+
+    def foodbanks_by_number(self, countries, normalise = lambda number: number):
+        """Open food banks in the countries, keyed by their normalised charity number."""
+        from givefood.models import Foodbank
+
+        by_number = {}
+        for foodbank in Foodbank.objects.filter(
+            country__in = countries, is_closed = False, charity_number__isnull = False,
+        ).exclude(charity_number = ""):
+            by_number.setdefault(normalise(foodbank.charity_number.strip()), []).append(foodbank)
+        return by_number
+
+    def update(self, foodbank, **fields):
+        for field, value in fields.items():
+            set_charity_field(foodbank, field, value)
+        foodbank.last_charity_check = self.now
+        self.foodbanks[foodbank.id] = foodbank
+
+    def add_year(self, foodbank, date, income, expenditure):
+        if date:
+            # Keyed so a year listed twice is upserted once, which ON CONFLICT needs within a statement
+            self.years[(foodbank.id, date)] = (income, expenditure)
+
+    def save(self):
+        from givefood.models import CharityYear, Foodbank, SearchDocument
+
+        years = [
+            CharityYear(foodbank_id = foodbank_id, date = date, income = income, expenditure = expenditure)
+            for (foodbank_id, date), (income, expenditure) in self.years.items()
+        ]
+        with transaction.atomic():
+            Foodbank.objects.bulk_update(list(self.foodbanks.values()), CHARITY_FIELDS, batch_size = BATCH_SIZE)
+            CharityYear.objects.bulk_create(
+                years,
+                update_conflicts = True,
+                unique_fields = ["foodbank", "date"],
+                update_fields = ["income", "expenditure"],
+                batch_size = BATCH_SIZE,
+            )
+            # The admin search finds food banks by charity name
+            SearchDocument.update_for(*self.foodbanks.values())
+        if self.foodbanks:
+            bump_data_version("foodbank")
+        return {"foodbanks": len(self.foodbanks), "years": len(years)}
+
+
+def load_ew(load, directory):
+    """Load England & Wales food banks from the Charity Commission's extract files in directory."""
+    directory = Path(directory)
+    by_number = load.foodbanks_by_number(["England", "Wales"])
+
+    def main_charity_rows(file_name):
+        # Linked charities share their parent's number, and aren't what a food bank's number means
+        for row in read_register(directory / file_name, "\t"):
+            if row.get("linked_charity_number", "0") in ("0", "") and row.get("registered_charity_number") in by_number:
+                yield row, by_number[row["registered_charity_number"]]
+
+    purposes = {}
+    for row, foodbanks in main_charity_rows(EW_CLASSIFICATION_FILE):
+        if row.get("classification_type") == "What":
+            purposes.setdefault(row["registered_charity_number"], []).append(row.get("classification_description", ""))
+
+    for row, foodbanks in main_charity_rows(EW_CHARITY_FILE):
+        for foodbank in foodbanks:
+            load.update(
+                foodbank,
+                charity_id = row.get("organisation_number"),
+                charity_name = row.get("charity_name"),
+                charity_type = row.get("charity_type"),
+                charity_reg_date = parse_date(row.get("date_of_registration")),
+                charity_postcode = row.get("charity_contact_postcode"),
+                charity_website = row.get("charity_contact_web"),
+                charity_objectives = row.get("charity_activities"),
+                charity_purpose = "".join("%s\n" % purpose for purpose in purposes.get(row["registered_charity_number"], [])),
+            )
+
+    for row, foodbanks in main_charity_rows(EW_ANNUAL_RETURN_FILE):
+        for foodbank in foodbanks:
+            load.add_year(
+                foodbank,
+                parse_date(row.get("fin_period_end_date")),
+                parse_money(row.get("total_gross_income")),
+                parse_money(row.get("total_gross_expenditure")),
+            )
+
+
+def load_scotland(load, path):
+    """Load Scottish food banks from OSCR's register download."""
+    by_number = load.foodbanks_by_number(["Scotland"], lambda number: number.upper())
+    columns = SCOTLAND_COLUMNS
+
+    for row in read_register(path):
+        foodbanks = by_number.get(row.get(columns["number"], "").upper())
+        if not foodbanks:
+            continue
+        purposes = row.get(columns["purposes"], "")
+        # Listed as 'quoted','values' in one column
+        purposes = re.findall(r"'([^']+)'", purposes) or [purpose for purpose in purposes.split(",") if purpose.strip()]
+        for foodbank in foodbanks:
+            load.update(
+                foodbank,
+                charity_name = row.get(columns["name"]),
+                charity_reg_date = parse_date(row.get(columns["reg_date"])),
+                charity_postcode = row.get(columns["postcode"]),
+                charity_website = row.get(columns["website"]),
+                charity_purpose = "".join("%s\n" % purpose.strip() for purpose in purposes),
+                charity_objectives = row.get(columns["objectives"]),
+            )
+            load.add_year(
+                foodbank,
+                parse_date(row.get(columns["year_end"])),
+                parse_money(row.get(columns["income"])),
+                parse_money(row.get(columns["expenditure"])),
+            )
+
+
+def load_ni(load, path):
+    """Load Northern Irish food banks from the Charity Commission for Northern Ireland's register export."""
+    by_number = load.foodbanks_by_number(["Northern Ireland"], lambda number: number.upper().replace("NIC", ""))
+    columns = NI_COLUMNS
+
+    for row in read_register(path):
+        if row.get(columns["sub_number"], "0") not in ("0", ""):
+            continue
+        foodbanks = by_number.get(row.get(columns["number"], ""))
+        if not foodbanks:
+            continue
+        does = row.get(columns["does"])
+        if does:
+            does = re.sub(r",(?!\s)", "\n", does)
+        for foodbank in foodbanks:
+            load.update(
+                foodbank,
+                charity_name = row.get(columns["name"]),
+                charity_reg_date = parse_date(row.get(columns["reg_date"])),
+                charity_website = row.get(columns["website"]),
+                # Objectives and purposes are reversed in NI
+                charity_objectives = row.get(columns["purposes"]),
+                charity_purpose = does,
+            )
+            load.add_year(
+                foodbank,
+                parse_date(row.get(columns["year_end"])),
+                parse_money(row.get(columns["income"])),
+                parse_money(row.get(columns["expenditure"])),
+            )
+
+
+def load_charity_registers(ew_dir = None, scotland_path = None, ni_path = None):
+    """Load whichever register extracts are given, and write every change together."""
+    load = RegisterLoad()
+    if ew_dir:
+        load_ew(load, ew_dir)
+    if scotland_path:
+        load_scotland(load, scotland_path)
+    if ni_path:
+        load_ni(load, ni_path)
+    return load.save()
@@ -151,14 +151,16 @@ def _crawl_charity_ew(foodbank, crawl_set = None):
     if response.status_code == 200:
         data = response.json()
         if data:
-            for year in data:
-                charity_year = CharityYear(
+            # A year listed twice would break the unique (foodbank, date) constraint
+            CharityYear.objects.bulk_create([
+                CharityYear(
                     foodbank=foodbank,
                     date=year.get("financial_period_end_date").replace("T00:00:00", ""),
                     income=year.get("income", 0),
                     expenditure=year.get("expenditure", 0),
                 )
-                charity_year.save()
+                for year in data
+            ], ignore_conflicts=True)
 
     foodbank.last_charity_check = timezone.now()
     foodbank.save(do_decache=False, do_geoupdate=False)
@@ -209,14 +211,15 @@ def _crawl_charity_scotland(foodbank, crawl_set = None):
     if response.status_code == 200:
         data = response.json()
         if data:
-            for year in data:
-                charity_year = CharityYear(
+            CharityYear.objects.bulk_create([
+                CharityYear(
                     foodbank=foodbank,
                     date=year.get("AccountingReferenceDate"),
                     income=year.get("GrossIncome", 0),
                     expenditure=year.get("GrossExpenditure", 0),
                 )
-                charity_year.save()
+                for year in data
+            ], ignore_conflicts=True)
 
     foodbank.last_charity_check = timezone.now()
     foodbank.save(do_decache=False, do_geoupdate=False)
@@ -278,6 +281,15 @@ def _crawl_charity_ni(foodbank, crawl_set = None):
     return True
 
 
+def _is_need_response(response):
+    """Whether an OpenRouter need check response has the needed and excess lists."""
+    try:
+        parsed_response = json.loads(response.json()["choices"][0]["message"]["content"])
+    except (ValueError, KeyError, IndexError, TypeError):
+        return False
+    return isinstance(parsed_response, dict) and "needed" in parsed_response and "excess" in parsed_response
+
+
 def do_foodbank_need_check(foodbank, crawl_set = None):
     """Scrape a food bank's website for current needs using AI, and record any changes."""
     from givefood.models import FoodbankChange, FoodbankDiscrepancy, CrawlItem
@@ -443,6 +455,11 @@ def do_foodbank_need_check(foodbank, crawl_set = None):
         "response_schema": response_schema,
         "cred_name": "openrouter_liveneed",
         "seed": 1,
+        # An unchanged page with an unchanged last need is the same prompt, so a repeat sweep is answered
+        # from the cache. Only a usable reply is kept, or the retry below would be given it again.
+        "caller": "need_check",
+        "cache": True,
+        "valid": _is_need_response,
     }
     # A reply that doesn't parse is a failure, not an empty shopping list, and has to be retried like
     # an HTTP error rather than read as "this food bank needs nothing" — that misreading blamed the
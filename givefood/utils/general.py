@@ -2,16 +2,26 @@
 # -*- coding: utf-8 -*-
 
 import re
-import urllib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 import requests
+from django.conf import settings
+from django.db import transaction
 from django_tasks import task
 
 from givefood.utils.cache import get_cred
 
 
+TRANSLATE_URL = "https://translation.googleapis.com/language/translate/v2"
+# The most texts the API takes in one request, and the most characters it recommends
+TRANSLATE_MAX_TEXTS = 128
+TRANSLATE_MAX_CHARS = 5000
+# Languages whose requests are in flight at once
+TRANSLATE_MAX_WORKERS = 8
+
+
 def validate_turnstile(turnstile_response):
     """Validate a Cloudflare Turnstile CAPTCHA response and return whether it succeeded."""
     turnstile_secret = get_cred("turnstile_secret")
@@ -176,46 +186,182 @@ def get_favicon(url):
     return response.content
 
 
+def get_translations(language, texts, source="en", key=None):
+    """
+    Translate a list of texts using the Google Cloud Translation API.
+
+    Texts go as repeated q values in a POST, as many to a request as the API
+    takes, rather than URL-encoded one to a GET. Returns the translations in
+    the same order, with None for any that weren't translated.
+    """
+    if key is None:
+        key = get_cred("gcp_translate_key")
+
+    batches = [[]]
+    batch_chars = 0
+    for text in texts:
+        if batches[-1] and (len(batches[-1]) == TRANSLATE_MAX_TEXTS or batch_chars + len(text) > TRANSLATE_MAX_CHARS):
+            batches.append([])
+            batch_chars = 0
+        batches[-1].append(text)
+        batch_chars += len(text)
+
+    translations = []
+    for batch in batches:
+        if not batch:
+            continue
+        batch_translations = [None] * len(batch)
+        request = requests.post(TRANSLATE_URL, params = {"key": key}, data = {
+            "q": batch,
+            "source": source,
+            "target": language,
+            "format": "text",
+        })
+        if request.status_code == 200:
+            translated = request.json().get("data", {}).get("translations", [])
+            if len(translated) == len(batch):
+                batch_translations = [translation.get("translatedText") for translation in translated]
+        translations.extend(batch_translations)
+    return translations
+
+
 def get_translation(language, text, source="en"):
     """Translate text to the given language using the Google Cloud Translation API."""
-    key = get_cred("gcp_translate_key")
+    return get_translations(language, [text], source)[0]
+
+
+def translation_languages():
+    """The languages needs are translated into."""
+    return [
+        language_code for language_code, language_name in settings.LANGUAGES
+        if language_code != settings.LANGUAGE_CODE and language_code not in settings.LANGUAGES_SKIP_TRANSLATE
+    ]
+
+
+def split_lines(text):
+    """Need text as normalised lines, the way the translation memory keys them."""
+    from givefood.models import TranslationMemory
+    return [TranslationMemory.normalise(line) for line in text.splitlines()]
+
+
+def join_lines(language, lines, translations):
+    """Put translated lines back together, or None if any of them wasn't translated."""
+    if any(line and (language, line) not in translations for line in lines):
+        return None
+    return "\n".join(translations[(language, line)] if line else "" for line in lines)
+
+
+def translate_lines(languages, lines, source="en"):
+    """
+    Translate normalised lines into each language, through the translation memory.
 
-    translate_url = "https://translation.googleapis.com/language/translate/v2?key=%s" % (key)
-    translate_url = "%s&source=%s&target=%s&q=%s&format=text" % (translate_url, source, language, urllib.parse.quote(text))
-    request = requests.get(translate_url)
-    if request.status_code == 200:
-        translate_json = request.json()
-        if "data" in translate_json:
-            if "translations" in translate_json["data"]:
-                if len(translate_json["data"]["translations"]) > 0:
-                    return translate_json["data"]["translations"][0]["translatedText"]
+    Lines translated into a language before come from TranslationMemory. The
+    rest go to Google, a batched POST per language with the languages sent
+    at the same time, and are remembered. Returns a dict keyed by
+    (language, line), without the lines that couldn't be translated.
+    """
+    from givefood.models import TranslationMemory
+
+    translations = TranslationMemory.recall(languages, lines)
+    unseen = {}
+    for language in languages:
+        language_unseen = [line for line in lines if (language, line) not in translations]
+        if language_unseen:
+            unseen[language] = language_unseen
+
+    if unseen:
+        # Fetched here rather than in each thread, which would each need a
+        # database connection to do it
+        key = get_cred("gcp_translate_key")
+        with ThreadPoolExecutor(max_workers = TRANSLATE_MAX_WORKERS) as executor:
+            results = executor.map(lambda language: get_translations(language, unseen[language], source, key), unseen)
+            translated = {}
+            for language, language_translations in zip(unseen, results):
+                for line, translation in zip(unseen[language], language_translations):
+                    if translation is not None:
+                        translated[(language, line)] = translation
+        TranslationMemory.remember(translated)
+        translations.update(translated)
+
+    return translations
+
+
+def translate_text(language, text, source="en"):
+    """Translate need text into a language, a line at a time through the translation memory. None if it couldn't be."""
+    lines = split_lines(text)
+    translations = translate_lines([language], sorted(set(line for line in lines if line)), source)
+    return join_lines(language, lines, translations)
+
+
+@task(queue_name="translate")
+def translate_needs_async(need_id_strs, languages = None):
+    """Async task to translate food bank needs into every language we translate into, or the ones given."""
+    from givefood.models import FoodbankChange
+    needs = list(FoodbankChange.objects.filter(need_id_str__in = need_id_strs))
+    translate_needs(needs, languages or translation_languages())
+    return True
 
 
 @task(queue_name="translate")
 def translate_need_async(language, need_id_str):
     """Async task to translate a food bank need into the given language."""
-    from givefood.models import FoodbankChange
-    need = FoodbankChange.objects.get(need_id_str=need_id_str)
-    result = translate_need(language, need)
+    # Superseded by translate_needs_async, and kept for the tasks already queued
+    translate_needs_async.call([need_id_str], [language])
     return True
 
 
-def translate_need(language, need):
-    """Translate a food bank need's change text and excess text into the given language."""
+def translate_needs(needs, languages):
+    """
+    Translate needs' change and excess text into the languages, replacing their FoodbankChangeTranslations.
+
+    Every line of every need in every language is looked up or translated in
+    one go, and the translations are written with one bulk_create. A need
+    that couldn't be translated into a language has no translation in it,
+    so is shown in English until it's next published. Returns the
+    translations written.
+    """
     from givefood.models import FoodbankChangeTranslation
 
-    FoodbankChangeTranslation.objects.filter(need = need, language = language).delete()
-    translated_change = get_translation(language, need.change_text)
-    if need.excess_change_text:
-        translated_excess = get_translation(language, need.excess_change_text)
-    else:
-        translated_excess = None
-
-    translated_need = FoodbankChangeTranslation(
-        need = need,
-        language = language,
-        change_text = translated_change,
-        excess_change_text = translated_excess,
-    )
-    translated_need.save()
-    return translated_need
+    # A translation belongs to the need's food bank, so needs without one can't have any
+    needs = [need for need in needs if need.foodbank_id]
+
+    texts = {}
+    for need in needs:
+        excess_lines = split_lines(need.excess_change_text) if need.excess_change_text else None
+        texts[need.id] = (split_lines(need.change_text), excess_lines)
+    lines = sorted(set(
+        line
+        for change_lines, excess_lines in texts.values()
+        for line in change_lines + (excess_lines or [])
+        if line
+    ))
+    translations = translate_lines(languages, lines)
+
+    translated_needs = []
+    for need in needs:
+        change_lines, excess_lines = texts[need.id]
+        for language in languages:
+            translated_change = join_lines(language, change_lines, translations)
+            translated_excess = join_lines(language, excess_lines, translations) if excess_lines is not None else None
+            if translated_change is None or (excess_lines is not None and translated_excess is None):
+                continue
+            translated_needs.append(FoodbankChangeTranslation(
+                need = need,
+                foodbank_id = need.foodbank_id,
+                language = language,
+                change_text = translated_change,
+                excess_change_text = translated_excess,
+            ))
+
+    with transaction.atomic():
+        FoodbankChangeTranslation.objects.filter(need__in = needs, language__in = languages).delete()
+        FoodbankChangeTranslation.objects.bulk_create(translated_needs)
+    return translated_needs
+
+
+def translate_need(language, need):
+    """Translate a food bank need's change text and excess text into the given language."""
+    translated_needs = translate_needs([need], [language])
+    if translated_needs:
+        return translated_needs[0]
+    return None
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import copy
 import json
 import logging
 import operator
@@ -8,13 +9,13 @@ import urllib
 
 import requests
 from math import radians, cos, sin, asin, sqrt
-from itertools import chain
 from openlocationcode import openlocationcode as olc
 from urllib.parse import quote
 
+from django.db import connection
 from django.urls import reverse
-from django.db.models import Expression, FloatField, Value
-from django_earthdistance.models import EarthDistance, LlToEarth
+from django.db.models import Expression, FloatField
+from django_earthdistance.models import LlToEarth
 
 from givefood.const.general import SITE_DOMAIN
 from givefood.utils.cache import get_cred, get_all_open_foodbanks, get_all_constituencies
@@ -233,62 +234,203 @@ def foodbank_queryset():
     return qs
 
 
-def find_locations(lat_lng, quantity = 10, skip_first = False):
-    """Find the nearest open food banks and locations to a coordinate using PostgreSQL earthdistance via django-earthdistance."""
-    from givefood.models import FoodbankLocation
-    from django.db.models import Prefetch
+def _nearest_branch(group, place_type, model, lat, lng, quantity, category = None, max_distance = None, foodbank = None, donation_points_only = False):
+    """
+    SQL for one KNN lookup of the nearest search, and its parameters.
+
+    Each branch is ordered by the <-> operator and limited on its own, so
+    PostgreSQL answers it from that table's partial GiST index on
+    ll_to_earth(latitude, longitude) WHERE is_closed = false, reading only
+    as many rows as it returns.
+    """
+    from givefood.models import Foodbank, FoodbankChangeLine
 
-    lat = lat_lng.split(",")[0]
-    lng = lat_lng.split(",")[1]
+    table = model._meta.db_table
+    foodbank_table = Foodbank._meta.db_table
+    is_foodbank = model is Foodbank
 
-    foodbanks = foodbank_queryset().filter(is_closed = False).annotate(
-        distance=EarthDistance([
-            LlToEarth([lat, lng]),
-            LlToEarth(['latitude', 'longitude'])
-        ])).annotate(type=Value("organisation")).order_by(NearestFirst(lat, lng))[:quantity]
+    where = ["t.is_closed = false"]
+    params = [group, place_type, lat, lng]
+    join = ""
 
-    locations = FoodbankLocation.objects.filter(is_closed = False).prefetch_related(
-        Prefetch("foodbank", queryset=foodbank_queryset())
-    ).annotate(
-        distance=EarthDistance([
-            LlToEarth([lat, lng]),
-            LlToEarth(['latitude', 'longitude'])
-        ])).annotate(type=Value("location")).order_by(NearestFirst(lat, lng))[:quantity]
+    if donation_points_only:
+        where.append("t.is_donation_point = true")
+    if foodbank is not None:
+        where.append("t.%s = %%s" % ("id" if is_foodbank else "foodbank_id"))
+        params_filter = [foodbank.id]
+    else:
+        params_filter = []
 
-    for foodbank in foodbanks:
-        foodbank.distance_mi = miles(foodbank.distance)
-        foodbank.distance_km = foodbank.distance / 1000
-        foodbank.foodbank_name = foodbank.name
-        foodbank.foodbank_slug = foodbank.slug
-        foodbank.foodbank_network = foodbank.network
-        foodbank.html_url = "%s%s" % (
-            SITE_DOMAIN,
-            reverse("wfbn:foodbank", kwargs={"slug":foodbank.slug}),
-        )
-        foodbank.homepage = foodbank.url_with_ref()
-
-    for location in locations:
-        location.distance_mi = miles(location.distance)
-        location.distance_km = location.distance / 1000
-        location.phone_number = location.phone_or_foodbank_phone()
-        location.contact_email = location.email_or_foodbank_email()
-        location.latest_need = location.foodbank.latest_need
-        location.html_url = "%s%s" % (
-            SITE_DOMAIN,
-            reverse("wfbn:foodbank_location", kwargs={"slug":location.foodbank_slug, "locslug":location.slug}),
+    if category:
+        # Only places whose food bank's latest need asks for this category
+        if is_foodbank:
+            need_owner = "t"
+        else:
+            join = "JOIN %s f ON f.id = t.foodbank_id" % (foodbank_table)
+            need_owner = "f"
+            where.append("f.is_closed = false")
+        where.append("%s.latest_need_id IS NOT NULL" % (need_owner))
+        where.append(
+            "EXISTS (SELECT 1 FROM %s l WHERE l.need_id = %s.latest_need_id AND l.category = %%s AND l.type = 'need')"
+            % (FoodbankChangeLine._meta.db_table, need_owner)
         )
-        location.homepage = location.foodbank.url_with_ref()
+        params_filter.append(category)
 
-    foodbanksandlocations = list(chain(foodbanks,locations))
-    foodbanksandlocations = sorted(foodbanksandlocations, key=lambda k: k.distance)
+    if max_distance is not None:
+        # earth_box() is index assisted, earth_distance() is exact
+        where.append("earth_box(ll_to_earth(%s, %s), %s) @> ll_to_earth(t.latitude, t.longitude)")
+        where.append("earth_distance(ll_to_earth(t.latitude, t.longitude), ll_to_earth(%s, %s)) <= %s")
+        params_filter.extend([lat, lng, max_distance, lat, lng, max_distance])
+
+    sql = (
+        "SELECT %%s AS nearest_group, %%s AS place_type, t.id, %s AS foodbank_id, "
+        "earth_distance(ll_to_earth(t.latitude, t.longitude), ll_to_earth(%%s, %%s)) AS distance "
+        "FROM %s t %s WHERE %s "
+        "ORDER BY ll_to_earth(t.latitude, t.longitude) <-> ll_to_earth(%%s, %%s) LIMIT %%s"
+    ) % ("t.id" if is_foodbank else "t.foodbank_id", table, join, " AND ".join(where))
+
+    return sql, params + params_filter + [lat, lng, quantity]
 
-    if skip_first:
-        first_item = 1
-        quantity = quantity + 1
-    else:
-        first_item = 0
 
-    return foodbanksandlocations[first_item:quantity]
+def find_nearest(lat_lng, locations = 0, donationpoints = 0, category = None, category_quantity = 20, category_distance = 20000, foodbank = None, skip_first = False):
+    """
+    The nearest food banks, locations and donation points to a 'lat,lng', in one query.
+
+    locations is how many of the nearest food banks and locations to find,
+    donationpoints how many donation points and donation point locations,
+    and if category is given, category_quantity food banks and locations
+    within category_distance metres whose latest need includes it. Any of
+    them can be 0 to skip it.
+
+    Every lookup is a branch of one UNION ALL of KNN queries, which returns
+    ids and distances. The places are then loaded by id, a query per table,
+    with their food banks' latest needs loaded alongside, so a search page
+    makes three or four queries however many lists it shows.
+
+    Returns a dict of "locations", "donationpoints" and "category" lists of
+    model instances, nearest first, with the attributes the templates and
+    API expect set on them.
+    """
+    from givefood.models import Foodbank, FoodbankDonationPoint, FoodbankLocation
+
+    lat = float(lat_lng.split(",")[0])
+    lng = float(lat_lng.split(",")[1])
+    skip = 1 if skip_first else 0
+
+    groups = []
+    if locations:
+        groups.append(("locations", locations, [
+            _nearest_branch("locations", "organisation", Foodbank, lat, lng, locations + skip, foodbank = foodbank),
+            _nearest_branch("locations", "location", FoodbankLocation, lat, lng, locations + skip, foodbank = foodbank),
+        ]))
+    if donationpoints:
+        groups.append(("donationpoints", donationpoints, [
+            _nearest_branch("donationpoints", "donationpoint", FoodbankDonationPoint, lat, lng, donationpoints, foodbank = foodbank),
+            _nearest_branch("donationpoints", "location", FoodbankLocation, lat, lng, donationpoints, foodbank = foodbank, donation_points_only = True),
+        ]))
+    if category:
+        groups.append(("category", category_quantity, [
+            _nearest_branch("category", "organisation", Foodbank, lat, lng, category_quantity, category = category, max_distance = category_distance, foodbank = foodbank),
+            _nearest_branch("category", "location", FoodbankLocation, lat, lng, category_quantity, category = category, max_distance = category_distance, foodbank = foodbank),
+        ]))
+
+    results = {"locations": [], "donationpoints": [], "category": []}
+    if not groups:
+        return results
+
+    sql_parts = []
+    params = []
+    for group, quantity, branches in groups:
+        branch_sql = " UNION ALL ".join("(%s)" % (branch[0]) for branch in branches)
+        offset = skip if group == "locations" else 0
+        sql_parts.append("(SELECT * FROM (%s) AS nearest ORDER BY distance LIMIT %%s OFFSET %%s)" % (branch_sql))
+        for branch in branches:
+            params.extend(branch[1])
+        params.extend([quantity, offset])
+    sql = "SELECT * FROM (%s) AS places ORDER BY distance" % (" UNION ALL ".join(sql_parts))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    # Load each table's rows once, whichever lists they're in
+    ids = {"organisation": set(), "location": set(), "donationpoint": set()}
+    for group, place_type, place_id, foodbank_id, distance in rows:
+        ids[place_type].add(place_id)
+        ids["organisation"].add(foodbank_id)
+
+    foodbanks = foodbank_queryset().in_bulk(ids["organisation"])
+    places = {"organisation": foodbanks}
+    if ids["location"]:
+        places["location"] = FoodbankLocation.objects.in_bulk(ids["location"])
+    if ids["donationpoint"]:
+        places["donationpoint"] = FoodbankDonationPoint.objects.in_bulk(ids["donationpoint"])
+
+    # reverse() once per URL rather than once per row
+    urls = {
+        "foodbank": _url_template("wfbn:foodbank", "slug"),
+        "location": _url_template("wfbn:foodbank_location", "slug", "locslug"),
+        "location_photo": _url_template("wfbn-generic:foodbank_location_photo", "slug", "locslug"),
+        "donationpoint": _url_template("wfbn:foodbank_donationpoint", "slug", "dpslug"),
+        "donationpoint_photo": _url_template("wfbn-generic:foodbank_donationpoint_photo", "slug", "dpslug"),
+    }
+
+    seen = set()
+    for group, place_type, place_id, foodbank_id, distance in rows:
+        place = places[place_type][place_id]
+        # A place in more than one list gets a copy each, as the lists set
+        # different attributes on it
+        if (place_type, place_id) in seen:
+            place = copy.copy(place)
+        seen.add((place_type, place_id))
+
+        if place_type != "organisation":
+            place.foodbank = foodbanks[foodbank_id]
+        place.type = place_type
+        place.distance = distance
+        place.distance_mi = miles(distance)
+
+        if group == "donationpoints":
+            if place_type == "location":
+                place.url = urls["location"] % (place.foodbank_slug, place.slug)
+                place.photo_url = urls["location_photo"] % (place.foodbank_slug, place.slug)
+            else:
+                # Preserve the original homepage URL before overwriting
+                place.homepage_url = place.url
+                place.url = urls["donationpoint"] % (place.foodbank_slug, place.slug)
+                place.photo_url = urls["donationpoint_photo"] % (place.foodbank_slug, place.slug)
+        else:
+            place.distance_km = distance / 1000
+            if place_type == "organisation":
+                place.foodbank_name = place.name
+                place.foodbank_slug = place.slug
+                place.foodbank_network = place.network
+                place.html_url = "%s%s" % (SITE_DOMAIN, urls["foodbank"] % (place.slug))
+                place.homepage = place.url_with_ref()
+            else:
+                place.phone_number = place.phone_or_foodbank_phone()
+                place.contact_email = place.email_or_foodbank_email()
+                place.latest_need = place.foodbank.latest_need
+                place.html_url = "%s%s" % (SITE_DOMAIN, urls["location"] % (place.foodbank_slug, place.slug))
+                place.homepage = place.foodbank.url_with_ref()
+
+        results[group].append(place)
+
+    return results
+
+
+def _url_template(name, *kwargs):
+    """A %s template of the URL for a view taking only slug kwargs."""
+    placeholders = {kwarg: "slug-placeholder-%s" % (number) for number, kwarg in enumerate(kwargs)}
+    url = reverse(name, kwargs = placeholders).replace("%", "%%")
+    for kwarg in kwargs:
+        url = url.replace(placeholders[kwarg], "%s")
+    return url
+
+
+def find_locations(lat_lng, quantity = 10, skip_first = False):
+    """Find the nearest open food banks and locations to a coordinate using PostgreSQL earthdistance."""
+    return find_nearest(lat_lng, locations = quantity, skip_first = skip_first)["locations"]
 
 
 def find_locations_by_category(lat_lng, category, max_distance_meters=20000, quantity=20):
@@ -305,138 +447,12 @@ def find_locations_by_category(lat_lng, category, max_distance_meters=20000, qua
         List of foodbanks and locations that need items in the specified category,
         ordered by distance
     """
-    from givefood.models import Foodbank, FoodbankLocation, FoodbankChangeLine
-    from django.db.models import Prefetch, Exists, OuterRef
-
-    lat = lat_lng.split(",")[0]
-    lng = lat_lng.split(",")[1]
-
-    # Subquery to check if latest_need has the specified category
-    has_category = FoodbankChangeLine.objects.filter(
-        need=OuterRef('latest_need'),
-        category=category,
-        type='need'
-    )
-
-    # Base foodbank query with category filter
-    foodbanks = foodbank_queryset().filter(
-        is_closed=False,
-        latest_need__isnull=False
-    ).annotate(
-        distance=EarthDistance([
-            LlToEarth([lat, lng]),
-            LlToEarth(['latitude', 'longitude'])
-        ]),
-        needs_category=Exists(has_category)
-    ).filter(
-        distance__lte=max_distance_meters,
-        needs_category=True
-    ).annotate(type=Value("organisation")).order_by(NearestFirst(lat, lng))[:quantity]
-
-    # Get the IDs of foodbanks that need the category
-    foodbank_ids_with_category = list(
-        Foodbank.objects.filter(
-            is_closed=False,
-            latest_need__isnull=False
-        ).annotate(
-            needs_category=Exists(has_category)
-        ).filter(
-            needs_category=True
-        ).values_list('id', flat=True)
-    )
-
-    # Query locations whose foodbank needs the category
-    # Filter by foodbank_id instead of using Exists subquery to avoid column ambiguity
-    locations = FoodbankLocation.objects.filter(
-        is_closed=False,
-        foodbank_id__in=foodbank_ids_with_category
-    ).prefetch_related(
-        Prefetch("foodbank", queryset=foodbank_queryset())
-    ).annotate(
-        distance=EarthDistance([
-            LlToEarth([lat, lng]),
-            LlToEarth(['latitude', 'longitude'])
-        ])
-    ).filter(
-        distance__lte=max_distance_meters
-    ).annotate(type=Value("location")).order_by(NearestFirst(lat, lng))[:quantity]
-
-    # Process foodbanks
-    for foodbank in foodbanks:
-        foodbank.distance_mi = miles(foodbank.distance)
-        foodbank.distance_km = foodbank.distance / 1000
-        foodbank.foodbank_name = foodbank.name
-        foodbank.foodbank_slug = foodbank.slug
-        foodbank.foodbank_network = foodbank.network
-        foodbank.html_url = "%s%s" % (
-            SITE_DOMAIN,
-            reverse("wfbn:foodbank", kwargs={"slug": foodbank.slug}),
-        )
-        foodbank.homepage = foodbank.url_with_ref()
-
-    # Process locations
-    for location in locations:
-        location.distance_mi = miles(location.distance)
-        location.distance_km = location.distance / 1000
-        location.phone_number = location.phone_or_foodbank_phone()
-        location.contact_email = location.email_or_foodbank_email()
-        location.latest_need = location.foodbank.latest_need
-        location.html_url = "%s%s" % (
-            SITE_DOMAIN,
-            reverse("wfbn:foodbank_location", kwargs={"slug": location.foodbank_slug, "locslug": location.slug}),
-        )
-        location.homepage = location.foodbank.url_with_ref()
-
-    # Combine and sort by distance
-    foodbanksandlocations = list(chain(foodbanks, locations))
-    foodbanksandlocations = sorted(foodbanksandlocations, key=lambda k: k.distance)
-
-    return foodbanksandlocations[:quantity]
+    return find_nearest(lat_lng, category = category, category_quantity = quantity, category_distance = max_distance_meters)["category"]
 
 
 def find_donationpoints(lat_lng, quantity = 10, foodbank = None):
     """Find the nearest open donation points and donation-point locations to a coordinate."""
-    from givefood.models import FoodbankLocation, FoodbankDonationPoint
-    from django.db.models import Prefetch
-
-    lat = lat_lng.split(",")[0]
-    lng = lat_lng.split(",")[1]
-
-    donationpoints = FoodbankDonationPoint.objects.filter(is_closed = False).prefetch_related(
-        Prefetch("foodbank", queryset=foodbank_queryset())
-    ).annotate(
-    distance=EarthDistance([
-        LlToEarth([lat, lng]),
-        LlToEarth(['latitude', 'longitude'])
-    ])).annotate(type=Value("donationpoint")).order_by(NearestFirst(lat, lng))[:quantity]
-
-    location_donationpoints = FoodbankLocation.objects.filter(is_closed = False, is_donation_point = True).prefetch_related(
-        Prefetch("foodbank", queryset=foodbank_queryset())
-    ).annotate(
-    distance=EarthDistance([
-        LlToEarth([lat, lng]),
-        LlToEarth(['latitude', 'longitude'])
-    ])).annotate(type=Value("location")).order_by(NearestFirst(lat, lng))[:quantity]
-
-    if foodbank:
-        donationpoints = donationpoints.filter(foodbank = foodbank)
-        location_donationpoints = location_donationpoints.filter(foodbank = foodbank)
-
-    donationpoints = list(chain(donationpoints,location_donationpoints))
-    donationpoints = sorted(donationpoints, key=lambda k: k.distance)[:quantity]
-
-    for donationpoint in donationpoints:
-        if donationpoint.type == "location":
-            donationpoint.url = reverse("wfbn:foodbank_location", kwargs={"slug":donationpoint.foodbank_slug, "locslug":donationpoint.slug})
-            donationpoint.photo_url = reverse("wfbn-generic:foodbank_location_photo", kwargs={"slug":donationpoint.foodbank_slug, "locslug":donationpoint.slug})
-        if donationpoint.type == "donationpoint":
-            # Preserve the original homepage URL before overwriting
-            donationpoint.homepage_url = donationpoint.url
-            donationpoint.url = reverse("wfbn:foodbank_donationpoint", kwargs={"slug":donationpoint.foodbank_slug, "dpslug":donationpoint.slug})
-            donationpoint.photo_url = reverse("wfbn-generic:foodbank_donationpoint_photo", kwargs={"slug":donationpoint.foodbank_slug, "dpslug":donationpoint.slug})
-        donationpoint.distance_mi = miles(donationpoint.distance)
-
-    return donationpoints
+    return find_nearest(lat_lng, donationpoints = quantity, foodbank = foodbank)["donationpoints"]
 
 
 def find_parlcons(lattlong, quantity = 10, skip_first = False):
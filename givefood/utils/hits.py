@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import atexit
+import datetime
+import os
+import threading
+import time
+from collections import Counter
+
+from django.db import DatabaseError, connection
+
+from givefood.const.general import HIT_FLUSH_SECONDS, HIT_SLUG_MAP_SECONDS
+
+
+class HitCounter:
+    """
+    Buffered food bank hit counter.
+
+    Every food bank page view used to look its slug up and upsert its
+    (foodbank, day) row there and then, so a popular page was a write per
+    view, all queueing on the same row lock. Here each worker adds hits up in
+    memory and writes them out at most every HIT_FLUSH_SECONDS, as a single
+    multi-row upsert, from whichever request comes along once that time is up.
+    Slugs are resolved from an in memory map of the whole food bank table,
+    reloaded every HIT_SLUG_MAP_SECONDS, so a hit doesn't read the database
+    at all.
+
+    Whatever is still pending is flushed when the worker shuts down, from
+    gunicorn's worker_exit hook or at interpreter exit otherwise. A worker
+    that is killed outright loses at most its last few seconds of hits.
+    """
+
+    def __init__(self, flush_seconds = HIT_FLUSH_SECONDS, slug_map_seconds = HIT_SLUG_MAP_SECONDS):
+        self.flush_seconds = flush_seconds
+        self.slug_map_seconds = slug_map_seconds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Drop pending hits and the slug map."""
+        with self.lock:
+            self.pending = Counter()
+            self.slugs = {}
+            self.slugs_loaded = None
+            self.last_flush = time.monotonic()
+            self.pid = os.getpid()
+
+    def foodbank_id(self, slug):
+        """The id of the food bank with this slug, or None if there isn't one."""
+        from givefood.models import Foodbank
+
+        now = time.monotonic()
+        if self.slugs_loaded is None or now - self.slugs_loaded >= self.slug_map_seconds:
+            slugs = dict(Foodbank.objects.values_list("slug", "id"))
+            with self.lock:
+                self.slugs = slugs
+                self.slugs_loaded = now
+
+        foodbank_id = self.slugs.get(slug)
+        if foodbank_id is None:
+            # Added since the map was loaded, or doesn't exist. Unknown slugs
+            # aren't remembered, so a new food bank is found straight away.
+            foodbank_id = Foodbank.objects.filter(slug = slug).values_list("id", flat = True).first()
+            if foodbank_id is not None:
+                with self.lock:
+                    self.slugs[slug] = foodbank_id
+        return foodbank_id
+
+    def record(self, foodbank_id, day = None):
+        """Count a hit, flushing if it's been long enough since the last flush."""
+        if day is None:
+            day = datetime.date.today()
+
+        with self.lock:
+            if self.pid != os.getpid():
+                # Forked with the parent's pending hits, which are the
+                # parent's to write out
+                self.pending = Counter()
+                self.pid = os.getpid()
+            self.pending[(foodbank_id, day)] += 1
+            due = time.monotonic() - self.last_flush >= self.flush_seconds
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write pending hits out in one upsert. Returns the number of rows sent."""
+        from givefood.models import Foodbank, FoodbankHit
+
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        # Sorted, so two workers flushing together take their row locks in
+        # the same order rather than deadlocking.
+        keys = sorted(pending)
+        hit_table = FoodbankHit._meta.db_table
+        try:
+            with connection.cursor() as cursor:
+                # Food banks deleted since their id was mapped are left out,
+                # rather than failing the foreign key and the whole batch.
+                cursor.execute(
+                    """
+                    INSERT INTO %s (foodbank_id, day, hits)
+                    SELECT hit.foodbank_id, hit.day, hit.hits
+                    FROM unnest(%%s::bigint[], %%s::date[], %%s::integer[]) AS hit (foodbank_id, day, hits)
+                    WHERE hit.foodbank_id IN (SELECT id FROM %s)
+                    ON CONFLICT (foodbank_id, day) DO UPDATE SET hits = %s.hits + EXCLUDED.hits
+                    """ % (hit_table, Foodbank._meta.db_table, hit_table),
+                    [
+                        [foodbank_id for foodbank_id, day in keys],
+                        [day for foodbank_id, day in keys],
+                        [pending[key] for key in keys],
+                    ],
+                )
+        except DatabaseError:
+            # Put the hits back to go out with the next flush
+            with self.lock:
+                self.pending.update(pending)
+            raise
+        return len(keys)
+
+
+hit_counter = HitCounter()
+atexit.register(hit_counter.flush)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+
+import requests
+from django.conf import settings
+from django_tasks import task
+
+from givefood.const.general import MAP_LANGUAGES, MAP_SIZE_CONFIG
+from givefood.utils.blobs import blob_path, blob_response, write_blob
+from givefood.utils.cache import get_cred
+
+
+STATIC_MAP_URL = "https://maps.googleapis.com/maps/api/staticmap"
+
+
+def map_language(language):
+    """The language Google draws our language's maps in, or the default's if it doesn't localise it."""
+    return MAP_LANGUAGES.get(language) or MAP_LANGUAGES[settings.LANGUAGE_CODE]
+
+
+def foodbank_map_params(foodbank, size, language):
+    """
+    Google Static Maps parameters for a food bank's map, less the API key.
+
+    These are what the stored map is named by, so anything that changes the
+    picture has to be in here and nothing that doesn't.
+    """
+    dimensions, scale = MAP_SIZE_CONFIG.get(size, (None, None))
+    if dimensions is None:
+        return None
+
+    # Main markers
+    main_markers = "icon:https://www.givefood.org.uk/static/img/mapmarkers/32/red.png|%s" % foodbank.lat_lng
+    if foodbank.delivery_address:
+        main_markers += "|%s" % (foodbank.delivery_lat_lng)
+
+    # Location markers
+    loc_markers = ""
+    if foodbank.no_locations != 0:
+        loc_markers += "icon:https://www.givefood.org.uk/static/img/mapmarkers/16/yellow.png|"
+        for location in foodbank.locations():
+            loc_markers += "%s|" % (location.lat_lng)
+
+    # Donation point markers
+    dp_markers = ""
+    if foodbank.no_donation_points != 0:
+        dp_markers += "icon:https://www.givefood.org.uk/static/img/mapmarkers/16/blue.png|"
+        for donationpoint in foodbank.donation_points():
+            dp_markers += "%s|" % (donationpoint.lat_lng)
+
+    params = [
+        ("center", foodbank.lat_lng),
+        ("size", dimensions),
+        ("scale", scale),
+        ("maptype", "roadmap"),
+        ("format", "png"),
+        ("language", map_language(language)),
+    ]
+    if dp_markers:
+        params.append(("markers", dp_markers))
+    if loc_markers:
+        params.append(("markers", loc_markers))
+    params.append(("markers", main_markers))
+    return params
+
+
+def location_map_params(location, size, language):
+    """Google Static Maps parameters for a location's map, less the API key."""
+    dimensions, scale = MAP_SIZE_CONFIG.get(size, (None, None))
+    if dimensions is None:
+        return None
+
+    # Use zoom 12 if boundary exists to show more area, otherwise zoom 15
+    zoom = 11 if location.boundary_geojson else 15
+
+    params = [
+        ("center", location.lat_lng),
+        ("zoom", zoom),
+        ("size", dimensions),
+        ("scale", scale),
+        ("maptype", "roadmap"),
+        ("format", "png"),
+        ("visual_refresh", "true"),
+        ("language", map_language(language)),
+    ]
+
+    # Add boundary polygon if it exists
+    if location.boundary_geojson:
+        try:
+            boundary_dict = location.boundary_geojson_dict()
+            if boundary_dict and boundary_dict.get("geometry") and boundary_dict["geometry"].get("type") == "Polygon":
+                coordinates = boundary_dict["geometry"]["coordinates"][0]  # Get outer ring
+
+                # Simplify coordinates to reduce URL length
+                # 1. Reduce precision to 4 decimal places (~11m accuracy)
+                # 2. Downsample if too many points (keep every Nth point)
+                max_points = 100  # Limit to avoid URL length issues
+                if len(coordinates) > max_points:
+                    # Calculate step to reduce points, ensure step is at least 2
+                    step = max(2, len(coordinates) // max_points)
+                    simplified = [coordinates[i] for i in range(0, len(coordinates), step)]
+                    # Ensure last point is included (closes the polygon)
+                    if coordinates[-1] not in simplified:
+                        simplified.append(coordinates[-1])
+                    coordinates = simplified
+
+                # Format: fillcolor:0xf7a72333 (orange with ~20% opacity) | color:0xf7a723ff (orange border) | weight:1
+                path_param = "fillcolor:0xf7a72333|color:0xf7a723ff|weight:1"
+                for coord in coordinates:
+                    # GeoJSON uses [lng, lat] order, Google Maps uses lat,lng
+                    # Round to 4 decimal places to reduce URL length
+                    path_param += "|%.4f,%.4f" % (coord[1], coord[0])
+                params.append(("path", path_param))
+        except (KeyError, IndexError, json.JSONDecodeError):
+            # If there's any error parsing the boundary, just continue without it
+            pass
+
+    return params
+
+
+def fetch_static_map(params):
+    """PNG bytes of a static map, or None if Google didn't give us one."""
+    response = requests.get(STATIC_MAP_URL, params=params + [("key", get_cred("gmap_static_key"))])
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+def static_map_response(params):
+    """The stored map for these parameters, fetching it first if it's not there."""
+    return blob_response("staticmap", params, "image/png", lambda: fetch_static_map(params))
+
+
+def is_map_stored(params):
+    path = blob_path("staticmap", params)
+    return path is None or os.path.exists(path)
+
+
+def queue_map_prerender(foodbank):
+    """
+    Queue prerender_maps for a food bank whose map, or one of its locations', has changed.
+
+    Saves only call this when a marker, centre or boundary has moved, and
+    the maps queue coalesces, so a food bank resaved along with its
+    location is rendered once.
+    """
+    if not getattr(settings, "BLOB_CACHE_DIR", None):
+        return False
+
+    prerender_maps.enqueue(foodbank.id)
+    return True
+
+
+@task(queue_name="maps")
+def prerender_maps(foodbank_id):
+    """
+    Render every size of a food bank's map, and its locations', ahead of being asked.
+
+    A cold map.png used to hold a web worker for a round trip to Google, and
+    it was cold every time a location moved. Only the default language is
+    rendered here: every language Google localises is another set of
+    fetches on a queue limited to one a second, for maps most visitors see
+    in English. The others are fetched and stored on their first request.
+    Variants already stored are skipped, so only the maps whose parameters
+    changed are fetched.
+    """
+    from givefood.models import Foodbank
+
+    try:
+        foodbank = Foodbank.objects.get(id = foodbank_id)
+    except Foodbank.DoesNotExist:
+        return 0
+
+    places = [(foodbank_map_params, foodbank)]
+    places.extend((location_map_params, location) for location in foodbank.locations())
+
+    rendered = 0
+    for params_for, place in places:
+        for size in MAP_SIZE_CONFIG:
+            params = params_for(place, size, settings.LANGUAGE_CODE)
+            if is_map_stored(params):
+                continue
+            content = fetch_static_map(params)
+            if not content:
+                logging.warning("Couldn't prerender map for %s at %s", place, size)
+                continue
+            write_blob(blob_path("staticmap", params), content)
+            rendered += 1
+    return rendered
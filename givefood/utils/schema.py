@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from django_tasks import task
+
+
+def queue_schema_org_update(foodbank_id = None, constituency_ids = ()):
+    """Queue update_schema_org for a food bank and the constituencies given, if there are any."""
+    constituency_ids = sorted(set(constituency_id for constituency_id in constituency_ids if constituency_id))
+    if not foodbank_id and not constituency_ids:
+        return False
+    update_schema_org.enqueue(foodbank_id, constituency_ids)
+    return True
+
+
+@task(queue_name="schema")
+def update_schema_org(foodbank_id = None, constituency_ids = ()):
+    """
+    Rebuild the stored schema.org of everything that nests a food bank's.
+
+    A location's and a donation point's JSON-LD has its food bank's in it,
+    as parentOrganization, and a constituency's has every open food bank and
+    location in it. So when a food bank is saved they're rebuilt here rather
+    than in its save(), which would otherwise rebuild every constituency the
+    food bank has a location in. Rows whose JSON-LD hasn't changed aren't
+    written.
+    """
+    from givefood.models import Foodbank, FoodbankDonationPoint, FoodbankLocation, ParliamentaryConstituency
+
+    constituency_ids = set(constituency_ids)
+    updated = 0
+
+    foodbank = Foodbank.objects.select_related("latest_need").filter(id = foodbank_id).first() if foodbank_id else None
+    if foodbank:
+        constituency_ids.add(foodbank.parliamentary_constituency_id)
+        for model in (FoodbankLocation, FoodbankDonationPoint):
+            changed = []
+            for place in model.objects.filter(foodbank = foodbank):
+                # Rather than loading the food bank again for each one
+                place.foodbank = foodbank
+                if place.update_schema_org_json():
+                    changed.append(place)
+                if model is FoodbankLocation:
+                    constituency_ids.add(place.parliamentary_constituency_id)
+            model.objects.bulk_update(changed, ["schema_org_json"], batch_size = 500)
+            updated += len(changed)
+
+    constituency_ids.discard(None)
+    for constituency in ParliamentaryConstituency.objects.filter(id__in = constituency_ids):
+        if constituency.update_schema_org_json():
+            ParliamentaryConstituency.objects.filter(id = constituency.id).update(schema_org_json = constituency.schema_org_json)
+            updated += 1
+
+    return updated
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+The figures behind the admin stats pages, kept in StatsSnapshot.
+
+Each page used to count, sum and bucket whole tables on every view. Here
+each set of figures is worked out in a query or two per table, stored, and
+read back by the page. Snapshots are refreshed by the refresh_stats command
+on a schedule, or from the page when the figures are wanted right now.
+"""
+
+import datetime
+from time import monotonic
+
+from django.db.models import Count, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, ExtractWeek, ExtractYear
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from givefood.const.general import PACKAGING_WEIGHT_PC
+
+
+def edit_stats():
+    from givefood.models import Foodbank, FoodbankDiscrepancy, FoodbankDonationPoint, FoodbankLocation
+
+    foodbanks = Foodbank.objects.aggregate(
+        total = Count("id"),
+        not_administrative = Count("id", filter = ~Q(address_is_administrative = True)),
+        delivery_address = Count("id", filter = ~Q(delivery_address = "")),
+        with_donation_points = Count("id", filter = ~Q(no_donation_points = 0)),
+        newest_edit = Max("edited"),
+        oldest_edit = Min("edited"),
+    )
+    locations = FoodbankLocation.objects.aggregate(
+        total = Count("id"),
+        donation_points = Count("id", filter = Q(is_donation_point = True)),
+    )
+    donation_points = FoodbankDonationPoint.objects.count()
+    discrepancies = FoodbankDiscrepancy.objects.aggregate(
+        total = Count("id"),
+        new = Count("id", filter = Q(status = "New")),
+        invalid = Count("id", filter = Q(status = "Invalid")),
+        done = Count("id", filter = Q(status = "Done")),
+    )
+
+    return [
+        ["Total Food Banks", foodbanks["total"]],
+        ["Total Locations", locations["total"]],
+        ["Headline Locations", locations["total"] + foodbanks["total"]],
+        ["Donation Points", donation_points],
+        ["Headline DP", donation_points + foodbanks["not_administrative"] + foodbanks["delivery_address"] + locations["donation_points"]],
+        ["FB With DP", foodbanks["with_donation_points"]],
+        ["Newest Edit", foodbanks["newest_edit"]],
+        ["Oldest Edit", foodbanks["oldest_edit"]],
+        ["Total Discrepancies", discrepancies["total"]],
+        ["Discrepancies Outstanding", discrepancies["new"]],
+        ["Discrepancies Invalid", discrepancies["invalid"]],
+        ["Discrepancies Done", discrepancies["done"]],
+    ]
+
+
+def order_stats():
+    from givefood.models import Order
+
+    totals = Order.objects.aggregate(
+        weight = Coalesce(Sum("weight"), Value(0)),
+        calories = Coalesce(Sum("calories"), Value(0)),
+        items = Coalesce(Sum("no_items"), Value(0)),
+        cost = Coalesce(Sum("cost"), Value(0)),
+        orders = Count("id"),
+    )
+    total_weight = totals["weight"] / 1000
+
+    return [
+        ["Total Weight", total_weight],
+        ["Total Calories", totals["calories"]],
+        ["Total Items", totals["items"]],
+        ["Total Orders", totals["orders"]],
+        ["Total Cost", float(totals["cost"]) / 100],
+        ["Total Weight (inc. packaging)", round(total_weight * PACKAGING_WEIGHT_PC, 2)],
+    ]
+
+
+def subscriber_stats():
+    from givefood.models import FoodbankSubscriber
+
+    subscribers = FoodbankSubscriber.objects.aggregate(
+        confirmed_count = Count("id", filter = Q(confirmed = True)),
+        unconfirmed_count = Count("id", filter = Q(confirmed = False)),
+    )
+
+    return [
+        ["Confirmed", subscribers["confirmed_count"]],
+        ["Unconfirmed", subscribers["unconfirmed_count"]],
+    ]
+
+
+def need_stats():
+    from givefood.models import FoodbankChange, FoodbankChangeLine
+
+    lines = FoodbankChangeLine.objects.aggregate(
+        total = Count("id"),
+        need = Count("id", filter = Q(type = "need")),
+        excess = Count("id", filter = Q(type = "excess")),
+    )
+
+    return [
+        ["Needs", FoodbankChange.objects.count()],
+        ["Items", lines["total"]],
+        ["Needed Items", lines["need"]],
+        ["Excess Items", lines["excess"]],
+    ]
+
+
+def subscriber_graph():
+    """Subscriptions of each type per year-week, counted by the database rather than loading every subscriber."""
+    from givefood.models import FoodbankSubscriber, MobileSubscriber, WebPushSubscription, WhatsappSubscriber
+
+    subscribers = {
+        "email": FoodbankSubscriber.objects.filter(confirmed = True),
+        "whatsapp": WhatsappSubscriber.objects.all(),
+        "webpush": WebPushSubscription.objects.all(),
+        "mobile": MobileSubscriber.objects.all(),
+    }
+
+    weeks = {}
+    for sub_type, queryset in subscribers.items():
+        # The calendar year with the ISO week, in UTC, as the keys have always been
+        counts = queryset.values(
+            year = ExtractYear("created", tzinfo = datetime.timezone.utc),
+            week = ExtractWeek("created", tzinfo = datetime.timezone.utc),
+        ).annotate(subs = Count("id")).order_by()
+        for count in counts:
+            week = weeks.setdefault((count["year"], count["week"]), dict.fromkeys(subscribers, 0))
+            week[sub_type] = count["subs"]
+
+    week_subs = []
+    for (year, week), counts in sorted(weeks.items()):
+        counts["total"] = sum(counts.values())
+        week_subs.append(["%s-%s" % (year, week), counts])
+    return week_subs
+
+
+# Snapshot name, which is also the admin URL name of its page, and what builds it
+STATS = {
+    "edit_stats": edit_stats,
+    "order_stats": order_stats,
+    "subscriber_stats": subscriber_stats,
+    "need_stats": need_stats,
+    "subscriber_graph": subscriber_graph,
+}
+
+
+def refresh_stats(names = None):
+    """Work out and store the named snapshots, or all of them. Returns the snapshots."""
+    from givefood.models import StatsSnapshot
+
+    snapshots = []
+    for name in names or STATS:
+        started = monotonic()
+        data = STATS[name]()
+        snapshot, created = StatsSnapshot.objects.update_or_create(
+            name = name,
+            defaults = {
+                "data": data,
+                "computed": timezone.now(),
+                "took_ms": int((monotonic() - started) * 1000),
+            },
+        )
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def get_stats(name):
+    """
+    A snapshot's figures as an ordered dict, and the snapshot they're from.
+
+    A snapshot that hasn't been built yet is built now. Dates come back out
+    of the JSON as datetimes.
+    """
+    from givefood.models import StatsSnapshot
+
+    snapshot = StatsSnapshot.objects.filter(name = name).first()
+    if snapshot is None:
+        snapshot = refresh_stats([name])[0]
+        # As it would be read back, rather than as built
+        snapshot.refresh_from_db()
+
+    stats = {}
+    for label, value in snapshot.data:
+        if isinstance(value, str):
+            value = parse_datetime(value) or value
+        stats[label] = value
+    return stats, snapshot
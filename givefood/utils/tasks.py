@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shaping how the task queues run, on top of django_tasks_db.
+
+Each queue's limits are in settings.TASK_QUEUE_LIMITS. The backend here
+enqueues a task identical to one still waiting only once, so five saves of
+one food bank's locations purge its pages once. manage.py task_worker runs
+tasks as db_worker does, but holds each queue to how many of its tasks run
+at once and how fast they start, so the services behind them aren't sent
+more than they'll take. queue_stats() reports each queue's depth and how
+long its tasks wait and run.
+"""
+
+import datetime
+import logging
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, F, Min, Q
+from django.utils import timezone
+from django_tasks.base import TaskResultStatus
+from django_tasks_db import DatabaseBackend as BaseDatabaseBackend
+from django_tasks_db.compat import normalize_json
+
+
+# How long a task waits when its queue already has as many running as it's allowed
+SLOT_WAIT_SECONDS = 5
+
+
+def queue_limits(queue_name):
+    return getattr(settings, "TASK_QUEUE_LIMITS", {}).get(queue_name, {})
+
+
+class DatabaseBackend(BaseDatabaseBackend):
+    """
+    django_tasks_db's backend, coalescing duplicate tasks on the queues that
+    ask for it.
+
+    A task is a duplicate if one with the same arguments is still waiting
+    to run. The task already queued is returned instead, and will do the
+    same work. Tasks already running aren't coalesced with, as they may
+    have read what the new task is queued to see.
+    """
+
+    def _task_to_db_task(self, task, args, kwargs):
+        from django_tasks_db.models import DBTaskResult
+
+        if not queue_limits(task.queue_name).get("coalesce"):
+            return super()._task_to_db_task(task, args, kwargs)
+
+        args_kwargs = normalize_json({"args": args, "kwargs": kwargs})
+        with transaction.atomic():
+            # One enqueue of each task at a time, so two at once can't both miss the other
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [task.module_path])
+            waiting = DBTaskResult.objects.filter(
+                status = TaskResultStatus.READY,
+                backend_name = self.alias,
+                queue_name = task.queue_name,
+                task_path = task.module_path,
+                args_kwargs = args_kwargs,
+            ).first()
+            if waiting:
+                logging.debug("Coalesced %s into waiting task %s", task.module_path, waiting.id)
+                return waiting
+            return super()._task_to_db_task(task, args, kwargs)
+
+    async def _atask_to_db_task(self, task, args, kwargs):
+        # aenqueue() creates the row through this rather than the above
+        if not queue_limits(task.queue_name).get("coalesce"):
+            return await super()._atask_to_db_task(task, args, kwargs)
+        return await sync_to_async(self._task_to_db_task)(task, args, kwargs)
+
+
+def take_token(queue_name, rate, burst):
+    """
+    Take a token from the queue's bucket, shared by every worker.
+
+    The bucket fills at rate tokens a second up to burst. Returns 0 if a
+    token was taken, or the seconds until there'll be one.
+    """
+    from givefood.models import TaskQueueBucket
+
+    now = timezone.now()
+    with transaction.atomic():
+        bucket, created = TaskQueueBucket.objects.select_for_update().get_or_create(
+            queue_name = queue_name,
+            defaults = {"tokens": burst, "updated": now},
+        )
+        elapsed = max(0, (now - bucket.updated).total_seconds())
+        tokens = min(burst, bucket.tokens + rate * elapsed)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0
+        else:
+            wait = (1 - tokens) / rate
+        bucket.tokens = tokens
+        bucket.updated = now
+        bucket.save(update_fields = ["tokens", "updated"])
+    return wait
+
+
+@contextmanager
+def queue_slot(queue_name, concurrency = None):
+    """
+    Hold one of the queue's concurrency slots while the block runs, yielding
+    whether there was one free.
+
+    Each slot is a Postgres advisory lock, so it's shared by every worker
+    and let go if a worker dies.
+    """
+    if not concurrency:
+        yield True
+        return
+
+    slot = None
+    with connection.cursor() as cursor:
+        for candidate in range(concurrency):
+            cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s), %s)", ["task_queue:%s" % queue_name, candidate])
+            if cursor.fetchone()[0]:
+                slot = candidate
+                break
+    try:
+        yield slot is not None
+    finally:
+        if slot is not None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s), %s)", ["task_queue:%s" % queue_name, slot])
+
+
+def defer_task(db_task_result, seconds):
+    """Put a claimed task back in its queue, to run no sooner than seconds from now."""
+    db_task_result.status = TaskResultStatus.READY
+    db_task_result.started_at = None
+    db_task_result.run_after = timezone.now() + datetime.timedelta(seconds = seconds)
+    db_task_result.save(update_fields = ["status", "started_at", "run_after"])
+
+
+def run_limited(db_task_result, run):
+    """
+    Run a claimed task with run() if its queue has a slot free and a token
+    to start it, or put it back to wait. Returns whether it ran.
+    """
+    queue_name = db_task_result.queue_name
+    limits = queue_limits(queue_name)
+
+    with queue_slot(queue_name, limits.get("concurrency")) as has_slot:
+        if not has_slot:
+            defer_task(db_task_result, SLOT_WAIT_SECONDS)
+            return False
+        if limits.get("rate"):
+            wait = take_token(queue_name, limits["rate"], limits.get("burst", 1))
+            if wait:
+                defer_task(db_task_result, wait)
+                return False
+        run(db_task_result)
+        return True
+
+
+def queue_stats(since):
+    """
+    Each queue's tasks waiting and running, how long the oldest has waited,
+    and of those finished since, how many failed and how long they waited
+    and ran on average, in seconds.
+    """
+    from django_tasks_db.models import DBTaskResult
+
+    finished = Q(finished_at__gte = since)
+    rows = DBTaskResult.objects.filter(
+        Q(status__in = [TaskResultStatus.READY, TaskResultStatus.RUNNING]) | finished
+    ).values("queue_name").annotate(
+        waiting = Count("id", filter = Q(status = TaskResultStatus.READY)),
+        running = Count("id", filter = Q(status = TaskResultStatus.RUNNING)),
+        oldest_enqueued = Min("enqueued_at", filter = Q(status = TaskResultStatus.READY)),
+        finished = Count("id", filter = finished),
+        failed = Count("id", filter = finished & Q(status = TaskResultStatus.FAILED)),
+        wait = Avg(F("started_at") - F("enqueued_at"), filter = finished),
+        run = Avg(F("finished_at") - F("started_at"), filter = finished),
+    ).order_by("queue_name")
+
+    stats = []
+    for row in rows:
+        for field in ("wait", "run"):
+            if row[field] is not None:
+                row[field] = round(row[field].total_seconds(), 1)
+        stats.append(row)
+    return stats
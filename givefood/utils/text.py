@@ -115,21 +115,35 @@ def clean_foodbank_need_text(text):
     return text
 
 
-def get_calories(text, weight, quantity):
-    """Calculate total calories for a given food item name, weight in grams, and quantity."""
+def get_calories(text, weight, quantity, item_calories = None):
+    """Calculate total calories for a given food item name, weight in grams, and quantity.
+
+    item_calories is a dict of item name to calories per 100g, such as from
+    get_item_calories(), to look the item up in rather than the database.
+    """
     from givefood.models import OrderItem
 
-    try:
-        order_item = OrderItem.objects.get(name = text)
-        calories = order_item.calories
-    except OrderItem.DoesNotExist:
-        calories = 0
+    if item_calories is not None:
+        calories = item_calories.get(text, 0)
+    else:
+        try:
+            order_item = OrderItem.objects.get(name = text)
+            calories = order_item.calories
+        except OrderItem.DoesNotExist:
+            calories = 0
 
     total_calories = calories * (weight/100) * quantity
     # logging.info("calories: %s, weight: %s, total: %s" % (calories,weight,total_calories))
     return total_calories
 
 
+def get_item_calories(names):
+    """A dict of calories per 100g for each of the item names that has an OrderItem, in one query."""
+    from givefood.models import OrderItem
+
+    return dict(OrderItem.objects.filter(name__in = set(names)).values_list("name", "calories"))
+
+
 def group_list(lst):
     """Group a list into (item, count) tuples using a Counter."""
     return list(Counter(lst).items())
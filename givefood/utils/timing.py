@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import contextvars
+import time
+from functools import wraps
+from urllib.parse import urlparse
+
+import requests
+
+
+# Outbound hosts we care about, grouped by who we're waiting on. Anything
+# else is counted as plain "http".
+HTTP_SERVICES = [
+    ("googleapis.com", "google"),
+    ("google.com", "google"),
+    ("postcodes.io", "postcodes"),
+    ("openrouter.ai", "openrouter"),
+    ("cloudflare.com", "cloudflare"),
+]
+
+_MISSING = object()
+
+_current = contextvars.ContextVar("request_timings", default = None)
+
+
+class RequestTimings:
+    """
+    What one request spent its time on.
+
+    Each metric is a [count, seconds] pair. Cache metrics also keep hits and
+    misses, keyed by the cache alias, so a view leaning on a cold cache
+    shows up as such rather than just as slow.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.metrics = {}
+        self.cache_hits = {}
+        self.cache_misses = {}
+        self.template_depth = 0
+        # get_many() and set_many() can be made of get()s and set()s on
+        # the same connection, which mustn't be counted twice
+        self.in_cache = False
+
+    def add(self, metric, seconds, count = 1):
+        totals = self.metrics.setdefault(metric, [0, 0.0])
+        totals[0] += count
+        totals[1] += seconds
+
+    def cache_lookup(self, alias, hits, misses):
+        self.cache_hits[alias] = self.cache_hits.get(alias, 0) + hits
+        self.cache_misses[alias] = self.cache_misses.get(alias, 0) + misses
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def header(self):
+        """The Server-Timing header value, with durations in milliseconds."""
+        entries = []
+        for metric, (count, seconds) in sorted(self.metrics.items()):
+            entry = "%s;dur=%.1f" % (metric, seconds * 1000)
+            if metric.startswith("cache-"):
+                alias = metric[len("cache-"):]
+                entry += ';desc="%s hit %s miss"' % (self.cache_hits.get(alias, 0), self.cache_misses.get(alias, 0))
+            elif metric != "tpl":
+                entry += ';desc="%s"' % count
+            entries.append(entry)
+        entries.append("total;dur=%.1f" % (self.total() * 1000))
+        return ", ".join(entries)
+
+    def as_dict(self):
+        """The same numbers as the header, for a structured log line."""
+        data = {"total_ms": round(self.total() * 1000, 1)}
+        for metric, (count, seconds) in sorted(self.metrics.items()):
+            data[metric] = {"count": count, "ms": round(seconds * 1000, 1)}
+            if metric.startswith("cache-"):
+                alias = metric[len("cache-"):]
+                data[metric]["hits"] = self.cache_hits.get(alias, 0)
+                data[metric]["misses"] = self.cache_misses.get(alias, 0)
+        return data
+
+
+def start_timings():
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def stop_timings(token):
+    _current.reset(token)
+
+
+def current_timings():
+    """The timings of the request being handled, or None outside of one."""
+    return _current.get()
+
+
+def time_db_query(execute, sql, params, many, context):
+    """A connection.execute_wrapper() that counts queries and their time."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add("db", time.perf_counter() - start)
+
+
+def http_service(url):
+    host = urlparse(url).hostname or ""
+    for domain, service in HTTP_SERVICES:
+        if host == domain or host.endswith("." + domain):
+            return service
+    return "http"
+
+
+def instrument_cache(alias, cache):
+    """
+    Time lookups on one cache connection and count its hits and misses.
+
+    Django gives each thread its own connection per alias, so this wraps
+    the methods on the instance rather than the backend class, which keeps
+    the alias and leaves any other use of the class alone. It's a no-op on
+    a connection that's already wrapped.
+    """
+    if getattr(cache, "_givefood_timed", False):
+        return
+    metric = "cache-%s" % alias
+    original_get = cache.get
+    original_get_many = cache.get_many
+
+    @wraps(original_get)
+    def get(key, default = None, version = None):
+        timings = _current.get()
+        if timings is None or timings.in_cache:
+            return original_get(key, default, version)
+        start = time.perf_counter()
+        timings.in_cache = True
+        try:
+            value = original_get(key, _MISSING, version)
+        finally:
+            timings.in_cache = False
+        timings.add(metric, time.perf_counter() - start)
+        if value is _MISSING:
+            timings.cache_lookup(alias, 0, 1)
+            return default
+        timings.cache_lookup(alias, 1, 0)
+        return value
+
+    @wraps(original_get_many)
+    def get_many(keys, version = None):
+        timings = _current.get()
+        if timings is None or timings.in_cache:
+            return original_get_many(keys, version)
+        keys = list(keys)
+        start = time.perf_counter()
+        timings.in_cache = True
+        try:
+            values = original_get_many(keys, version)
+        finally:
+            timings.in_cache = False
+        timings.add(metric, time.perf_counter() - start)
+        timings.cache_lookup(alias, len(values), len(keys) - len(values))
+        return values
+
+    def timed(original):
+        @wraps(original)
+        def method(*args, **kwargs):
+            timings = _current.get()
+            if timings is None or timings.in_cache:
+                return original(*args, **kwargs)
+            start = time.perf_counter()
+            timings.in_cache = True
+            try:
+                return original(*args, **kwargs)
+            finally:
+                timings.in_cache = False
+                timings.add(metric, time.perf_counter() - start)
+        return method
+
+    cache.get = get
+    cache.get_many = get_many
+    for name in ("set", "add", "delete", "set_many", "delete_many"):
+        setattr(cache, name, timed(getattr(cache, name)))
+    cache._givefood_timed = True
+
+
+_hooks_installed = False
+
+
+def install_timing_hooks():
+    """
+    Wrap template rendering and outbound HTTP so they're timed per request.
+
+    Both are patched once per process. Only the outermost template render is
+    timed, as {% include %}s render inside it. Every requests.get/post goes
+    through Session.send, so that's where HTTP is timed, grouped by service.
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+
+    @wraps(original_render)
+    def render(self, *args, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return original_render(self, *args, **kwargs)
+        timings.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return original_render(self, *args, **kwargs)
+        finally:
+            timings.template_depth -= 1
+            if timings.template_depth == 0:
+                timings.add("tpl", time.perf_counter() - start)
+
+    Template.render = render
+
+    original_send = requests.Session.send
+
+    @wraps(original_send)
+    def send(self, request, **kwargs):
+        timings = _current.get()
+        if timings is None:
+            return original_send(self, request, **kwargs)
+        start = time.perf_counter()
+        try:
+            return original_send(self, request, **kwargs)
+        finally:
+            timings.add("http-%s" % http_service(request.url), time.perf_counter() - start)
+
+    requests.Session.send = send
@@ -16,9 +16,10 @@ from django.contrib.humanize.templatetags.humanize import intcomma
 from session_csrf import anonymous_csrf
 from django.conf import settings
 
-from givefood.models import Foodbank, FoodbankArticle, FoodbankChange, FoodbankDonationPoint, FoodbankHit, FoodbankLocation, OrderGroup, ParliamentaryConstituency, Place, Postcode
+from givefood.models import Foodbank, FoodbankArticle, FoodbankChange, FoodbankDonationPoint, FoodbankHit, FoodbankLocation, MapPoint, OrderGroup, ParliamentaryConstituency, Place, Postcode
 from givefood.forms import FoodbankRegistrationForm, FlagForm
-from givefood.utils.cache import get_cred, get_site_stats
+from givefood.utils.autocomplete import get_autocomplete_index
+from givefood.utils.cache import get_cred, get_site_stats, versioned_cache_page
 from givefood.utils.general import validate_turnstile
 from givefood.utils.notifications import send_email
 from givefood.utils.text import get_user_ip
@@ -281,7 +282,7 @@ def country(request, country_slug):
     return render(request, "public/country.html", template_vars)
 
 
-@cache_page(SECONDS_IN_HOUR)
+@versioned_cache_page(SECONDS_IN_HOUR, ("foodbank", "location", "donationpoint"))
 def country_geojson(request, country_slug):
     """
     GeoJSON endpoint for country-specific food banks
@@ -291,133 +292,12 @@ def country_geojson(request, country_slug):
     if not country_name:
         raise Http404("Country not found")
 
-    # Get all food banks, locations, and donation points for this country
-    foodbanks = Foodbank.objects.filter(
-        country=country_name,
-        is_closed=False
-    ).only(
-        'slug', 'name', 'alt_name', 'address', 'postcode',
-        'lat_lng', 'delivery_address', 'delivery_lat_lng'
-    )
-    locations = FoodbankLocation.objects.filter(
-        country=country_name,
-        is_closed=False
-    ).only(
-        'name', 'foodbank_name', 'foodbank_slug', 'slug',
-        'address', 'postcode', 'lat_lng', 'boundary_geojson'
-    )
-    donationpoints = FoodbankDonationPoint.objects.filter(
-        country=country_name,
-        is_closed=False
-    ).only(
-        'name', 'foodbank_name', 'foodbank_slug', 'slug',
-        'address', 'postcode', 'lat_lng'
+    # Food banks, delivery addresses, locations and donation points
+    points = sorted(
+        MapPoint.objects.filter(country=country_name, is_closed=False),
+        key=MapPoint.map_order,
     )
-
-    features = []
-    decimal_places = 4
-
-    # Add food banks
-    for foodbank in foodbanks:
-        features.append({
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [
-                    round(foodbank.long(), decimal_places),
-                    round(foodbank.latt(), decimal_places)
-                ],
-            },
-            "properties": {
-                "type": "f",
-                "name": foodbank.full_name(),
-                "address": foodbank.full_address(),
-                "url": reverse(
-                    "wfbn:foodbank",
-                    kwargs={"slug": foodbank.slug}
-                ),
-            }
-        })
-
-        # Add delivery address if it exists (check both fields)
-        if foodbank.delivery_address and foodbank.delivery_lat_lng:
-            delivery_lat = foodbank.delivery_lat_lng.split(",")[0]
-            delivery_lng = foodbank.delivery_lat_lng.split(",")[1]
-            features.append({
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [
-                        round(float(delivery_lng), decimal_places),
-                        round(float(delivery_lat), decimal_places)
-                    ],
-                },
-                "properties": {
-                    "type": "f",
-                    "name": "%s Delivery Address" % (foodbank.full_name()),
-                    "address": foodbank.delivery_address,
-                    "url": reverse(
-                        "wfbn:foodbank",
-                        kwargs={"slug": foodbank.slug}
-                    ),
-                }
-            })
-
-    # Add locations
-    for location in locations:
-        lat = location.lat_lng.split(",")[0]
-        lng = location.lat_lng.split(",")[1]
-        features.append({
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [
-                    round(float(lng), decimal_places),
-                    round(float(lat), decimal_places)
-                ],
-            },
-            "properties": {
-                "type": "l",
-                "name": location.name,
-                "foodbank": location.foodbank_name,
-                "address": location.full_address(),
-                "url": reverse(
-                    "wfbn:foodbank_location",
-                    kwargs={
-                        "slug": location.foodbank_slug,
-                        "locslug": location.slug
-                    }
-                ),
-            }
-        })
-
-    # Add donation points
-    for dp in donationpoints:
-        lat = dp.lat_lng.split(",")[0]
-        lng = dp.lat_lng.split(",")[1]
-        features.append({
-            "type": "Feature",
-            "geometry": {
-                "type": "Point",
-                "coordinates": [
-                    round(float(lng), decimal_places),
-                    round(float(lat), decimal_places)
-                ],
-            },
-            "properties": {
-                "type": "d",
-                "name": dp.name,
-                "foodbank": dp.foodbank_name,
-                "address": dp.full_address(),
-                "url": reverse(
-                    "wfbn:foodbank_donationpoint",
-                    kwargs={
-                        "slug": dp.foodbank_slug,
-                        "dpslug": dp.slug
-                    }
-                ),
-            }
-        })
+    features = [point.geojson_feature(decimal_places=4) for point in points]
 
     response_dict = {
         "type": "FeatureCollection",
@@ -668,15 +548,12 @@ def sitemap(request):
         'facebook_page',
     )
     constituencies = ParliamentaryConstituency.objects.all().only('slug')
-    locations = (
-        FoodbankLocation.objects.all()
-        .exclude(is_closed=True)
-        .only('foodbank_slug', 'slug')
-    )
-    donationpoints = (
-        FoodbankDonationPoint.objects.all()
-        .exclude(is_closed=True)
-        .only('foodbank_slug', 'slug')
+    # Location and donation point pages, with their URLs already built
+    point_urls = (
+        MapPoint.objects
+        .filter(point_type__in=["location", "donationpoint"], is_closed=False)
+        .order_by('-point_type', 'id')
+        .values_list('url', flat=True)
     )
 
     template_vars = {
@@ -685,8 +562,7 @@ def sitemap(request):
         "country_slugs": country_slugs,
         "foodbanks": foodbanks,
         "constituencies": constituencies,
-        "locations": locations,
-        "donationpoints": donationpoints,
+        "point_urls": point_urls,
     }
     return render(
         request,
@@ -1530,6 +1406,9 @@ def address_autocomplete(request):
     descending so more populated areas appear first.
     Returns JSON with name and lat_lng for matching results.
 
+    Answered from the memory mapped index built by build_autocomplete_index
+    when there is one, and from the database otherwise.
+
     Example: /aac/?q=sw
     """
     query = request.GET.get("q", "").strip()
@@ -1538,11 +1417,16 @@ def address_autocomplete(request):
         return JsonResponse([], safe=False)
     
     results = []
+    index = get_autocomplete_index()
     escaped = _like_escape(query.upper())
     prefix_pattern = "%s%%" % escaped
 
     # Search places - two-pass approach: prefix matches first, then substring matches
-    for name, lat_lng, county in _place_matches(prefix_pattern, None, 10):
+    if index:
+        places = index.place_prefix(query, 10)
+    else:
+        places = _place_matches(prefix_pattern, None, 10)
+    for name, lat_lng, county in places:
         results.append({
             "n": name,
             "l": lat_lng,
@@ -1555,7 +1439,11 @@ def address_autocomplete(request):
     # so a substring search there means reading the whole table for results that
     # are barely worth having.
     if len(results) < 10 and len(query) >= 3:
-        for name, lat_lng, county in _place_matches("%%%s" % prefix_pattern, prefix_pattern, 10 - len(results)):
+        if index:
+            places = index.place_substring(query, 10 - len(results))
+        else:
+            places = _place_matches("%%%s" % prefix_pattern, prefix_pattern, 10 - len(results))
+        for name, lat_lng, county in places:
             results.append({
                 "n": name,
                 "l": lat_lng,
@@ -1565,17 +1453,21 @@ def address_autocomplete(request):
 
     # Search postcodes - only fetch if we have room for more results
     if len(results) < 20:
-        postcode_query = query.upper().replace(" ", "")
-        postcodes = Postcode.objects.filter(
-            postcode_normalized__startswith=postcode_query
-        ).values('postcode', 'lat_lng', 'county')[:min(10, 20 - len(results))]
-        
-        for postcode in postcodes:
+        limit = min(10, 20 - len(results))
+        if index:
+            postcodes = index.postcode_prefix(query, limit)
+        else:
+            postcode_query = query.upper().replace(" ", "")
+            postcodes = Postcode.objects.filter(
+                postcode_normalized__startswith=postcode_query
+            ).values_list('postcode', 'lat_lng', 'county')[:limit]
+
+        for postcode, lat_lng, county in postcodes:
             results.append({
-                "n": postcode['postcode'],
-                "l": postcode['lat_lng'],
+                "n": postcode,
+                "l": lat_lng,
                 "t": "c",
-                "c": postcode['county']
+                "c": county
             })
     
     response = JsonResponse(results, safe=False)
@@ -4,4 +4,10 @@ timeout = 1200
 # database traffic (460 txn/s vs 36). Halved rather than cut to what traffic
 # alone implies, because the 1200s timeout above says some endpoints tie a
 # worker up for a long time and the spare capacity absorbs that.
-workers = 4
\ No newline at end of file
+workers = 4
+
+
+def worker_exit(server, worker):
+    # Write out the food bank hits this worker is still holding in memory
+    from givefood.utils.hits import hit_counter
+    hit_counter.flush()
@@ -26,6 +26,12 @@ CACHES = {
     }
 }
 
+# Autocomplete tests run against the database unless they build an index
+AUTOCOMPLETE_INDEX_PATH = None
+
+# Proxied images are fetched every time unless a test gives them somewhere to go
+BLOB_CACHE_DIR = None
+
 # Disable Sentry for tests
 SENTRY_DSN = None
 